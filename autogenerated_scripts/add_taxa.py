@@ -10,11 +10,18 @@ __maintainer__ = "Daniel McDonald"
 __email__ = "wasade@gmail.com"
 __status__ = "Development"
 
-from cmd_abstraction.util import cmd_main
-from cmd_abstraction.autogenerated_interfaces import AddTaxa
 from sys import argv
+from cmd_abstraction.command_index import serve_help
+
+if __name__ == "__main__":
+    # help is printed from the command index, when it's up to date,
+    # without importing the command (or qiime)
+    serve_help('AddTaxa', argv)
+
+from cmd_abstraction.util import cmd_main
+from cmd_abstraction.autogenerated_interfaces import get_command_class
 
-cmd = AddTaxa()
+cmd = get_command_class('AddTaxa')()
 # script info is locally accessible for backward 
 # compatibility
 script_info = cmd.getScriptInfo()
@@ -10,11 +10,18 @@ __maintainer__ = "Greg Caporaso"
 __email__ = "gregcaporaso@gmail.com"
 __status__ = "Development"
 
-from cmd_abstraction.util import cmd_main
-from cmd_abstraction.autogenerated_interfaces import PickOtusThroughOtuTable
 from sys import argv
+from cmd_abstraction.command_index import serve_help
+
+if __name__ == "__main__":
+    # help is printed from the command index, when it's up to date,
+    # without importing the command (or qiime)
+    serve_help('PickOtusThroughOtuTable', argv)
+
+from cmd_abstraction.util import cmd_main
+from cmd_abstraction.autogenerated_interfaces import get_command_class
 
-cmd = PickOtusThroughOtuTable()
+cmd = get_command_class('PickOtusThroughOtuTable')()
 # script info is locally accessible for backward 
 # compatibility
 script_info = cmd.getScriptInfo()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+import sys
+from os.path import join, dirname, abspath, getsize
+from tempfile import mkdtemp
+from shutil import rmtree
+from time import time
+from qiime.util import parse_command_line_parameters, make_option
+from biom.parse import parse_biom_table
+import synthetic_data
+
+repo_dir = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, repo_dir)
+from cmd_abstraction.binary_biom import BinaryBiomTable
+from cmd_abstraction.observation_metadata import parse_taxonomy_columns
+from cmd_abstraction.table_annotation import add_taxa_to_table
+
+script_info = {}
+script_info['brief_description'] = "Compare the JSON and binary biom output of add_taxa"
+script_info['script_description'] = "For synthetic OTU tables of increasing size, time adding taxonomy to the table and writing it as biom JSON (parse_biom_table and write_biom_table) and in the binary format (add_taxa.py --output_format binary), then time reading each output back: parsing the JSON with parse_biom_table, and reading the observation ids, the taxonomy and the counts from the memory-mapped binary table. The sizes of the outputs are also reported."
+script_info['script_usage'] = [("","Benchmark the default table sizes","%prog"),
+ ("","Benchmark 1,000,000 observations in 50 samples","%prog -n 1000000 -s 50")]
+script_info['output_description']= "A tab-separated table of times (median of the repeats, in seconds) and sizes (in MB) is written to stdout."
+script_info['required_options'] = []
+script_info['optional_options'] = [
+ make_option('-n','--num_observations',type="string",default='1000,10000,100000',
+             help='comma-separated table sizes to benchmark [default: %default]'),
+ make_option('-s','--num_samples',type="int",default=20,
+             help='number of samples in each table [default: %default]'),
+ make_option('-r','--num_repeats',type="int",default=3,
+             help='number of times to repeat each measurement [default: %default]'),
+]
+script_info['version'] = __version__
+
+def median(values):
+    values = sorted(values)
+    mid = len(values) // 2
+    if len(values) % 2:
+        return values[mid]
+    return (values[mid - 1] + values[mid]) / 2
+
+def time_repeats(f, num_repeats):
+    """ Return the median wall time of num_repeats calls to f
+    """
+    times = []
+    for i in range(num_repeats):
+        start = time()
+        f()
+        times.append(time() - start)
+    return median(times)
+
+def read_json_table(fp):
+    parse_biom_table(open(fp, 'U'))
+
+def read_binary_table(fp):
+    table = BinaryBiomTable(fp)
+    table.ObservationIds
+    table.getObservationMetadataColumn('taxonomy')
+    table.getObservationMatrix()
+    table.close()
+
+def main():
+    option_parser, opts, args =\
+       parse_command_line_parameters(**script_info)
+    sizes = map(int, opts.num_observations.split(','))
+    temp_dir = mkdtemp(prefix='binary_biom_benchmark_')
+    labels = ['taxonomy', 'score']
+    print '\t'.join(['#observations', 'JSON write (s)', 'binary write (s)',
+                     'JSON read (s)', 'binary read (s)', 'JSON size (MB)',
+                     'binary size (MB)'])
+    try:
+        for size in sizes:
+            input_fp = join(temp_dir, 'table_%d.biom' % size)
+            input_f = open(input_fp, 'w')
+            synthetic_data.write_biom_table(input_f, size, opts.num_samples)
+            input_f.close()
+            taxonomy_fp = join(temp_dir, 'taxonomy_%d.txt' % size)
+            taxonomy_f = open(taxonomy_fp, 'w')
+            synthetic_data.write_taxonomy(taxonomy_f, size)
+            taxonomy_f.close()
+            observation_metadata = parse_taxonomy_columns(
+             open(taxonomy_fp, 'U'), labels=labels)
+            json_fp = join(temp_dir, 'json_%d.biom' % size)
+            binary_fp = join(temp_dir, 'binary_%d.bbiom' % size)
+            results = [size]
+            for output_fp, output_format in [(json_fp, 'json'),
+                                             (binary_fp, 'binary')]:
+                results.append(time_repeats(
+                 lambda: add_taxa_to_table(input_fp, output_fp,
+                                           observation_metadata, labels,
+                                           output_format),
+                 opts.num_repeats))
+            results.append(time_repeats(lambda: read_json_table(json_fp),
+                                        opts.num_repeats))
+            results.append(time_repeats(lambda: read_binary_table(binary_fp),
+                                        opts.num_repeats))
+            results.append(getsize(json_fp) / 2**20)
+            results.append(getsize(binary_fp) / 2**20)
+            print '%d\t%1.3f\t%1.3f\t%1.3f\t%1.3f\t%1.1f\t%1.1f' % \
+             tuple(results)
+    finally:
+        rmtree(temp_dir)
+
+if __name__ == "__main__":
+    main()
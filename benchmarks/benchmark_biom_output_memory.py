@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+import re
+import sys
+from os import environ, pathsep
+from os.path import join, dirname, abspath
+from subprocess import Popen, PIPE
+from tempfile import mkdtemp
+from shutil import rmtree
+from qiime.util import parse_command_line_parameters, make_option
+import synthetic_data
+
+script_info = {}
+script_info['brief_description'] = "Compare peak memory of string and streaming biom output"
+script_info['script_description'] = "For synthetic OTU tables of increasing size, measure the peak resident set size of writing the table with format_biom_table (which builds the whole document as a string) and with cmd_abstraction.biom_output.write_biom_table (which streams it), and confirm that the outputs are identical apart from their creation dates."
+script_info['script_usage'] = [("","Benchmark the default table sizes","%prog"),
+ ("","Benchmark 200,000 observations in 50 samples","%prog -n 200000 -s 50")]
+script_info['output_description']= "A tab-separated table of peak RSS (in MB) is written to stdout."
+script_info['required_options'] = []
+script_info['optional_options'] = [
+ make_option('-n','--num_observations',type="string",default='1000,10000,100000',
+             help='comma-separated table sizes to benchmark [default: %default]'),
+ make_option('-s','--num_samples',type="int",default=20,
+             help='number of samples in each table [default: %default]'),
+]
+script_info['version'] = __version__
+
+repo_dir = dirname(dirname(abspath(__file__)))
+
+# run in a fresh interpreter for each measurement, as peak RSS can't be reset
+_measure_script = """
+from resource import getrusage, RUSAGE_SELF
+from biom.parse import parse_biom_table
+from qiime.format import format_biom_table
+from cmd_abstraction.biom_output import write_biom_table
+table = parse_biom_table(open(%(input_fp)r,'U'))
+table_rss = getrusage(RUSAGE_SELF).ru_maxrss
+output_f = open(%(output_fp)r,'w')
+if %(streaming)r:
+    write_biom_table(table, output_f)
+else:
+    output_f.write(format_biom_table(table))
+output_f.close()
+print table_rss, getrusage(RUSAGE_SELF).ru_maxrss
+"""
+
+def measure_peak_rss(input_fp, output_fp, streaming):
+    """ Return (peak RSS after parsing, peak RSS after writing) in MB
+    """
+    env = dict(environ)
+    env['PYTHONPATH'] = pathsep.join([repo_dir, env.get('PYTHONPATH','')])
+    proc = Popen([sys.executable, '-c', _measure_script % locals()],
+                 stdout=PIPE, stderr=PIPE, env=env)
+    stdout, stderr = proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError, stderr
+    # ru_maxrss is in kilobytes on linux
+    return [int(v) / 1024 for v in stdout.split()]
+
+_date_re = re.compile(r'"date": "[^"]*"')
+
+def outputs_match(fp1, fp2):
+    return _date_re.sub('', open(fp1).read()) == \
+           _date_re.sub('', open(fp2).read())
+
+def main():
+    option_parser, opts, args =\
+       parse_command_line_parameters(**script_info)
+    sizes = map(int, opts.num_observations.split(','))
+    temp_dir = mkdtemp(prefix='biom_output_benchmark_')
+    print '\t'.join(['#observations', 'parsed table RSS (MB)',
+                     'string output RSS (MB)', 'streaming output RSS (MB)',
+                     'identical output'])
+    try:
+        for size in sizes:
+            input_fp = join(temp_dir, 'table_%d.biom' % size)
+            input_f = open(input_fp, 'w')
+            synthetic_data.write_biom_table(input_f, size, opts.num_samples)
+            input_f.close()
+            string_fp = join(temp_dir, 'string_%d.biom' % size)
+            streaming_fp = join(temp_dir, 'streaming_%d.biom' % size)
+            table_rss, string_rss = \
+             measure_peak_rss(input_fp, string_fp, False)
+            table_rss, streaming_rss = \
+             measure_peak_rss(input_fp, streaming_fp, True)
+            print '%d\t%1.1f\t%1.1f\t%1.1f\t%s' % \
+             (size, table_rss, string_rss, streaming_rss,
+              outputs_match(string_fp, streaming_fp))
+    finally:
+        rmtree(temp_dir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+import sys
+from os.path import join, dirname, abspath, exists
+from shlex import split
+from time import time, sleep
+from subprocess import Popen, call, PIPE
+from tempfile import mkdtemp
+from shutil import rmtree
+from qiime.util import parse_command_line_parameters, make_option
+from cmd_abstraction.command_client import send_command
+
+script_info = {}
+script_info['brief_description'] = "Compare cold-start and warm-dispatch command latency"
+script_info['script_description'] = "Run a wrapper script repeatedly as a new process (cold start), then send the same command repeatedly to a QIIME command server (warm dispatch), and report the latency of each."
+script_info['script_usage'] = [("","Time add_taxa.py -h 25 times each way","%prog -s add_taxa -n 25"),
+ ("","Time a real add_taxa.py run","%prog -s add_taxa -a \"-i $PWD/otu_table.biom -o $PWD/out.biom -t $PWD/tax.txt\"")]
+script_info['output_description']= "Summary statistics are written to stdout."
+script_info['required_options'] = [
+ make_option('-s','--script_name',type="string",help='the wrapper script to benchmark (e.g., add_taxa)'),
+]
+script_info['optional_options'] = [
+ make_option('-a','--script_args',type="string",default='-h',
+             help='arguments to pass to the script [default: %default]'),
+ make_option('-n','--num_iterations',type="int",default=10,
+             help='number of times to run each way [default: %default]'),
+ make_option('-d','--script_dir',type="existing_dirpath",
+             default=join(dirname(dirname(abspath(__file__))),'autogenerated_scripts'),
+             help='directory containing the wrapper scripts [default: %default]'),
+]
+script_info['version'] = __version__
+
+repo_dir = dirname(dirname(abspath(__file__)))
+
+def summarize(times):
+    times = sorted(times)
+    n = len(times)
+    if n % 2:
+        median = times[n // 2]
+    else:
+        median = (times[n // 2 - 1] + times[n // 2]) / 2
+    return (min(times), median, sum(times) / n, max(times))
+
+def time_cold_start(script_fp, script_args, num_iterations):
+    result = []
+    for i in range(num_iterations):
+        start = time()
+        call([sys.executable, script_fp] + script_args,
+             stdout=PIPE, stderr=PIPE)
+        result.append(time() - start)
+    return result
+
+def time_warm_dispatch(socket_fp, script_fp, script_args, num_iterations):
+    result = []
+    for i in range(num_iterations):
+        start = time()
+        send_command(socket_fp, script_fp, [script_fp] + script_args)
+        result.append(time() - start)
+    return result
+
+def start_server(socket_fp, timeout=60):
+    server = Popen([sys.executable,
+                    join(repo_dir, 'scripts', 'start_qiime_command_server.py'),
+                    '-s', socket_fp])
+    start = time()
+    while not exists(socket_fp):
+        if time() - start > timeout or server.poll() is not None:
+            server.kill()
+            raise RuntimeError, "Command server failed to start."
+        sleep(0.05)
+    return server
+
+def main():
+    option_parser, opts, args =\
+       parse_command_line_parameters(**script_info)
+    script_fp = join(opts.script_dir, '%s.py' % opts.script_name)
+    script_args = split(opts.script_args)
+
+    cold_times = time_cold_start(script_fp, script_args, opts.num_iterations)
+
+    temp_dir = mkdtemp(prefix='cmd_server_benchmark_')
+    socket_fp = join(temp_dir, 'qiime.sock')
+    server = start_server(socket_fp)
+    try:
+        warm_times = time_warm_dispatch(socket_fp,
+                                        script_fp,
+                                        script_args,
+                                        opts.num_iterations)
+    finally:
+        server.terminate()
+        server.wait()
+        rmtree(temp_dir)
+
+    print "%s %s (%d iterations)" % (opts.script_name,
+                                     opts.script_args,
+                                     opts.num_iterations)
+    print "\tmin (s)\tmedian (s)\tmean (s)\tmax (s)"
+    for label, times in [('cold start', cold_times),
+                         ('warm dispatch', warm_times)]:
+        print "%s\t%s" % (label,
+                          '\t'.join(['%1.4f' % t for t in summarize(times)]))
+    cold_median = summarize(cold_times)[1]
+    warm_median = summarize(warm_times)[1]
+    if warm_median > 0:
+        print "Median speed-up: %1.1fx" % (cold_median / warm_median)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+import sys
+from os import environ, pathsep
+from os.path import join, dirname, abspath
+from subprocess import Popen, PIPE
+from tempfile import mkdtemp
+from shutil import rmtree
+from qiime.util import parse_command_line_parameters, make_option
+import synthetic_data
+
+script_info = {}
+script_info['brief_description'] = "Compare peak memory and time of the dict and column observation metadata merges"
+script_info['script_description'] = "For synthetic OTU tables and taxonomy files of increasing size, measure the peak resident set size and time of parsing the taxonomy and adding it to the table (as a biom JSON document) with qiime's parse_taxonomy_to_otu_metadata (a dict per line), and with cmd_abstraction.observation_metadata.parse_taxonomy_columns (columns of interned values and arrays), and confirm that the resulting tables are identical."
+script_info['script_usage'] = [("","Benchmark the default table sizes","%prog"),
+ ("","Benchmark 1,000,000 observations","%prog -n 1000000")]
+script_info['output_description']= "A tab-separated table of peak RSS (in MB) and times (in seconds) is written to stdout."
+script_info['required_options'] = []
+script_info['optional_options'] = [
+ make_option('-n','--num_observations',type="string",default='10000,100000,1000000',
+             help='comma-separated table sizes to benchmark [default: %default]'),
+ make_option('-s','--num_samples',type="int",default=2,
+             help='number of samples in each table [default: %default]'),
+]
+script_info['version'] = __version__
+
+repo_dir = dirname(dirname(abspath(__file__)))
+
+# run in a fresh interpreter for each measurement, as peak RSS can't be reset
+_measure_script = """
+from hashlib import md5
+from json import dumps
+from resource import getrusage, RUSAGE_SELF
+from time import time
+from qiime.parse import parse_taxonomy_to_otu_metadata
+from cmd_abstraction.binary_biom import (load_biom_document,
+                                         add_observation_metadata)
+from cmd_abstraction.observation_metadata import parse_taxonomy_columns
+doc = load_biom_document(%(table_fp)r)
+table_rss = getrusage(RUSAGE_SELF).ru_maxrss
+start = time()
+if %(columns)r:
+    observation_metadata = parse_taxonomy_columns(open(%(taxonomy_fp)r,'U'))
+    observation_metadata, missing_ids, extra_ids = \\
+     observation_metadata.getTableMetadata([r['id'] for r in doc['rows']])
+else:
+    observation_metadata = \\
+     parse_taxonomy_to_otu_metadata(open(%(taxonomy_fp)r,'U'))
+add_observation_metadata(doc, observation_metadata)
+elapsed = time() - start
+print table_rss, getrusage(RUSAGE_SELF).ru_maxrss, elapsed, \\
+ md5(dumps(doc['rows'])).hexdigest()
+"""
+
+def measure_merge(table_fp, taxonomy_fp, columns):
+    """ Return (peak RSS after loading the table (MB), peak RSS after the
+         merge (MB), time of the merge (s), md5 of the merged rows)
+    """
+    env = dict(environ)
+    env['PYTHONPATH'] = pathsep.join([repo_dir, env.get('PYTHONPATH','')])
+    proc = Popen([sys.executable, '-c', _measure_script % locals()],
+                 stdout=PIPE, stderr=PIPE, env=env)
+    stdout, stderr = proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError, stderr
+    table_rss, merge_rss, elapsed, digest = stdout.split()
+    # ru_maxrss is in kilobytes on linux
+    return int(table_rss) / 1024, int(merge_rss) / 1024, float(elapsed), \
+           digest
+
+def main():
+    option_parser, opts, args =\
+       parse_command_line_parameters(**script_info)
+    sizes = map(int, opts.num_observations.split(','))
+    temp_dir = mkdtemp(prefix='metadata_merge_benchmark_')
+    print '\t'.join(['#observations', 'table RSS (MB)', 'dict merge RSS (MB)',
+                     'column merge RSS (MB)', 'dict merge (s)',
+                     'column merge (s)', 'identical tables'])
+    try:
+        for size in sizes:
+            table_fp = join(temp_dir, 'table_%d.biom' % size)
+            table_f = open(table_fp, 'w')
+            synthetic_data.write_biom_table(table_f, size, opts.num_samples)
+            table_f.close()
+            taxonomy_fp = join(temp_dir, 'taxonomy_%d.txt' % size)
+            taxonomy_f = open(taxonomy_fp, 'w')
+            synthetic_data.write_taxonomy(taxonomy_f, size)
+            taxonomy_f.close()
+            table_rss, dict_rss, dict_time, dict_digest = \
+             measure_merge(table_fp, taxonomy_fp, False)
+            table_rss, column_rss, column_time, column_digest = \
+             measure_merge(table_fp, taxonomy_fp, True)
+            print '%d\t%1.1f\t%1.1f\t%1.1f\t%1.2f\t%1.2f\t%s' % \
+             (size, table_rss, dict_rss, column_rss, dict_time, column_time,
+              dict_digest == column_digest)
+    finally:
+        rmtree(temp_dir)
+
+if __name__ == "__main__":
+    main()
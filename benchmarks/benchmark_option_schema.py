@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+from time import time
+from qiime.util import parse_command_line_parameters, make_option
+from cmd_abstraction.util import QiimeCommand, get_options_dict
+
+script_info = {}
+script_info['brief_description'] = "Check that command setup cost stays flat over many invocations"
+script_info['script_description'] = "Repeatedly instantiate a command, build its script info, parse a command line with it and convert the parsed options to a dict, as a long-lived process (e.g., the command server or batch_qiime_command.py) does. The time taken by each block of invocations and the number of options the command has are reported; both should stay flat."
+script_info['script_usage'] = [("","Run 10,000 invocations in blocks of 1,000","%prog"),
+ ("","Run 100,000 invocations in blocks of 10,000","%prog -n 100000 -b 10000")]
+script_info['output_description']= "A tab-separated table with one line per block is written to stdout."
+script_info['required_options'] = []
+script_info['optional_options'] = [
+ make_option('-n','--num_invocations',type="int",default=10000,
+             help='number of invocations to time [default: %default]'),
+ make_option('-b','--block_size',type="int",default=1000,
+             help='number of invocations per reported block [default: %default]'),
+]
+script_info['version'] = __version__
+
+class BenchmarkCommand(QiimeCommand):
+    _required_options = [
+     make_option('-i','--input_fp',type='string',help='input'),
+     make_option('-o','--output_fp',type='string',help='output')]
+    _optional_options = [
+     make_option('-l','--labels',type='string',default='taxonomy,score',
+                 help='labels'),
+     make_option('--all_strings',action='store_true',default=False,
+                 help='all strings')]
+
+command_line = ['-i', 'otu_table.biom', '-o', 'out.biom', '--all_strings']
+
+def invoke():
+    cmd = BenchmarkCommand()
+    command_script_info = cmd.getScriptInfo()
+    command_script_info['command_line_args'] = command_line
+    option_parser, options, arguments = \
+     parse_command_line_parameters(**command_script_info)
+    get_options_dict(options)
+    return len(command_script_info['optional_options'])
+
+def main():
+    option_parser, opts, args =\
+       parse_command_line_parameters(**script_info)
+    print '#block\tseconds\tmicroseconds per invocation\toptional options'
+    for block in range(opts.num_invocations // opts.block_size):
+        start = time()
+        for i in range(opts.block_size):
+            num_options = invoke()
+        elapsed = time() - start
+        print '%d\t%1.3f\t%1.1f\t%d' % (block, elapsed,
+                                        elapsed / opts.block_size * 1e6,
+                                        num_options)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+import re
+import sys
+from os.path import join, dirname, abspath
+from tempfile import mkdtemp
+from shutil import rmtree
+from time import time
+from qiime.util import parse_command_line_parameters, make_option
+import synthetic_data
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+from generate_interfaces import (format_interface,
+                                 get_class_name,
+                                 get_hand_written_commands,
+                                 get_script_names,
+                                 _interfaces_header_block,
+                                 _class_definition)
+
+script_info = {}
+script_info['brief_description'] = "Compare the token-based and line-based interface transforms"
+script_info['script_description'] = "Generate the interface for every script in a directory (e.g., QIIME's scripts directory) with the token-based transform engine (format_interface) and with the line-based transform it replaced (kept in this benchmark as format_interface_by_line), and report the time each takes and the speedup of the token-based engine. Scripts that one of the transforms fails on, and scripts with hand-written interfaces (which format_interface doesn't transform), are reported and skipped. Without -i, synthetic QIIME-style scripts are used."
+script_info['script_usage'] = [("","Benchmark on the full QIIME script set","%prog -i Qiime/scripts/"),
+ ("","Benchmark on 300 synthetic scripts","%prog -n 300")]
+script_info['output_description']= "The total and per-script times of each transform, and the speedup of the token-based transform, are written to stdout."
+script_info['required_options'] = []
+script_info['optional_options'] = [
+ make_option('-i','--input_dir',type="existing_dirpath",
+             help='the directory of scripts to transform [default: synthetic scripts]'),
+ make_option('-n','--num_scripts',type="int",default=200,
+             help='number of synthetic scripts to use, if -i isn\'t provided [default: %default]'),
+ make_option('-r','--num_repeats',type="int",default=3,
+             help='number of times to transform each script set (the fastest is reported) [default: %default]'),
+]
+script_info['version'] = __version__
+
+# The line-based transform that format_interface replaced. It only rewrites
+# the first opts.x on each line, and doesn't handle statements that span
+# lines, so it's only kept here for comparison.
+
+def ignore_line(line):
+    bad_prefixes = ['__author__', '__copyright__', '__credits__',
+                    '__license__', '__version__', '__maintainer__',
+                    '__email__', '__status__','#!/usr/bin/env',
+                    '# File created on','option_parser, opts, args',
+                    'from __future__ import division','script_info={}']
+    stripped_line = line.strip()
+    if stripped_line:
+        for p in bad_prefixes:
+            if stripped_line.startswith(p):
+                return True
+    return False
+
+def transform_line(line):
+    line = line.replace('load_qiime_config()', 'get_qiime_config()')
+    line = line.replace('get_options_lookup()', 'get_qiime_options_lookup()')
+    
+    if line.strip() == 'def main():':
+        return 'def run_command(self,opts,args):\n'
+        
+    # replace of script_info['x'] with _x
+    m = re.match(r".*script_info\[\'(?P<si_entry>\w+)\'\]", line)
+    if m:
+        si_entry = m.groupdict()['si_entry']
+        line = line.replace('script_info["%s"]' % si_entry, "_%s" % si_entry)
+        line = line.replace("script_info['%s']" % si_entry, "_%s" % si_entry)
+        return line
+    
+    m = re.match(r".*opts\.(?P<param_id>\w+)", line)
+    if m:
+        param_id = m.groupdict()['param_id']
+        line = line.replace('opts.%s' % param_id, "opts['%s']" % param_id)
+        return line
+        
+    return line
+
+def is_script_info_definition(line):
+    return re.match(r"script_info\s*=\s*\{\}", line.strip()) != None
+
+def format_interface_by_line(script_name, input_script_fp):
+    class_name = get_class_name(script_name)
+    # everything before script_info is defined (i.e., the script's imports
+    # and module-level setup) stays at the module level, and everything 
+    # after becomes the class body
+    module_lines = []
+    code_lines = []
+    in_class_body = False
+    for line in open(input_script_fp,'U'):
+        if 'if __name__ ==' in line:
+            break
+        elif is_script_info_definition(line):
+            in_class_body = True
+        elif ignore_line(line):
+            continue
+        elif in_class_body:
+            line = transform_line(line)
+            code_lines.append('    %s' % line)
+        else:
+            module_lines.append(transform_line(line))
+    
+    result = ''.join([_interfaces_header_block,
+                      ''.join(module_lines),
+                      _class_definition % (class_name,
+                                           script_name,
+                                           ''.join(code_lines))])
+    return result
+
+def time_transform(transform, scripts, num_repeats):
+    best = None
+    for i in range(num_repeats):
+        start = time()
+        for script_name, script_fp in scripts:
+            transform(script_name, script_fp)
+        elapsed = time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def main():
+    option_parser, opts, args =\
+       parse_command_line_parameters(**script_info)
+    temp_dir = None
+    try:
+        if opts.input_dir:
+            input_dir = opts.input_dir
+            script_names = get_script_names(input_dir)
+        else:
+            input_dir = temp_dir = mkdtemp(prefix='transform_benchmark_')
+            script_names = ['synthetic_script_%d' % i
+                            for i in range(opts.num_scripts)]
+            for script_name in script_names:
+                script_f = open(join(input_dir, '%s.py' % script_name), 'w')
+                synthetic_data.write_qiime_script(script_f, script_name)
+                script_f.close()
+        
+        scripts = []
+        for script_name in script_names:
+            script_fp = join(input_dir, '%s.py' % script_name)
+            if get_class_name(script_name) in get_hand_written_commands():
+                print '# skipping %s: the interface is hand-written' % \
+                 script_name
+                continue
+            try:
+                format_interface(script_name, script_fp)
+                format_interface_by_line(script_name, script_fp)
+            except Exception, e:
+                print '# skipping %s: %s' % (script_name, e)
+                continue
+            scripts.append((script_name, script_fp))
+        
+        print '#transform\ttotal seconds\tmilliseconds per script'
+        times = {}
+        for name, transform in [('token-based', format_interface),
+                                ('line-based', format_interface_by_line)]:
+            seconds = time_transform(transform, scripts, opts.num_repeats)
+            times[name] = seconds
+            print '%s\t%1.3f\t%1.3f' % (name,
+                                        seconds,
+                                        seconds / max(len(scripts), 1) * 1000)
+        print '# %d scripts' % len(scripts)
+        if times['token-based'] > 0:
+            print '# token-based speedup: %1.2fx' % \
+             (times['line-based'] / times['token-based'])
+    finally:
+        if temp_dir:
+            rmtree(temp_dir)
+
+if __name__ == "__main__":
+    main()
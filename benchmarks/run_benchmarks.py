@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+import sys
+import platform
+from json import dump, load
+from os import environ, pathsep
+from os.path import join, dirname, abspath
+from subprocess import Popen, PIPE
+from tempfile import mkdtemp
+from shutil import rmtree
+from datetime import datetime
+from time import time
+from qiime.util import (parse_command_line_parameters,
+                        make_option,
+                        get_qiime_library_version)
+from qiime.workflow import WorkflowLogger
+import synthetic_data
+
+repo_dir = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, repo_dir)
+from cmd_abstraction.util import QiimeCommand, cmd_main
+from generate_interfaces import format_interface, format_registry
+
+benchmark_names = ['cold_start',
+                   'cmd_main',
+                   'start_logging',
+                   'add_taxa',
+                   'generate_interfaces']
+
+script_info = {}
+script_info['brief_description'] = "Run the cmd_abstraction benchmark suite, and compare the results to a baseline"
+script_info['script_description'] = "Time wrapper script cold start (a minimal real run of each script in a new interpreter), cmd_main dispatch overhead, _start_logging on inputs of increasing size, add_taxa.py end to end on synthetic tables of increasing size, and generate_interfaces.py throughput. All benchmarks run on synthetic data. Results (the median of the repeats, in seconds) are written as JSON, which can be passed back as a baseline (-b) to flag any benchmark that is slower than the baseline by more than the threshold (-t). Available benchmarks are: %s" % ', '.join(benchmark_names)
+script_info['script_usage'] = [("","Record a baseline","%prog -o baseline.json"),
+ ("","Compare against the baseline, flagging benchmarks more than 10% slower","%prog -o current.json -b baseline.json -t 0.10"),
+ ("","Run only the add_taxa benchmark, up to 1M observations","%prog -k add_taxa -s 1000,10000,100000,1000000 -o add_taxa.json")]
+script_info['output_description']= "Results are written as JSON to -o, and a summary (including a comparison to the baseline, if -b is provided) is written to stdout. If any benchmark regressed, the exit status is 1."
+script_info['required_options'] = [
+ make_option('-o','--output_fp',type="new_filepath",help='path to write the results JSON'),
+]
+script_info['optional_options'] = [
+ make_option('-b','--baseline_fp',type="existing_filepath",
+             help='results JSON from an earlier run to compare against [default: no comparison]'),
+ make_option('-t','--threshold',type="float",default=0.25,
+             help='flag benchmarks that are slower than the baseline by more than this fraction [default: %default]'),
+ make_option('-k','--benchmarks',type="string",default=','.join(benchmark_names),
+             help='comma-separated benchmarks to run [default: %default]'),
+ make_option('-n','--num_repeats',type="int",default=3,
+             help='number of times to repeat each measurement [default: %default]'),
+ make_option('-s','--add_taxa_sizes',type="string",default='1000,10000,100000',
+             help='comma-separated numbers of observations for the add_taxa benchmark [default: %default]'),
+ make_option('-m','--input_sizes_mb',type="string",default='1,10,100',
+             help='comma-separated input file sizes (in MB) for the start_logging benchmark [default: %default]'),
+]
+script_info['version'] = __version__
+
+def median(values):
+    values = sorted(values)
+    mid = len(values) // 2
+    if len(values) % 2:
+        return values[mid]
+    return (values[mid - 1] + values[mid]) / 2
+
+def time_repeats(f, num_repeats):
+    """ Return the median wall time of num_repeats calls to f
+    """
+    times = []
+    for i in range(num_repeats):
+        start = time()
+        f()
+        times.append(time() - start)
+    return median(times)
+
+def run_python(args):
+    env = dict(environ)
+    env['PYTHONPATH'] = pathsep.join([repo_dir, env.get('PYTHONPATH','')])
+    proc = Popen([sys.executable] + args, stdout=PIPE, stderr=PIPE, env=env)
+    stdout, stderr = proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError, "%s failed:\n%s" % (' '.join(args), stderr)
+
+class NoOpCommand(QiimeCommand):
+    _digest_cache_fp = None
+    _run_history_fp = None
+
+    def run_command(self, params, args):
+        pass
+
+class HashInputCommand(QiimeCommand):
+    _required_options = [
+     make_option('-i','--input_fp',type='existing_filepath',help='input')]
+    _input_file_parameter_ids = ['input_fp']
+    _digest_cache_fp = None
+    _run_history_fp = None
+
+def benchmark_cold_start(opts, work_dir):
+    """ Start each wrapper script in a new interpreter, for a minimal run
+
+        -h is answered from the command index without importing the
+         command, so a real invocation on tiny inputs is timed instead:
+         add_taxa.py on a ten-observation table, and
+         pick_otus_through_otu_table.py printing (-w) the commands for a
+         ten-sequence input.
+    """
+    table_fp = join(work_dir, 'cold_start_table.biom')
+    table_f = open(table_fp, 'w')
+    synthetic_data.write_biom_table(table_f, 10)
+    table_f.close()
+    taxonomy_fp = join(work_dir, 'cold_start_tax.txt')
+    taxonomy_f = open(taxonomy_fp, 'w')
+    synthetic_data.write_taxonomy(taxonomy_f, 10)
+    taxonomy_f.close()
+    fasta_fp = join(work_dir, 'cold_start_seqs.fna')
+    fasta_f = open(fasta_fp, 'w')
+    synthetic_data.write_fasta(fasta_f, 10)
+    fasta_f.close()
+    # each run needs its own (new) output path
+    runs = [0]
+    def get_args(script_name):
+        runs[0] += 1
+        output_fp = join(work_dir, 'cold_start_%d' % runs[0])
+        if script_name == 'add_taxa':
+            args = ['-i', table_fp, '-t', taxonomy_fp, '-o', output_fp]
+        else:
+            args = ['-i', fasta_fp, '-o', output_fp, '-w']
+        return args + ['--master_script_log_dir', work_dir]
+    result = {}
+    for script_name in ['add_taxa', 'pick_otus_through_otu_table']:
+        script_fp = join(repo_dir, 'autogenerated_scripts',
+                         '%s.py' % script_name)
+        result[script_name] = time_repeats(
+         lambda: run_python([script_fp] + get_args(script_name)),
+         opts.num_repeats)
+    return result
+
+def benchmark_cmd_main(opts, work_dir, num_calls=100):
+    """ Dispatch a do-nothing command through cmd_main
+    """
+    cmd = NoOpCommand()
+    argv = ['no_op.py', '--master_script_log_dir', work_dir]
+    def dispatch():
+        saved_argv = sys.argv
+        sys.argv = argv
+        try:
+            for i in range(num_calls):
+                cmd_main(cmd, argv)
+        finally:
+            sys.argv = saved_argv
+    return {'per_call': time_repeats(dispatch, opts.num_repeats) / num_calls}
+
+def benchmark_start_logging(opts, work_dir):
+    """ Set up logging (including input md5s) for inputs of increasing size
+    """
+    result = {}
+    for size_mb in map(int, opts.input_sizes_mb.split(',')):
+        input_fp = join(work_dir, 'input_%dMB.fna' % size_mb)
+        input_f = open(input_fp, 'w')
+        synthetic_data.write_fasta(input_f, size_mb * 4000)
+        input_f.close()
+        params = {'input_fp': input_fp, 'master_script_log_dir': work_dir}
+        def start_logging():
+            cmd = HashInputCommand()
+            logger = WorkflowLogger()
+            cmd._start_logging(params, [], ['hash_input.py'], logger)
+        result['%dMB' % size_mb] = time_repeats(start_logging,
+                                                opts.num_repeats)
+    return result
+
+def benchmark_add_taxa(opts, work_dir):
+    """ Run add_taxa.py end to end on synthetic tables of increasing size
+    """
+    result = {}
+    script_fp = join(repo_dir, 'autogenerated_scripts', 'add_taxa.py')
+    for size in map(int, opts.add_taxa_sizes.split(',')):
+        table_fp = join(work_dir, 'table_%d.biom' % size)
+        table_f = open(table_fp, 'w')
+        synthetic_data.write_biom_table(table_f, size)
+        table_f.close()
+        taxonomy_fp = join(work_dir, 'tax_%d.txt' % size)
+        taxonomy_f = open(taxonomy_fp, 'w')
+        synthetic_data.write_taxonomy(taxonomy_f, size)
+        taxonomy_f.close()
+        args = [script_fp, '-i', table_fp, '-t', taxonomy_fp,
+                '-o', join(work_dir, 'table_%d_w_tax.biom' % size),
+                '--master_script_log_dir', work_dir]
+        result[str(size)] = time_repeats(lambda: run_python(args),
+                                         opts.num_repeats)
+    return result
+
+def benchmark_generate_interfaces(opts, work_dir, num_scripts=50):
+    """ Generate interfaces for synthetic QIIME scripts
+    """
+    script_names = ['synthetic_script_%d' % i for i in range(num_scripts)]
+    script_fps = []
+    for script_name in script_names:
+        script_fp = join(work_dir, '%s.py' % script_name)
+        script_f = open(script_fp, 'w')
+        synthetic_data.write_qiime_script(script_f, script_name)
+        script_f.close()
+        script_fps.append(script_fp)
+    def generate():
+        for script_name, script_fp in zip(script_names, script_fps):
+            format_interface(script_name, script_fp)
+        format_registry(script_names)
+    return {'per_script': time_repeats(generate, opts.num_repeats) /
+                          num_scripts}
+
+def compare_results(results, baseline, threshold):
+    """ Compare results to baseline, returning a list of comparisons
+
+        Each comparison is (name, baseline seconds, seconds, ratio,
+         regressed). Benchmarks missing from either are skipped.
+    """
+    comparisons = []
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        ratio = results[name] / baseline[name] if baseline[name] else 1.0
+        comparisons.append((name, baseline[name], results[name], ratio,
+                            ratio > 1.0 + threshold))
+    return comparisons
+
+def format_comparisons(comparisons, threshold):
+    lines = ['#benchmark\tbaseline (s)\tcurrent (s)\tratio\tstatus']
+    for name, baseline_seconds, seconds, ratio, regressed in comparisons:
+        lines.append('%s\t%1.4f\t%1.4f\t%1.2f\t%s' %
+                     (name, baseline_seconds, seconds, ratio,
+                      'REGRESSED' if regressed else 'ok'))
+    n_regressed = len([c for c in comparisons if c[4]])
+    lines.append('# %d of %d benchmarks regressed by more than %1.0f%%' %
+                 (n_regressed, len(comparisons), threshold * 100))
+    return '\n'.join(lines)
+
+def main():
+    option_parser, opts, args =\
+       parse_command_line_parameters(**script_info)
+    to_run = opts.benchmarks.split(',')
+    for name in to_run:
+        if name not in benchmark_names:
+            option_parser.error("Unknown benchmark: %s. Available benchmarks "
+                                "are: %s" % (name, ', '.join(benchmark_names)))
+
+    results = {}
+    work_dir = mkdtemp(prefix='cmd_abstraction_benchmarks_')
+    try:
+        for name in to_run:
+            benchmark = globals()['benchmark_%s' % name]
+            for metric, seconds in benchmark(opts, work_dir).items():
+                results['%s/%s' % (name, metric)] = seconds
+                print '%s/%s\t%1.4f' % (name, metric, seconds)
+    finally:
+        rmtree(work_dir)
+
+    output_f = open(opts.output_fp, 'w')
+    dump({'metadata': {'date': datetime.now().isoformat(),
+                       'python_version': platform.python_version(),
+                       'platform': platform.platform(),
+                       'qiime_version': get_qiime_library_version(),
+                       'num_repeats': opts.num_repeats},
+          'results': results},
+         output_f, indent=1, sort_keys=True)
+    output_f.write('\n')
+    output_f.close()
+
+    if opts.baseline_fp:
+        baseline = load(open(opts.baseline_fp, 'U'))['results']
+        comparisons = compare_results(results, baseline, opts.threshold)
+        print
+        print format_comparisons(comparisons, opts.threshold)
+        if [c for c in comparisons if c[4]]:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+# Stand-in data for the benchmarks. Everything is generated from a seed, so
+# the same arguments always produce the same files.
+
+from random import Random
+
+_taxonomy_levels = ['k__', 'p__', 'c__', 'o__', 'f__', 'g__', 's__']
+
+def get_observation_id(i):
+    return 'OTU%d' % i
+
+def get_sample_id(i):
+    return 'S%d' % i
+
+def write_biom_table(output_f,
+                     num_observations,
+                     num_samples=10,
+                     density=0.1,
+                     seed=0):
+    """ Write a sparse biom-format OTU table with random counts
+
+        The table is written a row at a time, so very large tables can be
+         generated without holding them in memory. Every observation has at
+         least one non-zero count.
+    """
+    rng = Random(seed)
+    output_f.write('{"id": null,'
+                   '"format": "Biological Observation Matrix 1.0.0",'
+                   '"format_url": "http://biom-format.org",'
+                   '"type": "OTU table",'
+                   '"generated_by": "cmd_abstraction synthetic data",'
+                   '"date": "2012-08-01T00:00:00.000000",'
+                   '"matrix_type": "sparse",'
+                   '"matrix_element_type": "float",'
+                   '"shape": [%d, %d],' % (num_observations, num_samples))
+    output_f.write('"data": [')
+    first = True
+    for i in range(num_observations):
+        columns = [c for c in range(num_samples) if rng.random() < density]
+        if not columns:
+            columns = [rng.randrange(num_samples)]
+        for c in columns:
+            if not first:
+                output_f.write(',')
+            first = False
+            output_f.write('[%d,%d,%1.1f]' % (i, c, rng.randint(1, 1000)))
+    output_f.write('],"rows": [')
+    output_f.write(','.join(['{"id": "%s", "metadata": null}' %
+                             get_observation_id(i)
+                             for i in range(num_observations)]))
+    output_f.write('],"columns": [')
+    output_f.write(','.join(['{"id": "%s", "metadata": null}' %
+                             get_sample_id(i) for i in range(num_samples)]))
+    output_f.write(']}')
+
+def write_taxonomy(output_f, num_observations, num_taxa=500, seed=0):
+    """ Write a taxonomy assignment file (as from assign_taxonomy.py)
+
+        Lineages are drawn from num_taxa distinct random lineages, as in
+         real data many OTUs share a lineage.
+    """
+    rng = Random(seed)
+    lineages = []
+    for i in range(num_taxa):
+        lineages.append('; '.join(['%s%d' % (level, rng.randrange(50))
+                                   for level in _taxonomy_levels]))
+    for i in range(num_observations):
+        output_f.write('%s\t%s\t%1.3f\n' % (get_observation_id(i),
+                                            rng.choice(lineages),
+                                            rng.random()))
+
+def write_fasta(output_f,
+                num_sequences,
+                num_samples=10,
+                min_length=200,
+                max_length=300,
+                seed=0):
+    """ Write a post-split_libraries fasta file (<sample_id>_<seq_id> ids)
+    """
+    rng = Random(seed)
+    # sequences are slices of a random pool, which is much faster than 
+    # drawing every base for large files
+    pool = ''.join([rng.choice('ACGT') for j in range(10 * max_length)])
+    for i in range(num_sequences):
+        length = rng.randint(min_length, max_length)
+        start = rng.randrange(len(pool) - length)
+        output_f.write('>%s_%d\n%s\n' %
+                       (get_sample_id(rng.randrange(num_samples)),
+                        i,
+                        pool[start:start + length]))
+
+_qiime_script_template = """#!/usr/bin/env python
+# File created on 01 Aug 2012
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+from qiime.util import (parse_command_line_parameters,
+                        make_option,
+                        load_qiime_config,
+                        get_options_lookup)
+
+qiime_config = load_qiime_config()
+options_lookup = get_options_lookup()
+
+script_info = {}
+script_info['brief_description'] = "%(script_name)s"
+script_info['script_description'] = "A synthetic script for benchmarking."
+script_info['script_usage'] = [("Example","Run it","%%prog -i in.txt -o out")]
+script_info['output_description']= "Nothing useful."
+script_info['required_options'] = [
+ make_option('-i','--input_fp',type="existing_filepath",help='the input'),
+ make_option('-o','--output_dir',type="new_dirpath",help='the output'),
+]
+script_info['optional_options'] = [
+%(optional_options)s
+]
+script_info['version'] = __version__
+
+def main():
+    option_parser, opts, args =\\
+       parse_command_line_parameters(**script_info)
+    
+    if opts.verbose:
+        print opts.input_fp
+%(body)s
+
+if __name__ == "__main__":
+    main()
+"""
+
+def write_qiime_script(output_f, script_name, num_options=20, num_lines=200):
+    """ Write a script in the style of a QIIME 1.5 script
+
+        The script has num_options optional options, and a main() of
+         roughly num_lines lines which read them.
+    """
+    optional_options = []
+    for i in range(num_options):
+        optional_options.append(
+         " make_option('--option_%d',type='int',default=%d,"
+         "help='option %d [default: %%default]')," % (i, i, i))
+    body = []
+    for i in range(num_lines // 2):
+        body.append("    if opts.option_%d > %d:" % (i % num_options, i))
+        body.append("        option_parser.error('option_%d is too big')" %
+                    (i % num_options))
+    output_f.write(_qiime_script_template %
+                   {'script_name': script_name,
+                    'optional_options': '\n'.join(optional_options),
+                    'body': '\n'.join(body)})
@@ -0,0 +1,21 @@
+#!/usr/bin/env python
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ['Greg Caporaso']
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+from cmd_abstraction.registry import CommandRegistry
+
+registry = CommandRegistry({
+ 'AddTaxa': 'add_taxa',
+ 'PickOtusThroughOtuTable': 'pick_otus_through_otu_table',
+}, package=__name__)
+
+def get_command_class(class_name):
+    return registry.getCommandClass(class_name)
@@ -0,0 +1,15 @@
+#!/usr/bin/env python
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ['Greg Caporaso']
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+# AddTaxa is hand-written in cmd_abstraction.interfaces,
+# rather than generated from add_taxa.py
+from cmd_abstraction.interfaces import AddTaxa
@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+import sys
+from json import load
+from time import time
+from itertools import izip
+from StringIO import StringIO
+from traceback import format_exception_only
+from multiprocessing import Pool
+from qiime.util import parse_command_line_parameters
+from cmd_abstraction.util import (get_options_dict,
+                                  QiimeCommandError)
+
+def option_set_to_argv(option_set):
+    """ Convert {option name: value} to a list of command line arguments
+
+        Flags (i.e., store_true options) are given as True to pass them,
+         and False, None or empty values are omitted.
+    """
+    result = []
+    for option_name in sorted(option_set):
+        value = option_set[option_name]
+        if not option_name.startswith('-'):
+            option_name = '--%s' % option_name
+        if value is True:
+            result.append(option_name)
+        elif value is False or value is None or value == '':
+            continue
+        else:
+            result.extend([option_name, str(value)])
+    return result
+
+def parse_manifest(manifest_f):
+    """ Parse a batch manifest into a list of argument lists
+
+        The manifest can be JSON, in which case it must be a list of
+         option sets (dicts of {option name: value}) or of argument lists,
+         or tab-separated text where the header line contains option names
+         and each subsequent line is an option set. In tsv manifests,
+         flags are passed by setting their value to True.
+    """
+    data = manifest_f.read()
+    if data.lstrip().startswith('['):
+        items = load(StringIO(data))
+    else:
+        lines = [l for l in data.split('\n')
+                 if l.strip() and not l.startswith('#')]
+        option_names = lines[0].split('\t')
+        items = []
+        for line in lines[1:]:
+            values = line.split('\t')
+            option_set = {}
+            for option_name, value in zip(option_names, values):
+                value = value.strip()
+                if value == 'True':
+                    value = True
+                elif value == 'False':
+                    value = False
+                option_set[option_name.strip()] = value
+            items.append(option_set)
+    result = []
+    for item in items:
+        if isinstance(item, dict):
+            result.append(option_set_to_argv(item))
+        else:
+            result.append([str(a) for a in item])
+    return result
+
+def validate_batch(cmd, batch_argvs):
+    """ Parse every argument list up front
+
+        Returns a list of (options, arguments, error) tuples, where error
+         is None for valid argument lists. Argument lists which ask for
+         the command's help or version are invalid, as they would print it
+         rather than run the command.
+    """
+    script_info = cmd.getScriptInfo()
+    result = []
+    for argv in batch_argvs:
+        # parse argv rather than this process's sys.argv
+        script_info['command_line_args'] = argv
+        # option_parser.error writes to stderr and exits, and the help and
+        # version options write to stdout and exit, so capture the output
+        # and catch the exit
+        stdout = sys.stdout
+        stderr = sys.stderr
+        sys.stdout = StringIO()
+        sys.stderr = StringIO()
+        try:
+            try:
+                option_parser, options, arguments = \
+                 parse_command_line_parameters(**script_info)
+            except SystemExit, e:
+                if e.code:
+                    error = sys.stderr.getvalue().strip().split('\n')[-1]
+                else:
+                    error = "Help and version options (e.g., -h, --help "+\
+                     "and --version) can't be used in batch items."
+                result.append((None, None, error))
+            else:
+                result.append((get_options_dict(options), arguments, None))
+        finally:
+            sys.stdout = stdout
+            sys.stderr = stderr
+    return result
+
+class BufferingLogger(object):
+    """ Collect log writes, so they can be passed back from a worker
+    """
+
+    def __init__(self):
+        self._buffer = []
+
+    def write(self, s):
+        self._buffer.append(s)
+
+    def close(self):
+        pass
+
+    def getvalue(self):
+        return ''.join(self._buffer)
+
+def run_batch_item(cmd, options, arguments, argv, logger):
+    """ Run a single item, returning (succeeded, seconds, error message)
+    """
+    start = time()
+    try:
+        cmd(options, arguments, argv, logger=logger)
+    except SystemExit, e:
+        if e.code:
+            return False, time() - start, 'Exited with status %s' % e.code
+    except Exception, e:
+        return (False,
+                time() - start,
+                ''.join(format_exception_only(type(e), e)).strip())
+    return True, time() - start, None
+
+# the command run by pool workers: set before the pool is created, so
+# forked workers inherit it rather than having to unpickle it
+_worker_cmd = None
+
+def _run_batch_item_in_worker(item):
+    options, arguments, argv = item
+    logger = BufferingLogger()
+    succeeded, seconds, error = \
+     run_batch_item(_worker_cmd, options, arguments, argv, logger)
+    return succeeded, seconds, error, logger.getvalue()
+
+def run_batch(cmd,
+              batch_argvs,
+              logger,
+              script_name=None,
+              jobs_to_start=1):
+    """ Run cmd once for each argument list in batch_argvs
+
+        All argument lists are validated before any are run, and a
+         QiimeCommandError is raised if any are invalid. Items are then
+         run in this process (if jobs_to_start is 1) or on a pool of
+         jobs_to_start processes, and a failed item doesn't stop the
+         batch. Every item logs to logger: items run in workers log to a
+         buffer which is written to logger in batch order.
+
+        Returns a list of (argv, succeeded, seconds, error message), with
+         the values of the command's secret options redacted from argv.
+    """
+    global _worker_cmd
+    script_name = script_name or cmd.__class__.__name__
+    validated = validate_batch(cmd, batch_argvs)
+    errors = ['Item %d (%s): %s' % (i, ' '.join(cmd._get_logged_argv(argv)),
+                                    error)
+              for i, (argv, (options, arguments, error))
+              in enumerate(zip(batch_argvs, validated)) if error]
+    if errors:
+        raise QiimeCommandError, \
+         "Invalid batch items, so nothing was run:\n%s" % '\n'.join(errors)
+
+    items = [(options, arguments, [script_name] + argv)
+             for argv, (options, arguments, error)
+             in zip(batch_argvs, validated)]
+    result = []
+    if int(jobs_to_start) <= 1:
+        for options, arguments, argv in items:
+            succeeded, seconds, error = \
+             run_batch_item(cmd, options, arguments, argv, logger)
+            result.append((cmd._get_logged_argv(argv[1:]), succeeded,
+                           seconds, error))
+    else:
+        _worker_cmd = cmd
+        pool = Pool(int(jobs_to_start))
+        try:
+            for (options, arguments, argv), (succeeded, seconds, error, log) \
+             in izip(items, pool.imap(_run_batch_item_in_worker, items)):
+                logger.write(log)
+                result.append((cmd._get_logged_argv(argv[1:]), succeeded,
+                               seconds, error))
+        finally:
+            pool.close()
+            pool.join()
+            _worker_cmd = None
+    return result
+
+def format_batch_report(results):
+    lines = ['#item\tstatus\tseconds\targuments\terror']
+    for i, (argv, succeeded, seconds, error) in enumerate(results):
+        lines.append('%d\t%s\t%1.3f\t%s\t%s' % (i,
+                                              'success' if succeeded else 'failed',
+                                              seconds,
+                                              ' '.join(argv),
+                                              (error or '').replace('\n', ' ')))
+    n_failed = len([r for r in results if not r[1]])
+    lines.append('# %d succeeded, %d failed, %1.3f seconds in total' %
+                 (len(results) - n_failed,
+                  n_failed,
+                  sum([r[2] for r in results])))
+    return '\n'.join(lines)
@@ -0,0 +1,504 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+# A binary, columnar format for biom tables, which can be memory-mapped and
+# read lazily. The file is a format line, a line of JSON metadata (the
+# table's biom attributes and the offset, size and kind of each section),
+# and then the sections:
+#
+#  observation_id_offsets, observation_ids, sample_id_offsets, sample_ids:
+#   string tables of the ids (the offset of each UTF-8 encoded id, and the
+#   ids)
+#  csr_indptr, csr_indices, csr_data: the non-zero counts by observation
+#   (compressed sparse rows), so an observation's counts can be read
+#   without reading those of any other
+#  csc_indptr, csc_indices, csc_data: the same, by sample (compressed
+#   sparse columns)
+#  observation_metadata_<i>, sample_metadata_<i>: a JSON list of the values
+#   of the i-th metadata field, so each field is read (and parsed) on its
+#   own, and of the rows which don't have the field (<name>_missing) or
+#   don't have metadata (observation_metadata_null, sample_metadata_null)
+#
+# Tables are converted to and from this format through their biom JSON
+# documents (i.e., the parsed JSON), so the biom package isn't needed to
+# read or write them.
+
+import sys
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+from json import dumps, loads, load
+from mmap import mmap, ACCESS_READ
+from cmd_abstraction.input_files import open_input
+
+binary_biom_format = '# cmd_abstraction binary biom 1\n'
+
+# array typecodes of the sparse matrix index pointers and indices...
+_indptr_typecode = 'L'
+_indices_typecode = 'I'
+
+# ...and of its values, by biom matrix_element_type
+_data_typecodes = {'int': 'l', 'float': 'd'}
+
+# the keys of a biom JSON document, in the order biom writes them
+_biom_document_keys = ['id', 'format', 'format_url', 'type', 'generated_by',
+                       'date', 'rows', 'columns', 'matrix_type',
+                       'matrix_element_type', 'shape', 'data']
+
+def is_binary_biom_table(fp):
+    """ Return True if fp is a table in the binary biom format
+    """
+    f = open(fp, 'rb')
+    try:
+        return f.read(len(binary_biom_format)) == binary_biom_format
+    finally:
+        f.close()
+
+def get_sparse_data(doc):
+    """ Return [(row, column, value)] of the non-zero values of a biom JSON
+         document, sorted by row and then column
+    """
+    if doc['matrix_type'] == 'dense':
+        return [(r, c, v) for r, row in enumerate(doc['data'])
+                          for c, v in enumerate(row) if v]
+    result = [(r, c, v) for r, c, v in doc['data'] if v]
+    # biom writes sparse data in order, so this is rarely needed
+    for previous, current in zip(result, result[1:]):
+        if current[:2] < previous[:2]:
+            result.sort()
+            break
+    return result
+
+def get_metadata(doc, axis):
+    """ Return the metadata of doc's rows or columns, or None if they have
+         none (as biom's Table.ObservationMetadata and SampleMetadata)
+    """
+    result = [entry['metadata'] for entry in doc[axis]]
+    if not [m for m in result if m is not None]:
+        return None
+    return result
+
+def add_observation_metadata(doc, observation_metadata):
+    """ Add metadata to the rows of a biom JSON document
+
+        observation_metadata: {observation id: {field: value}}, as
+         passed to biom's Table.addObservationMetadata, which this
+         mirrors: if the rows already have metadata, it's updated,
+         otherwise each row's metadata is replaced (with None for rows
+         without metadata in observation_metadata).
+    """
+    if get_metadata(doc, 'rows') is not None:
+        for row in doc['rows']:
+            if row['id'] in observation_metadata:
+                if row['metadata'] is None:
+                    row['metadata'] = {}
+                row['metadata'].update(observation_metadata[row['id']])
+    else:
+        for row in doc['rows']:
+            row['metadata'] = observation_metadata.get(row['id'])
+
+def _string_table(strings):
+    # return (offsets, data) of a string table of strings
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = array(_indptr_typecode, [0])
+    position = 0
+    for s in encoded:
+        position += len(s)
+        offsets.append(position)
+    return offsets, ''.join(encoded)
+
+def _metadata_columns(metadata):
+    # return (fields, [JSON list of each field's values], [JSON list of the
+    # rows without each field], JSON list of the rows without metadata)
+    fields = sorted(set([field for m in metadata if m is not None
+                               for field in m]))
+    columns = []
+    missing = []
+    for field in fields:
+        columns.append(dumps([m.get(field) if m is not None else None
+                              for m in metadata]))
+        missing.append(dumps([i for i, m in enumerate(metadata)
+                              if m is None or field not in m]))
+    null_rows = dumps([i for i, m in enumerate(metadata) if m is None])
+    return fields, columns, missing, null_rows
+
+def write_binary_biom_table(doc, output_f):
+    """ Write a biom JSON document to output_f in the binary biom format
+    """
+    element_type = doc['matrix_element_type']
+    if element_type not in _data_typecodes:
+        raise ValueError, ("Only tables of int or float values can be "
+                           "written in the binary biom format, not %s."
+                           % element_type)
+    num_rows, num_columns = doc['shape']
+    triples = get_sparse_data(doc)
+    data_typecode = _data_typecodes[element_type]
+    cast = int if element_type == 'int' else float
+
+    sections = []
+    for axis, name in [('rows', 'observation'), ('columns', 'sample')]:
+        offsets, strings = _string_table([e['id'] for e in doc[axis]])
+        sections.append(('%s_id_offsets' % name, offsets))
+        sections.append(('%s_ids' % name, strings))
+
+    # compressed sparse rows
+    indptr = array(_indptr_typecode, [0] * (num_rows + 1))
+    for r, c, v in triples:
+        indptr[r + 1] += 1
+    for r in range(num_rows):
+        indptr[r + 1] += indptr[r]
+    sections.append(('csr_indptr', indptr))
+    sections.append(('csr_indices',
+                     array(_indices_typecode, [c for r, c, v in triples])))
+    sections.append(('csr_data',
+                     array(data_typecode, [cast(v) for r, c, v in triples])))
+    # compressed sparse columns: the triples are sorted by row, so each
+    # column's rows are in order
+    by_column = [[] for c in range(num_columns)]
+    for triple in triples:
+        by_column[triple[1]].append(triple)
+    indptr = array(_indptr_typecode, [0])
+    for column in by_column:
+        indptr.append(indptr[-1] + len(column))
+    sections.append(('csc_indptr', indptr))
+    sections.append(('csc_indices',
+                     array(_indices_typecode,
+                           [r for column in by_column for r, c, v in column])))
+    sections.append(('csc_data',
+                     array(data_typecode,
+                           [cast(v) for column in by_column
+                                    for r, c, v in column])))
+    num_nonzero = len(triples)
+    del by_column, triples
+
+    header = dict([(key, doc.get(key)) for key in ['id', 'format',
+                                                   'format_url', 'type',
+                                                   'generated_by', 'date',
+                                                   'matrix_element_type',
+                                                   'shape']])
+    header['nnz'] = num_nonzero
+    for axis, name in [('rows', 'observation'), ('columns', 'sample')]:
+        metadata = get_metadata(doc, axis)
+        if metadata is None:
+            header['%s_metadata' % name] = None
+            continue
+        fields, columns, missing, null_rows = _metadata_columns(metadata)
+        header['%s_metadata' % name] = fields
+        for i, (column, missing_rows) in enumerate(zip(columns, missing)):
+            sections.append(('%s_metadata_%d' % (name, i), column))
+            sections.append(('%s_metadata_%d_missing' % (name, i),
+                             missing_rows))
+        sections.append(('%s_metadata_null' % name, null_rows))
+
+    header['byteorder'] = sys.byteorder
+    header['itemsizes'] = dict([(typecode, array(typecode).itemsize)
+                                for typecode in [_indptr_typecode,
+                                                 _indices_typecode,
+                                                 data_typecode]])
+    header['sections'] = {}
+    offset = 0
+    for name, data in sections:
+        if isinstance(data, array):
+            kind = data.typecode
+            size = len(data) * data.itemsize
+        else:
+            kind = 'bytes'
+            size = len(data)
+        header['sections'][name] = [offset, size, kind]
+        offset += size
+    output_f.write(binary_biom_format)
+    output_f.write(dumps(header, sort_keys=True))
+    output_f.write('\n')
+    for name, data in sections:
+        if isinstance(data, array):
+            data = data.tostring()
+        output_f.write(data)
+
+class BinaryBiomTable(object):
+    """ A read-only, memory-mapped table in the binary biom format
+
+        Sections of the file are only read when they're first needed: e.g.,
+         getObservationData reads one observation's counts, and
+         getObservationMetadataColumn one metadata field. The biom Table
+         attributes ObservationIds, SampleIds, ObservationMetadata,
+         SampleMetadata, TableId and Type are provided (and read on first
+         use).
+    """
+
+    def __init__(self, fp):
+        self.fp = fp
+        self._f = open(fp, 'rb')
+        self._data = mmap(self._f.fileno(), 0, access=ACCESS_READ)
+        if self._data.readline() != binary_biom_format:
+            self.close()
+            raise ValueError, "%s isn't a binary biom table." % fp
+        self.header = loads(self._data.readline())
+        self._data_start = self._data.tell()
+        self._swap = self.header['byteorder'] != sys.byteorder
+        for typecode, itemsize in self.header['itemsizes'].items():
+            if array(str(typecode)).itemsize != itemsize:
+                self.close()
+                raise ValueError, ("%s was written on a platform with "
+                                   "different sizes of numbers." % fp)
+        self.TableId = self.header['id']
+        self.Type = self.header['type']
+        self.shape = tuple(self.header['shape'])
+        self._cache = {}
+
+    def close(self):
+        self._data.close()
+        self._f.close()
+
+    def _get_bytes(self, name, start=0, end=None):
+        offset, size, kind = self.header['sections'][name]
+        if end is None:
+            end = size
+        offset += self._data_start
+        return self._data[offset + start:offset + end]
+
+    def _get_array(self, name, start=0, end=None):
+        # return items start to end of an array section
+        kind = str(self.header['sections'][name][2])
+        result = array(kind)
+        if end is None:
+            data = self._get_bytes(name, start * result.itemsize)
+        else:
+            data = self._get_bytes(name, start * result.itemsize,
+                                   end * result.itemsize)
+        result.fromstring(data)
+        if self._swap:
+            result.byteswap()
+        return result
+
+    def _get_cached(self, key, f):
+        if key not in self._cache:
+            self._cache[key] = f()
+        return self._cache[key]
+
+    def _get_strings(self, name):
+        offsets = self._get_array('%s_id_offsets' % name)
+        data = self._get_bytes('%s_ids' % name).decode('utf-8')
+        # ids are usually ASCII, in which case character and byte offsets
+        # are the same
+        if len(data) != offsets[-1]:
+            data = self._get_bytes('%s_ids' % name)
+            return [data[offsets[i]:offsets[i + 1]].decode('utf-8')
+                    for i in range(len(offsets) - 1)]
+        return [data[offsets[i]:offsets[i + 1]]
+                for i in range(len(offsets) - 1)]
+
+    @property
+    def ObservationIds(self):
+        return self._get_cached('observation_ids',
+                                lambda: self._get_strings('observation'))
+
+    @property
+    def SampleIds(self):
+        return self._get_cached('sample_ids',
+                                lambda: self._get_strings('sample'))
+
+    def getObservationIndex(self, observation_id):
+        index = self._get_cached('observation_index',
+         lambda: dict([(id_, i) for i, id_ in
+                       enumerate(self.ObservationIds)]))
+        return index[observation_id]
+
+    def getSampleIndex(self, sample_id):
+        index = self._get_cached('sample_index',
+         lambda: dict([(id_, i) for i, id_ in enumerate(self.SampleIds)]))
+        return index[sample_id]
+
+    def _get_vector(self, layout, i):
+        start, end = self._get_array('%s_indptr' % layout, i, i + 2)
+        return (self._get_array('%s_indices' % layout, start, end),
+                self._get_array('%s_data' % layout, start, end))
+
+    def getObservationData(self, i):
+        """ Return (sample indices, values) of observation i's non-zero counts
+        """
+        return self._get_vector('csr', i)
+
+    def getSampleData(self, i):
+        """ Return (observation indices, values) of sample i's non-zero counts
+        """
+        return self._get_vector('csc', i)
+
+    def getValue(self, observation_index, sample_index):
+        indices, values = self.getObservationData(observation_index)
+        i = bisect_left(indices, sample_index)
+        if i < len(indices) and indices[i] == sample_index:
+            return values[i]
+        return 0
+
+    def getObservationMatrix(self):
+        """ Return the (indptr, indices, data) arrays of the counts in
+             compressed sparse row (i.e., observation) form
+        """
+        return (self._get_array('csr_indptr'),
+                self._get_array('csr_indices'),
+                self._get_array('csr_data'))
+
+    def getSampleMatrix(self):
+        """ Return the (indptr, indices, data) arrays of the counts in
+             compressed sparse column (i.e., sample) form
+        """
+        return (self._get_array('csc_indptr'),
+                self._get_array('csc_indices'),
+                self._get_array('csc_data'))
+
+    def iterNonzero(self):
+        """ Yield (observation index, sample index, value) of the non-zero
+             counts, by observation
+        """
+        indptr, indices, values = self.getObservationMatrix()
+        for r in range(len(indptr) - 1):
+            for j in range(indptr[r], indptr[r + 1]):
+                yield r, indices[j], values[j]
+
+    def getNumNonzero(self):
+        return self.header['nnz']
+
+    def _get_metadata_column(self, name, i):
+        return loads(self._get_bytes('%s_metadata_%d' % (name, i)))
+
+    def getObservationMetadataColumn(self, field):
+        """ Return the values of one observation metadata field, by
+             observation (None where an observation doesn't have it)
+        """
+        fields = self.header['observation_metadata'] or []
+        if field not in fields:
+            raise KeyError, field
+        return self._get_metadata_column('observation', fields.index(field))
+
+    def getSampleMetadataColumn(self, field):
+        """ Return the values of one sample metadata field, by sample
+        """
+        fields = self.header['sample_metadata'] or []
+        if field not in fields:
+            raise KeyError, field
+        return self._get_metadata_column('sample', fields.index(field))
+
+    def _get_metadata(self, name, size):
+        fields = self.header['%s_metadata' % name]
+        if fields is None:
+            return None
+        result = [{} for i in range(size)]
+        for i, field in enumerate(fields):
+            column = self._get_metadata_column(name, i)
+            missing = set(loads(self._get_bytes('%s_metadata_%d_missing' %
+                                                (name, i))))
+            for j, value in enumerate(column):
+                if j not in missing:
+                    result[j][field] = value
+        for j in loads(self._get_bytes('%s_metadata_null' % name)):
+            result[j] = None
+        return result
+
+    @property
+    def ObservationMetadata(self):
+        return self._get_cached('observation_metadata',
+         lambda: self._get_metadata('observation', self.shape[0]))
+
+    @property
+    def SampleMetadata(self):
+        return self._get_cached('sample_metadata',
+         lambda: self._get_metadata('sample', self.shape[1]))
+
+    def toDocument(self):
+        """ Return the table as a biom JSON document (with sparse data)
+        """
+        result = dict([(key, self.header[key])
+                       for key in _biom_document_keys
+                       if key in self.header])
+        result['matrix_type'] = 'sparse'
+        for axis, ids, metadata in [('rows', self.ObservationIds,
+                                     self.ObservationMetadata),
+                                    ('columns', self.SampleIds,
+                                     self.SampleMetadata)]:
+            if metadata is None:
+                metadata = [None] * len(ids)
+            result[axis] = [{'id': id_, 'metadata': m}
+                            for id_, m in zip(ids, metadata)]
+        result['data'] = [[r, c, v] for r, c, v in self.iterNonzero()]
+        return result
+
+def load_biom_document(fp):
+    """ Return the biom JSON document of a table in either format
+    """
+    if is_binary_biom_table(fp):
+        table = BinaryBiomTable(fp)
+        try:
+            return table.toDocument()
+        finally:
+            table.close()
+    return load(open_input(fp, 'U'))
+
+def _format_data(item):
+    # sparse [row, column, value] items are the bulk of most documents, so
+    # they're formatted directly (repr of a float is what json writes)
+    if len(item) == 3:
+        r, c, v = item
+        if isinstance(v, float):
+            return '[%d,%d,%r]' % (r, c, v)
+        if isinstance(v, (int, long)):
+            return '[%d,%d,%d]' % (r, c, v)
+    return dumps(item)
+
+def write_biom_document(doc, output_f, block_size=10000):
+    """ Write a biom JSON document to output_f, in blocks of items
+    """
+    output_f.write('{')
+    for i, key in enumerate(_biom_document_keys):
+        if i:
+            output_f.write(', ')
+        output_f.write('%s: ' % dumps(key))
+        if key in ('rows', 'columns', 'data'):
+            if key == 'data' and doc['matrix_type'] == 'sparse':
+                format_item = _format_data
+            else:
+                format_item = dumps
+            items = doc[key]
+            output_f.write('[')
+            for start in range(0, len(items), block_size):
+                if start:
+                    output_f.write(',')
+                output_f.write(','.join(map(format_item,
+                                            items[start:start + block_size])))
+            output_f.write(']')
+        else:
+            output_f.write(dumps(doc.get(key)))
+    output_f.write('}')
+
+def update_generated_by(doc, generated_by):
+    """ Set the generated_by and date of a biom JSON document, as biom does
+         when it writes a table
+    """
+    doc['generated_by'] = generated_by
+    doc['date'] = datetime.now().isoformat()
+
+def convert_biom_table(input_fp, output_f, output_format=None):
+    """ Write the table in input_fp to output_f in output_format
+
+        output_format: 'json' or 'binary' (default: the format input_fp
+         isn't in)
+    """
+    if output_format is None:
+        if is_binary_biom_table(input_fp):
+            output_format = 'json'
+        else:
+            output_format = 'binary'
+    doc = load_biom_document(input_fp)
+    if output_format == 'binary':
+        write_binary_biom_table(doc, output_f)
+    else:
+        write_biom_document(doc, output_f)
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+from inspect import getargspec
+from qiime.util import get_qiime_library_version
+
+def get_generated_by():
+    """ Return the generated_by string that qiime.format.format_biom_table uses
+    """
+    return "QIIME " + get_qiime_library_version()
+
+def supports_direct_io(table):
+    """ Return True if table can write its biom string directly to a file
+    """
+    try:
+        args = getargspec(table.getBiomFormatJsonString).args
+    except TypeError:
+        return False
+    return 'direct_io' in args
+
+def write_biom_table(table, output_f, generated_by=None):
+    """ Write table to output_f in biom format
+
+        This writes the same document as
+         output_f.write(format_biom_table(table)), but where the installed
+         biom-format package supports it, the document is written to
+         output_f in pieces as it is built rather than first being built
+         as one string. That string can be as large as the table itself,
+         so this roughly halves peak memory use when writing large tables.
+    """
+    if generated_by is None:
+        generated_by = get_generated_by()
+    if supports_direct_io(table):
+        table.getBiomFormatJsonString(generated_by, direct_io=output_f)
+    else:
+        output_f.write(table.getBiomFormatJsonString(generated_by))
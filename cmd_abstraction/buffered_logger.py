@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+import atexit
+from os import getpid
+from threading import Thread, Lock
+from Queue import Queue
+from qiime.workflow import WorkflowLogger
+
+# loggers that haven't been closed yet are flushed when the interpreter
+# exits, so a command that dies with an exception still leaves a complete
+# log behind
+_open_loggers = set()
+_open_loggers_lock = Lock()
+
+def flush_open_loggers():
+    with _open_loggers_lock:
+        loggers = list(_open_loggers)
+    for logger in loggers:
+        # a forked child has a copy of the logger, but not its writer thread
+        if logger._pid == getpid():
+            logger.flush()
+
+atexit.register(flush_open_loggers)
+
+class BufferedWorkflowLogger(WorkflowLogger):
+    """ A WorkflowLogger whose writes happen on a background thread
+
+        write() queues the string and returns immediately; a writer thread
+         appends queued strings to the log file in order, flushing the file
+         whenever it has caught up. The queue holds at most
+         max_queued_writes strings, so if the log file can't keep up write()
+         blocks rather than buffering without limit.
+
+        The log file's contents are identical to those WorkflowLogger
+         would write. flush() waits until everything written so far is in
+         the file, and is called by close() and at interpreter exit.
+    """
+
+    def __init__(self,
+                 log_fp=None,
+                 params=None,
+                 qiime_config=None,
+                 open_mode='w',
+                 max_queued_writes=10000):
+        if log_fp:
+            self._log_f = open(log_fp, open_mode)
+        else:
+            self._log_f = None
+        self._queue = Queue(max_queued_writes)
+        self._write_error = None
+        self._closed = False
+        self._pid = getpid()
+        self._writer = Thread(target=self._write_queued)
+        self._writer.daemon = True
+        self._writer.start()
+        with _open_loggers_lock:
+            _open_loggers.add(self)
+        # the base class writes the log header through self.write, and
+        # doesn't open the log file itself as log_fp is None
+        WorkflowLogger.__init__(self,
+                                log_fp=None,
+                                params=params,
+                                qiime_config=qiime_config)
+
+    def _write_queued(self):
+        while True:
+            s = self._queue.get()
+            try:
+                if s is None:
+                    return
+                if self._log_f is not None and self._write_error is None:
+                    self._log_f.write(s)
+                    if self._queue.empty():
+                        self._log_f.flush()
+            except Exception, e:
+                # reported to the caller on the next flush()
+                self._write_error = e
+            finally:
+                self._queue.task_done()
+
+    def write(self, s):
+        if self._closed:
+            raise ValueError, "I/O operation on closed log."
+        if self._log_f is not None:
+            self._queue.put(s)
+
+    def flush(self):
+        """ Block until all writes so far are in the log file
+        """
+        self._queue.join()
+        if self._log_f is not None and not self._log_f.closed:
+            self._log_f.flush()
+        if self._write_error is not None:
+            e, self._write_error = self._write_error, None
+            raise e
+
+    def close(self):
+        WorkflowLogger.close(self)
+        self._closed = True
+        self._queue.put(None)
+        try:
+            self.flush()
+            self._writer.join()
+        finally:
+            with _open_loggers_lock:
+                _open_loggers.discard(self)
+            if self._log_f is not None:
+                self._log_f.close()
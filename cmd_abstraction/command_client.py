@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+# This module is imported by the thin client, so it must not import
+# qiime, biom or anything from cmd_abstraction which does.
+from os import getcwd
+from json import dumps, loads
+from socket import socket, AF_UNIX, SOCK_STREAM
+
+def send_command(socket_fp, command_name, argv, cwd=None):
+    """ Send a command to a running QiimeCommandServer
+
+        command_name: the command class name (e.g., AddTaxa) or script
+         name (e.g., add_taxa.py)
+        argv: the full argv, as it would be passed to cmd_main
+
+        Returns (exit_status, stdout, stderr).
+    """
+    request = {'command': command_name,
+               'argv': list(argv),
+               'cwd': cwd or getcwd()}
+    s = socket(AF_UNIX, SOCK_STREAM)
+    try:
+        s.connect(socket_fp)
+        s.sendall(dumps(request) + '\n')
+        chunks = []
+        while True:
+            chunk = s.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        s.close()
+    response = loads(''.join(chunks))
+    return (response['exit_status'],
+            response['stdout'],
+            response['stderr'])
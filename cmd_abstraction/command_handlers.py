@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+import sys
+from os.path import normpath, sep
+from shlex import split
+from qiime.workflow import WorkflowError
+from cmd_abstraction.executors import LocalPoolExecutor, run_measured_command
+
+# tokens which are followed by the path a step writes to
+output_flags = ['-o', '--output_dir', '--output_fp', '>']
+
+def get_step_outputs(command):
+    """ Return the normalized paths that command writes to
+    """
+    tokens = split(command)
+    result = []
+    for i, token in enumerate(tokens):
+        if token in output_flags and i + 1 < len(tokens):
+            result.append(normpath(tokens[i + 1]))
+        elif '=' in token and token.split('=', 1)[0] in output_flags:
+            result.append(normpath(token.split('=', 1)[1]))
+    return result
+
+def get_step_paths(command):
+    """ Return every token in command which could be a path, normalized
+    """
+    result = []
+    for token in split(command):
+        if '=' in token and token.startswith('-'):
+            token = token.split('=', 1)[1]
+        if token and not token.startswith('-'):
+            result.append(normpath(token))
+    return result
+
+def paths_overlap(path1, path2):
+    """ Return True if the paths are equal or one contains the other
+    """
+    return path1 == path2 or \
+           path1.startswith(path2 + sep) or \
+           path2.startswith(path1 + sep)
+
+def flatten_commands(commands):
+    """ Flatten qiime's list of lists of (description, command) tuples
+    """
+    return [step for command_group in commands for step in command_group]
+
+def build_command_dependency_graph(steps):
+    """ Infer which steps each step depends on
+
+        steps: list of (description, command) tuples, in the order in which
+         they would be run serially
+
+        A step depends on an earlier step if it refers to any path which
+         the earlier step writes to (or to a path within, or containing,
+         one of those paths). Returns a list of sets, where the set at
+         index i contains the indices of the steps which step i depends on.
+    """
+    outputs = [get_step_outputs(command) for description, command in steps]
+    result = []
+    for i, (description, command) in enumerate(steps):
+        step_paths = get_step_paths(command)
+        dependencies = set()
+        for j in range(i):
+            for output in outputs[j]:
+                if [p for p in step_paths if paths_overlap(p, output)]:
+                    dependencies.add(j)
+                    break
+        result.append(dependencies)
+    return result
+
+def _format_step_failure(step, stdout, stderr, return_value):
+    description, command = step
+    return "\n\n*** ERROR RAISED DURING STEP: %s\n" % description +\
+           "Command run was:\n %s\n" % command +\
+           "Command returned exit status: %d\n" % return_value +\
+           "Stdout:\n%s\nStderr\n%s\n" % (stdout, stderr)
+
+def call_commands_serially_measured(commands,
+                                   status_update_callback,
+                                   logger,
+                                   close_logger_on_success=True,
+                                   step_history=None,
+                                   profiler=None):
+    """ Run commands one at a time, recording each step's cost
+
+        This runs and logs the steps as qiime.workflow's
+         call_commands_serially does, but measures each step (see
+         run_measured_command). As in call_commands_as_dag, completed
+         steps are recorded in step_history and every step that was run
+         is added to profiler as a phase named 'step: <step>'.
+    """
+    logger.write("Executing commands.\n\n")
+    try:
+        for step in flatten_commands(commands):
+            status_update_callback('%s\n%s' % step)
+            logger.write('# %s command \n%s\n\n' % step)
+            stdout, stderr, return_value, seconds, peak_rss_kb = \
+             run_measured_command(step[1])
+            if profiler is not None:
+                # the step ran in another process, so its cpu time isn't
+                # known
+                profiler.addPhase('step: %s' % step[0], seconds, None,
+                                  peak_rss_kb)
+            if return_value != 0:
+                failure_msg = _format_step_failure(step, stdout, stderr,
+                                                   return_value)
+                logger.write(failure_msg)
+                logger.close()
+                raise WorkflowError, failure_msg
+            if step_history is not None:
+                step_history.recordStep(step[1], seconds, peak_rss_kb)
+            logger.write("Stdout:\n%s\nStderr:\n%s\n" % (stdout, stderr))
+            if stdout:
+                print stdout
+            if stderr:
+                sys.stderr.write(stderr)
+    finally:
+        if step_history is not None:
+            step_history.save()
+    if close_logger_on_success:
+        logger.close()
+
+def make_serial_command_handler(step_history=None, profiler=None):
+    """ Return a command handler which runs steps one at a time
+    """
+    def command_handler(commands,
+                        status_update_callback,
+                        logger,
+                        close_logger_on_success=True):
+        call_commands_serially_measured(
+         commands,
+         status_update_callback,
+         logger,
+         close_logger_on_success=close_logger_on_success,
+         step_history=step_history,
+         profiler=profiler)
+    return command_handler
+
+def call_commands_as_dag(commands,
+                         status_update_callback,
+                         logger,
+                         close_logger_on_success=True,
+                         jobs_to_start=2,
+                         step_cache=None,
+                         executor_factory=LocalPoolExecutor,
+                         max_retries=0,
+                         scheduler=None,
+                         step_history=None,
+                         profiler=None):
+    """ Run commands concurrently, respecting dependencies between steps
+
+        This is a drop-in replacement for qiime.workflow's
+         call_commands_serially. Independent steps (e.g., taxonomy
+         assignment and alignment, which both depend only on the
+         representative set) are run at the same time on an executor
+         (see cmd_abstraction.executors) created by
+         executor_factory(jobs_to_start).
+
+        A step which fails is retried up to max_retries times. If it still
+         fails, no further steps are started. Steps which are already
+         running are allowed to finish (so they don't leave partial output
+         behind), and then a WorkflowError is raised.
+
+        Each step's log entry and output are written in step order, as
+         soon as the step and all steps before it have finished, so the
+         log and stdout don't depend on the order in which concurrent
+         steps finish.
+
+        If a StepCache is provided, steps which it reports as hits are
+         skipped, and all completed steps are recorded in it.
+
+        If a ResourceScheduler (see cmd_abstraction.scheduler) is provided,
+         a step is only started once its cores and memory fit in the
+         scheduler's budget alongside the steps already running.
+
+        If a StepHistory (see cmd_abstraction.cost_model) is provided, the
+         run time and peak memory of each completed step are recorded in
+         it, to calibrate later cost estimates.
+
+        If a PhaseProfiler (see cmd_abstraction.profiling) is provided, the
+         run time and peak memory of each step that was run (including
+         failed steps) are added to it as a phase named 'step: <step>'.
+    """
+    steps = flatten_commands(commands)
+    dependencies = build_command_dependency_graph(steps)
+    remaining = set(range(len(steps)))
+    running = set()
+    completed = set()
+    failure_msg = None
+    step_keys = {}
+    attempts = [0] * len(steps)
+    # per step: list of (log text, stdout, stderr), written in step order
+    step_output = [[] for step in steps]
+    finished = set()
+    next_to_write = [0]
+
+    def write_finished_output():
+        while next_to_write[0] in finished:
+            for log_text, stdout, stderr in step_output[next_to_write[0]]:
+                logger.write(log_text)
+                if stdout:
+                    print stdout
+                if stderr:
+                    sys.stderr.write(stderr)
+            step_output[next_to_write[0]] = None
+            next_to_write[0] += 1
+
+    def submit(i):
+        running.add(i)
+        attempts[i] += 1
+        status_update_callback('%s\n%s' % steps[i])
+        executor.submit(i, steps[i][1])
+
+    logger.write("Executing commands.\n\n")
+    executor = executor_factory(jobs_to_start)
+    try:
+        while remaining or running:
+            if failure_msg is None:
+                ready = [i for i in sorted(remaining)
+                         if dependencies[i] <= completed]
+                to_start = []
+                for i in ready:
+                    # steps waiting for resources were checked already
+                    if step_cache is not None and i not in step_keys:
+                        step_keys[i] = step_cache.getStepKey(*steps[i])
+                        if step_cache.isHit(step_keys[i]):
+                            remaining.remove(i)
+                            step_cache.recordHit(steps[i][0])
+                            completed.add(i)
+                            finished.add(i)
+                            step_output[i].append(
+                             ('# %s command (skipped: step cache hit)'
+                              '\n%s\n\n' % steps[i], '', ''))
+                            continue
+                    to_start.append(i)
+                if scheduler is not None:
+                    to_start = scheduler.selectSteps(
+                     [(i, steps[i][1]) for i in to_start])
+                for i in to_start:
+                    remaining.remove(i)
+                    step_output[i].append(('# %s command \n%s\n\n' %
+                                           steps[i], '', ''))
+                    submit(i)
+            write_finished_output()
+            if not running:
+                if remaining and failure_msg is None:
+                    # steps were cache hits, so more may now be ready
+                    continue
+                # a failure occurred and everything in flight has finished
+                break
+            i, stdout, stderr, return_value, seconds, peak_rss_kb = \
+             executor.getResult()
+            running.remove(i)
+            if return_value != 0 and attempts[i] <= max_retries and \
+               failure_msg is None:
+                step_output[i].append((
+                 "# %s command failed (exit status %d, attempt %d of %d), "
+                 "retrying\nStdout:\n%s\nStderr:\n%s\n" %
+                 (steps[i][0], return_value, attempts[i], max_retries + 1,
+                  stdout, stderr), '', ''))
+                submit(i)
+                continue
+            finished.add(i)
+            if scheduler is not None:
+                scheduler.finish(i)
+            if profiler is not None:
+                # the step ran in another process, so its cpu time isn't
+                # known
+                profiler.addPhase('step: %s' % steps[i][0], seconds, None,
+                                  peak_rss_kb)
+            if return_value != 0:
+                if failure_msg is None:
+                    failure_msg = _format_step_failure(steps[i], stdout,
+                                                       stderr, return_value)
+                    step_output[i].append((failure_msg, '', ''))
+            else:
+                completed.add(i)
+                if step_cache is not None:
+                    step_cache.recordCompleted(step_keys[i], *steps[i])
+                if step_history is not None:
+                    step_history.recordStep(steps[i][1], seconds,
+                                            peak_rss_kb)
+                step_output[i].append(("Stdout:\n%s\nStderr:\n%s\n" %
+                                       (stdout, stderr), stdout, stderr))
+            write_finished_output()
+    finally:
+        executor.close()
+        # steps after a failure are never run, so write the output of
+        # everything that did run
+        finished.update(remaining)
+        write_finished_output()
+        if step_cache is not None:
+            step_cache.save()
+            logger.write(step_cache.formatReport())
+        if step_history is not None:
+            step_history.save()
+
+    if failure_msg is not None:
+        logger.close()
+        raise WorkflowError, failure_msg
+    if close_logger_on_success:
+        logger.close()
+
+def make_dag_command_handler(jobs_to_start,
+                             step_cache=None,
+                             executor_factory=LocalPoolExecutor,
+                             max_retries=0,
+                             scheduler=None,
+                             step_history=None,
+                             profiler=None):
+    """ Return a command handler which runs up to jobs_to_start steps at once
+    """
+    def command_handler(commands,
+                        status_update_callback,
+                        logger,
+                        close_logger_on_success=True):
+        call_commands_as_dag(commands,
+                             status_update_callback,
+                             logger,
+                             close_logger_on_success=close_logger_on_success,
+                             jobs_to_start=jobs_to_start,
+                             step_cache=step_cache,
+                             executor_factory=executor_factory,
+                             max_retries=max_retries,
+                             scheduler=scheduler,
+                             step_history=step_history,
+                             profiler=profiler)
+    return command_handler
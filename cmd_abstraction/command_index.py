@@ -0,0 +1,364 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+# The command index holds each command's script info (descriptions, usage
+# examples, options and version) as JSON, so that help text and command
+# listings can be produced without importing the commands or qiime. Like
+# cmd_abstraction.registry, this module must stay cheap to import.
+
+import sys
+from hashlib import md5
+from imp import find_module
+from inspect import getsourcefile
+from json import dump, load
+from optparse import OptionParser, OptionGroup, Option, NO_DEFAULT
+from os import rename, getenv
+from os.path import join, dirname, abspath, basename, exists, splitext
+from traceback import format_exception_only
+
+index_format_version = 2
+index_filename = 'command_index.json'
+default_index_fp = join(dirname(abspath(__file__)),
+                        'autogenerated_interfaces',
+                        index_filename)
+
+# the standard options are defined here, so changes to this module change
+# every command's options
+_util_fp = join(dirname(abspath(__file__)), 'util.py')
+
+def get_file_md5(fp):
+    return md5(open(fp,'rb').read()).hexdigest()
+
+def get_files_md5(fps):
+    """ Return the md5 of the paths and contents of those of fps which exist
+    """
+    result = md5()
+    for fp in fps:
+        if exists(fp):
+            result.update('%s\0%s\0' % (fp, open(fp,'rb').read()))
+    return result.hexdigest()
+
+def get_qiime_dir():
+    """ Return the directory of the qiime package, without importing it
+    """
+    try:
+        return find_module('qiime')[1]
+    except ImportError:
+        return None
+
+def get_qiime_md5():
+    """ Return the md5 of qiime's version and the options lookup (qiime.util)
+
+        These supply the version and the help of options shared between 
+         scripts, so an upgrade of qiime changes this.
+    """
+    qiime_dir = get_qiime_dir()
+    if qiime_dir is None:
+        return None
+    return get_files_md5([join(qiime_dir, '__init__.py'),
+                          join(qiime_dir, 'util.py')])
+
+def get_qiime_config_md5():
+    """ Return the md5 of the files qiime.util.load_qiime_config reads
+
+        The qiime config supplies defaults (e.g., jobs_to_start) shown in
+         help text.
+    """
+    qiime_dir = get_qiime_dir()
+    fps = []
+    if qiime_dir is not None:
+        fps.append(join(qiime_dir, 'support_files', 'qiime_config'))
+    if getenv('QIIME_CONFIG_FP'):
+        fps.append(getenv('QIIME_CONFIG_FP'))
+    if getenv('HOME'):
+        fps.append(join(getenv('HOME'), '.qiime_config'))
+    return get_files_md5(fps)
+
+def get_option_definition(option):
+    """ Return a JSON-compatible dict describing an optparse Option
+    """
+    default = option.default
+    if default is NO_DEFAULT:
+        default = None
+    elif not isinstance(default, (basestring, int, long, float, bool,
+                                  type(None))):
+        default = str(default)
+    return {'short_opts': option._short_opts,
+            'long_opts': option._long_opts,
+            'dest': option.dest,
+            'action': option.action,
+            'type': option.type,
+            'choices': option.choices,
+            'default': default,
+            'metavar': option.metavar,
+            'help': option.help}
+
+def get_command_definition(command_class, module_fp):
+    """ Return the index entry for command_class, defined in module_fp
+    """
+    script_info = command_class().getScriptInfo()
+    # the class may be defined elsewhere (e.g., hand-written commands are
+    # imported by their interface modules)
+    source_fp = abspath(getsourcefile(command_class))
+    return {'module_filename': basename(splitext(module_fp)[0] + '.py'),
+            'module_md5': get_file_md5(splitext(module_fp)[0] + '.py'),
+            'source_fp': source_fp,
+            'source_md5': get_file_md5(source_fp),
+            'brief_description': script_info['brief_description'],
+            'script_description': script_info['script_description'],
+            'script_usage': script_info['script_usage'],
+            'output_description': script_info['output_description'],
+            'version': script_info['version'],
+            'required_options': [get_option_definition(o) for o in
+                                 script_info['required_options']],
+            'optional_options': [get_option_definition(o) for o in
+                                 script_info['optional_options']]}
+
+def build_command_index(command_definitions, qiime_version=None):
+    """ Return the index for {class name: command definition}
+    """
+    return {'format_version': index_format_version,
+            'cmd_abstraction_version': __version__,
+            'util_md5': get_file_md5(_util_fp),
+            'qiime_version': qiime_version,
+            'qiime_md5': get_qiime_md5(),
+            'qiime_config_md5': get_qiime_config_md5(),
+            'commands': command_definitions}
+
+def build_command_definition(item):
+    """ Return (class name, definition, error) for (class name, module fp)
+
+        Importing an interface module imports everything its command
+         depends on, which may fail (e.g., if an optional dependency isn't
+         installed). That is returned as error (and definition is None),
+         rather than raised, so one command can't stop the index being
+         built. This can run in a worker process, which keeps the
+         commands' imports out of the caller.
+    """
+    # this is only needed to build the index, not to use it
+    import imp
+    class_name, module_fp = item
+    module_name = splitext(basename(module_fp))[0]
+    try:
+        module = imp.load_source('_command_index_%s' % module_name,
+                                 module_fp)
+        return (class_name,
+                get_command_definition(getattr(module, class_name),
+                                       module_fp),
+                None)
+    except (Exception, SystemExit), e:
+        return (class_name, None,
+                ''.join(format_exception_only(type(e), e)).strip())
+
+def update_command_index(command_modules, package_dir, index_fp=None,
+                         jobs_to_start=1):
+    """ Write the index for {class name: module name} in package_dir
+
+        Entries are reused from the existing index for commands whose
+         interface module (and cmd_abstraction.util, qiime and the qiime
+         config) haven't changed, so only new or changed interfaces are
+         imported. Those are imported on a pool of jobs_to_start
+         processes, or in this process if jobs_to_start is 1.
+
+        Returns (the class names of the rebuilt entries, and
+         [(class name, error)] for those which couldn't be built). Failed
+         commands are left out of the index, so their help is printed by
+         importing them.
+    """
+    # this is only needed to build the index, not to use it
+    from qiime.util import get_qiime_library_version
+    index_fp = index_fp or join(package_dir, index_filename)
+    last_index = load_command_index(index_fp)
+    stale = set(command_modules)
+    if last_index is not None:
+        stale = set([class_name for class_name, reason in
+                     get_stale_commands(last_index, command_modules,
+                                        package_dir)])
+    command_definitions = {}
+    to_build = []
+    for class_name, module_name in sorted(command_modules.items()):
+        if class_name in stale:
+            to_build.append((class_name,
+                             join(package_dir, '%s.py' % module_name)))
+        else:
+            command_definitions[class_name] = \
+             last_index['commands'][class_name]
+    if jobs_to_start > 1 and len(to_build) > 1:
+        from multiprocessing import Pool
+        pool = Pool(min(jobs_to_start, len(to_build)))
+        try:
+            built = pool.map(build_command_definition, to_build)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        built = map(build_command_definition, to_build)
+    failures = []
+    for class_name, definition, error in built:
+        if error:
+            failures.append((class_name, error))
+        else:
+            command_definitions[class_name] = definition
+    write_command_index(build_command_index(command_definitions,
+                                            get_qiime_library_version()),
+                        index_fp)
+    return sorted(stale), failures
+
+def write_command_index(index, index_fp=default_index_fp):
+    tmp_fp = '%s.tmp' % index_fp
+    index_f = open(tmp_fp,'w')
+    dump(index, index_f, sort_keys=True, separators=(',',':'))
+    index_f.close()
+    rename(tmp_fp, index_fp)
+
+def load_command_index(index_fp=default_index_fp):
+    """ Return the index, or None if there isn't one in the current format
+    """
+    if not exists(index_fp):
+        return None
+    index = load(open(index_fp,'U'))
+    if index.get('format_version') != index_format_version:
+        return None
+    return index
+
+def get_stale_commands(index, class_names, package_dir=None):
+    """ Return (class name, reason) for each out-of-date command in index
+
+        A command is out of date if it's missing from the index, or if its
+         interface module, the module defining its class,
+         cmd_abstraction.util, qiime or the qiime config have changed since
+         the index was built.
+    """
+    package_dir = package_dir or dirname(default_index_fp)
+    if index['util_md5'] != get_file_md5(_util_fp):
+        shared_change = 'cmd_abstraction.util has changed'
+    elif index['qiime_md5'] != get_qiime_md5():
+        shared_change = 'qiime has changed'
+    elif index['qiime_config_md5'] != get_qiime_config_md5():
+        shared_change = 'the qiime config has changed'
+    else:
+        shared_change = None
+    result = []
+    for class_name in class_names:
+        definition = index['commands'].get(class_name)
+        if definition is None:
+            result.append((class_name, 'not in index'))
+            continue
+        module_fp = join(package_dir, definition['module_filename'])
+        if not exists(module_fp):
+            result.append((class_name, 'interface module is missing'))
+        elif get_file_md5(module_fp) != definition['module_md5']:
+            result.append((class_name, 'interface module has changed'))
+        elif not exists(definition['source_fp']) or \
+             get_file_md5(definition['source_fp']) != \
+             definition['source_md5']:
+            result.append((class_name, 'command module has changed'))
+        elif shared_change:
+            result.append((class_name, shared_change))
+    return result
+
+def _build_option(definition):
+    # qiime's option types (e.g., existing_filepath) aren't known to
+    # optparse, but only affect parsing, not help text
+    option_type = definition['type']
+    if option_type not in Option.TYPES:
+        option_type = 'string'
+    kwargs = {'dest': definition['dest'],
+              'action': definition['action'],
+              'default': definition['default'],
+              'metavar': definition['metavar'],
+              'help': definition['help']}
+    if definition['action'] in Option.TYPED_ACTIONS:
+        kwargs['type'] = option_type
+        if option_type == 'choice':
+            kwargs['choices'] = definition['choices']
+    if definition['default'] is None:
+        del kwargs['default']
+    return Option(*(definition['short_opts'] + definition['long_opts']),
+                  **kwargs)
+
+def _build_usage(definition):
+    # as qiime.util.parse_command_line_parameters does
+    line1 = 'usage: %prog [options] ' + '{%s}' % \
+     ' '.join(['%s %s' % ('/'.join(o['short_opts'] + o['long_opts']),
+                          o['dest'].upper())
+               for o in definition['required_options']])
+    usage_examples = []
+    for title, description, command in definition['script_usage']:
+        title = title.strip(':').strip()
+        description = description.strip(':').strip()
+        command = command.strip()
+        if title:
+            usage_examples.append('%s: %s\n %s' %
+                                  (title, description, command))
+        else:
+            usage_examples.append('%s\n %s' % (description, command))
+    return '\n'.join([line1,
+                      '',
+                      ' [] indicates optional input (order unimportant)',
+                      ' {} indicates required input (order unimportant)',
+                      '',
+                      definition['script_description'],
+                      '',
+                      'Example usage: ',
+                      'Print help message and exit',
+                      ' %prog -h\n',
+                      '\n\n'.join(usage_examples)])
+
+def format_help(definition, prog):
+    """ Return the help text for a command, laid out as qiime does
+    """
+    parser = OptionParser(usage=_build_usage(definition),
+                          version='Version: %prog ' + definition['version'],
+                          prog=prog)
+    required = OptionGroup(parser, "REQUIRED options",
+     "The following options must be provided under all circumstances.")
+    for option_definition in definition['required_options']:
+        option = _build_option(option_definition)
+        if not option.help.strip().endswith('[REQUIRED]'):
+            option.help += ' [REQUIRED]'
+        required.add_option(option)
+    parser.add_option_group(required)
+    parser.add_option('-v','--verbose',action='store_true',
+                      dest='verbose',help='Print information during execution '+\
+                      '-- useful for debugging [default: %default]',
+                      default=False)
+    for option_definition in definition['optional_options']:
+        parser.add_option(_build_option(option_definition))
+    return parser.format_help()
+
+def format_command_list(index):
+    lines = []
+    for class_name in sorted(index['commands']):
+        definition = index['commands'][class_name]
+        lines.append('%s\t%s\t%s' % (class_name,
+                                     splitext(definition['module_filename'])[0],
+                                     definition['brief_description']))
+    return '\n'.join(lines)
+
+def serve_help(class_name, argv, index_fp=default_index_fp):
+    """ Print class_name's help from the index and exit, if argv asks for it
+
+        If argv isn't a request for help, or the index is missing or out of
+         date for this command, this returns and the caller should import
+         the command as usual.
+    """
+    if argv[1:] not in (['-h'], ['--help']):
+        return
+    index = load_command_index(index_fp)
+    if index is None or get_stale_commands(index, [class_name],
+                                           dirname(index_fp)):
+        return
+    sys.stdout.write(format_help(index['commands'][class_name],
+                                 basename(argv[0])))
+    sys.exit(0)
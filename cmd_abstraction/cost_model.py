@@ -0,0 +1,337 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+# Estimates the run time and peak memory of workflow steps from the size of
+# the workflow's input. Each step's cost is modelled as linear in the number
+# of input sequences, with the model for each script fit to the recorded
+# costs of its past runs (see StepHistory). Scripts without recorded runs
+# fall back on rough built-in models, and are reported as uncalibrated.
+
+from collections import namedtuple
+from json import dump, load
+from os import rename, makedirs, getpid
+from os.path import join, expanduser, exists, dirname, getsize
+from cmd_abstraction.command_handlers import (flatten_commands,
+                                              build_command_dependency_graph)
+from cmd_abstraction.scheduler import get_step_script_name
+from cmd_abstraction.sharding import get_shard_range
+from cmd_abstraction.input_files import open_input
+
+default_step_history_fp = join(expanduser('~'), '.cmd_abstraction',
+                               'step_history.json')
+
+CostModel = namedtuple('CostModel', ['fixed_seconds',
+                                     'seconds_per_seq',
+                                     'fixed_memory_mb',
+                                     'memory_mb_per_seq'])
+
+# rough models for uncalibrated scripts: a few seconds of startup, and
+# a few milliseconds and kilobytes per sequence
+default_cost_model = CostModel(5.0, 0.001, 100.0, 0.002)
+
+def get_fasta_size(fasta_fp, chunk_size=1024*1024):
+    """ Return (number of sequences, number of bytes) of a fasta file
+
+        Compressed files' sequences are counted as they're decompressed,
+         and the number of bytes is that of the compressed file.
+    """
+    num_seqs = 0
+    at_line_start = True
+    fasta_f = open_input(fasta_fp, 'rb')
+    while True:
+        chunk = fasta_f.read(chunk_size)
+        if not chunk:
+            break
+        num_seqs += chunk.count('\n>')
+        if at_line_start and chunk.startswith('>'):
+            num_seqs += 1
+        at_line_start = chunk.endswith('\n')
+    fasta_f.close()
+    return num_seqs, getsize(fasta_fp)
+
+def get_step_num_seqs(command, num_seqs, num_bytes=None):
+    """ Return the number of the workflow's input sequences a step reads
+
+        Shard steps (see cmd_abstraction.sharding) read their shard's
+         share of the input, estimated from the share of its bytes. Other
+         steps are taken to read all num_seqs.
+    """
+    shard_range = get_shard_range(command)
+    if shard_range is None or not num_bytes:
+        return num_seqs
+    start, end = shard_range
+    return num_seqs * (end - start) / num_bytes
+
+class StepHistory(object):
+    """ The recorded run time and peak memory of past workflow steps
+
+        Records are kept per script, along with the number of sequences the
+         step read, and only the most recent max_records for each script
+         are kept.
+    """
+
+    def __init__(self, history_fp, num_seqs=None, max_records=100,
+                 num_bytes=None, input_fp=None):
+        """
+            history_fp: JSON file the records are kept in
+            num_seqs: the number of input sequences of the workflow whose
+             steps are being recorded
+            num_bytes: the size of the workflow's input, used to estimate
+             the number of sequences read by shard steps
+            input_fp: the workflow's input, which num_seqs and num_bytes
+             are counted from (see get_fasta_size) if they aren't provided.
+             It's only read once they're needed.
+        """
+        self.history_fp = history_fp
+        self.num_seqs = num_seqs
+        self.num_bytes = num_bytes
+        self.input_fp = input_fp
+        self.max_records = max_records
+        self._records = self._load()
+        # the records added since loading, which are merged into the file
+        # as it is when they're saved
+        self._new_records = {}
+
+    def _load(self):
+        if self.history_fp and exists(self.history_fp):
+            return load(open(self.history_fp, 'U'))
+        return {}
+
+    def getInputSize(self):
+        """ Return (num_seqs, num_bytes), counting them from input_fp if needed
+        """
+        if self.num_seqs is None and self.input_fp is not None:
+            self.num_seqs, self.num_bytes = get_fasta_size(self.input_fp)
+        return self.num_seqs, self.num_bytes
+
+    def recordStep(self, command, seconds, peak_rss_kb):
+        script_name = get_step_script_name(command)
+        if script_name is None or self.getInputSize()[0] is None:
+            return
+        record = [get_step_num_seqs(command, self.num_seqs, self.num_bytes),
+                  seconds, peak_rss_kb / 1024]
+        for records in (self._records.setdefault(script_name, []),
+                        self._new_records.setdefault(script_name, [])):
+            records.append(record)
+            del records[:-self.max_records]
+
+    def getRecords(self, script_name):
+        """ Return [(num_seqs, seconds, peak memory in MB)] for a script
+        """
+        return [tuple(r) for r in self._records.get(script_name, [])]
+
+    def save(self):
+        """ Add the records since loading to those in history_fp
+
+            Other workflows may have saved records since this history was
+             loaded, so the new records are added to the file's current
+             records rather than replacing them.
+        """
+        if not self.history_fp:
+            return
+        history_dir = dirname(self.history_fp)
+        if history_dir and not exists(history_dir):
+            makedirs(history_dir)
+        records = self._load()
+        for script_name, new_records in self._new_records.items():
+            script_records = records.setdefault(script_name, [])
+            script_records.extend(new_records)
+            del script_records[:-self.max_records]
+        # each process writes its own temporary file
+        tmp_fp = '%s.%d.tmp' % (self.history_fp, getpid())
+        history_f = open(tmp_fp, 'w')
+        dump(records, history_f)
+        history_f.close()
+        rename(tmp_fp, self.history_fp)
+        self._records = records
+        self._new_records = {}
+
+def fit_linear(xs, ys):
+    """ Return (intercept, slope) of the least squares fit of ys on xs
+
+        With only one distinct x, the line passes through the origin (i.e.,
+         cost is assumed proportional to size). Neither the intercept nor
+         the slope is allowed to be negative.
+    """
+    n = len(xs)
+    mean_x = sum(xs) / n
+    mean_y = sum(ys) / n
+    sxx = sum([(x - mean_x) ** 2 for x in xs])
+    if sxx == 0:
+        if mean_x == 0:
+            return mean_y, 0.0
+        return 0.0, mean_y / mean_x
+    slope = sum([(x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)]) / sxx
+    slope = max(slope, 0.0)
+    intercept = max(mean_y - slope * mean_x, 0.0)
+    return intercept, slope
+
+def calibrate_cost_model(records, default=default_cost_model):
+    """ Return (CostModel, calibrated) fit to [(num_seqs, seconds, memory)]
+    """
+    if not records:
+        return default, False
+    num_seqs = [r[0] for r in records]
+    fixed_seconds, seconds_per_seq = fit_linear(num_seqs,
+                                                [r[1] for r in records])
+    fixed_memory_mb, memory_mb_per_seq = fit_linear(num_seqs,
+                                                    [r[2] for r in records])
+    return CostModel(fixed_seconds, seconds_per_seq,
+                     fixed_memory_mb, memory_mb_per_seq), True
+
+def estimate_step_costs(steps, num_seqs, history, num_bytes=None):
+    """ Return [(seconds, peak memory in MB, calibrated)] for each step
+
+        num_bytes: the size of the input, used to estimate the number of
+         sequences read by shard steps (see get_step_num_seqs)
+    """
+    models = {}
+    result = []
+    for description, command in steps:
+        script_name = get_step_script_name(command)
+        if script_name not in models:
+            models[script_name] = \
+             calibrate_cost_model(history.getRecords(script_name))
+        model, calibrated = models[script_name]
+        step_num_seqs = get_step_num_seqs(command, num_seqs, num_bytes)
+        result.append((model.fixed_seconds +
+                       model.seconds_per_seq * step_num_seqs,
+                       model.fixed_memory_mb +
+                       model.memory_mb_per_seq * step_num_seqs,
+                       calibrated))
+    return result
+
+def simulate_schedule(durations, dependencies, jobs_to_start):
+    """ Return (start times, finish times) of steps run on jobs_to_start slots
+
+        Steps are started as call_commands_as_dag starts them: whenever a
+         slot is free, the lowest-numbered step whose dependencies have
+         all finished is started.
+    """
+    if jobs_to_start < 1:
+        raise ValueError, "jobs_to_start must be at least 1, not %d" % \
+         jobs_to_start
+    n = len(durations)
+    starts = [None] * n
+    finishes = [None] * n
+    running = []
+    now = 0.0
+    completed = set()
+    while len(completed) < n:
+        for i in range(n):
+            if len(running) >= jobs_to_start:
+                break
+            if starts[i] is None and dependencies[i] <= completed:
+                starts[i] = now
+                finishes[i] = now + durations[i]
+                running.append(i)
+        # advance to the next step to finish
+        now = min([finishes[i] for i in running])
+        for i in [i for i in running if finishes[i] == now]:
+            running.remove(i)
+            completed.add(i)
+    return starts, finishes
+
+def get_critical_path(dependencies, starts, finishes):
+    """ Return the chain of steps which determines the overall run time
+
+        Starting from the step that finishes last, each step's predecessor
+         is the step whose finish allowed it to start: a dependency if one
+         finished then, or otherwise the step which freed its slot.
+    """
+    if not starts:
+        return []
+    i = max(range(len(finishes)), key=lambda j: (finishes[j], j))
+    path = [i]
+    while starts[i] > 0:
+        enabling = [j for j in range(len(finishes))
+                    if j != i and finishes[j] == starts[i]]
+        if not enabling:
+            break
+        dependency_enabling = [j for j in enabling if j in dependencies[i]]
+        i = max(dependency_enabling or enabling)
+        path.append(i)
+    path.reverse()
+    return path
+
+def get_peak_memory(starts, finishes, memory_mbs):
+    """ Return the largest total memory of steps running at the same time
+    """
+    events = []
+    for start, finish, memory_mb in zip(starts, finishes, memory_mbs):
+        # at equal times, finishes are processed before starts
+        events.append((start, 1, memory_mb))
+        events.append((finish, 0, -memory_mb))
+    result = 0.0
+    current = 0.0
+    for time, kind, memory_mb in sorted(events):
+        current += memory_mb
+        result = max(result, current)
+    return result
+
+def format_seconds(seconds):
+    hours, remainder = divmod(int(round(seconds)), 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return '%d:%02d:%02d' % (hours, minutes, seconds)
+
+def format_cost_estimate(steps, num_seqs, num_bytes, history, jobs_to_start):
+    """ Return a report of the estimated cost of running steps
+    """
+    costs = estimate_step_costs(steps, num_seqs, history, num_bytes)
+    durations = [c[0] for c in costs]
+    dependencies = build_command_dependency_graph(steps)
+    starts, finishes = simulate_schedule(durations, dependencies,
+                                         jobs_to_start)
+    critical_path = get_critical_path(dependencies, starts, finishes)
+    lines = ['Input: %d sequences, %d bytes' % (num_seqs, num_bytes),
+             '',
+             '#step\testimated time\testimated peak memory (MB)\tcalibrated']
+    for (description, command), (seconds, memory_mb, calibrated) \
+     in zip(steps, costs):
+        lines.append('%s\t%s\t%1.0f\t%s' % (description,
+                                            format_seconds(seconds),
+                                            memory_mb,
+                                            'yes' if calibrated else 'no'))
+    lines.append('')
+    lines.append('Critical path with jobs_to_start=%d:' % jobs_to_start)
+    for i in critical_path:
+        lines.append(' %s (%s to %s)' % (steps[i][0],
+                                         format_seconds(starts[i]),
+                                         format_seconds(finishes[i])))
+    lines.append('Estimated total time: %s' %
+                 format_seconds(max(finishes or [0])))
+    lines.append('Estimated peak memory: %1.0f MB' %
+                 get_peak_memory(starts, finishes, [c[1] for c in costs]))
+    if [c for c in costs if not c[2]]:
+        lines.append('Steps which have no recorded runs use rough default '
+                     'estimates (calibrated: no).')
+    return '\n'.join(lines)
+
+def make_cost_estimate_command_handler(num_seqs, num_bytes, history,
+                                       jobs_to_start):
+    """ Return a command handler which prints a cost estimate of the steps
+
+        No steps are run.
+    """
+    def command_handler(commands,
+                        status_update_callback,
+                        logger,
+                        close_logger_on_success=True):
+        print format_cost_estimate(flatten_commands(commands),
+                                   num_seqs,
+                                   num_bytes,
+                                   history,
+                                   int(jobs_to_start))
+        if close_logger_on_success:
+            logger.close()
+    return command_handler
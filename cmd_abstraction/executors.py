@@ -0,0 +1,549 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+# Executors run workflow steps for call_commands_as_dag. They all have the
+# same interface:
+#
+#  submit(step_index, command): start running command
+#  getResult(): block until a step finishes, and return
+#   (step_index, stdout, stderr, return_value, seconds, peak_rss_kb)
+#  close(): wait for running steps, and release the executor's resources
+#
+# LocalPoolExecutor runs steps on a pool of local processes, and steps
+# whose process dies are reported as failed.
+# QueueWorkerExecutor serves a job queue and a result queue over TCP, and
+# steps are run by worker processes (see run_worker) which can be on this
+# host or on any other host that can connect to it. Steps running on
+# workers that stop responding are reported as failed, and the workers
+# kill those steps (see _send_heartbeats) so they don't write output
+# alongside a retry.
+
+from errno import ESRCH
+from os import (urandom, wait4, WIFSIGNALED, WTERMSIG, WEXITSTATUS, getpid,
+                kill, killpg, setpgrp)
+from signal import SIGKILL
+from multiprocessing import Pool, Process
+from multiprocessing import Queue as ProcessQueue
+from multiprocessing.managers import BaseManager, AutoProxy
+from Queue import Queue, Empty
+from subprocess import Popen
+from tempfile import TemporaryFile
+from threading import Event, Lock, Thread
+from time import time
+from cmd_abstraction.util import executor_names
+
+def run_measured_command(command, started=None):
+    """ Run command in a shell, as qiime_system_call does, and measure it
+
+        Returns (stdout, stderr, return value, wall seconds, peak rss in
+         KB). The peak RSS is that of the largest process the command ran
+         (the shell, or any process it waited for), as reported by wait4.
+
+        started: if provided, the command is run in its own process group
+         (so that it and every process it starts can be killed together),
+         and this is called with the command's Popen once it has started
+    """
+    # the output goes to files rather than pipes, so the process can be
+    # reaped with wait4 (which reports its resource usage) without 
+    # risking a deadlock on a full pipe
+    stdout_f = TemporaryFile()
+    stderr_f = TemporaryFile()
+    start = time()
+    if started is None:
+        proc = Popen(command, shell=True, stdout=stdout_f, stderr=stderr_f)
+    else:
+        proc = Popen(command, shell=True, stdout=stdout_f, stderr=stderr_f,
+                     preexec_fn=setpgrp)
+        started(proc)
+    pid, status, usage = wait4(proc.pid, 0)
+    seconds = time() - start
+    if WIFSIGNALED(status):
+        proc.returncode = -WTERMSIG(status)
+    else:
+        proc.returncode = WEXITSTATUS(status)
+    stdout_f.seek(0)
+    stderr_f.seek(0)
+    return (stdout_f.read(), stderr_f.read(), proc.returncode, seconds,
+            usage.ru_maxrss)
+
+def _run_step(step_index, command, started=None):
+    # run in a worker process: must be a module-level function so
+    # it can be pickled
+    try:
+        stdout, stderr, return_value, seconds, peak_rss_kb = \
+         run_measured_command(command, started)
+    except Exception, e:
+        stdout, stderr, return_value, seconds, peak_rss_kb = \
+         '', str(e), 1, 0.0, 0
+    return step_index, stdout, stderr, return_value, seconds, peak_rss_kb
+
+# set in each pool process by _init_pool_process
+_started_steps = None
+
+def _init_pool_process(started_steps):
+    global _started_steps
+    _started_steps = started_steps
+
+def _run_pool_step(step_index, command):
+    # tell the executor which process is running the step, so it can tell
+    # if the process dies
+    _started_steps.put((step_index, getpid()))
+    return _run_step(step_index, command)
+
+def pid_exists(pid):
+    try:
+        kill(pid, 0)
+    except OSError, e:
+        return e.errno != ESRCH
+    return True
+
+class LocalPoolExecutor(object):
+    """ Run steps on a pool of jobs_to_start local processes
+
+        The pool replaces processes which die (e.g., killed by the
+         out-of-memory killer), but the steps they were running never
+         finish. So while waiting for a result, the executor checks every
+         poll_interval seconds that the processes running its steps are
+         alive, and reports the steps of those which aren't as failed,
+         with exit status 1.
+    """
+
+    def __init__(self, jobs_to_start, poll_interval=1.0):
+        self.poll_interval = poll_interval
+        self._started_steps = ProcessQueue()
+        self._pool = Pool(int(jobs_to_start),
+                          _init_pool_process,
+                          (self._started_steps,))
+        self._results = Queue()
+        self._lock = Lock()
+        # step index -> submission time, for steps without a result
+        self._running = {}
+        # step index -> pid of the pool process running it
+        self._step_pids = {}
+        # steps whose process was found dead on the last poll
+        self._dead = set()
+        self._lost_steps = False
+
+    def submit(self, step_index, command):
+        self._lock.acquire()
+        try:
+            self._running[step_index] = time()
+        finally:
+            self._lock.release()
+        self._pool.apply_async(_run_pool_step,
+                               (step_index, command),
+                               callback=self._putResult)
+
+    def _putResult(self, result):
+        # called on the pool's result handler thread
+        self._lock.acquire()
+        try:
+            # lost steps have already been reported
+            if self._running.pop(result[0], None) is not None:
+                self._step_pids.pop(result[0], None)
+                self._results.put(result)
+        finally:
+            self._lock.release()
+
+    def getResult(self):
+        while True:
+            try:
+                return self._results.get(True, self.poll_interval)
+            except Empty:
+                self._collectLost()
+
+    def _collectLost(self):
+        """ Report the steps of pool processes which have died as failed
+
+            A step is only reported once its process has been found dead
+             on two polls in a row, so that a result the process sent
+             before it died is delivered rather than reported as a failure.
+        """
+        self._lock.acquire()
+        try:
+            while True:
+                try:
+                    step_index, pid = self._started_steps.get(False)
+                except Empty:
+                    break
+                if step_index in self._running:
+                    self._step_pids[step_index] = pid
+            dead = set([step_index for step_index, pid in
+                        self._step_pids.items() if not pid_exists(pid)])
+            for step_index in dead & self._dead:
+                pid = self._step_pids.pop(step_index)
+                seconds = time() - self._running.pop(step_index)
+                self._results.put((step_index, '',
+                 'Pool process %d died while running this step.\n' % pid,
+                 1, seconds, 0))
+                self._lost_steps = True
+            self._dead = dead - self._dead
+        finally:
+            self._lock.release()
+
+    def close(self):
+        if self._lost_steps:
+            # the pool waits for the results of every step it was given,
+            # and will never get those of lost steps
+            self._pool.terminate()
+        else:
+            self._pool.close()
+        self._pool.join()
+
+class StepTracker(object):
+    """ Hands out queued steps to workers, and tracks the step each is running
+
+        This lives in the manager's server process, and the executor and
+         the workers call it through proxies (each call runs in a thread
+         of the server). Workers call it at least every heartbeat_interval
+         seconds, while idle (take) and while running a step (heartbeat),
+         so the executor can tell when one has been lost: see collectLost.
+
+        Each submission of a step is a new attempt, and jobs are handed
+         out as (step index, command, attempt). Only the result of a 
+         step's latest attempt is accepted.
+    """
+
+    def __init__(self):
+        self.heartbeat_interval = 10.0
+        self.lost_worker_timeout = 60.0
+        self._jobs = Queue()
+        self._results = Queue()
+        self._lock = Lock()
+        # worker id -> [time last heard from, job or None]
+        self._workers = {}
+        self._next_worker_id = 0
+        # step index -> its latest attempt
+        self._attempts = {}
+        self._stopping = False
+
+    def setTimeouts(self, heartbeat_interval, lost_worker_timeout):
+        self.heartbeat_interval = heartbeat_interval
+        self.lost_worker_timeout = lost_worker_timeout
+
+    def register(self):
+        """ Return (a new worker id, heartbeat interval, lost worker timeout)
+        """
+        self._lock.acquire()
+        try:
+            worker_id = self._next_worker_id
+            self._next_worker_id += 1
+            self._workers[worker_id] = [time(), None]
+            return (worker_id, self.heartbeat_interval,
+                    self.lost_worker_timeout)
+        finally:
+            self._lock.release()
+
+    def submit(self, job):
+        """ Queue job, a (step index, command) tuple, as a new attempt
+        """
+        step_index, command = job
+        self._lock.acquire()
+        try:
+            attempt = self._attempts.get(step_index, 0) + 1
+            self._attempts[step_index] = attempt
+        finally:
+            self._lock.release()
+        self._jobs.put((step_index, command, attempt))
+
+    def take(self, worker_id):
+        """ Return the next job for worker_id to run
+
+            Returns None if the worker should stop (because the executor is
+             closing, or the worker was given up as lost), and False if
+             there is no job after waiting for heartbeat_interval seconds.
+        """
+        if not self.heartbeat(worker_id):
+            return None
+        try:
+            job = self._jobs.get(True, self.heartbeat_interval)
+        except Empty:
+            return False
+        self._lock.acquire()
+        try:
+            if job is None:
+                # woken by stop
+                self._workers.pop(worker_id, None)
+                return None
+            if worker_id not in self._workers:
+                # lost while waiting: the job goes to another worker
+                self._jobs.put(job)
+                return None
+            if job[2] != self._attempts[job[0]]:
+                # the step has been submitted again since
+                return False
+            self._workers[worker_id] = [time(), job]
+            return job
+        finally:
+            self._lock.release()
+
+    def heartbeat(self, worker_id):
+        """ Record that worker_id is alive, returning False if it should stop
+        """
+        self._lock.acquire()
+        try:
+            if self._stopping or worker_id not in self._workers:
+                self._workers.pop(worker_id, None)
+                return False
+            self._workers[worker_id][0] = time()
+            return True
+        finally:
+            self._lock.release()
+
+    def complete(self, worker_id, result):
+        """ Record result of worker_id's step
+
+            Results from workers which have been given up as lost are
+             dropped, as their steps have already been reported as failed,
+             as are results of attempts other than the step's latest.
+        """
+        self._lock.acquire()
+        try:
+            if worker_id not in self._workers:
+                return
+            job = self._workers[worker_id][1]
+            self._workers[worker_id] = [time(), None]
+            if job is not None and job[2] == self._attempts[job[0]]:
+                self._results.put(result)
+        finally:
+            self._lock.release()
+
+    def getResult(self, timeout):
+        """ Return the next result, or None if there isn't one in timeout
+        """
+        try:
+            return self._results.get(True, timeout)
+        except Empty:
+            return None
+
+    def collectLost(self):
+        """ Give up on workers not heard from in lost_worker_timeout seconds
+
+            The steps they were running are reported as failed (so they're
+             retried if the workflow allows it). Returns the number of 
+             workers given up on.
+        """
+        self._lock.acquire()
+        try:
+            timeout = self.lost_worker_timeout
+            now = time()
+            lost = [worker_id for worker_id, (last_seen, job) in
+                    self._workers.items() if now - last_seen > timeout]
+            for worker_id in lost:
+                last_seen, job = self._workers.pop(worker_id)
+                if job is not None:
+                    self._results.put((job[0], '',
+                     'Worker %d stopped responding for more than %1.0f '
+                     'seconds while running this step.\n' % 
+                     (worker_id, timeout), 1, now - last_seen, 0))
+            return len(lost)
+        finally:
+            self._lock.release()
+
+    def stop(self):
+        """ Tell the workers to stop the next time they ask for a job
+        """
+        self._lock.acquire()
+        try:
+            self._stopping = True
+            # wake the workers waiting for a job
+            for worker_id in self._workers:
+                self._jobs.put(None)
+        finally:
+            self._lock.release()
+
+# the tracker is created in the manager's server process, and everything
+# else (the executor and the workers) accesses it through proxies
+_step_tracker = None
+
+def _get_step_tracker():
+    global _step_tracker
+    if _step_tracker is None:
+        _step_tracker = StepTracker()
+    return _step_tracker
+
+class StepQueueManager(BaseManager):
+    pass
+
+def _get_borrowed_proxy(token, serializer, manager=None, authkey=None,
+                        exposed=None):
+    # the executor holds a reference to the tracker for as long as the
+    # manager runs, so the workers' proxies don't need their own. Without
+    # one, a proxy doesn't tell the manager it's done with the tracker
+    # when its process exits, which would wait for the connection to
+    # time out if the manager has already shut down.
+    return AutoProxy(token, serializer, manager=manager, authkey=authkey,
+                     exposed=exposed, incref=False)
+
+StepQueueManager.register('get_step_tracker', callable=_get_step_tracker)
+StepQueueManager.register('get_worker_step_tracker',
+                          callable=_get_step_tracker,
+                          proxytype=_get_borrowed_proxy)
+
+def parse_address(address):
+    """ host:port -> (host, port)
+    """
+    host, port = address.rsplit(':', 1)
+    return host, int(port)
+
+def _send_heartbeats(tracker, worker_id, interval, lease, stopped, running):
+    # run in a thread of a worker while it runs a step. The proxy opens a 
+    # connection for each thread, so this doesn't interfere with the
+    # worker's own calls.
+    #
+    # Once the executor has given up on the worker, the step may be retried
+    # on another worker, so it's killed (along with any processes it
+    # started) rather than left to write the same output. The worker also
+    # gives up on itself if it can't reach the executor for lease seconds,
+    # which is less than the executor waits before giving up on it.
+    last_reported = time()
+    while not stopped.wait(interval):
+        try:
+            alive = tracker.heartbeat(worker_id)
+        except (EOFError, IOError):
+            alive = time() - last_reported < lease
+        else:
+            if alive:
+                last_reported = time()
+        if not alive:
+            for proc in running:
+                try:
+                    killpg(proc.pid, SIGKILL)
+                except OSError:
+                    pass
+
+def run_worker(address, authkey):
+    """ Run steps from the executor at address until it shuts down
+
+        address: (host, port) of a QueueWorkerExecutor
+        authkey: the executor's authentication key
+    """
+    manager = StepQueueManager(address=address, authkey=authkey)
+    manager.connect()
+    tracker = manager.get_worker_step_tracker()
+    try:
+        worker_id, heartbeat_interval, lost_worker_timeout = \
+         tracker.register()
+        lease = max(lost_worker_timeout - heartbeat_interval,
+                    heartbeat_interval)
+        while True:
+            job = tracker.take(worker_id)
+            if job is None:
+                return
+            elif job is False:
+                continue
+            step_index, command, attempt = job
+            # the step's process, once it has started
+            running = []
+            stopped = Event()
+            heartbeats = Thread(target=_send_heartbeats,
+                                args=(tracker, worker_id, heartbeat_interval,
+                                      lease, stopped, running))
+            heartbeats.daemon = True
+            heartbeats.start()
+            try:
+                result = _run_step(step_index, command, running.append)
+            finally:
+                stopped.set()
+                heartbeats.join()
+            tracker.complete(worker_id, result)
+    except (EOFError, IOError):
+        # the executor has shut down
+        return
+
+class QueueWorkerExecutor(object):
+    """ Run steps on workers which pull them from a queue served over TCP
+
+        This stands in for a cluster: the workers can be local processes
+         (started here, one per job), or processes on other hosts started
+         with start_qiime_step_worker.py, or both. Steps are run by
+         whichever worker takes them from the queue first.
+
+        jobs_to_start: number of local worker processes to start
+        address: (host, port) to serve the queues on. The default only
+         accepts connections from this host, on any free port.
+        authkey: key that workers must present to connect. Required if
+         workers on other hosts will connect; otherwise a random key
+         is used.
+        start_local_workers: if False, no local workers are started, and
+         steps wait for workers on other hosts to connect
+        heartbeat_interval: seconds between workers' reports that they're
+         alive
+        lost_worker_timeout: seconds after which a worker that hasn't
+         reported is given up as lost (e.g., its host went down), and the
+         step it was running is reported as failed, with exit status 1.
+         Workers kill their step once they learn they've been given up on,
+         or if they can't reach the executor for nearly this long.
+    """
+
+    def __init__(self,
+                 jobs_to_start,
+                 address=('127.0.0.1', 0),
+                 authkey=None,
+                 start_local_workers=True,
+                 heartbeat_interval=10.0,
+                 lost_worker_timeout=60.0):
+        self.authkey = authkey or urandom(16)
+        self.heartbeat_interval = heartbeat_interval
+        self.lost_worker_timeout = lost_worker_timeout
+        self._manager = StepQueueManager(address=address,
+                                         authkey=self.authkey)
+        self._manager.start()
+        self.address = self._manager.address
+        self._tracker = self._manager.get_step_tracker()
+        self._tracker.setTimeouts(heartbeat_interval, lost_worker_timeout)
+        self._workers = []
+        if start_local_workers:
+            for i in range(int(jobs_to_start)):
+                worker = Process(target=run_worker,
+                                 args=(self.address, self.authkey))
+                worker.daemon = True
+                worker.start()
+                self._workers.append(worker)
+
+    def submit(self, step_index, command):
+        self._tracker.submit((step_index, command))
+
+    def getResult(self):
+        while True:
+            result = self._tracker.getResult(self.heartbeat_interval)
+            if result is not None:
+                return result
+            self._tracker.collectLost()
+
+    def close(self):
+        # local workers stop when they next ask for a step, and remote
+        # workers then or when the manager shuts down
+        self._tracker.stop()
+        for worker in self._workers:
+            worker.join()
+        # proxies reconnect to the manager in any process forked later
+        # (e.g., a Pool's workers), which would wait for the connection
+        # to time out once the manager has shut down
+        self._tracker = None
+        self._manager.shutdown()
+
+def get_executor(executor_name, jobs_to_start, **kwargs):
+    """ Return a new executor of type executor_name
+
+        jobs_to_start is the pool size for local_pool, and the number of
+         local workers for queue_workers. kwargs are passed to the
+         executor's constructor.
+    """
+    if executor_name == 'local_pool':
+        return LocalPoolExecutor(jobs_to_start, **kwargs)
+    elif executor_name == 'queue_workers':
+        return QueueWorkerExecutor(jobs_to_start, **kwargs)
+    else:
+        raise ValueError, "Unknown executor: %s. Available executors are: %s"\
+         % (executor_name, ', '.join(executor_names))
@@ -0,0 +1,426 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+# A pre-flight scan of a workflow's input fasta file. The file is
+# memory-mapped and split into chunks at record boundaries, and the chunks
+# are scanned in parallel processes. Each record's structure and
+# <sample_id>_<seq_id> identifier are validated, and the scan produces an
+# index of the record offsets, the number of sequences per sample and
+# sequence length statistics, which later stages (e.g., cost estimates)
+# can use without reading the file again. gzip and bz2 compressed files
+# can't be memory-mapped or split into chunks, so they're scanned in this
+# process as they're decompressed.
+#
+# The index file is a format line, a line of JSON metadata, and then the
+# record offsets as an array of unsigned longs.
+
+import re
+import sys
+from array import array
+from json import dumps, loads
+from mmap import mmap, ACCESS_READ
+from multiprocessing import Pool, cpu_count
+from os import rename
+from os.path import exists
+from cmd_abstraction.hashing import get_file_signature
+from cmd_abstraction.input_files import get_compression, open_input
+
+index_format = '# cmd_abstraction fasta index 1\n'
+
+# array typecode of the record offsets
+_offset_typecode = 'L'
+
+# QIIME sample ids may contain only alphanumeric characters and periods
+sample_id_re = re.compile(r'^[A-Za-z0-9.]+$')
+
+# matches the header line of a record whose identifier is valid, and
+# captures its sample id
+_valid_header_re = re.compile(r'([A-Za-z0-9.]+)_[^\s_]+(?:[ \t][^\n]*)?\r?\n')
+
+# IUPAC nucleotide codes and gaps, in either case, and line endings
+_valid_seq_chars = 'ACGTURYSWKMBDHVN-.acgturyswkmbdhvn\r\n'
+
+# files are split into chunks of at least this size for parallel scanning,
+# so small files are scanned in this process
+_min_chunk_size = 64 * 2**20
+
+# chunks are split into records in blocks of about this size
+_block_size = 16 * 2**20
+
+# at most this many errors are reported per chunk
+_max_errors = 20
+
+class FastaIndex(object):
+    """ Record offsets, per-sample sequence counts and length statistics
+
+        offsets: array of the byte offset of each record's header (in the
+         decompressed data, if the fasta file is compressed)
+        sample_counts: {sample id: number of sequences}
+        min_length, max_length, total_length: of the sequences, excluding
+         line endings
+        signature: the fasta file's signature (see
+         cmd_abstraction.hashing.get_file_signature) when it was indexed
+    """
+
+    def __init__(self, fasta_fp, signature, offsets, sample_counts,
+                 min_length, max_length, total_length):
+        self.fasta_fp = fasta_fp
+        self.signature = signature
+        self.offsets = offsets
+        self.sample_counts = sample_counts
+        self.min_length = min_length
+        self.max_length = max_length
+        self.total_length = total_length
+
+    def getNumSeqs(self):
+        return len(self.offsets)
+
+    def getNumBytes(self):
+        return self.signature[2]
+
+    def getMeanLength(self):
+        if not self.offsets:
+            return 0.0
+        return self.total_length / len(self.offsets)
+
+    def isCurrent(self):
+        """ Return True if the fasta file hasn't changed since it was indexed
+        """
+        return exists(self.fasta_fp) and \
+               list(get_file_signature(self.fasta_fp)) == list(self.signature)
+
+def find_chunk_starts(data, num_chunks):
+    """ Return the offsets at which to split data into num_chunks chunks
+
+        Each chunk starts at a record header (or at the start of the
+         data), so fewer chunks are returned if records are too long to
+         split data evenly.
+    """
+    size = len(data)
+    result = [0]
+    for i in range(1, num_chunks):
+        boundary = data.find('\n>', max(i * size // num_chunks - 1,
+                                         result[-1]))
+        if boundary == -1:
+            break
+        if boundary + 1 > result[-1]:
+            result.append(boundary + 1)
+    return result
+
+def scan_fasta_chunk(data, start, end):
+    """ Validate and index the records in data[start:end]
+
+        start must be the start of a record (or of the file). Returns
+         (offsets, sample_counts, min_length, max_length, total_length,
+         errors, number of errors), where errors is a list of (offset,
+         message) of at most _max_errors of the errors.
+    """
+    offsets = array(_offset_typecode)
+    sample_counts = {}
+    min_length = None
+    max_length = 0
+    total_length = 0
+    errors = []
+    # a list, so error can update it
+    num_errors = [0]
+
+    def error(offset, message):
+        if len(errors) < _max_errors:
+            errors.append((offset, message))
+        num_errors[0] += 1
+
+    if start < end and data[start] != '>':
+        error(start, 'file does not start with a header (a line starting '
+                     'with ">")')
+    block_start = start
+    while block_start < end:
+        # the chunk is read in blocks which end at a record boundary, and
+        # each block is split into records in one call
+        block_end = block_start + _block_size
+        if block_end < end:
+            boundary = data.find('\n>', block_end - 1, end)
+            block_end = end if boundary == -1 else boundary + 1
+        else:
+            block_end = end
+        records = data[block_start:block_end].split('\n>')
+        # the offset of the text following each record's '>'
+        pos = block_start
+        if records[0].startswith('>'):
+            records[0] = records[0][1:]
+            pos += 1
+            first_record = 0
+        else:
+            # text before the first header, which was reported above
+            pos += len(records[0]) + 2
+            first_record = 1
+        valid_header = _valid_header_re.match
+        for record in records[first_record:]:
+            offset = pos - 1
+            pos += len(record) + 2
+            offsets.append(offset)
+            match = valid_header(record)
+            if match is not None:
+                # the common case, so it's checked first
+                sample_id = match.group(1)
+                sample_counts[sample_id] = sample_counts.get(sample_id, 0) + 1
+                seq = record[match.end():]
+                seq_id = None
+            else:
+                header, newline, seq = record.partition('\n')
+                seq_id = check_header(header.strip(), offset, error,
+                                      sample_counts)
+            invalid_chars = seq.translate(None, _valid_seq_chars)
+            length = len(seq) - seq.count('\n') - seq.count('\r')
+            if invalid_chars or length == 0:
+                if seq_id is None:
+                    seq_id = record.split(None, 1)[0]
+                if invalid_chars:
+                    error(offset, 'sequence %s contains invalid '
+                     'characters: %s' % (seq_id,
+                                         ''.join(sorted(set(invalid_chars)))))
+                else:
+                    error(offset, 'sequence %s is empty' % seq_id)
+            if min_length is None or length < min_length:
+                min_length = length
+            if length > max_length:
+                max_length = length
+            total_length += length
+        block_start = block_end
+    return (offsets, sample_counts, min_length or 0, max_length,
+            total_length, errors, num_errors[0])
+
+def check_header(header, offset, error, sample_counts):
+    """ Report any errors in a header, and count its sample if it's valid
+
+        Returns the header's sequence identifier.
+    """
+    if not header:
+        error(offset, 'empty header')
+        return ''
+    seq_id = header.split(None, 1)[0]
+    sample_id, sep, seq_num = seq_id.rpartition('_')
+    if not sample_id or not seq_num:
+        error(offset, 'identifier %s is not of the form <sample_id>_<seq_id>'
+                      % seq_id)
+    elif not sample_id_re.match(sample_id):
+        error(offset, 'sample id %s in identifier %s may only contain '
+                      'alphanumeric characters and periods'
+                      % (sample_id, seq_id))
+    else:
+        sample_counts[sample_id] = sample_counts.get(sample_id, 0) + 1
+    return seq_id
+
+def _scan_file_chunk(fasta_fp, start, end):
+    # run in a worker process: must be a module-level function so
+    # it can be pickled
+    fasta_f = open(fasta_fp, 'rb')
+    data = mmap(fasta_f.fileno(), 0, access=ACCESS_READ)
+    try:
+        return scan_fasta_chunk(data, start, end)
+    finally:
+        data.close()
+        fasta_f.close()
+
+def scan_compressed_fasta(fasta_fp):
+    """ Return the results of scan_fasta_chunk for blocks of a compressed
+         fasta file
+
+        The file is decompressed as it's read, so each block of records is
+         scanned while the following blocks are decompressed. Offsets are
+         into the decompressed data.
+    """
+    results = []
+    fasta_f = open_input(fasta_fp, 'rb')
+    try:
+        base = 0
+        data = ''
+        while True:
+            block = fasta_f.read(_block_size)
+            data += block
+            if block:
+                # blocks are scanned up to their last record boundary
+                end = data.rfind('\n>') + 1
+            else:
+                end = len(data)
+            if end:
+                offsets, sample_counts, min_length, max_length, \
+                 total_length, errors, num_errors = \
+                 scan_fasta_chunk(data, 0, end)
+                if base:
+                    offsets = array(_offset_typecode,
+                                    [offset + base for offset in offsets])
+                    errors = [(offset + base, message)
+                              for offset, message in errors]
+                results.append((offsets, sample_counts, min_length,
+                                max_length, total_length, errors,
+                                num_errors))
+                base += end
+                data = data[end:]
+            if not block:
+                break
+    finally:
+        fasta_f.close()
+    return results
+
+def _scan_uncompressed_fasta(fasta_fp, size, jobs):
+    # returns the results of scan_fasta_chunk for each chunk of the file
+    fasta_f = open(fasta_fp, 'rb')
+    data = mmap(fasta_f.fileno(), 0, access=ACCESS_READ)
+    try:
+        starts = find_chunk_starts(data,
+                                   max(1, min(jobs, size // _min_chunk_size)))
+        chunks = zip(starts, starts[1:] + [size])
+        if len(chunks) == 1:
+            results = [scan_fasta_chunk(data, 0, size)]
+        else:
+            pool = Pool(min(jobs, len(chunks)))
+            try:
+                results = [pool.apply_async(_scan_file_chunk,
+                                            (fasta_fp, start, end))
+                           for start, end in chunks]
+                # a timeout is passed so the wait can be interrupted
+                results = [r.get(sys.maxint) for r in results]
+            finally:
+                pool.terminate()
+                pool.join()
+    finally:
+        data.close()
+        fasta_f.close()
+    return results
+
+def scan_fasta(fasta_fp, jobs=None):
+    """ Validate and index fasta_fp, scanning chunks in up to jobs processes
+
+        Returns (FastaIndex, errors, number of errors), where errors is a
+         list of (offset, message) of the first errors found.
+    """
+    if jobs is None:
+        jobs = cpu_count()
+    signature = get_file_signature(fasta_fp)
+    size = signature[2]
+    if size == 0:
+        return (FastaIndex(fasta_fp, signature, array(_offset_typecode), {},
+                           0, 0, 0),
+                [(0, 'file contains no sequences')], 1)
+    if get_compression(fasta_fp) is not None:
+        results = scan_compressed_fasta(fasta_fp)
+    else:
+        results = _scan_uncompressed_fasta(fasta_fp, size, jobs)
+
+    offsets = array(_offset_typecode)
+    sample_counts = {}
+    lengths = []
+    errors = []
+    num_errors = 0
+    for chunk_offsets, chunk_sample_counts, min_length, max_length, \
+     total_length, chunk_errors, chunk_num_errors in results:
+        offsets.extend(chunk_offsets)
+        for sample_id, count in chunk_sample_counts.items():
+            sample_counts[sample_id] = sample_counts.get(sample_id, 0) + count
+        if chunk_offsets:
+            lengths.append((min_length, max_length, total_length))
+        errors.extend(chunk_errors)
+        num_errors += chunk_num_errors
+    if not offsets:
+        errors.append((0, 'file contains no sequences'))
+        num_errors += 1
+    index = FastaIndex(fasta_fp,
+                       signature,
+                       offsets,
+                       sample_counts,
+                       min([l[0] for l in lengths] or [0]),
+                       max([l[1] for l in lengths] or [0]),
+                       sum([l[2] for l in lengths]))
+    return index, errors[:_max_errors], num_errors
+
+def write_fasta_index(index, index_fp):
+    """ Write index to index_fp (atomically)
+    """
+    metadata = {'fasta_fp': index.fasta_fp,
+                'signature': list(index.signature),
+                'num_seqs': len(index.offsets),
+                'sample_counts': index.sample_counts,
+                'min_length': index.min_length,
+                'max_length': index.max_length,
+                'total_length': index.total_length,
+                'byteorder': sys.byteorder,
+                'offset_size': index.offsets.itemsize}
+    tmp_fp = '%s.tmp' % index_fp
+    index_f = open(tmp_fp, 'wb')
+    index_f.write(index_format)
+    index_f.write(dumps(metadata, sort_keys=True))
+    index_f.write('\n')
+    index.offsets.tofile(index_f)
+    index_f.close()
+    rename(tmp_fp, index_fp)
+
+def load_fasta_index(index_fp):
+    """ Return the FastaIndex in index_fp, or None if it can't be read
+    """
+    if not exists(index_fp):
+        return None
+    index_f = open(index_fp, 'rb')
+    try:
+        if index_f.readline() != index_format:
+            return None
+        metadata = loads(index_f.readline())
+        offsets = array(_offset_typecode)
+        if metadata['offset_size'] != offsets.itemsize:
+            # written on a platform with a different size of long
+            return None
+        try:
+            offsets.fromfile(index_f, metadata['num_seqs'])
+        except EOFError:
+            # the index was truncated
+            return None
+    finally:
+        index_f.close()
+    if metadata['byteorder'] != sys.byteorder:
+        offsets.byteswap()
+    return FastaIndex(metadata['fasta_fp'],
+                      metadata['signature'],
+                      offsets,
+                      metadata['sample_counts'],
+                      metadata['min_length'],
+                      metadata['max_length'],
+                      metadata['total_length'])
+
+def get_fasta_index(fasta_fp, index_fp, jobs=None):
+    """ Return (FastaIndex, errors, number of errors) of fasta_fp
+
+        The index in index_fp is used if it's of fasta_fp and fasta_fp
+         hasn't changed since (an index is only written if no errors
+         were found, so a reused index has no errors). Otherwise fasta_fp
+         is scanned, and the index is written to index_fp if it's valid.
+         If index_fp is None, fasta_fp is always scanned, and the index
+         isn't written.
+    """
+    if index_fp is not None:
+        index = load_fasta_index(index_fp)
+        if index is not None and index.fasta_fp == fasta_fp and \
+           index.isCurrent():
+            return index, [], 0
+    index, errors, num_errors = scan_fasta(fasta_fp, jobs)
+    if not num_errors and index_fp is not None:
+        write_fasta_index(index, index_fp)
+    return index, errors, num_errors
+
+def format_fasta_errors(fasta_fp, errors, num_errors):
+    """ Return a message describing the errors found in fasta_fp
+    """
+    lines = ['Found %d error(s) in %s:' % (num_errors, fasta_fp)]
+    for offset, message in errors:
+        lines.append(' at byte %d: %s' % (offset, message))
+    if num_errors > len(errors):
+        lines.append(' (and %d more)' % (num_errors - len(errors)))
+    return '\n'.join(lines)
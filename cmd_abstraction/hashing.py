@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+from os import stat, rename, makedirs, getpid
+from os.path import exists, dirname, expanduser, join
+from mmap import mmap, ACCESS_READ
+from hashlib import md5
+from json import dump, load
+from threading import Thread, Lock
+from time import time
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+
+default_digest_cache_fp = join(expanduser('~'), '.cmd_abstraction',
+                               'md5_cache.json')
+
+# files smaller than this are read in one go rather than memory-mapped
+_mmap_threshold = 2**20
+
+def compute_file_md5(fp):
+    """ Return the hex md5 of fp's contents
+
+        Large files are memory-mapped and passed to md5 in a single call,
+         which avoids copying the data through python strings and
+         releases the GIL for the duration of the hashing, so several
+         files can be hashed concurrently.
+    """
+    result = md5()
+    f = open(fp, 'rb')
+    try:
+        size = stat(fp).st_size
+        if size < _mmap_threshold:
+            result.update(f.read())
+        else:
+            m = mmap(f.fileno(), 0, access=ACCESS_READ)
+            try:
+                result.update(m)
+            finally:
+                m.close()
+    finally:
+        f.close()
+    return result.hexdigest()
+
+def get_file_signature(fp):
+    """ Return (device, inode, size, mtime in ns) for fp
+    """
+    s = stat(fp)
+    mtime_ns = getattr(s, 'st_mtime_ns', None)
+    if mtime_ns is None:
+        mtime_ns = int(round(s.st_mtime * 1e9))
+    return (s.st_dev, s.st_ino, s.st_size, mtime_ns)
+
+class DigestCache(object):
+    """ Persistent cache of file md5s, keyed on (device, inode, size, mtime)
+
+        If any of those change the file is re-hashed. The cache is shared
+         by all commands run by a user, so saving merges with whatever is
+         on disk and replaces the file atomically. The file is only
+         rewritten if entries were added: hits update the entries' last
+         use (which decides what is evicted) in memory, and that is saved
+         with the next addition.
+    """
+
+    def __init__(self, cache_fp=default_digest_cache_fp, max_entries=10000):
+        self.cache_fp = cache_fp
+        self.max_entries = max_entries
+        self._lock = Lock()
+        self._entries = self._load()
+        self._changed = False
+
+    def _load(self):
+        if not exists(self.cache_fp):
+            return {}
+        try:
+            return load(open(self.cache_fp))
+        except ValueError:
+            # a corrupt cache is just an empty cache
+            return {}
+
+    def _get_key(self, signature):
+        return '%d:%d:%d:%d' % signature
+
+    def getMd5(self, fp):
+        key = self._get_key(get_file_signature(fp))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry[1] = time()
+                return entry[0]
+        result = compute_file_md5(fp)
+        with self._lock:
+            self._entries[key] = [result, time()]
+            self._changed = True
+        return result
+
+    def save(self):
+        if not self._changed:
+            return
+        with self._lock:
+            entries = self._load()
+            entries.update(self._entries)
+            if len(entries) > self.max_entries:
+                # drop the least recently used entries
+                keys = sorted(entries, key=lambda k: entries[k][1])
+                for k in keys[:len(entries) - self.max_entries]:
+                    del entries[k]
+            cache_dir = dirname(self.cache_fp)
+            if cache_dir and not exists(cache_dir):
+                makedirs(cache_dir)
+            temp_fp = '%s.%d.tmp' % (self.cache_fp, getpid())
+            f = open(temp_fp, 'w')
+            dump(entries, f)
+            f.close()
+            rename(temp_fp, self.cache_fp)
+            self._entries = entries
+            self._changed = False
+
+def get_file_md5s(fps, digest_cache=None, jobs=None):
+    """ Return the md5s of fps, in order, hashing files concurrently
+    """
+    if digest_cache is None:
+        get_md5 = compute_file_md5
+    else:
+        get_md5 = digest_cache.getMd5
+    if jobs is None:
+        jobs = cpu_count()
+    jobs = min(jobs, len(fps))
+    if jobs <= 1:
+        return map(get_md5, fps)
+    pool = ThreadPool(jobs)
+    try:
+        return pool.map(get_md5, fps)
+    finally:
+        pool.close()
+        pool.join()
+
+def write_input_md5s(logger, fps, md5s):
+    """ Write md5s in the same format as qiime.workflow.log_input_md5s
+    """
+    logger.write('Input file md5 sums:\n')
+    for fp, fp_md5 in zip(fps, md5s):
+        logger.write('%s: %s\n' % (fp, fp_md5))
+    logger.write('\n')
+
+def log_input_md5s(logger, fps, digest_cache=None):
+    """ Drop-in replacement for qiime.workflow.log_input_md5s
+
+        Returns [(filepath, md5)] of the files that were logged.
+    """
+    fps = [fp for fp in fps if fp != None]
+    md5s = get_file_md5s(fps, digest_cache)
+    write_input_md5s(logger, fps, md5s)
+    if digest_cache is not None:
+        digest_cache.save()
+    return zip(fps, md5s)
+
+class BackgroundInputMd5s(Thread):
+    """ Compute input md5s on a background thread
+
+        This lets a command start running while its (possibly very large)
+         inputs are hashed. Call write (which waits for the hashing to
+         finish) to log the md5s, or log through a HeldInputMd5sLogger so
+         the md5s are logged before anything the command writes.
+    """
+
+    def __init__(self, fps, digest_cache=None):
+        Thread.__init__(self)
+        self.daemon = True
+        self.fps = [fp for fp in fps if fp != None]
+        self.digest_cache = digest_cache
+        self.md5s = None
+        self.error = None
+        self._written = False
+
+    def run(self):
+        try:
+            self.md5s = get_file_md5s(self.fps, self.digest_cache)
+            if self.digest_cache is not None:
+                self.digest_cache.save()
+        except Exception, e:
+            self.error = e
+
+    def write(self, logger):
+        if self._written:
+            return
+        self._written = True
+        self.join()
+        if self.error is not None:
+            raise self.error
+        write_input_md5s(logger, self.fps, self.md5s)
+
+class HeldInputMd5sLogger(object):
+    """ Log through logger, holding writes until input md5s are written
+
+        Writes are held while background_input_md5s is hashing, so the md5s
+         are logged where log_input_md5s would have logged them (i.e.,
+         before anything the command writes), and the held writes follow.
+         Once hashing has finished, writes pass straight through.
+    """
+
+    def __init__(self, logger, background_input_md5s):
+        self._logger = logger
+        self._background_input_md5s = background_input_md5s
+        self._held = []
+
+    def write(self, s):
+        if self._held is not None:
+            if self._background_input_md5s.is_alive():
+                self._held.append(s)
+                return
+            self.release()
+        self._logger.write(s)
+
+    def release(self):
+        """ Write the md5s (waiting for them if needed), then held writes
+        """
+        if self._held is None:
+            return
+        held = self._held
+        self._held = None
+        try:
+            self._background_input_md5s.write(self._logger)
+        finally:
+            for s in held:
+                self._logger.write(s)
+
+    def close(self):
+        self.release()
+        self._logger.close()
+
+    def __getattr__(self, name):
+        return getattr(self._logger, name)
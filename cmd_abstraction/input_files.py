@@ -0,0 +1,376 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+# Opening of (possibly compressed) input files. gzip and bz2 files are
+# detected by their magic numbers, not their names, and are decompressed as
+# they're read: a background thread reads and decompresses blocks of the
+# file into a bounded queue, so the decompression overlaps with the parsing
+# of the data (zlib and bz2 release the GIL while they decompress). Nothing
+# is decompressed to disk, and the compressed files themselves are what
+# commands' existing_filepath options check and what their logs hash.
+#
+# Workflow steps run external scripts, which can only read uncompressed
+# files. Steps reading a compressed workflow input are run as
+#
+#  python -m cmd_abstraction.input_files stream <fp> -- <step command>
+#
+# which passes the step the path of a named pipe (with the same file name
+# as fp, so the step names its output files as it would for fp) which the
+# decompressed data is streamed to. The pipe can only be read once, so
+# steps which read their input more than once (e.g., parallel OTU picking)
+# can't read compressed inputs.
+
+import sys
+import bz2
+import zlib
+from io import RawIOBase, BufferedReader
+from os import mkfifo, remove, rmdir
+from optparse import OptionParser
+from os.path import join, basename, splitext
+from pipes import quote
+from Queue import Queue, Full
+from shlex import split
+from subprocess import call
+from tempfile import mkdtemp
+from threading import Thread, Event
+
+# (magic number, compression) of the supported compression formats
+compression_magic_numbers = [('\x1f\x8b', 'gzip'), ('BZh', 'bz2')]
+
+# file extensions of the supported compression formats
+compression_extensions = ['.gz', '.gzip', '.bz2']
+
+# compressed files are read and decompressed in blocks of this size...
+_block_size = 2**20
+
+# ...and at most this many decompressed blocks are queued for the reader
+_max_queued_blocks = 16
+
+# shell operators which end the command a streamed input is passed to
+_shell_operators = set(['|', '||', '&', '&&', ';', '>', '>>', '<'])
+
+def get_compression(fp):
+    """ Return 'gzip' or 'bz2' if fp is compressed, or None if it isn't
+    """
+    f = open(fp, 'rb')
+    try:
+        start = f.read(3)
+    finally:
+        f.close()
+    for magic_number, compression in compression_magic_numbers:
+        if start.startswith(magic_number):
+            return compression
+    return None
+
+def get_uncompressed_basename(fp):
+    """ Return fp's file name without its compression extension
+    """
+    name = basename(fp)
+    root, ext = splitext(name)
+    if ext.lower() in compression_extensions:
+        return root
+    return name
+
+def _new_decompressor(compression):
+    if compression == 'gzip':
+        # 16 + MAX_WBITS: expect a gzip header and trailer
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    return bz2.BZ2Decompressor()
+
+def iter_decompressed_blocks(compressed_f, compression,
+                             block_size=_block_size):
+    """ Yield the decompressed data of compressed_f in blocks
+
+        Files of several concatenated gzip or bz2 streams (as written by
+         e.g., pigz, pbzip2 or cat) are decompressed in full.
+    """
+    decompressor = _new_decompressor(compression)
+    ended = False
+    while True:
+        data = compressed_f.read(block_size)
+        if not data:
+            break
+        while data:
+            if ended:
+                # another stream follows the one which ended
+                decompressor = _new_decompressor(compression)
+            block = decompressor.decompress(data)
+            if block:
+                yield block
+            data = decompressor.unused_data
+            ended = bool(data) or _stream_ended(decompressor, compression)
+    if not ended:
+        raise IOError, ("%s ends part-way through a %s stream: it may be "
+         "truncated." % (getattr(compressed_f, 'name', 'The file'),
+                         compression))
+
+def _stream_ended(decompressor, compression):
+    # Return True if decompressor has reached the end of its stream
+    if compression == 'gzip':
+        # data following the end of a stream is left unused, so the end is
+        # detected by passing a byte to a copy of the decompressor
+        probe = decompressor.copy()
+        try:
+            probe.decompress('\0')
+        except zlib.error:
+            return False
+        return probe.unused_data == '\0'
+    try:
+        decompressor.decompress('')
+    except EOFError:
+        return True
+    return False
+
+def translate_newlines(blocks):
+    """ Yield blocks with \\r\\n and \\r line endings replaced by \\n
+    """
+    pending_cr = False
+    for block in blocks:
+        if pending_cr:
+            block = '\r' + block
+        # a \r at the end of a block may start a \r\n
+        pending_cr = block.endswith('\r')
+        if pending_cr:
+            block = block[:-1]
+        if '\r' in block:
+            block = block.replace('\r\n', '\n').replace('\r', '\n')
+        if block:
+            yield block
+    if pending_cr:
+        yield '\n'
+
+class DecompressionThread(Thread):
+    """ Decompress a file into a queue of blocks on a background thread
+
+        The queue holds at most max_queued_blocks blocks, followed by None
+         at the end of the data (or the exception which stopped the
+         decompression). Call stop to stop the thread before the end of
+         the data.
+    """
+
+    def __init__(self, fp, compression, universal_newlines=False,
+                 max_queued_blocks=_max_queued_blocks):
+        Thread.__init__(self)
+        self.daemon = True
+        self.fp = fp
+        self.compression = compression
+        self.universal_newlines = universal_newlines
+        self.queue = Queue(max_queued_blocks)
+        self._stopped = Event()
+
+    def _put(self, item):
+        # a timeout is passed so the thread notices if it's been stopped
+        # while the queue is full
+        while not self._stopped.is_set():
+            try:
+                self.queue.put(item, True, 0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    def run(self):
+        try:
+            compressed_f = open(self.fp, 'rb')
+            try:
+                blocks = iter_decompressed_blocks(compressed_f,
+                                                  self.compression)
+                if self.universal_newlines:
+                    blocks = translate_newlines(blocks)
+                for block in blocks:
+                    if not self._put(block):
+                        return
+            finally:
+                compressed_f.close()
+        except Exception, e:
+            self._put(e)
+        else:
+            self._put(None)
+
+    def stop(self):
+        self._stopped.set()
+
+class DecompressedStream(RawIOBase):
+    """ A read-only stream of the blocks queued by a DecompressionThread
+    """
+
+    def __init__(self, decompression_thread):
+        RawIOBase.__init__(self)
+        self._thread = decompression_thread
+        self._block = ''
+        self._pos = 0
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while self._pos == len(self._block):
+            if self._eof:
+                return 0
+            # a timeout is passed so the wait can be interrupted
+            block = self._thread.queue.get(True, sys.maxint)
+            if block is None:
+                self._eof = True
+            elif isinstance(block, Exception):
+                self._eof = True
+                raise block
+            else:
+                self._block = block
+                self._pos = 0
+        n = min(len(b), len(self._block) - self._pos)
+        b[:n] = self._block[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._thread.stop()
+        RawIOBase.close(self)
+
+def open_input(fp, mode='U'):
+    """ Open fp for reading, decompressing it if it's gzip or bz2 compressed
+
+        mode: 'U' (universal newlines), 'r' or 'rb'
+
+        Uncompressed files are opened with open. Compressed files are
+         returned as a buffered, read-only file of their decompressed data,
+         supporting read, readline and iteration over lines, which is
+         decompressed on a background thread as it's read.
+    """
+    compression = get_compression(fp)
+    if compression is None:
+        return open(fp, mode)
+    decompression_thread = DecompressionThread(fp, compression,
+                                               universal_newlines='U' in mode)
+    decompression_thread.start()
+    return BufferedReader(DecompressedStream(decompression_thread),
+                          _block_size)
+
+def write_decompressed(fp, output_f):
+    """ Write the decompressed data of fp to output_f
+    """
+    input_f = open_input(fp, 'rb')
+    try:
+        while True:
+            block = input_f.read(_block_size)
+            if not block:
+                break
+            output_f.write(block)
+    finally:
+        input_f.close()
+
+def _serve_fifo(fp, fifo_fp):
+    # write fp's decompressed data to the named pipe once it's opened
+    try:
+        fifo_f = open(fifo_fp, 'wb')
+    except IOError:
+        # the command exited without opening it
+        return
+    try:
+        write_decompressed(fp, fifo_f)
+        fifo_f.close()
+    except IOError:
+        # the command closed the pipe before the end of the data
+        pass
+
+def run_with_decompressed_input(fp, argv):
+    """ Run argv, passing it a named pipe of fp's decompressed data in
+         place of fp, and return its exit status
+
+        The named pipe can only be read once.
+    """
+    fifo_dir = mkdtemp(prefix='cmd_abstraction_input_')
+    fifo_fp = join(fifo_dir, basename(fp))
+    mkfifo(fifo_fp)
+    try:
+        argv = [a.replace(fp, fifo_fp) if a == fp or a.endswith('=' + fp)
+                else a for a in argv]
+        server = Thread(target=_serve_fifo, args=(fp, fifo_fp))
+        # the server waits forever if argv doesn't open the named pipe
+        server.daemon = True
+        server.start()
+        return call(argv)
+    finally:
+        remove(fifo_fp)
+        rmdir(fifo_dir)
+
+def decompressing_step(step, input_fp, python_exe=sys.executable):
+    """ Return step, run so that it reads input_fp's decompressed data
+
+        step: (description, command) of a workflow step
+
+        Steps which don't read input_fp are returned unchanged. Raises
+         ValueError if input_fp isn't read by the first command of the
+         step (e.g., it's read by the second command of a pipeline).
+    """
+    description, command = step
+    tokens = split(command)
+    for token in tokens:
+        if token in _shell_operators:
+            break
+        if token == input_fp or token.endswith('=' + input_fp):
+            return (description,
+                    '%s -m cmd_abstraction.input_files stream %s -- %s' %
+                    (quote(python_exe), quote(input_fp), command))
+    if [t for t in tokens
+        if t == input_fp or t.endswith('=' + input_fp)]:
+        raise ValueError, ("Can't stream compressed input %s to a step "
+         "which doesn't read it in its first command: %s" %
+         (input_fp, command))
+    return step
+
+def decompress_commands(commands, input_fp):
+    """ Run the steps reading input_fp so they read its decompressed data
+
+        commands: qiime's list of lists of (description, command) tuples
+    """
+    return [[decompressing_step(step, input_fp) for step in command_group]
+            for command_group in commands]
+
+def make_decompressing_command_handler(command_handler, input_fp):
+    """ Return a command handler which streams input_fp's decompressed
+         data to the steps which read it, and then runs the commands with
+         command_handler
+    """
+    def decompressing_command_handler(commands,
+                                      status_update_callback,
+                                      logger,
+                                      close_logger_on_success=True):
+        command_handler(decompress_commands(commands, input_fp),
+                        status_update_callback,
+                        logger,
+                        close_logger_on_success=close_logger_on_success)
+    return decompressing_command_handler
+
+def main(argv):
+    usage = """%prog cat fp
+       %prog stream fp -- command [arg ...]
+
+Write the decompressed data of a gzip or bz2 compressed file to stdout, or
+run a command which reads a compressed file, passing it a named pipe of the
+decompressed data in place of the file. These are the commands workflow
+steps reading compressed inputs run; see cmd_abstraction.input_files."""
+    option_parser = OptionParser(usage=usage)
+    # the command's options are its own
+    option_parser.disable_interspersed_args()
+    opts, args = option_parser.parse_args(argv)
+    if args[:1] == ['cat'] and len(args) == 2:
+        write_decompressed(args[1], sys.stdout)
+    elif args[:1] == ['stream'] and len(args) > 3 and args[2] == '--':
+        sys.exit(run_with_decompressed_input(args[1], args[3:]))
+    else:
+        option_parser.error("Expected cat or stream, and their arguments.")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
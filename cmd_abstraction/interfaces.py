@@ -13,23 +13,14 @@ __status__ = "Development"
 
 from qiime.util import make_option
 from os import makedirs
-from qiime.util import (load_qiime_config,
-                        parse_command_line_parameters,
-                        get_options_lookup)
-from qiime.parse import parse_qiime_parameters
-from qiime.workflow import (run_qiime_data_preparation, 
-                            print_commands,
-                            call_commands_serially,
-                            print_to_stdout,
-                            no_status_updates,
-                            log_input_md5s,
-                            WorkflowLogger,
-                            generate_log_fp)
+from os.path import join, basename, exists
+from shutil import rmtree
+from tempfile import mkdtemp
 from cmd_abstraction.util import (WorkflowCommand,
-                                  QiimeCommand)
-
-qiime_config = load_qiime_config()
-options_lookup = get_options_lookup()
+                                  QiimeCommand,
+                                  QiimeCommandError,
+                                  get_qiime_config,
+                                  get_qiime_options_lookup)
 
 class PickOtusThroughOtuTable(WorkflowCommand):
     """
@@ -41,7 +32,9 @@ class PickOtusThroughOtuTable(WorkflowCommand):
     _output_description = """This script will produce an OTU mapping file (pick_otus.py), a representative set of sequences (FASTA file from pick_rep_set.py), a sequence alignment file (FASTA file from align_seqs.py), taxonomy assignment file (from assign_taxonomy.py), a filtered sequence alignment (from filter_alignment.py), a phylogenetic tree (Newick file from make_phylogeny.py) and a biom-formatted OTU table (from make_otu_table.py)."""
     _required_options = [
         make_option('-i','--input_fp',type='existing_filepath',
-            help='the input fasta file [REQUIRED]'),
+            help='the input fasta file, which may be gzip or bz2 '+\
+                'compressed (except with --parallel or --num_shards) '+\
+                '[REQUIRED]'),
         make_option('-o','--output_dir',type='new_dirpath',
             help='the output directory [REQUIRED]'),
     ]
@@ -61,7 +54,56 @@ class PickOtusThroughOtuTable(WorkflowCommand):
         make_option('-a','--parallel',action='store_true',\
                 dest='parallel',default=False,\
                 help='Run in parallel where available [default: %default]'),
-        options_lookup['jobs_to_start_workflow']
+        make_option('--concurrent_steps',action='store_true',\
+                dest='concurrent_steps',default=False,\
+                help='Run independent workflow steps at the same time, '+\
+                'using up to jobs_to_start processes [default: %default]'),
+        make_option('--disable_input_validation',action='store_true',\
+                dest='disable_input_validation',default=False,\
+                help='Don\'t check the input file\'s fasta records and '+\
+                '<sample_id>_<seq_id> identifiers before running. By '+\
+                'default the input is scanned (in parallel, for large '+\
+                'files) before any steps are run, and the command fails '+\
+                'if any errors are found [default: %default]'),
+        make_option('--num_shards',type='int',\
+                dest='num_shards',default=1,\
+                help='Pick OTUs on this many shards of the input at the '+\
+                'same time (using up to jobs_to_start processes), and '+\
+                'merge their OTU maps. Shards are read in place from the '+\
+                'input, rather than copied. Requires reference-based OTU '+\
+                'picking (uclust_ref, which like the parallel OTU pickers '+\
+                'then doesn\'t create new clusters, or blast). This '+\
+                'replaces --parallel\'s splitting of the input for OTU '+\
+                'picking, so the two can\'t be combined [default: %default]'),
+        make_option('--use_step_cache',action='store_true',\
+                dest='use_step_cache',default=False,\
+                help='Skip steps for which an identical step (same '+\
+                'command, inputs and version) completed in a previous run '+\
+                'into output_dir, and whose outputs are unchanged. Only '+\
+                'steps which write to paths passed with -o, '+\
+                '--output_dir, --output_fp or > can be skipped. Steps '+\
+                'are then run by a step handler which, like '+\
+                '--concurrent_steps, runs them in worker processes and '+\
+                'writes each step\'s log entry when it finishes '+\
+                '[default: %default]'),
+        make_option('--purge_step_cache',action='store_true',\
+                dest='purge_step_cache',default=False,\
+                help='Remove all records of previously completed steps '+\
+                'before running [default: %default]'),
+        make_option('--estimate_costs',action='store_true',\
+                dest='estimate_costs',default=False,\
+                help='Print the estimated run time and peak memory of '+\
+                'each step and of the whole workflow, and the critical '+\
+                'path with jobs_to_start, but don\'t run any steps. '+\
+                'Estimates are based on the number of input sequences, '+\
+                'and calibrated from the steps recorded in '+\
+                'step_history_fp [default: %default]'),
+        make_option('--step_history_fp',type='string',\
+                dest='step_history_fp',\
+                help='Path to the record of past steps\' run times and '+\
+                'peak memory use, which completed steps are added to '+\
+                '[default: ~/.cmd_abstraction/step_history.json]'),
+        get_qiime_options_lookup()['jobs_to_start_workflow']
     ]
     _version = __version__
     
@@ -70,6 +112,30 @@ class PickOtusThroughOtuTable(WorkflowCommand):
     def run_command(self, 
                     options,
                     arguments):
+        # the workflow modules are only needed to actually run the
+        # command, so don't pay for importing them to render --help
+        from qiime.parse import parse_qiime_parameters
+        from qiime.workflow import (run_qiime_data_preparation,
+                                    print_commands,
+                                    print_to_stdout,
+                                    no_status_updates)
+        from qiime.util import get_qiime_library_version
+        from cmd_abstraction.command_handlers import (
+                                            make_dag_command_handler,
+                                            make_serial_command_handler)
+        from cmd_abstraction.step_cache import StepCache
+        from cmd_abstraction.hashing import DigestCache
+        from cmd_abstraction.cost_model import (StepHistory,
+                                                default_step_history_fp,
+                                      make_cost_estimate_command_handler)
+        from cmd_abstraction.fasta_index import (get_fasta_index,
+                                                 format_fasta_errors)
+        from cmd_abstraction.sharding import (compute_shards,
+                                              shardable_otu_picking_methods,
+                                              make_sharded_command_handler)
+        from cmd_abstraction.input_files import (get_compression,
+                                        make_decompressing_command_handler)
+        qiime_config = get_qiime_config()
     
         verbose = options['verbose']
     
@@ -77,8 +143,13 @@ class PickOtusThroughOtuTable(WorkflowCommand):
         output_dir = options['output_dir']
         verbose = options['verbose']
         print_only = options['print_only']
+        estimate_costs = options['estimate_costs']
     
         parallel = options['parallel']
+        concurrent_steps = options['concurrent_steps']
+        num_shards = options['num_shards']
+        sharded = num_shards > 1
+        input_compressed = get_compression(input_fp) is not None
         # No longer checking that jobs_to_start > 2, but
         # commenting as we may change our minds about this.
         #if parallel: raise_error_on_parallel_unavailable()
@@ -94,39 +165,277 @@ class PickOtusThroughOtuTable(WorkflowCommand):
         else:
             params = parse_qiime_parameters([]) 
             # empty list returns empty defaultdict for now
+        
+        if parallel and input_compressed:
+            raise QiimeCommandError, "--parallel requires an uncompressed "+\
+             "input file, as the parallel OTU picking step reads it more "+\
+             "than once, and compressed inputs are streamed to the steps "+\
+             "which read them (so can only be read once)."
+        if sharded:
+            if parallel:
+                raise QiimeCommandError, "--num_shards and --parallel "+\
+                 "can't be combined, as they're alternative ways of "+\
+                 "splitting the input for OTU picking."
+            otu_picking_method = \
+             params['pick_otus'].get('otu_picking_method', 'uclust')
+            if otu_picking_method not in shardable_otu_picking_methods:
+                raise QiimeCommandError, "--num_shards requires a "+\
+                 "reference-based OTU picking method (%s), not %s." % \
+                 (', '.join(shardable_otu_picking_methods),
+                  otu_picking_method)
+            if input_compressed:
+                raise QiimeCommandError, "--num_shards requires an "+\
+                 "uncompressed input file, as shards are read from byte "+\
+                 "ranges of it."
             
         params['parallel']['jobs_to_start'] = self._validate_jobs_to_start(
                                                             options['jobs_to_start'],
                                                             qiime_config['jobs_to_start'],
-                                                            parallel)
+                                                            parallel or concurrent_steps or sharded)
     
-        try:
-            makedirs(output_dir)
-        except OSError:
-            if options['force']:
-                pass
+        # a cost estimate doesn't run anything, so it doesn't create the
+        # output directory (which would stop the real run from using it)
+        if not estimate_costs:
+            try:
+                makedirs(output_dir)
+            except OSError:
+                if options['force']:
+                    pass
+                else:
+                    # Since the analysis can take quite a while, I put this 
+                    # check in to help users avoid overwriting previous
+                    # output.
+                    print "Output directory already exists. Please choose "+\
+                     "a different directory, or force overwrite with -f."
+                    exit(1)
+        
+        # malformed input is reported now, rather than by whichever step
+        # first fails on it. The index of the input is kept in the output
+        # directory, and reused while the input is unchanged.
+        input_index = None
+        if estimate_costs:
+            input_index_fp = None
+        else:
+            input_index_fp = join(output_dir, '%s.idx' % basename(input_fp))
+        if not options['disable_input_validation'] and \
+           (estimate_costs or not print_only):
+            with self.phase('validate_input'):
+                input_index, errors, num_errors = get_fasta_index(
+                 input_fp,
+                 input_index_fp,
+                 int(params['parallel']['jobs_to_start']))
+            if num_errors:
+                raise QiimeCommandError, \
+                 format_fasta_errors(input_fp, errors, num_errors)
+        if sharded and input_index is None:
+            # shards are divided at the record offsets in the index
+            input_index = get_fasta_index(
+             input_fp,
+             input_index_fp,
+             int(params['parallel']['jobs_to_start']))[0]
+        
+        # the step cache is opt-in, so that plain serial runs are still
+        # run by call_commands_serially_measured
+        step_cache = None
+        if (options['use_step_cache'] or options['purge_step_cache']) and \
+           not print_only and not estimate_costs:
+            if self._digest_cache_fp:
+                digest_cache = DigestCache(self._digest_cache_fp)
             else:
-                # Since the analysis can take quite a while, I put this check
-                # in to help users avoid overwriting previous output.
-                print "Output directory already exists. Please choose "+\
-                 "a different directory, or force overwrite with -f."
-                exit(1)
+                digest_cache = None
+            step_cache = StepCache(join(output_dir,'step_cache.json'),
+                                   '%s %s' % (self._version,
+                                              get_qiime_library_version()),
+                                   digest_cache)
+            if options['purge_step_cache']:
+                step_cache.purge()
+            if not options['use_step_cache']:
+                step_cache = None
+        
+        # call_commands_as_dag runs the steps if they can run at the same
+        # time, or if any of the options that only it supports are used
+        use_dag_handler = concurrent_steps or sharded or \
+         step_cache is not None or options['step_retries'] or \
+         options['executor'] != 'local_pool'
         
-        if print_only:
+        # steps' run times are recorded along with the input's sequence
+        # count, and used to estimate the cost of later runs. Without an
+        # index, the input is only counted once it's needed.
+        step_history = None
+        if estimate_costs or not print_only:
+            if input_index is not None:
+                num_seqs = input_index.getNumSeqs()
+                num_bytes = input_index.getNumBytes()
+            else:
+                num_seqs = num_bytes = None
+            step_history = StepHistory(options['step_history_fp'] or
+                                       default_step_history_fp,
+                                       num_seqs,
+                                       num_bytes=num_bytes,
+                                       input_fp=input_fp)
+        
+        executor_factory = self._get_executor_factory(options)
+        if estimate_costs:
+            if concurrent_steps or sharded:
+                jobs_to_start = params['parallel']['jobs_to_start']
+            else:
+                jobs_to_start = 1
+            num_seqs, num_bytes = step_history.getInputSize()
+            command_handler = make_cost_estimate_command_handler(
+                                num_seqs, num_bytes, step_history,
+                                jobs_to_start)
+        elif print_only:
             command_handler = print_commands
+        elif concurrent_steps or sharded:
+            # steps only run at the same time if their cores and memory
+            # fit in the budget together
+            command_handler = make_dag_command_handler(
+                                params['parallel']['jobs_to_start'],
+                                step_cache=step_cache,
+                                executor_factory=executor_factory,
+                                max_retries=options['step_retries'],
+                                scheduler=self._get_scheduler(options),
+                                step_history=step_history,
+                                profiler=self._profiler)
+        elif use_dag_handler:
+            command_handler = make_dag_command_handler(1,
+                                step_cache=step_cache,
+                                executor_factory=executor_factory,
+                                max_retries=options['step_retries'],
+                                step_history=step_history,
+                                profiler=self._profiler)
         else:
-            command_handler = call_commands_serially
+            command_handler = make_serial_command_handler(
+                                step_history=step_history,
+                                profiler=self._profiler)
+        if sharded:
+            command_handler = make_sharded_command_handler(
+                                command_handler,
+                                input_fp,
+                                compute_shards(input_index, num_shards),
+                                input_index.getNumSeqs())
+        if input_compressed and not estimate_costs:
+            # the workflow's scripts read the input as it's decompressed
+            command_handler = make_decompressing_command_handler(
+                                command_handler,
+                                input_fp)
     
         if verbose:
             status_update_callback = print_to_stdout
         else:
             status_update_callback = no_status_updates
     
-        run_qiime_data_preparation(
-         input_fp, 
-         output_dir,
-         command_handler=command_handler,
-         params=params,
-         qiime_config=qiime_config,
-         parallel=parallel,\
-         status_update_callback=status_update_callback)
+        if estimate_costs:
+            # qiime creates the output directory (for its log) as it 
+            # builds the steps, so they're built in a temporary directory
+            workflow_output_dir = mkdtemp(prefix='estimate_costs_')
+        else:
+            workflow_output_dir = output_dir
+        try:
+            run_qiime_data_preparation(
+             input_fp, 
+             workflow_output_dir,
+             command_handler=command_handler,
+             params=params,
+             qiime_config=qiime_config,
+             parallel=parallel,\
+             status_update_callback=status_update_callback)
+        finally:
+            if estimate_costs:
+                rmtree(workflow_output_dir)
+
+class AddTaxa(QiimeCommand):
+    """ Add observation metadata (e.g., taxonomy) to any number of OTU tables
+    
+        This replaces the autogenerated interface of add_taxa.py, as it
+         annotates many tables with one parse of the taxonomy, reads
+         compressed inputs, and can write the binary biom format.
+    """
+    _brief_description = """Add taxa to OTU table"""
+    _script_description = """This script adds taxa to a biom-formatted OTU table. Input tables and the taxonomy file may be gzip or bz2 compressed, and input tables may also be in the binary format written with --output_format binary. Any number of tables can be annotated in one run (by passing -i and -o once per table, or with --input_dir and --output_dir), in which case the taxonomy file is only parsed once."""
+    _script_usage = [
+     ("""Example:""","""Given an input otu table with no metadata (otu_table_no_tax.biom) and a tab-separated text file mapping OTU ids to taxonomic assignments and scores associated with those assignments (tax.txt), generate a new otu table that includes taxonomic assignments (otu_table_w_tax.biom).""","""%prog -i otu_table_no_tax.biom -o otu_table_w_tax.biom -t tax.txt"""),
+     ("""Example:""","""Given an input otu table with no metadata (otu_table_no_tax.biom) and a tab-separated text file mapping OTU ids to taxonomic assignments and scores associated with those assignments (tax.txt), generate a new otu table that includes taxonomic assignments (otu_table_w_tax.biom) with alternate metadata identifiers.""","""%prog -i otu_table_no_tax.biom -o otu_table_w_alt_labeled_tax.biom -t tax.txt -l "Consensus Lineage,Score" """),
+     ("""Example:""","""Given an input otu table with no metadata (otu_table_no_tax.biom) and a tab-separated text file mapping OTU ids to some value, generate a new otu table that includes that metadata category labeled as "Score" (otu_table_w_score.biom).""","""%prog -i otu_table_no_tax.biom -o otu_table_w_score.biom -t score_only.txt -l "Score" --all_strings"""),
+     ("""Example:""","""Add taxonomic assignments from tax.txt to every biom file in the otu_tables directory, four tables at a time, writing the new tables to the otu_tables_w_tax directory.""","""%prog --input_dir otu_tables/ --output_dir otu_tables_w_tax/ -t tax.txt -O 4"""),
+     ("""Example:""","""Add taxonomic assignments from tax.txt to otu_table_no_tax.biom, writing the new table in the binary format, which later steps can read without parsing JSON.""","""%prog -i otu_table_no_tax.biom -o otu_table_w_tax.bbiom -t tax.txt --output_format binary""")]
+    _output_description = """An OTU table in biom format is written to the file specified as -o (or, with --output_dir, to a file of the same name as each input table in that directory)."""
+    _required_options = [\
+        make_option('-t','--taxonomy_fp',type='existing_filepath',
+                    help='path to input taxonomy file (e.g., as generated by assign_taxonomy.py)'),
+    ]
+    
+    _optional_options = [
+        make_option('-i','--input_fp',type='existing_filepath',action='append',
+                    help='path to input otu table file in biom format (may be passed more than once)'),
+        make_option('-o','--output_fp',type='new_filepath',action='append',
+                    help='path to output file in biom format (pass once for each -i)'),
+        make_option('--input_dir',type='existing_dirpath',
+                    help='directory of otu tables in biom format (all *.biom, *.biom.gz and *.biom.bz2 files will be processed)'),
+        make_option('--output_dir',type='new_dirpath',
+                    help='directory where output tables will be written, using the input table file names'),
+        make_option('-O','--jobs_to_start',type='int',default=1,
+                    help='number of tables to process at once [default: %default]'),
+        make_option('-l','--labels',type='string',default='taxonomy,score',
+                    help='labels to be assigned to metadata in taxonomy_fp'),
+        make_option('--output_format',type='choice',choices=['json','binary'],default='json',
+                    help='format of the output tables: biom JSON, or the memory-mappable binary format of cmd_abstraction.binary_biom (which is much faster to write and read, and can be converted to biom JSON with convert_binary_biom.py) [default: %default]'),
+        make_option('--all_strings',action='store_true',default=False,
+                    help='treat all metadata as strings, rather than casting to lists/floats (useful with --labels for adding arbitrary observation metadata) [default:%default]')]
+    _input_file_parameter_ids = ['input_fp', 'taxonomy_fp']
+    _version = __version__
+    
+    def _get_input_fps(self, params):
+        result = QiimeCommand._get_input_fps(self, params)
+        if params.get('input_dir'):
+            from cmd_abstraction.table_annotation import get_input_dir_tables
+            result.extend(get_input_dir_tables(params['input_dir']))
+        return result
+    
+    def run_command(self, 
+                    options,
+                    arguments):
+        # biom and the table helpers are only needed to actually run the
+        # command, so don't pay for importing them to render --help
+        from cmd_abstraction.input_files import open_input
+        from cmd_abstraction.observation_metadata import \
+         parse_taxonomy_columns
+        from cmd_abstraction.table_annotation import (get_table_fp_pairs,
+                                                      add_taxa_to_tables,
+                                                      format_unmatched_ids)
+        
+        table_fp_pairs = get_table_fp_pairs(options['input_fp'],
+                                            options['output_fp'],
+                                            options['input_dir'],
+                                            options['output_dir'])
+        jobs_to_start = options['jobs_to_start']
+        if jobs_to_start < 1:
+            raise QiimeCommandError, "jobs_to_start must be at least 1."
+        
+        labels = options['labels'].split(',')
+        if options['all_strings']:
+            process_fs = [str] * len(labels)
+        else:
+            process_fs = None
+        with self.phase('parse_taxonomy'):
+            observation_metadata = parse_taxonomy_columns(
+             open_input(options['taxonomy_fp'],'U'),
+             labels=labels,
+             process_fs=process_fs)
+        
+        if options['output_dir'] and not exists(options['output_dir']):
+            makedirs(options['output_dir'])
+        
+        with self.phase('add_taxa_to_tables'):
+            unmatched_ids = add_taxa_to_tables(table_fp_pairs,
+                                               observation_metadata,
+                                               labels,
+                                               options['output_format'],
+                                               jobs_to_start)
+        
+        for (input_fp, output_fp), (missing_ids, extra_ids) in \
+         zip(table_fp_pairs, unmatched_ids):
+            for line in format_unmatched_ids(input_fp,
+                                             options['taxonomy_fp'],
+                                             missing_ids, extra_ids):
+                self.logger.write(line)
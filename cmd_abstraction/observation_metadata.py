@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+# Observation metadata (e.g., taxonomy assignments) stored by column, for
+# adding to OTU tables. qiime's parse_taxonomy_to_otu_metadata builds a
+# dict for every line of the taxonomy file, each with its own list of
+# taxonomy levels and its own float, which for millions of observations
+# dominates add_taxa's run time and memory. Here each line is a row of the
+# columns, and rows are found by observation id through a single index:
+#
+#  scores (and other float fields) are stored in an array of doubles
+#  taxonomy assignments (and other fields) are interned: each distinct
+#   field is processed and stored once, and each row stores the code of
+#   its value. The levels of taxonomy assignments are also interned, so
+#   they're shared between assignments.
+#
+# Metadata dicts are only built for the observations of the table that the
+# metadata is added to, and they share the lists of equal taxonomy
+# assignments.
+
+import gc
+from array import array
+from contextlib import contextmanager
+from itertools import izip, repeat
+
+# array typecodes of the interned values' codes, float values, the number
+# of fields on each line, and the rows of a table's observations
+_code_typecode = 'I'
+_float_typecode = 'd'
+_num_fields_typecode = 'H'
+_row_typecode = 'l'
+
+# the number of lines parsed at a time
+_block_size = 100000
+
+@contextmanager
+def gc_paused():
+    """ Pause the cyclic garbage collector (e.g., while building many
+         containers which won't be garbage, which would otherwise trigger
+         repeated full collections)
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+def split_taxonomy(field):
+    """ Return the levels of a taxonomy assignment, as qiime's
+         parse_taxonomy_to_otu_metadata (but interned)
+    """
+    return [intern(level.strip()) for level in field.split(';')]
+
+class FloatColumn(object):
+    """ A column of float values """
+
+    def __init__(self):
+        self._values = array(_float_typecode)
+
+    def extend(self, fields):
+        """ Add a row for each of fields (None for rows without the field)
+        """
+        if None in fields:
+            self._values.extend([0.0 if field is None else float(field)
+                                 for field in fields])
+        else:
+            self._values.extend(map(float, fields))
+
+    def take(self, rows):
+        """ Return a list of the values of rows """
+        values = self._values
+        return [values[row] for row in rows]
+
+class InternedColumn(object):
+    """ A column of values which are processed once per distinct field
+
+        process_f must return the same value for the same field, as
+         it's only called for the first row with each field. The
+         returned value is shared between those rows.
+    """
+
+    def __init__(self, process_f):
+        self._process_f = process_f
+        self._codes = array(_code_typecode)
+        self._values = []
+        self._field_codes = {}
+
+    def extend(self, fields):
+        """ Add a row for each of fields (None for rows without the field)
+        """
+        field_codes = self._field_codes
+        for field in fields:
+            if field not in field_codes and field is not None:
+                field_codes[field] = len(self._values)
+                self._values.append(self._process_f(field))
+        # rows without the field are never read, as their num_fields
+        # excludes this column
+        get_code = field_codes.get
+        self._codes.extend([get_code(field, 0) for field in fields])
+
+    def take(self, rows):
+        """ Return a list of the values of rows """
+        codes = self._codes
+        values = self._values
+        return [values[codes[row]] for row in rows]
+
+    def getNumValues(self):
+        return len(self._values)
+
+class ObservationMetadataColumns(object):
+    """ Observation metadata, by observation id, stored by column """
+
+    def __init__(self, labels, columns):
+        """ labels: the metadata field names
+            columns: a FloatColumn or InternedColumn for each label
+        """
+        self.Labels = list(labels)
+        self._columns = columns
+        self._ids = []
+        self._index = {}
+        # fields are positional, so a row without some of the fields is
+        # missing the trailing ones
+        self._num_fields = array(_num_fields_typecode)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, observation_id):
+        return observation_id in self._index
+
+    def extend(self, observation_ids, rows):
+        """ Add rows of observation_ids, replacing any earlier rows
+
+            rows: the unprocessed fields of each row, in the order of
+             Labels (any beyond the labels are ignored)
+        """
+        num_labels = len(self.Labels)
+        num_fields = [min(len(row), num_labels) for row in rows]
+        if num_fields and min(num_fields) < num_labels:
+            rows = [row + [None] * (num_labels - len(row)) for row in rows]
+        for column, fields in izip(self._columns, zip(*rows)):
+            column.extend(fields)
+        start = len(self._ids)
+        self._index.update(izip(observation_ids,
+                                xrange(start, start + len(rows))))
+        self._ids.extend(observation_ids)
+        self._num_fields.extend(num_fields)
+
+    def getRows(self, observation_ids):
+        """ Return an array of the row of each of observation_ids (or -1
+             for those which have no metadata)
+        """
+        index = self._index
+        return array(_row_typecode,
+                     [index.get(observation_id, -1)
+                      for observation_id in observation_ids])
+
+    def getMetadata(self, observation_id):
+        """ Return a dict of observation_id's metadata """
+        return self.getTableMetadata([observation_id])[0][observation_id]
+
+    def getTableMetadata(self, observation_ids):
+        """ Return the metadata of a table's observations
+
+            Returns ({observation id: metadata dict} for those of
+             observation_ids which have metadata, the ids in
+             observation_ids without metadata, and the ids with metadata
+             which aren't in observation_ids, in the order they were
+             added).
+        """
+        rows = self.getRows(observation_ids)
+        missing_ids = [observation_id for observation_id, row
+                       in izip(observation_ids, rows) if row < 0]
+        matched_ids = [observation_id for observation_id, row
+                       in izip(observation_ids, rows) if row >= 0]
+        matched_rows = array(_row_typecode, [row for row in rows if row >= 0])
+        del rows
+
+        num_labels = len(self.Labels)
+        num_fields = self._num_fields
+        with gc_paused():
+            if self._columns:
+                row_values = izip(*[column.take(matched_rows)
+                                    for column in self._columns])
+            else:
+                row_values = repeat((), len(matched_rows))
+            if min(num_fields or [num_labels]) == num_labels:
+                labels = self.Labels
+                metadata = dict(izip(matched_ids,
+                                     [dict(izip(labels, values))
+                                      for values in row_values]))
+            else:
+                # the labels of rows with each number of fields
+                labels = [self.Labels[:i] for i in range(num_labels + 1)]
+                metadata = dict(izip(matched_ids,
+                                     [dict(izip(labels[num_fields[row]],
+                                                values))
+                                      for row, values
+                                      in izip(matched_rows, row_values)]))
+
+        used = array('b', [0]) * len(self._ids)
+        for row in matched_rows:
+            used[row] = 1
+        index = self._index
+        extra_ids = [observation_id for row, observation_id
+                     in enumerate(self._ids)
+                     if not used[row] and index[observation_id] == row]
+        return metadata, missing_ids, extra_ids
+
+def parse_taxonomy_columns(lines, labels=['taxonomy','score'],
+                           process_fs=None):
+    """ Return the observation metadata in lines as ObservationMetadataColumns
+
+        lines are read as qiime's parse_taxonomy_to_otu_metadata reads
+         them: each is an observation id followed by tab-separated fields,
+         which are labeled in order with labels (fields beyond the labels
+         are ignored). By default the first field is a taxonomy assignment,
+         which is split into its levels, and the others are floats.
+         Otherwise process_fs is the function that processes each field
+         (see InternedColumn).
+    """
+    if process_fs is None:
+        columns = [InternedColumn(split_taxonomy)] + \
+                  [FloatColumn() for label in labels[1:]]
+    else:
+        columns = [InternedColumn(process_f)
+                   for process_f in process_fs[:len(labels)]]
+    result = ObservationMetadataColumns(labels[:len(columns)], columns)
+    num_labels = len(labels)
+    block = []
+    with gc_paused():
+        for line in lines:
+            line = line.strip()
+            if line:
+                block.append(line.split('\t'))
+                if len(block) == _block_size:
+                    _add_block(result, block, num_labels)
+                    block = []
+        _add_block(result, block, num_labels)
+    return result
+
+def _add_block(result, block, num_labels):
+    # add the split lines in block to result
+    observation_ids = [fields[0].split()[0] for fields in block]
+    rows = [fields[1:num_labels + 1] for fields in block]
+    if rows and max(map(len, rows)) > len(result.Labels):
+        raise ValueError, \
+         ("Too many fields to parse. Only %d processing functions "
+          "are defined." % len(result.Labels))
+    result.extend(observation_ids, rows)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+from contextlib import contextmanager
+from json import dump
+from os import rename
+from resource import getrusage, RUSAGE_SELF
+from time import time
+
+profile_modes = ['none', 'phases', 'cprofile']
+
+def get_usage():
+    """ Return (wall seconds, cpu seconds, peak rss) for this process
+
+        Peak RSS is ru_maxrss, which is in kilobytes on linux.
+    """
+    usage = getrusage(RUSAGE_SELF)
+    return time(), usage.ru_utime + usage.ru_stime, usage.ru_maxrss
+
+@contextmanager
+def null_phase():
+    yield
+
+class PhaseProfiler(object):
+    """ Record the wall time, cpu time and peak RSS of named phases
+
+        Phases can be nested, in which case the inner phase is recorded as
+         outer/inner. Phases are recorded in the order they finish, so
+         sub-phases are listed before the phase that contains them.
+
+        Peak RSS is the process's peak at the end of the phase, so a phase's
+         own memory use shows up as an increase over the previous phase.
+    """
+
+    def __init__(self):
+        self._names = []
+        self._phases = []
+
+    @contextmanager
+    def phase(self, name):
+        self._names.append(name)
+        start_wall, start_cpu, start_rss = get_usage()
+        try:
+            yield
+        finally:
+            end_wall, end_cpu, end_rss = get_usage()
+            self.addPhase('/'.join(self._names),
+                          end_wall - start_wall,
+                          end_cpu - start_cpu,
+                          end_rss)
+            self._names.pop()
+
+    def addPhase(self, name, wall_seconds, cpu_seconds, peak_rss_kb):
+        self._phases.append({'name': name,
+                             'wall_seconds': wall_seconds,
+                             'cpu_seconds': cpu_seconds,
+                             'peak_rss_kb': peak_rss_kb})
+
+    def getPhases(self):
+        return list(self._phases)
+
+    def writeJson(self, output_fp, **metadata):
+        """ Write the phases, and any metadata, to output_fp as JSON
+        """
+        result = dict(metadata)
+        result['phases'] = self.getPhases()
+        tmp_fp = '%s.tmp' % output_fp
+        output_f = open(tmp_fp, 'w')
+        dump(result, output_f, indent=1, sort_keys=True)
+        output_f.write('\n')
+        output_f.close()
+        rename(tmp_fp, output_fp)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+# This module must stay cheap to import: nothing here should import qiime,
+# biom or the command modules until a command is actually requested.
+
+from os.path import basename
+
+def get_command_class_name(command_name):
+    """ Map add_taxa, add_taxa.py or AddTaxa to AddTaxa
+    """
+    command_name = basename(command_name)
+    if command_name.endswith('.py'):
+        command_name = command_name[:-3]
+    if '_' in command_name or command_name.islower():
+        command_name = command_name.replace('_',' ').title().replace(' ','')
+    return command_name
+
+def load_command_class(command_name,
+                       module_name='cmd_abstraction.autogenerated_interfaces'):
+    """ Return the command class for command_name from module_name
+
+        module_name can either be a lazy interfaces package (i.e., one
+         with a CommandRegistry called registry) or a regular module
+         defining the command class.
+    """
+    class_name = get_command_class_name(command_name)
+    module = __import__(module_name, globals(), locals(), ['*'])
+    registry = getattr(module, 'registry', None)
+    if isinstance(registry, CommandRegistry):
+        return registry.getCommandClass(class_name)
+    try:
+        return getattr(module, class_name)
+    except AttributeError:
+        raise KeyError, "Unknown command: %s" % command_name
+
+class CommandRegistry(object):
+    """ Map command class names to the modules that define them
+
+        Command modules are only imported when their class is first
+         requested, so looking up one command doesn't pay the import
+         cost of every other command.
+    """
+
+    def __init__(self, command_modules, package=None):
+        """
+            command_modules: dict of {class name: module name}
+            package: if provided, module names are relative to this package
+        """
+        self._command_modules = {}
+        for class_name, module_name in command_modules.items():
+            if package:
+                module_name = '%s.%s' % (package, module_name)
+            self._command_modules[class_name] = module_name
+        self._command_classes = {}
+
+    def getCommandNames(self):
+        return sorted(self._command_modules)
+
+    def getModuleName(self, class_name):
+        try:
+            return self._command_modules[class_name]
+        except KeyError:
+            raise KeyError, "Unknown command: %s" % class_name
+
+    def getCommandClass(self, class_name):
+        try:
+            return self._command_classes[class_name]
+        except KeyError:
+            module_name = self.getModuleName(class_name)
+            module = __import__(module_name, globals(), locals(), [class_name])
+            command_class = getattr(module, class_name)
+            self._command_classes[class_name] = command_class
+            return command_class
+
+    def __contains__(self, class_name):
+        return class_name in self._command_modules
@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+# Structured records of command runs, kept in a SQLite database alongside
+# the free-text master script logs. Every QiimeCommand run adds one row to
+# runs, one row to run_inputs for each input file, and one row to
+# run_phases for each phase recorded by its PhaseProfiler (including
+# workflow steps). Each run is written in a single transaction, and SQLite
+# serializes writers, so parallel jobs can share a database. The database
+# is at default_run_history_fp, unless run_history_fp is set in the qiime
+# config (see cmd_abstraction.util.get_run_history_fp).
+
+import sqlite3
+from hashlib import md5
+from json import dumps
+from os import makedirs, getpid
+from os.path import exists, dirname, getsize, abspath, realpath
+from socket import gethostname
+from time import strftime, gmtime
+from cmd_abstraction.util import default_run_history_fp
+
+# seconds a writer waits for another writer to finish before giving up
+_busy_timeout = 60
+
+_schema = """
+CREATE TABLE IF NOT EXISTS runs (
+ run_id INTEGER PRIMARY KEY,
+ command TEXT NOT NULL,
+ version TEXT,
+ options_md5 TEXT,
+ command_line TEXT,
+ hostname TEXT,
+ pid INTEGER,
+ start_time REAL NOT NULL,
+ end_time REAL NOT NULL,
+ exit_status INTEGER NOT NULL,
+ error TEXT);
+CREATE INDEX IF NOT EXISTS runs_command_start ON runs (command, start_time);
+CREATE TABLE IF NOT EXISTS run_inputs (
+ run_id INTEGER NOT NULL REFERENCES runs (run_id),
+ fp TEXT NOT NULL,
+ md5 TEXT,
+ size_bytes INTEGER);
+CREATE INDEX IF NOT EXISTS run_inputs_run_id ON run_inputs (run_id);
+CREATE TABLE IF NOT EXISTS run_phases (
+ run_id INTEGER NOT NULL REFERENCES runs (run_id),
+ name TEXT NOT NULL,
+ wall_seconds REAL,
+ cpu_seconds REAL,
+ peak_rss_kb INTEGER);
+CREATE INDEX IF NOT EXISTS run_phases_run_id ON run_phases (run_id);
+"""
+
+# file systems which don't support SQLite's write-ahead log, as its
+# processes share memory through a file that must be mapped by every host
+network_filesystem_types = set(['nfs', 'nfs4', 'cifs', 'smbfs', 'smb3',
+                                'afs', 'ncpfs', 'lustre', 'gpfs', 'ceph',
+                                'glusterfs', 'fuse.glusterfs', 'fuse.sshfs',
+                                '9p'])
+
+def get_filesystem_type(fp, mounts_fp='/proc/mounts'):
+    """ Return the type of the file system fp is on, or None if unknown
+
+        The type is read from the mount table in mounts_fp, so is only
+         known on Linux.
+    """
+    path = realpath(fp)
+    try:
+        mounts = open(mounts_fp).readlines()
+    except IOError:
+        return None
+    result = None
+    longest_mount_point = -1
+    for line in mounts:
+        fields = line.split()
+        if len(fields) < 3:
+            continue
+        # spaces in mount points are escaped
+        mount_point = fields[1].replace('\\040', ' ')
+        # later mounts on the same mount point hide earlier ones
+        if (path == mount_point or
+            path.startswith(mount_point.rstrip('/') + '/')) and \
+           len(mount_point) >= longest_mount_point:
+            longest_mount_point = len(mount_point)
+            result = fields[2]
+    return result
+
+def get_journal_mode(history_fp, mounts_fp='/proc/mounts'):
+    """ Return the SQLite journal mode to use for the database history_fp
+
+        Readers don't block the writer (or vice versa) with a write-ahead
+         log ('wal'), but that only works on local file systems, so a
+         rollback journal ('delete') is used on network file systems, or
+         if the file system can't be determined.
+    """
+    filesystem_type = get_filesystem_type(dirname(abspath(history_fp)),
+                                          mounts_fp)
+    if filesystem_type is None or \
+       filesystem_type in network_filesystem_types:
+        return 'delete'
+    return 'wal'
+
+def get_options_md5(options):
+    """ Return an md5 of the options, which is the same for equal options
+    """
+    return md5(dumps(options, sort_keys=True, default=str)).hexdigest()
+
+def connect_run_history(history_fp=default_run_history_fp):
+    """ Return a connection to the run history, creating it if necessary
+    """
+    history_dir = dirname(history_fp)
+    if history_dir and not exists(history_dir):
+        try:
+            makedirs(history_dir)
+        except OSError:
+            # another process created it first
+            if not exists(history_dir):
+                raise
+    conn = sqlite3.connect(history_fp, timeout=_busy_timeout)
+    # the journal mode is a property of the database file, so this also
+    # switches databases moved to a network file system back to a
+    # rollback journal
+    conn.execute('PRAGMA journal_mode=%s' % get_journal_mode(history_fp))
+    # the schema is created in a write transaction, which concurrent
+    # connections wait for (executescript would commit each statement
+    # separately, and fail if another connection changed the schema
+    # in between)
+    conn.isolation_level = None
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        for statement in _schema.split(';'):
+            if statement.strip():
+                conn.execute(statement)
+        conn.execute('COMMIT')
+    except:
+        conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.isolation_level = ''
+    return conn
+
+def record_run(history_fp,
+               command,
+               version,
+               options,
+               argv,
+               start_time,
+               end_time,
+               exit_status,
+               error=None,
+               input_md5s=None,
+               phases=None):
+    """ Add a run to the run history, returning its run_id
+
+        input_md5s: list of (filepath, md5), where md5 may be None if it
+         wasn't computed
+        phases: list of dicts, as returned by PhaseProfiler.getPhases
+    """
+    conn = connect_run_history(history_fp)
+    try:
+        # the connection's context manager commits the transaction, or
+        # rolls it back on error
+        with conn:
+            cursor = conn.execute(
+             'INSERT INTO runs (command, version, options_md5, command_line,'
+             ' hostname, pid, start_time, end_time, exit_status, error)'
+             ' VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+             (command, version, get_options_md5(options), ' '.join(argv),
+              gethostname(), getpid(), start_time, end_time, exit_status,
+              error))
+            run_id = cursor.lastrowid
+            input_rows = []
+            for fp, fp_md5 in input_md5s or []:
+                try:
+                    size_bytes = getsize(fp)
+                except OSError:
+                    size_bytes = None
+                input_rows.append((run_id, fp, fp_md5, size_bytes))
+            conn.executemany('INSERT INTO run_inputs VALUES (?, ?, ?, ?)',
+                             input_rows)
+            conn.executemany('INSERT INTO run_phases VALUES (?, ?, ?, ?, ?)',
+             [(run_id, p['name'], p['wall_seconds'], p['cpu_seconds'],
+               p['peak_rss_kb']) for p in phases or []])
+    finally:
+        conn.close()
+    return run_id
+
+def median(values):
+    values = sorted(values)
+    mid = len(values) // 2
+    if len(values) % 2:
+        return values[mid]
+    return (values[mid - 1] + values[mid]) / 2
+
+period_lengths = {'hour': 3600, 'day': 86400, 'week': 7 * 86400}
+
+def get_run_trends(conn, command=None, since=None, period='day',
+                   phase=None):
+    """ Return latency and throughput of runs, per command and period
+
+        Each result is (command, period start, runs, failures, median
+         seconds, max seconds, MB of input per second), where seconds are
+         the run's wall time (or that of phase, if given), and throughput
+         is the total input size of successful runs divided by their
+         total time. Results are sorted by command and period.
+
+        command: only include runs of this command class
+        since: only include runs which started at or after this time
+        period: 'hour', 'day' or 'week'. Periods are in UTC, and weeks start
+         on Thursday (the first day of the epoch).
+    """
+    period_length = period_lengths[period]
+    if phase is None:
+        query = 'SELECT r.run_id, r.command, r.start_time, ' +\
+                'r.end_time - r.start_time, r.exit_status FROM runs r'
+        params = []
+    else:
+        query = 'SELECT r.run_id, r.command, r.start_time, ' +\
+                'p.wall_seconds, r.exit_status FROM runs r ' +\
+                'JOIN run_phases p ON p.run_id = r.run_id AND p.name = ?'
+        params = [phase]
+    conditions = []
+    if command is not None:
+        conditions.append('r.command = ?')
+        params.append(command)
+    if since is not None:
+        conditions.append('r.start_time >= ?')
+        params.append(since)
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    input_sizes = dict(conn.execute(
+     'SELECT run_id, SUM(size_bytes) FROM run_inputs GROUP BY run_id'))
+
+    groups = {}
+    for run_id, run_command, start_time, seconds, exit_status \
+     in conn.execute(query, params):
+        period_start = start_time - start_time % period_length
+        groups.setdefault((run_command, period_start), []).append(
+         (seconds, exit_status, input_sizes.get(run_id) or 0))
+
+    result = []
+    for (run_command, period_start), runs in sorted(groups.items()):
+        succeeded = [r for r in runs if r[1] == 0]
+        total_seconds = sum([r[0] for r in succeeded])
+        total_mb = sum([r[2] for r in succeeded]) / (1024 * 1024)
+        seconds = [r[0] for r in runs]
+        result.append((run_command,
+                       period_start,
+                       len(runs),
+                       len(runs) - len(succeeded),
+                       median(seconds),
+                       max(seconds),
+                       total_mb / total_seconds if total_seconds else None))
+    return result
+
+def format_run_trends(trends, period='day'):
+    """ Return a tab-separated table of get_run_trends results
+    """
+    if period == 'hour':
+        time_format = '%Y-%m-%d %H:00'
+    else:
+        time_format = '%Y-%m-%d'
+    lines = ['#command\t%s\truns\tfailures\tmedian seconds\tmax seconds\t'
+             'MB/second' % period]
+    for command, period_start, runs, failures, median_seconds, \
+     max_seconds, mb_per_second in trends:
+        if mb_per_second is None:
+            mb_per_second = 'N/A'
+        else:
+            mb_per_second = '%1.3f' % mb_per_second
+        lines.append('%s\t%s\t%d\t%d\t%1.2f\t%1.2f\t%s' %
+                     (command, strftime(time_format, gmtime(period_start)),
+                      runs, failures, median_seconds, max_seconds,
+                      mb_per_second))
+    return '\n'.join(lines)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+from collections import namedtuple
+from multiprocessing import cpu_count
+from os import sysconf
+from os.path import basename, exists
+from shlex import split
+
+# the cores and memory (in MB) that a step needs while it runs
+StepRequirements = namedtuple('StepRequirements', ['cores', 'memory_mb'])
+
+default_requirements = StepRequirements(1, 256)
+
+# Requirements of the scripts run by the workflows, keyed on script name.
+# OTU picking and tree building hold all of the sequences (or the whole
+# alignment) in memory, so they're the steps to keep apart. The parallel
+# scripts run one job per core (their -O), and their memory_mb is per job.
+default_step_requirements = {
+ 'pick_otus.py': StepRequirements(1, 2048),
+ 'pick_rep_set.py': StepRequirements(1, 512),
+ 'align_seqs.py': StepRequirements(1, 1024),
+ 'assign_taxonomy.py': StepRequirements(1, 1024),
+ 'filter_alignment.py': StepRequirements(1, 512),
+ 'make_phylogeny.py': StepRequirements(1, 2048),
+ 'make_otu_table.py': StepRequirements(1, 512),
+ 'parallel_pick_otus_uclust_ref.py': StepRequirements(1, 1024),
+ 'parallel_align_seqs_pynast.py': StepRequirements(1, 512),
+ 'parallel_assign_taxonomy_rdp.py': StepRequirements(1, 1024),
+ 'parallel_assign_taxonomy_blast.py': StepRequirements(1, 512),
+}
+
+def get_step_script_name(command):
+    """ Return the name of the (first) python script a command runs
+    """
+    for token in split(command):
+        if token.endswith('.py'):
+            return basename(token)
+    return None
+
+def get_step_requirements(command, step_requirements=None):
+    """ Return the StepRequirements of a command
+
+        step_requirements: {script name: StepRequirements} (default:
+         default_step_requirements). Commands which don't run a script
+         listed there get default_requirements.
+    """
+    if step_requirements is None:
+        step_requirements = default_step_requirements
+    script_name = get_step_script_name(command)
+    requirements = step_requirements.get(script_name, default_requirements)
+    if script_name and script_name.startswith('parallel_'):
+        tokens = split(command)
+        for i, token in enumerate(tokens[:-1]):
+            if token in ('-O', '--jobs_to_start'):
+                jobs = int(tokens[i + 1])
+                return StepRequirements(requirements.cores * jobs,
+                                        requirements.memory_mb * jobs)
+    return requirements
+
+def parse_step_requirements(lines):
+    """ Parse script name, cores and memory (MB) from tab-separated lines
+
+        Returns {script name: StepRequirements}, starting from
+         default_step_requirements, so only the scripts which differ from
+         the defaults need to be listed.
+    """
+    result = dict(default_step_requirements)
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        fields = line.split('\t')
+        if len(fields) != 3:
+            raise ValueError, "Step requirements must be script name, "+\
+             "cores and memory (MB), separated by tabs: %s" % line
+        result[fields[0]] = StepRequirements(int(fields[1]), int(fields[2]))
+    return result
+
+def get_host_resources(meminfo_fp='/proc/meminfo'):
+    """ Return (cores, available memory in MB) of this host
+
+        Available memory is MemAvailable from /proc/meminfo where there is
+         one (i.e., on linux), or the physical memory otherwise, or None if
+         neither can be found.
+    """
+    memory_mb = None
+    if exists(meminfo_fp):
+        for line in open(meminfo_fp):
+            if line.startswith('MemAvailable:'):
+                memory_mb = int(line.split()[1]) // 1024
+                break
+    if memory_mb is None:
+        try:
+            memory_mb = sysconf('SC_PHYS_PAGES') * sysconf('SC_PAGE_SIZE') \
+                        // (1024 * 1024)
+        except (ValueError, OSError):
+            pass
+    return cpu_count(), memory_mb
+
+class ResourceScheduler(object):
+    """ Decide which steps can start without exceeding a core and memory budget
+
+        A step can start if its cores and memory fit in what's left of the
+         budget once the running steps' requirements are subtracted. A
+         step which needs more than the whole budget could never start,
+         so it's treated as needing the whole budget (i.e., it runs only
+         when nothing else is running).
+    """
+
+    def __init__(self, cores=None, memory_mb=None, step_requirements=None):
+        """
+            cores, memory_mb: the budget (default: this host's cores
+             and memory)
+            step_requirements: {script name: StepRequirements} (default:
+             default_step_requirements)
+        """
+        host_cores, host_memory_mb = get_host_resources()
+        self.cores = cores or host_cores
+        self.memory_mb = memory_mb or host_memory_mb
+        self.step_requirements = step_requirements
+        self._running = {}
+
+    def getRequirements(self, command):
+        """ Return the step's requirements, capped at the whole budget
+        """
+        cores, memory_mb = get_step_requirements(command,
+                                                 self.step_requirements)
+        return StepRequirements(min(cores, self.cores),
+                                min(memory_mb, self.memory_mb or memory_mb))
+
+    def getAvailable(self):
+        cores = self.cores - sum([r.cores for r in self._running.values()])
+        if self.memory_mb is None:
+            memory_mb = None
+        else:
+            memory_mb = self.memory_mb - \
+                        sum([r.memory_mb for r in self._running.values()])
+        return StepRequirements(cores, memory_mb)
+
+    def canStart(self, command):
+        required = self.getRequirements(command)
+        available = self.getAvailable()
+        return required.cores <= available.cores and \
+               (available.memory_mb is None or
+                required.memory_mb <= available.memory_mb)
+
+    def start(self, step_id, command):
+        """ Record that a step has started, and reserve its requirements
+        """
+        self._running[step_id] = self.getRequirements(command)
+
+    def finish(self, step_id):
+        """ Record that a step has finished, and release its requirements
+        """
+        del self._running[step_id]
+
+    def selectSteps(self, ready_steps):
+        """ Return the ready steps which can start now, and reserve them
+
+            ready_steps: list of (step id, command), in order of preference.
+             Steps are started first-fit: each step that fits in what's
+             left is started, so a small step can start while a larger
+             one waits.
+        """
+        result = []
+        for step_id, command in ready_steps:
+            if self.canStart(command):
+                self.start(step_id, command)
+                result.append(step_id)
+        return result
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+import sys
+from os import chdir, dup, dup2, remove, stat
+from os.path import exists
+from stat import S_ISSOCK
+from socket import socket, AF_UNIX, SOCK_STREAM, error as socket_error
+from json import dumps, loads
+from tempfile import TemporaryFile
+from traceback import format_exc
+from SocketServer import (UnixStreamServer,
+                          ForkingMixIn,
+                          StreamRequestHandler)
+from cmd_abstraction.util import (cmd_main,
+                                  QiimeCommand,
+                                  WorkflowCommand)
+from cmd_abstraction.registry import (CommandRegistry,
+                                      get_command_class_name)
+
+def load_command_classes(module_names):
+    """ Import module_names and return {class name: QiimeCommand subclass}
+    """
+    result = {}
+    for module_name in module_names:
+        module = __import__(module_name, globals(), locals(), ['*'])
+        registry = getattr(module, 'registry', None)
+        if isinstance(registry, CommandRegistry):
+            # lazy registries are loaded in full here, as the point of
+            # the server is to pay all import costs once, up front
+            for name in registry.getCommandNames():
+                result[name] = registry.getCommandClass(name)
+            continue
+        for name in dir(module):
+            obj = getattr(module, name)
+            if isinstance(obj, type) and \
+               issubclass(obj, QiimeCommand) and \
+               obj not in (QiimeCommand, WorkflowCommand):
+                result[name] = obj
+    return result
+
+def run_command_request(command_classes, request):
+    """ Run a single request as cmd_main would, capturing its output
+
+        This is called in a forked child, so sys.argv, the working
+         directory, file descriptors and any class-level state touched by
+         the command are private to this request.
+    """
+    class_name = get_command_class_name(request['command'])
+    argv = [str(a) for a in request['argv']]
+    try:
+        command_class = command_classes[class_name]
+    except KeyError:
+        return {'exit_status': 1,
+                'stdout': '',
+                'stderr': 'Unknown command: %s\n' % request['command']}
+
+    if request.get('cwd'):
+        chdir(request['cwd'])
+    sys.argv = argv
+
+    # capture output at the file descriptor level so output of any
+    # subprocesses started by the command is returned to the client too
+    stdout_f = TemporaryFile()
+    stderr_f = TemporaryFile()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved_stdout_fd = dup(1)
+    saved_stderr_fd = dup(2)
+    dup2(stdout_f.fileno(), 1)
+    dup2(stderr_f.fileno(), 2)
+    exit_status = 0
+    try:
+        try:
+            cmd_main(command_class(), argv)
+        except SystemExit, e:
+            if e.code is None:
+                exit_status = 0
+            elif isinstance(e.code, int):
+                exit_status = e.code
+            else:
+                sys.stderr.write('%s\n' % e.code)
+                exit_status = 1
+        except Exception:
+            sys.stderr.write(format_exc())
+            exit_status = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        dup2(saved_stdout_fd, 1)
+        dup2(saved_stderr_fd, 2)
+
+    stdout_f.seek(0)
+    stderr_f.seek(0)
+    return {'exit_status': exit_status,
+            'stdout': stdout_f.read(),
+            'stderr': stderr_f.read()}
+
+class QiimeCommandRequestHandler(StreamRequestHandler):
+    """ Handle one newline-terminated JSON request per connection
+    """
+
+    def handle(self):
+        line = self.rfile.readline()
+        try:
+            request = loads(line)
+        except ValueError:
+            response = {'exit_status': 1,
+                        'stdout': '',
+                        'stderr': 'Malformed request.\n'}
+        else:
+            response = run_command_request(self.server.command_classes,
+                                           request)
+        self.wfile.write(dumps(response))
+        self.wfile.write('\n')
+
+def remove_stale_socket(socket_fp):
+    """ Remove socket_fp if it was left by a server which is no longer running
+
+        Servers remove their socket when they exit cleanly, but not if
+         they crash or are killed. Raises ValueError if a server is still
+         listening on socket_fp, or if socket_fp isn't a socket.
+    """
+    if not exists(socket_fp):
+        return
+    if not S_ISSOCK(stat(socket_fp).st_mode):
+        raise ValueError, "%s exists and isn't a socket." % socket_fp
+    s = socket(AF_UNIX, SOCK_STREAM)
+    try:
+        try:
+            s.connect(socket_fp)
+        except socket_error:
+            # nothing is listening, so the socket is stale
+            remove(socket_fp)
+            return
+    finally:
+        s.close()
+    raise ValueError, "A server is already listening on %s." % socket_fp
+
+class QiimeCommandServer(ForkingMixIn, UnixStreamServer):
+    """ Long-lived server which dispatches requests to preloaded commands
+
+        The command classes (and everything they import, including qiime
+         and the qiime config) are loaded once in the parent process. Each
+         request is then handled in a forked child, which starts warm but
+         can't leak state into the next request.
+    """
+
+    def __init__(self, socket_fp, command_classes):
+        remove_stale_socket(socket_fp)
+        self.socket_fp = socket_fp
+        self.command_classes = command_classes
+        UnixStreamServer.__init__(self,
+                                  socket_fp,
+                                  QiimeCommandRequestHandler)
+
+    def server_close(self):
+        UnixStreamServer.server_close(self)
+        if exists(self.socket_fp):
+            remove(self.socket_fp)
+
+def start_command_server(socket_fp,
+                         module_names=['cmd_abstraction.autogenerated_interfaces']):
+    server = QiimeCommandServer(socket_fp,
+                                load_command_classes(module_names))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
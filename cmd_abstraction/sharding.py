@@ -0,0 +1,370 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+# Sharded OTU picking. The workflow's input fasta file is divided into
+# record-aligned byte ranges (using its FastaIndex), and the workflow's
+# pick_otus.py step is replaced by one step per shard and a step which
+# merges their OTU maps. Shards aren't copied to files: each shard step
+# pipes its byte range, read in place from a memory map, into pick_otus.py.
+# The steps run:
+#
+#  python -m cmd_abstraction.sharding run <fasta_fp> <start> <end> -- \
+#   pick_otus.py -i /dev/stdin ...
+#  python -m cmd_abstraction.sharding merge -o <otu_map_fp> \
+#   -n <num_seqs> <shard_dir> ...
+#
+# A shard step fails if either pick_otus.py or the reading of its range
+# fails (unlike a shell pipeline, which only reports its last command's
+# exit status), and the merge step fails if the merged OTU map and
+# failures don't account for every input sequence.
+#
+# Only reference-based OTU picking can be sharded, as de novo clusters
+# can't be merged across shards.
+
+import sys
+from bisect import bisect_left
+from collections import OrderedDict
+from mmap import mmap, ACCESS_READ
+from optparse import OptionParser
+from os import rename
+from os.path import join, exists, basename, splitext
+from pipes import quote
+from shlex import split
+from signal import signal, SIGPIPE, SIG_DFL
+from subprocess import Popen, PIPE
+from cmd_abstraction.scheduler import get_step_script_name
+
+# OTU picking methods whose per-shard results can be merged
+shardable_otu_picking_methods = ['uclust_ref', 'blast']
+# OTU picking methods which list every sequence they don't assign to an
+# OTU in a failures file (uclust_ref, as shards are run with
+# --suppress_new_clusters), so every input sequence is accounted for
+complete_otu_picking_methods = ['uclust_ref']
+
+# the path shard steps read their sequences from
+shard_input_fp = '/dev/stdin'
+
+def compute_shards(index, num_shards):
+    """ Return [(start, end)] byte ranges dividing an indexed fasta file
+
+        Ranges start at records, and are of about equal size. Fewer ranges
+         are returned if there are fewer records than num_shards.
+    """
+    offsets = index.offsets
+    size = index.getNumBytes()
+    if not offsets:
+        return []
+    starts = [offsets[0]]
+    for i in range(1, num_shards):
+        j = bisect_left(offsets, i * size // num_shards)
+        if j < len(offsets) and offsets[j] > starts[-1]:
+            starts.append(offsets[j])
+    return zip(starts, starts[1:] + [size])
+
+class FastaRangeReader(object):
+    """ A read-only file over a byte range of a file, read in place
+
+        The range is read through a memory map, so nothing outside it is
+         read, and it isn't copied before being read. Supports read,
+         readline and iteration over lines, so it can be passed to fasta
+         parsers in place of an open file.
+    """
+
+    def __init__(self, fp, start, end):
+        self._f = open(fp, 'rb')
+        self._data = mmap(self._f.fileno(), 0, access=ACCESS_READ)
+        self._pos = start
+        self._end = min(end, len(self._data))
+
+    def read(self, size=-1):
+        if size < 0:
+            end = self._end
+        else:
+            end = min(self._pos + size, self._end)
+        result = self._data[self._pos:end]
+        self._pos = end
+        return result
+
+    def readline(self):
+        end = self._data.find('\n', self._pos, self._end)
+        if end == -1:
+            end = self._end
+        else:
+            end += 1
+        result = self._data[self._pos:end]
+        self._pos = end
+        return result
+
+    def __iter__(self):
+        while True:
+            line = self.readline()
+            if not line:
+                return
+            yield line
+
+    def close(self):
+        self._data.close()
+        self._f.close()
+
+def write_range(fp, start, end, output_f, block_size=2**20):
+    """ Write bytes start to end of fp to output_f
+
+        Raises IOError if fp ends before end.
+    """
+    reader = FastaRangeReader(fp, start, end)
+    num_bytes = 0
+    try:
+        while True:
+            block = reader.read(block_size)
+            if not block:
+                break
+            output_f.write(block)
+            num_bytes += len(block)
+    finally:
+        reader.close()
+    if num_bytes < end - start:
+        raise IOError, "%s ends at byte %d, before the end of the range "\
+         "(%d)" % (fp, start + num_bytes, end)
+
+def _restore_sigpipe():
+    # python ignores SIGPIPE, and its children inherit that, but commands
+    # run from a shell expect the default (to exit when their output is
+    # closed)
+    signal(SIGPIPE, SIG_DFL)
+
+def run_on_range(fp, start, end, args):
+    """ Run args with bytes start to end of fp as its stdin
+
+        Returns args' exit status, or 1 if it succeeded but the range
+         couldn't be written to it in full (e.g., fp was truncated, or
+         args stopped reading early).
+    """
+    proc = Popen(args, stdin=PIPE, preexec_fn=_restore_sigpipe)
+    error = None
+    try:
+        write_range(fp, start, end, proc.stdin)
+    except (IOError, OSError), e:
+        error = e
+    try:
+        proc.stdin.close()
+    except IOError, e:
+        error = error or e
+    return_value = proc.wait()
+    if return_value == 0 and error is not None:
+        sys.stderr.write("Couldn't pass bytes %d to %d of %s to %s: %s\n" %
+                         (start, end, fp, ' '.join(args), error))
+        return 1
+    return return_value
+
+def get_otu_map_fp(output_dir, input_fp):
+    """ Return the path pick_otus.py writes input_fp's OTU map to
+    """
+    return join(output_dir, '%s_otus.txt' % splitext(basename(input_fp))[0])
+
+def get_failures_fp(otu_map_fp):
+    return '%s_failures.txt' % otu_map_fp[:-len('_otus.txt')]
+
+def merge_otu_maps(shard_otu_map_fps, output_fp, num_seqs=None):
+    """ Merge OTU maps, and their failures files, in shard order
+
+        OTUs are written in the order they first appear, and each OTU's
+         sequences in shard order, so the merged map doesn't depend on the
+         order in which the shards finished. If the OTU picker lists OTUs
+         in the order they first appear in its input, and each OTU's
+         sequences in input order, the merged map is the same as that of
+         the unsharded input.
+
+        If num_seqs (the number of sequences in the sharded input) is
+         given, ValueError is raised (and nothing is written) unless the
+         OTU maps and failures have that many sequences between them.
+    """
+    otus = OrderedDict()
+    failures = []
+    for otu_map_fp in shard_otu_map_fps:
+        for line in open(otu_map_fp, 'U'):
+            fields = line.rstrip('\n').split('\t')
+            if fields[0]:
+                otus.setdefault(fields[0], []).extend(fields[1:])
+        failures_fp = get_failures_fp(otu_map_fp)
+        if exists(failures_fp):
+            failures.extend([l for l in open(failures_fp, 'U') if l.strip()])
+    if num_seqs is not None:
+        num_merged = sum(map(len, otus.values())) + len(failures)
+        if num_merged != num_seqs:
+            raise ValueError, "The shards' OTU maps and failures have %d "\
+             "sequences, but the input has %d." % (num_merged, num_seqs)
+    tmp_fp = '%s.tmp' % output_fp
+    output_f = open(tmp_fp, 'w')
+    for otu_id, seq_ids in otus.items():
+        output_f.write('%s\n' % '\t'.join([otu_id] + seq_ids))
+    output_f.close()
+    rename(tmp_fp, output_fp)
+    if failures:
+        open(get_failures_fp(output_fp), 'w').writelines(failures)
+
+def _find_option(tokens, flags):
+    """ Return (index, prefix, value) of an option's value in tokens
+
+        prefix is '' if the value is a token of its own, or '<flag>=' if it
+         was passed as --flag=value. Returns (None, None, None) if none of
+         flags were passed.
+    """
+    for i, token in enumerate(tokens):
+        if token in flags and i + 1 < len(tokens):
+            return i + 1, '', tokens[i + 1]
+        for flag in flags:
+            if flag.startswith('--') and token.startswith(flag + '='):
+                return i, flag + '=', token[len(flag) + 1:]
+    return None, None, None
+
+def get_shard_range(command):
+    """ Return the (start, end) byte range a shard step reads, or None
+
+        None is returned for commands which aren't shard steps.
+    """
+    tokens = split(command)
+    for i in range(len(tokens) - 4):
+        if tokens[i:i + 2] == ['cmd_abstraction.sharding', 'run']:
+            return int(tokens[i + 3]), int(tokens[i + 4])
+    return None
+
+def shard_pick_otus_step(step, input_fp, shards, python_exe=sys.executable,
+                         num_seqs=None):
+    """ Return the steps which run a pick_otus.py step on shards of input_fp
+
+        step: (description, command) of a pick_otus.py step whose input is
+         input_fp
+        shards: [(start, end)] byte ranges of input_fp (see compute_shards)
+        num_seqs: the number of sequences in input_fp, which the merge step
+         checks are all accounted for, for methods which record their
+         failures (complete_otu_picking_methods) [default: not checked]
+
+        Raises ValueError if the step's OTU picking method can't be
+         sharded. Like parallel_pick_otus_uclust_ref.py, uclust_ref steps
+         don't create new clusters for sequences which fail to hit the
+         reference (so each sequence's OTU doesn't depend on its shard).
+    """
+    description, command = step
+    tokens = split(command)
+    method = _find_option(tokens, ['-m', '--otu_picking_method'])[2] or \
+             'uclust'
+    if method not in shardable_otu_picking_methods:
+        raise ValueError, "OTU picking can only be sharded with reference"+\
+         "-based methods (%s), not %s." % \
+         (', '.join(shardable_otu_picking_methods), method)
+    if method == 'uclust_ref' and \
+       not [t for t in tokens if t in ('-C', '--suppress_new_clusters')]:
+        tokens.append('--suppress_new_clusters')
+    input_i, input_prefix = \
+     _find_option(tokens, ['-i', '--input_seqs_filepath'])[:2]
+    output_i, output_prefix, output_dir = \
+     _find_option(tokens, ['-o', '--output_dir'])
+    if output_dir is None:
+        raise ValueError, "Can't shard a pick_otus.py step without an "+\
+         "output directory (-o): %s" % command
+    result = []
+    shard_dirs = []
+    for i, (start, end) in enumerate(shards):
+        shard_dir = join(output_dir, 'shards', 'shard_%d' % i)
+        shard_dirs.append(shard_dir)
+        shard_tokens = list(tokens)
+        shard_tokens[input_i] = input_prefix + shard_input_fp
+        shard_tokens[output_i] = output_prefix + shard_dir
+        result.append(('%s (shard %d of %d)' % (description, i + 1,
+                                                len(shards)),
+                       '%s -m cmd_abstraction.sharding run %s %d %d -- %s' %
+                       (quote(python_exe), quote(input_fp), start, end,
+                        ' '.join(map(quote, shard_tokens)))))
+    if num_seqs is None or method not in complete_otu_picking_methods:
+        num_seqs_option = ''
+    else:
+        num_seqs_option = ' -n %d' % num_seqs
+    result.append(('%s (merge shards)' % description,
+                   '%s -m cmd_abstraction.sharding merge -o %s%s %s' %
+                   (quote(python_exe),
+                    quote(get_otu_map_fp(output_dir, input_fp)),
+                    num_seqs_option,
+                    ' '.join(map(quote, shard_dirs)))))
+    return result
+
+def shard_commands(commands, input_fp, shards, num_seqs=None):
+    """ Replace the pick_otus.py steps reading input_fp with sharded steps
+
+        commands: qiime's list of lists of (description, command) tuples
+        num_seqs: the number of sequences in input_fp (see 
+         shard_pick_otus_step)
+    """
+    result = []
+    for command_group in commands:
+        group = []
+        for step in command_group:
+            if get_step_script_name(step[1]) == 'pick_otus.py' and \
+               _find_option(split(step[1]),
+                            ['-i', '--input_seqs_filepath'])[2] == input_fp:
+                group.extend(shard_pick_otus_step(step, input_fp, shards,
+                                                  num_seqs=num_seqs))
+            else:
+                group.append(step)
+        result.append(group)
+    return result
+
+def make_sharded_command_handler(command_handler, input_fp, shards,
+                                 num_seqs=None):
+    """ Return a command handler which shards OTU picking and then runs
+         the commands with command_handler
+    """
+    def sharded_command_handler(commands,
+                                status_update_callback,
+                                logger,
+                                close_logger_on_success=True):
+        command_handler(shard_commands(commands, input_fp, shards, num_seqs),
+                        status_update_callback,
+                        logger,
+                        close_logger_on_success=close_logger_on_success)
+    return sharded_command_handler
+
+def main(argv):
+    usage = """%prog cat fasta_fp start end
+       %prog run fasta_fp start end -- command [argument ...]
+       %prog merge -o otu_map_fp [-n num_seqs] shard_dir [shard_dir ...]
+
+Write a byte range of a fasta file to stdout, run a command with a byte
+range as its stdin, or merge the OTU maps of sharded OTU picking steps.
+These are the commands sharded workflow steps run; see
+cmd_abstraction.sharding."""
+    option_parser = OptionParser(usage=usage)
+    option_parser.add_option('-o','--output_fp',
+     help='the merged OTU map [REQUIRED for merge]')
+    option_parser.add_option('-n','--num_seqs',type='int',
+     help='the number of sequences the merged OTU map and failures must '
+          'have between them [default: not checked]')
+    opts, args = option_parser.parse_args(argv)
+    if args[:1] == ['cat'] and len(args) == 4:
+        write_range(args[1], int(args[2]), int(args[3]), sys.stdout)
+    elif args[:1] == ['run'] and len(args) > 4:
+        sys.exit(run_on_range(args[1], int(args[2]), int(args[3]), args[4:]))
+    elif args[:1] == ['merge'] and len(args) > 1 and opts.output_fp:
+        try:
+            merge_otu_maps([get_otu_map_fp(d, shard_input_fp)
+                            for d in args[1:]],
+                           opts.output_fp,
+                           opts.num_seqs)
+        except ValueError, e:
+            sys.stderr.write('%s\n' % e)
+            sys.exit(1)
+    else:
+        option_parser.error("Expected cat, run or merge, and their "
+                            "arguments.")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
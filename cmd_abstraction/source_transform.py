@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+# Converts a QIIME script's source into the source of a QiimeCommand. The
+# script is tokenized once, and each statement is either dropped, kept at
+# the module level, or moved into the class body, with all rewrites applied
+# to its tokens as it goes past.
+
+from ast import literal_eval
+from StringIO import StringIO
+from tokenize import (generate_tokens, NAME, STRING, COMMENT, NL,
+                      NEWLINE, INDENT, DEDENT, ENDMARKER)
+
+_script_metadata_names = frozenset(['__author__', '__copyright__',
+                                    '__credits__', '__license__',
+                                    '__version__', '__maintainer__',
+                                    '__email__', '__status__'])
+
+# the qiime config and options lookup are loaded once per process
+# by cmd_abstraction.util
+_renamed_functions = {'load_qiime_config': 'get_qiime_config',
+                      'get_options_lookup': 'get_qiime_options_lookup'}
+
+_dropped_comment_prefixes = ('#!/usr/bin/env', '# File created on')
+
+_ignored_token_types = frozenset([COMMENT, NL, NEWLINE])
+
+_skipped_token_types = frozenset([INDENT, DEDENT, ENDMARKER])
+
+def get_statements(source):
+    """ Yield (tokens, code tokens) for each statement, comment or blank line
+
+        Code tokens exclude comments and newlines. Newlines within a
+         statement (e.g., inside brackets) don't end it, so a multi-line
+         statement is yielded as one list of tokens.
+    """
+    tokens = []
+    code = []
+    for t in generate_tokens(StringIO(source).readline):
+        token_type = t[0]
+        if token_type in _skipped_token_types:
+            continue
+        tokens.append(t)
+        if token_type not in _ignored_token_types:
+            code.append(t)
+        elif token_type == NEWLINE or (token_type == NL and not code):
+            yield tokens, code
+            tokens = []
+            code = []
+    if tokens:
+        yield tokens, code
+
+def _values(tokens):
+    return [t[1] for t in tokens]
+
+# statements without any of these names don't need to be rewritten
+_rewritten_names = frozenset(['script_info', 'opts', 'def', 'option_parser']
+                             + _renamed_functions.keys())
+
+def get_statement_edits(code):
+    """ Return the (start, end, replacement) edits for a statement
+
+        code is the statement's code tokens, and start and end are 
+         (row, col) positions, as in tokenize.
+    """
+    edits = []
+    for i, t in enumerate(code):
+        if t[1] not in _rewritten_names or t[0] != NAME:
+            continue
+        prev = code[i-1][1] if i > 0 else None
+        following = _values(code[i+1:i+4])
+        if t[1] == 'script_info' and following[:1] == ['['] and \
+           len(following) == 3 and code[i+2][0] == STRING and \
+           following[2] == ']':
+            # script_info['x'] -> _x
+            key = literal_eval(following[1])
+            edits.append((t[2], code[i+3][3], '_%s' % key))
+        elif t[1] == 'opts' and prev != '.' and following[:1] == ['.'] and \
+             len(following) > 1 and code[i+2][0] == NAME:
+            # opts.x -> opts['x']
+            edits.append((t[2], code[i+2][3], "opts['%s']" % following[1]))
+        elif t[1] == 'def' and t[2][1] == 0 and \
+             following == ['main', '(', ')']:
+            edits.append((code[i+1][2], code[i+3][3],
+                          'run_command(self,opts,args)'))
+        elif t[1] in _renamed_functions and prev != '.' and \
+             following[:1] == ['(']:
+            edits.append((t[2], t[3], _renamed_functions[t[1]]))
+        elif t[1] == 'option_parser' and prev in (None, ':') and \
+             following[:2] == ['.', 'error']:
+            # option_parser.error(msg) is always a statement of its own,
+            # so can become a raise. cmd_main reports QiimeCommandErrors
+            # through the option parser, so the user sees the same message.
+            edits.append((t[2], code[i+2][3], 'raise QiimeCommandError'))
+    return edits
+
+def is_dropped_statement(tokens, code):
+    code = _values(code[:6])
+    if not code:
+        comments = [t[1] for t in tokens if t[0] == COMMENT]
+        return bool(comments) and \
+               comments[0].startswith(_dropped_comment_prefixes)
+    return (code[0] in _script_metadata_names and code[1:2] == ['=']) or \
+           code[:2] == ['from', '__future__'] or \
+           code[:6] == ['option_parser', ',', 'opts', ',', 'args', '=']
+
+def is_script_info_definition(code):
+    return len(code) == 4 and \
+           _values(code) == ['script_info', '=', '{', '}']
+
+def is_main_block(code):
+    return len(code) > 1 and code[0][1] == 'if' and code[0][2][1] == 0 and \
+           code[1][1] == '__name__'
+
+class _SourceLines(object):
+
+    def __init__(self, source):
+        self.lines = source.splitlines(True)
+        self.offsets = [0]
+        for line in self.lines:
+            self.offsets.append(self.offsets[-1] + len(line))
+
+    def getStatementSource(self, tokens, edits):
+        """ Return the source lines of a statement, with edits applied
+        """
+        first_row = tokens[0][2][0]
+        last_row = tokens[-1][3][0]
+        # a NEWLINE/NL token ends on its own row, but a statement that ends
+        # at the end of the file has no newline
+        last_row = min(last_row, len(self.lines))
+        text = ''.join(self.lines[first_row-1:last_row])
+        base = self.offsets[first_row-1]
+        for start, end, replacement in sorted(edits, reverse=True):
+            start = self.offsets[start[0]-1] + start[1] - base
+            end = self.offsets[end[0]-1] + end[1] - base
+            text = text[:start] + replacement + text[end:]
+        return first_row, text.splitlines(True)
+
+def get_string_continuation_rows(tokens):
+    """ Return the rows which are continuations of multi-line strings
+    """
+    result = set()
+    for t in tokens:
+        if t[0] == STRING and t[3][0] > t[2][0]:
+            result.update(range(t[2][0] + 1, t[3][0] + 1))
+    return result
+
+def transform_script(source):
+    """ Return (module source, class body source) for a script's source
+
+        Statements before script_info is defined (the script's imports and
+         module-level setup) stay at the module level, and those after
+         (up to the if __name__ == "__main__" block) become the indented
+         class body. The script's metadata, its __future__ import and its
+         call to parse_command_line_parameters are dropped, as the
+         interface module provides its own.
+
+        The rewrites are:
+         def main(): -> def run_command(self,opts,args):
+         script_info['x'] -> _x
+         opts.x -> opts['x']
+         option_parser.error(...) -> raise QiimeCommandError(...)
+         load_qiime_config() -> get_qiime_config()
+         get_options_lookup() -> get_qiime_options_lookup()
+    """
+    source_lines = _SourceLines(source)
+    module_lines = []
+    class_lines = []
+    in_class_body = False
+    for tokens, code in get_statements(source):
+        if is_main_block(code):
+            break
+        elif is_script_info_definition(code):
+            in_class_body = True
+            continue
+        elif is_dropped_statement(tokens, code):
+            continue
+        first_row, lines = source_lines.getStatementSource(
+         tokens, get_statement_edits(code))
+        if in_class_body:
+            continuation_rows = get_string_continuation_rows(tokens)
+            for row, line in enumerate(lines, first_row):
+                if row in continuation_rows:
+                    class_lines.append(line)
+                else:
+                    class_lines.append('    %s' % line)
+        else:
+            module_lines.extend(lines)
+    return ''.join(module_lines), ''.join(class_lines)
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+from os import walk, remove, rename
+from os.path import exists, isdir, isfile, join
+from hashlib import md5
+from json import dump, load
+from cmd_abstraction.command_handlers import (get_step_outputs,
+                                              get_step_paths,
+                                              paths_overlap)
+from cmd_abstraction.hashing import compute_file_md5, get_file_signature
+
+class StepCache(object):
+    """ Record completed workflow steps so they can be skipped on re-runs
+
+        A step's key is computed from the cache version (e.g., the command
+         and QIIME versions), the step's command (which includes all of
+         its parameters) and the content of every existing path the step
+         reads. When a step is completed its key is recorded along with
+         the md5s of its outputs. A later step with the same key is a hit,
+         and is skipped, if its outputs are still present and unchanged.
+         Steps with no outputs detected by get_step_outputs are never
+         recorded, as whatever they write can't be checked.
+    """
+
+    def __init__(self, cache_fp, version, digest_cache=None):
+        self.cache_fp = cache_fp
+        self.version = version
+        self.digest_cache = digest_cache
+        self.hits = []
+        self._md5s = {}
+        self._completed_steps = {}
+        self._records = {}
+        if exists(cache_fp):
+            try:
+                self._records = load(open(cache_fp))
+            except ValueError:
+                # e.g., a write was interrupted: the cache is rebuilt
+                pass
+
+    def _get_path_md5(self, path):
+        """ Return the md5 of a file, or of all files under a directory
+        """
+        if isdir(path):
+            result = md5()
+            for dirpath, dirnames, filenames in walk(path):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    fp = join(dirpath, filename)
+                    result.update(fp)
+                    result.update(self._get_path_md5(fp))
+            return result.hexdigest()
+        # files are re-hashed only if they have changed since they
+        # were last hashed
+        if self.digest_cache is not None:
+            return self.digest_cache.getMd5(path)
+        memo_key = get_file_signature(path)
+        try:
+            return self._md5s[memo_key]
+        except KeyError:
+            result = compute_file_md5(path)
+            self._md5s[memo_key] = result
+            return result
+
+    def getStepKey(self, description, command):
+        outputs = get_step_outputs(command)
+        key = md5()
+        key.update(self.version)
+        key.update('\0')
+        key.update(command)
+        for path in sorted(set(get_step_paths(command))):
+            # pipes and devices (e.g., /dev/stdin) can't be hashed without
+            # consuming them
+            if not (isfile(path) or isdir(path)):
+                continue
+            if [o for o in outputs if paths_overlap(path, o)]:
+                continue
+            key.update('\0%s\0%s' % (path, self._get_path_md5(path)))
+        return key.hexdigest()
+
+    def isHit(self, key):
+        try:
+            record = self._records[key]
+        except KeyError:
+            return False
+        # steps with no detected outputs may write to paths that aren't
+        # passed with output_flags, so can't be checked and are always run
+        if not record['outputs']:
+            return False
+        for path, path_md5 in record['outputs']:
+            if not exists(path) or self._get_path_md5(path) != path_md5:
+                return False
+        return True
+
+    def recordHit(self, description):
+        self.hits.append(description)
+
+    def recordCompleted(self, key, description, command):
+        self._completed_steps[key] = (description, command)
+
+    def save(self):
+        """ Record output md5s of completed steps and write the cache
+
+            This is called once the workflow has stopped, rather than as
+             each step completes, as later steps can write to their
+             predecessors' output directories.
+        """
+        for key, (description, command) in self._completed_steps.items():
+            outputs = [(o, self._get_path_md5(o))
+                       for o in get_step_outputs(command) if exists(o)]
+            if not outputs:
+                continue
+            self._records[key] = {'description':description,
+                                  'command':command,
+                                  'outputs':outputs}
+        self._completed_steps = {}
+        temp_fp = '%s.tmp' % self.cache_fp
+        f = open(temp_fp, 'w')
+        dump(self._records, f, indent=1)
+        f.close()
+        rename(temp_fp, self.cache_fp)
+        if self.digest_cache is not None:
+            self.digest_cache.save()
+
+    def purge(self):
+        self._records = {}
+        self._completed_steps = {}
+        if exists(self.cache_fp):
+            remove(self.cache_fp)
+
+    def formatReport(self):
+        lines = ['Step cache hits (%d):\n' % len(self.hits)]
+        for description in self.hits:
+            lines.append(' %s\n' % description)
+        return ''.join(lines)
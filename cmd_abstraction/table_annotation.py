@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+# Adding observation metadata (e.g., taxonomy assignments) to OTU tables,
+# for the AddTaxa command (see cmd_abstraction.interfaces).
+
+from os.path import join
+from glob import glob
+from multiprocessing import Pool
+from biom.parse import parse_biom_table
+from cmd_abstraction.util import QiimeCommandError
+from cmd_abstraction.biom_output import write_biom_table, get_generated_by
+from cmd_abstraction.binary_biom import (is_binary_biom_table,
+                                         load_biom_document,
+                                         get_metadata,
+                                         add_observation_metadata,
+                                         update_generated_by,
+                                         write_binary_biom_table,
+                                         write_biom_document)
+from cmd_abstraction.input_files import (open_input,
+                                         get_uncompressed_basename)
+
+# the number of missing or extra observation ids listed in the log
+max_logged_ids = 10
+
+# the files in --input_dir which are processed (tables may be compressed)
+input_dir_table_patterns = ['*.biom', '*.biom.gz', '*.biom.bz2']
+
+def get_input_dir_tables(input_dir):
+    """ Return the (sorted) filepaths of the tables in input_dir
+    """
+    result = []
+    for pattern in input_dir_table_patterns:
+        result.extend(glob(join(input_dir, pattern)))
+    return sorted(result)
+
+def get_table_fp_pairs(input_fps, output_fps, input_dir, output_dir):
+    """ Return the (input_fp, output_fp) pairs that add_taxa should process
+
+        Tables are taken from the -i values, followed by the .biom files
+         (compressed or not) in input_dir (if provided). Output filepaths
+         are either the -o values, which must pair up with the input
+         tables, or files of the same name (without any compression
+         extension, as they're written uncompressed) in output_dir.
+    """
+    input_fps = list(input_fps or [])
+    output_fps = list(output_fps or [])
+    if input_dir:
+        input_fps.extend(get_input_dir_tables(input_dir))
+    if not input_fps:
+        raise QiimeCommandError, \
+         "At least one input table must be provided with -i or --input_dir."
+    
+    if output_dir:
+        if output_fps:
+            raise QiimeCommandError, \
+             "-o and --output_dir can't be used together."
+        output_fps = [join(output_dir, get_uncompressed_basename(fp))
+                      for fp in input_fps]
+    elif len(output_fps) != len(input_fps):
+        raise QiimeCommandError, \
+         ("Each input table needs an output filepath (%d input tables, "
+          "%d output filepaths). Pass -o once per -i, or use --output_dir."
+          % (len(input_fps), len(output_fps)))
+    
+    if len(set(output_fps)) != len(output_fps):
+        raise QiimeCommandError, "Output filepaths must be unique."
+    overwritten = set(input_fps) & set(output_fps)
+    if overwritten:
+        raise QiimeCommandError, \
+         "Output would overwrite input table(s): %s" % \
+         ', '.join(sorted(overwritten))
+    return zip(input_fps, output_fps)
+
+def check_new_metadata_labels(otu_table, labels, table_fp):
+    """ Raise QiimeCommandError if otu_table already has any of labels
+    """
+    check_new_observation_metadata_labels(otu_table.ObservationMetadata,
+                                          labels, table_fp)
+
+def check_new_observation_metadata_labels(observation_metadata, labels,
+                                          table_fp):
+    """ Raise QiimeCommandError if observation_metadata (a table's list of
+         observation metadata, or None) already has any of labels
+    """
+    if observation_metadata != None:
+        # if there is already metadata associated with the 
+        # observations, confirm that none of the metadata names
+        # are already present (on any observation, as not every
+        # observation has to have the same fields)
+        existing_keys = set()
+        for metadata in observation_metadata:
+            if metadata:
+                existing_keys.update(metadata)
+        for label in labels:
+            if label in existing_keys:
+                raise QiimeCommandError, \
+                 ("%s is already an observation metadata field in %s."
+                  " Can't add it, so nothing is being added to this table."
+                  % (label, table_fp))
+
+def add_taxa_to_table(input_fp, output_fp, observation_metadata, labels,
+                      output_format='json'):
+    """ Add observation_metadata to the table in input_fp, writing output_fp
+    
+        observation_metadata: ObservationMetadataColumns (as returned by
+         parse_taxonomy_columns)
+        
+        Returns the ids of the table's observations which have no
+         metadata, and the ids with metadata which aren't in the table.
+    """
+    if output_format == 'json' and not is_binary_biom_table(input_fp):
+        otu_table = parse_biom_table(open_input(input_fp,'U'))
+        check_new_metadata_labels(otu_table, labels, input_fp)
+        table_metadata, missing_ids, extra_ids = \
+         observation_metadata.getTableMetadata(otu_table.ObservationIds)
+        otu_table.addObservationMetadata(table_metadata)
+        
+        output_f = open(output_fp,'w')
+        write_biom_table(otu_table, output_f)
+        output_f.close()
+        return missing_ids, extra_ids
+    
+    # binary tables are read and written as biom JSON documents, without
+    # building a biom Table
+    doc = load_biom_document(input_fp)
+    check_new_observation_metadata_labels(get_metadata(doc, 'rows'),
+                                          labels, input_fp)
+    table_metadata, missing_ids, extra_ids = \
+     observation_metadata.getTableMetadata([row['id'] for row in doc['rows']])
+    add_observation_metadata(doc, table_metadata)
+    update_generated_by(doc, get_generated_by())
+    output_f = open(output_fp,'wb')
+    if output_format == 'binary':
+        write_binary_biom_table(doc, output_f)
+    else:
+        write_biom_document(doc, output_f)
+    output_f.close()
+    return missing_ids, extra_ids
+
+def format_ids(ids):
+    """ Return ids as a comma-separated string, listing at most
+         max_logged_ids of them
+    """
+    if len(ids) > max_logged_ids:
+        return ', '.join(ids[:max_logged_ids]) + ', ...'
+    return ', '.join(ids)
+
+def format_unmatched_ids(table_fp, taxonomy_fp, missing_ids, extra_ids):
+    """ Return log lines summarizing the observation ids of table_fp
+         without metadata in taxonomy_fp, and vice versa
+    """
+    result = []
+    if missing_ids:
+        result.append('%d observations in %s have no metadata in %s: %s\n' %
+                      (len(missing_ids), table_fp, taxonomy_fp,
+                       format_ids(missing_ids)))
+    if extra_ids:
+        result.append('%d observations in %s aren\'t in %s: %s\n' %
+                      (len(extra_ids), taxonomy_fp, table_fp,
+                       format_ids(extra_ids)))
+    return result
+
+# The parsed taxonomy is shared with worker processes by fork, rather than
+# being pickled and sent with every table.
+_worker_observation_metadata = None
+_worker_labels = None
+_worker_output_format = None
+
+def _add_taxa_to_table_worker(fps):
+    input_fp, output_fp = fps
+    return add_taxa_to_table(input_fp, output_fp,
+                             _worker_observation_metadata, _worker_labels,
+                             _worker_output_format)
+
+def add_taxa_to_tables(table_fp_pairs, observation_metadata, labels,
+                       output_format='json', jobs_to_start=1):
+    """ Add observation_metadata to each (input_fp, output_fp) table
+
+        Tables are processed in this process (if jobs_to_start is 1) or on
+         a pool of up to jobs_to_start processes. Returns the
+         (missing ids, extra ids) of each table (see add_taxa_to_table),
+         in the order of table_fp_pairs.
+    """
+    global _worker_observation_metadata, _worker_labels, \
+           _worker_output_format
+    if jobs_to_start == 1 or len(table_fp_pairs) == 1:
+        return [add_taxa_to_table(input_fp, output_fp,
+                                  observation_metadata, labels,
+                                  output_format)
+                for input_fp, output_fp in table_fp_pairs]
+    _worker_observation_metadata = observation_metadata
+    _worker_labels = labels
+    _worker_output_format = output_format
+    pool = Pool(min(jobs_to_start, len(table_fp_pairs)))
+    try:
+        return pool.map(_add_taxa_to_table_worker, table_fp_pairs)
+    finally:
+        pool.terminate()
+        _worker_observation_metadata = None
+        _worker_labels = None
+        _worker_output_format = None
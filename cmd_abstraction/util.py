@@ -11,35 +11,112 @@ __maintainer__ = "Greg Caporaso"
 __email__ = "gregcaporaso@gmail.com"
 __status__ = "Development"
 
+import sys
+from collections import namedtuple
+from os import environ
+from os.path import splitext, join, expanduser
+from time import time
 from qiime.util import make_option
-from os import makedirs
-from qiime.util import (load_qiime_config,
-                        parse_command_line_parameters,
-                        get_options_lookup)
-from qiime.parse import parse_qiime_parameters
-from qiime.workflow import (log_input_md5s,
-                            WorkflowLogger,
-                            generate_log_fp)
-
-qiime_config = load_qiime_config()
-options_lookup = get_options_lookup()
+from qiime.util import parse_command_line_parameters
+from cmd_abstraction.hashing import (DigestCache,
+                                     BackgroundInputMd5s,
+                                     HeldInputMd5sLogger,
+                                     log_input_md5s,
+                                     default_digest_cache_fp)
+from cmd_abstraction.profiling import (PhaseProfiler,
+                                       null_phase,
+                                       profile_modes)
+
+# the run history database (see cmd_abstraction.run_history, which is only
+# imported to record a run)
+default_run_history_fp = join(expanduser('~'), '.cmd_abstraction',
+                              'run_history.sqlite')
+
+# The qiime config and options lookup are loaded on first use rather than
+# at import time, and then shared by every command in the process.
+_qiime_config = None
+_options_lookup = None
+
+def get_qiime_config():
+    global _qiime_config
+    if _qiime_config is None:
+        from qiime.util import load_qiime_config
+        _qiime_config = load_qiime_config()
+    return _qiime_config
+
+def get_run_history_fp(run_history_fp=default_run_history_fp):
+    """ Return the run history database to use in place of run_history_fp
+    
+        The default database can be changed by setting run_history_fp in 
+         the qiime config (e.g., to a local disk, if the home directory is 
+         on a network file system).
+    """
+    if run_history_fp == default_run_history_fp:
+        return get_qiime_config().get('run_history_fp') or run_history_fp
+    return run_history_fp
+
+def get_qiime_options_lookup():
+    global _options_lookup
+    if _options_lookup is None:
+        from qiime.util import get_options_lookup
+        _options_lookup = get_options_lookup()
+    return _options_lookup
+
+def redact_argv(argv, secret_options, replacement='<redacted>'):
+    """ Return argv with the values of secret_options replaced
+
+        secret_options: long options (e.g., '--executor_authkey'). Their
+         values are replaced whether they're passed as '--option value' or
+         '--option=value', or with an abbreviated option name.
+    """
+    result = []
+    redact_next = False
+    for token in argv:
+        if redact_next:
+            token = replacement
+            redact_next = False
+        elif token.startswith('--') and len(token) > 2:
+            name, equals, value = token.partition('=')
+            if [o for o in secret_options if o.startswith(name)]:
+                if equals:
+                    token = '%s=%s' % (name, replacement)
+                else:
+                    redact_next = True
+        result.append(token)
+    return result
+
+def get_options_dict(options):
+    """ Convert the optparse Values object to the dict commands expect
+    """
+    return dict(vars(options))
 
 def cmd_main(cmd, argv):
     script_info = cmd.getScriptInfo()
     
-    option_parser, options, arguments =\
-       parse_command_line_parameters(**script_info)
+    profiler = PhaseProfiler()
+    with profiler.phase('parse_options'):
+        option_parser, options, arguments =\
+           parse_command_line_parameters(**script_info)
     
     try:
-        cmd(options = eval(str(options)), 
+        cmd(options = get_options_dict(options), 
             arguments = arguments,
-            argv = argv)
+            argv = argv,
+            profiler = profiler)
     except QiimeCommandError, e:
         option_parser.error(e)
 
 class QiimeCommandError(IOError):
     pass
 
+# The options a command class accepts, built once per class by
+# QiimeCommand.getOptionSchema. optional_options includes the standard
+# options that every command accepts.
+OptionSchema = namedtuple('OptionSchema',
+                          ['required_options', 'optional_options', 'dests'])
+
+_option_schemas = {}
+
 class QiimeCommand(object):
     """ Base class for abstracted QIIME command
     """
@@ -47,8 +124,33 @@ class QiimeCommand(object):
     _standard_options = [
         make_option('--master_script_log_dir',type='existing_dirpath',
         help='directory where master script log will be stored [default: %default]',
-        default='./')]
+        default='./'),
+        make_option('--hash_inputs_in_background',action='store_true',
+        help='compute the input file md5s for the master script log while '
+        'the command runs, rather than before it starts [default: %default]',
+        default=False),
+        make_option('--buffer_master_script_log',action='store_true',
+        help='write the master script log on a background thread, so slow '
+        'log file systems don\'t hold up the command [default: %default]',
+        default=False),
+        make_option('--profile_mode',type='choice',choices=profile_modes,
+        help='record the wall time, cpu time and peak memory use of each '
+        'phase of the command as JSON next to the master script log '
+        '("phases"), and additionally capture a cProfile of the command '
+        '("cprofile"). Valid choices are: %s [default: %%default]' %
+        ', '.join(profile_modes),
+        default='none')]
     _input_file_parameter_ids = []
+    # md5s of input files are cached here, keyed on each file's device, 
+    # inode, size and modification time. Set to None to disable caching.
+    _digest_cache_fp = default_digest_cache_fp
+    # a record of each run (options, inputs, timings and exit status) is
+    # added to this database (the default can be changed in the qiime 
+    # config: see get_run_history_fp). Set to None to disable recording.
+    _run_history_fp = default_run_history_fp
+    # options whose values are redacted from the command line in the master
+    # script log, profiles and the run history
+    _secret_options = []
     
     _brief_description = """ """
     _script_description = """ """
@@ -58,71 +160,410 @@ class QiimeCommand(object):
     _required_options = []
     _optional_options = []
     _version = __version__
+    _profiler = None
     
-    def __init__(self):
-        """
+    def __call__(self,options,arguments,argv,logger=None,profiler=None):
         """
-        self._optional_options.extend(self._standard_options)
-    
-    def __call__(self,options,arguments,argv,logger=None):
         """
+        if profiler is None:
+            profiler = PhaseProfiler()
+        self._profiler = profiler
+        self._log_fp = None
+        self._cprofile = None
+        self._input_md5s = None
+        succeeded = False
+        start_time = time()
+        exit_status = 1
+        error = None
+        try:
+            with self.phase('start_logging'):
+                close_logger_on_success = \
+                 self._start_logging(options,arguments,argv,logger)
+            try:
+                with self.phase('run_command'):
+                    self._profile_run_command(options,arguments)
+            except:
+                # the input md5s should be logged even if the command fails
+                self._write_background_input_md5s()
+                self._flush_logger()
+                raise
+            with self.phase('stop_logging'):
+                self._stop_logging(options,arguments,argv,close_logger_on_success)
+            succeeded = True
+            exit_status = 0
+        except SystemExit, e:
+            # as for the interpreter, None is success and other non-int
+            # codes are failures
+            if e.code is None:
+                exit_status = 0
+            elif isinstance(e.code, int):
+                exit_status = e.code
+            else:
+                exit_status = 1
+            if exit_status != 0:
+                error = 'SystemExit: %s' % e.code
+            raise
+        except BaseException, e:
+            error = '%s: %s' % (e.__class__.__name__, e)
+            raise
+        finally:
+            self._profiler = None
+            if options.get('profile_mode', 'none') != 'none':
+                self._write_profile(profiler, options, argv, succeeded)
+            if self._run_history_fp:
+                self._record_run(profiler, options, argv, start_time,
+                                 exit_status, error)
+
+    def phase(self, name):
+        """ Return a context manager that times a phase of the command
+        
+            Subclasses can use this in run_command to record their own
+             sub-phases, e.g.:
+             
+                with self.phase('parse_taxonomy'):
+                    ...
         """
-        close_logger_on_success = self._start_logging(options,arguments,argv,logger)
-        self.run_command(options,arguments)
-        self._stop_logging(options,arguments,argv,close_logger_on_success)
+        if self._profiler is None:
+            return null_phase()
+        return self._profiler.phase(name)
+
+    def _profile_run_command(self, options, arguments):
+        if options.get('profile_mode') == 'cprofile':
+            from cProfile import Profile
+            self._cprofile = Profile()
+            self._cprofile.runcall(self.run_command,options,arguments)
+        else:
+            self.run_command(options,arguments)
+
+    def _write_profile(self, profiler, options, argv, succeeded):
+        from qiime.workflow import generate_log_fp
+        from qiime.util import get_qiime_library_version
+        if self._log_fp:
+            base_fp = '%s_profile' % splitext(self._log_fp)[0]
+        else:
+            # there's no log file of our own to write next to (e.g., in a 
+            # batch run), so use a timestamp precise enough to be unique
+            base_fp = splitext(generate_log_fp(
+             options['master_script_log_dir'],
+             basefile_name='%s_profile' % self.__class__.__name__,
+             timestamp_pattern='%Y%m%d%H%M%S%f'))[0]
+        if self._cprofile is not None:
+            cprofile_fp = '%s.prof' % base_fp
+            self._cprofile.dump_stats(cprofile_fp)
+        else:
+            cprofile_fp = None
+        profiler.writeJson('%s.json' % base_fp,
+                           command=self.__class__.__name__,
+                           command_line=' '.join(self._get_logged_argv(argv)),
+                           version=self._version,
+                           qiime_version=get_qiime_library_version(),
+                           profile_mode=options['profile_mode'],
+                           succeeded=succeeded,
+                           cprofile_fp=cprofile_fp)
+
+    def _record_run(self, profiler, options, argv, start_time, exit_status,
+                    error):
+        from cmd_abstraction.run_history import record_run
+        run_history_fp = get_run_history_fp(self._run_history_fp)
+        background_input_md5s = getattr(self, '_background_input_md5s', None)
+        if background_input_md5s is not None and \
+           background_input_md5s.md5s is not None:
+            input_md5s = zip(background_input_md5s.fps,
+                             background_input_md5s.md5s)
+        else:
+            input_md5s = self._input_md5s
+        try:
+            record_run(run_history_fp,
+                       self.__class__.__name__,
+                       self._version,
+                       options,
+                       self._get_logged_argv(argv),
+                       start_time,
+                       time(),
+                       exit_status,
+                       error=error,
+                       input_md5s=input_md5s,
+                       phases=profiler.getPhases())
+        except Exception, e:
+            # the run history is a convenience, so failing to record a run
+            # shouldn't fail (or hide the outcome of) the command
+            sys.stderr.write("Couldn't record run in %s: %s\n" %
+                             (run_history_fp, e))
 
     def _start_logging(self,
                        params,
                        args,
                        argv,
                        logger):
-        if logger == None:
-            self.logger = WorkflowLogger(generate_log_fp(params['master_script_log_dir']),
-                                    params={},
-                                    qiime_config=qiime_config)
-            close_logger_on_success = True
-        else:
-            self.logger = logger
-            close_logger_on_success = False
+        from qiime.workflow import (WorkflowLogger,
+                                    generate_log_fp)
+        with self.phase('setup_logger'):
+            if logger == None:
+                if params.get('buffer_master_script_log'):
+                    from cmd_abstraction.buffered_logger import \
+                     BufferedWorkflowLogger as WorkflowLogger
+                self._log_fp = generate_log_fp(params['master_script_log_dir'])
+                self.logger = WorkflowLogger(self._log_fp,
+                                        params={},
+                                        qiime_config=get_qiime_config())
+                close_logger_on_success = True
+            else:
+                self.logger = logger
+                close_logger_on_success = False
+            
+            self.logger.write('Command:\n')
+            self.logger.write(' '.join(self._get_logged_argv(argv)))
+            self.logger.write('\n\n')
         
-        self.logger.write('Command:\n')
-        self.logger.write(' '.join(argv))
-        self.logger.write('\n\n')
-    
-        log_input_md5s(self.logger,
-                       [params[p] for p in self._input_file_parameter_ids])
+        with self.phase('log_input_md5s'):
+            input_fps = self._get_input_fps(params)
+            if self._digest_cache_fp:
+                digest_cache = DigestCache(self._digest_cache_fp)
+            else:
+                digest_cache = None
+            if params.get('hash_inputs_in_background'):
+                self._background_input_md5s = \
+                 BackgroundInputMd5s(input_fps, digest_cache)
+                self._background_input_md5s.start()
+                # the command's log lines are held until the md5s are
+                # written, so the log reads as it does without
+                # hash_inputs_in_background
+                self.logger = HeldInputMd5sLogger(self.logger,
+                                             self._background_input_md5s)
+            else:
+                self._background_input_md5s = None
+                self._input_md5s = \
+                 log_input_md5s(self.logger, input_fps, digest_cache)
         
         return close_logger_on_success
 
+    def _get_logged_argv(self, argv):
+        return redact_argv(argv, self._secret_options)
+
+    def _get_input_fps(self, params):
+        """ Return the input filepaths whose md5s should be logged
+        
+            Parameters that can be passed more than once (i.e., list values)
+             contribute each of their filepaths, and unset parameters are
+             skipped.
+        """
+        result = []
+        for p in self._input_file_parameter_ids:
+            value = params.get(p)
+            if value is None:
+                continue
+            elif isinstance(value, list):
+                result.extend(value)
+            else:
+                result.append(value)
+        return result
+
+    def _write_background_input_md5s(self):
+        if getattr(self, '_background_input_md5s', None) is not None:
+            self.logger.release()
+
+    def _flush_logger(self):
+        # buffered loggers are flushed so the log is complete even if the
+        # process is about to exit. This is called while handling the
+        # command's exception, which is more useful than a log write error.
+        flush = getattr(getattr(self, 'logger', None), 'flush', None)
+        if flush is not None:
+            try:
+                flush()
+            except Exception:
+                pass
+
     def _stop_logging(self,
                       params,
                       args,
                       argv,
                       close_logger_on_success):
+        self._write_background_input_md5s()
         if close_logger_on_success:
             self.logger.close()
 
+    @classmethod
+    def getOptionSchema(cls):
+        """ Return the (cached) OptionSchema for this command class
+        """
+        try:
+            return _option_schemas[cls]
+        except KeyError:
+            required_options = tuple(cls._required_options)
+            optional_options = tuple(cls._optional_options) + \
+                               tuple(cls._standard_options)
+            dests = frozenset([o.dest for o in
+                               required_options + optional_options])
+            schema = OptionSchema(required_options, optional_options, dests)
+            _option_schemas[cls] = schema
+            return schema
+
     def getScriptInfo(self):
+        schema = self.getOptionSchema()
         result = {}
         result['brief_description'] = self._brief_description
         result['script_description'] = self._script_description
         result['script_usage'] = self._script_usage
         result['script_usage_output_to_remove'] = self._script_usage_output_to_remove
         result['output_description'] = self._output_description
-        result['required_options'] = self._required_options
-        result['optional_options'] = self._optional_options
+        # parse_command_line_parameters gets its own copies of the option 
+        # lists, so nothing it does can change the schema
+        result['required_options'] = list(schema.required_options)
+        result['optional_options'] = list(schema.optional_options)
         result['version'] = self._version
         return result
     
     def run_command(self,params,args):
         raise NotImplementedError, "All subclasses must implement run_command."
 
+# the backends which WorkflowCommands can run their steps on (see
+# cmd_abstraction.executors, which is only imported to run steps)
+executor_names = ['local_pool', 'queue_workers']
+
+# the queue_workers key is read from this environment variable if it isn't
+# read from a file, so that it isn't visible (e.g., in ps) to other users
+executor_authkey_env_var = 'QIIME_EXECUTOR_AUTHKEY'
+
+def read_executor_authkey(authkey_fp=None):
+    """ Return the queue_workers key in authkey_fp, or in the environment
+
+        A trailing newline in authkey_fp is ignored. Returns None if 
+         authkey_fp isn't provided and executor_authkey_env_var isn't set.
+    """
+    if authkey_fp:
+        authkey_f = open(authkey_fp, 'U')
+        authkey = authkey_f.read().rstrip('\n')
+        authkey_f.close()
+        if not authkey:
+            raise ValueError, "%s is empty." % authkey_fp
+        return authkey
+    return environ.get(executor_authkey_env_var) or None
+
 class WorkflowCommand(QiimeCommand):
+    
+    _secret_options = QiimeCommand._secret_options + ['--executor_authkey']
+    _standard_options = QiimeCommand._standard_options + [
+        make_option('--executor',type='choice',choices=executor_names,
+        help='where to run the workflow\'s steps: on a pool of local '
+        'processes ("local_pool"), or on workers which take steps from a '
+        'queue served over TCP ("queue_workers"). jobs_to_start is the '
+        'pool size, or the number of local workers to start. Valid choices '
+        'are: %s [default: %%default]' % ', '.join(executor_names),
+        default='local_pool'),
+        make_option('--executor_address',type='string',
+        help='host:port to serve the queue_workers step queue on, for '
+        'workers on other hosts (started with start_qiime_step_worker.py) '
+        'to connect to [default: a free port, local connections only]'),
+        make_option('--executor_authkey_fp',type='existing_filepath',
+        help='file containing the key that queue_workers workers must '
+        'present to connect. A key is required with --executor_address, '
+        'and is read from the %s environment variable if this isn\'t '
+        'provided [default: a random key]' % executor_authkey_env_var),
+        make_option('--executor_authkey',type='string',
+        help='deprecated: the key is visible to other users of the host. '
+        'Use --executor_authkey_fp or %s instead' % executor_authkey_env_var),
+        make_option('--remote_workers_only',action='store_true',
+        help='don\'t start local queue_workers workers: steps wait for '
+        'workers on other hosts [default: %default]',
+        default=False),
+        make_option('--step_retries',type='int',
+        help='number of times to retry a failed step before giving up. '
+        'Steps fail if they exit with a non-zero status, or if the '
+        'queue_workers worker running them stops responding '
+        '[default: %default]',
+        default=0),
+        make_option('--max_cores',type='int',
+        help='number of cores that concurrent steps may use between them '
+        '[default: the number of cores on this host]'),
+        make_option('--max_memory_mb',type='int',
+        help='memory (in MB) that concurrent steps may use between them '
+        '[default: the available memory on this host]'),
+        make_option('--step_requirements_fp',type='existing_filepath',
+        help='tab-separated script names, cores and memory (MB) that '
+        'override the default requirements of the workflow\'s steps '
+        '[default: built-in requirements]')]
 
     def _validate_jobs_to_start(self,
                                 jobs_to_start,
                                 default_jobs_to_start,
                                 parallel):
+        if int(jobs_to_start) < 1:
+            raise QiimeCommandError, "jobs_to_start must be at least 1."
         if (int(jobs_to_start) != int(default_jobs_to_start)) and not parallel:
-            raise QiimeCommandError, "Modifying jobs_to_start requires that parallel is True."
+            raise QiimeCommandError, "Modifying jobs_to_start requires that parallel (or concurrent steps) is True."
         return str(jobs_to_start)
+
+    def _get_executor_factory(self, options):
+        """ Return a function which creates the executor selected in options
+        
+            The function takes jobs_to_start, so the command handler can 
+             create the executor when (and only if) it runs steps.
+        """
+        executor_name = options.get('executor', 'local_pool')
+        if executor_name == 'local_pool':
+            if options.get('executor_address') or \
+               options.get('remote_workers_only'):
+                raise QiimeCommandError, "--executor_address and "+\
+                 "--remote_workers_only can only be used with the "+\
+                 "queue_workers executor."
+            kwargs = {}
+        else:
+            if options.get('executor_authkey_fp') and \
+               options.get('executor_authkey'):
+                raise QiimeCommandError, "Only one of --executor_authkey_fp "+\
+                 "and --executor_authkey can be provided."
+            elif options.get('executor_authkey'):
+                sys.stderr.write("Warning: --executor_authkey is visible to "
+                 "other users of this host. Use --executor_authkey_fp or "
+                 "%s instead.\n" % executor_authkey_env_var)
+                authkey = options['executor_authkey']
+            else:
+                try:
+                    authkey = read_executor_authkey(
+                               options.get('executor_authkey_fp'))
+                except (IOError, ValueError), e:
+                    raise QiimeCommandError, \
+                     "Couldn't read --executor_authkey_fp: %s" % e
+            kwargs = {'authkey': authkey,
+                      'start_local_workers':
+                       not options.get('remote_workers_only')}
+            if options.get('executor_address'):
+                if not authkey:
+                    raise QiimeCommandError, "A key must be provided "+\
+                     "with --executor_address, in --executor_authkey_fp "+\
+                     "or %s." % executor_authkey_env_var
+                from cmd_abstraction.executors import parse_address
+                try:
+                    kwargs['address'] = \
+                     parse_address(options['executor_address'])
+                except ValueError:
+                    raise QiimeCommandError, "--executor_address must be "+\
+                     "host:port, not %s." % options['executor_address']
+            elif options.get('remote_workers_only'):
+                raise QiimeCommandError, "--remote_workers_only requires "+\
+                 "--executor_address, so that workers can connect."
+        def executor_factory(jobs_to_start):
+            from cmd_abstraction.executors import get_executor
+            return get_executor(executor_name, jobs_to_start, **kwargs)
+        return executor_factory
+
+    def _get_scheduler(self, options):
+        """ Return a ResourceScheduler for the budget selected in options
+        """
+        from cmd_abstraction.scheduler import (ResourceScheduler,
+                                               parse_step_requirements)
+        step_requirements = None
+        if options.get('step_requirements_fp'):
+            try:
+                step_requirements = parse_step_requirements(
+                 open(options['step_requirements_fp'],'U'))
+            except ValueError, e:
+                raise QiimeCommandError, str(e)
+        for option_name in ['max_cores', 'max_memory_mb']:
+            if options.get(option_name) is not None and \
+               options[option_name] < 1:
+                raise QiimeCommandError, "--%s must be at least 1." % \
+                 option_name
+        return ResourceScheduler(options.get('max_cores'),
+                                 options.get('max_memory_mb'),
+                                 step_requirements)
@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+# Applies the fixers in this package to many files at once. All fixers are
+# loaded into one RefactoringTool per process (so the grammar and fixer
+# patterns are set up once), which applies them all in a single walk of
+# each file's tree.
+
+import sys
+from hashlib import md5
+from json import dump, load
+from multiprocessing import Pool
+from os import rename, makedirs
+from os.path import exists, splitext, join, expanduser, dirname
+from time import time
+from traceback import format_exception_only
+from lib2to3.refactor import RefactoringTool
+
+all_fixer_names = ['fixers.fix_options_object',
+                   'fixers.fix_replace_opts',
+                   'fixers.fix_replace_args',
+                   'fixers.fix_option_error']
+
+default_fixer_cache_fp = join(expanduser('~'), '.cmd_abstraction',
+                              'fixer_cache.json')
+
+def get_fixers_md5(fixer_names):
+    """ Return an md5 of the fixer names and sources
+
+        Cached results are keyed on this, so they're discarded when any
+         fixer changes.
+    """
+    result = md5()
+    for fixer_name in fixer_names:
+        __import__(fixer_name)
+        module_fp = sys.modules[fixer_name].__file__
+        result.update(fixer_name)
+        result.update(open(splitext(module_fp)[0] + '.py','U').read())
+    return result.hexdigest()
+
+# one RefactoringTool per process, with counters of how many times each of
+# its fixers has transformed a node
+_tool = None
+_tool_fixer_names = None
+_transform_counts = None
+
+def _count_transforms(fixer):
+    transform = fixer.transform
+    name = fixer.__class__.__name__
+    def counted_transform(node, results):
+        _transform_counts[name] = _transform_counts.get(name, 0) + 1
+        return transform(node, results)
+    fixer.transform = counted_transform
+
+def get_refactoring_tool(fixer_names):
+    global _tool, _tool_fixer_names, _transform_counts
+    if _tool is None or _tool_fixer_names != fixer_names:
+        _tool = RefactoringTool(fixer_names)
+        _tool_fixer_names = list(fixer_names)
+        _transform_counts = {}
+        for fixer in _tool.pre_order + _tool.post_order:
+            _count_transforms(fixer)
+    return _tool
+
+def refactor_source(source, name, fixer_names=all_fixer_names):
+    """ Return (refactored source, {fixer class name: transforms})
+    """
+    global _transform_counts
+    tool = get_refactoring_tool(fixer_names)
+    _transform_counts = {}
+    # lib2to3 requires a trailing newline
+    add_newline = not source.endswith('\n')
+    if add_newline:
+        source += '\n'
+    result = str(tool.refactor_string(source, name))
+    if add_newline:
+        result = result[:-1]
+    return result, _transform_counts
+
+def _refactor_file(item):
+    """ Return (refactored source, counts, seconds, error)
+    """
+    fp, source, fixer_names = item
+    start = time()
+    try:
+        refactored, counts = refactor_source(source, fp, fixer_names)
+    except Exception, e:
+        return (None, {}, time() - start,
+                ''.join(format_exception_only(type(e), e)).strip())
+    return refactored, counts, time() - start, None
+
+class FixerCache(object):
+    """ Refactored sources, keyed on the md5 of the source
+
+        The cache is only valid for one set of fixers (identified by
+         fixers_md5), and is emptied if loaded with a different set.
+    """
+
+    def __init__(self, cache_fp, fixers_md5):
+        self._cache_fp = cache_fp
+        self._fixers_md5 = fixers_md5
+        self._entries = {}
+        if cache_fp and exists(cache_fp):
+            cache = load(open(cache_fp,'U'))
+            if cache.get('fixers_md5') == fixers_md5:
+                self._entries = cache['entries']
+
+    def get(self, source_md5):
+        """ Return (refactored source, counts), or None if not cached
+        """
+        entry = self._entries.get(source_md5)
+        if entry is None:
+            return None
+        # json gives back unicode, but sources are handled as utf-8 bytes
+        return entry['refactored'].encode('utf-8'), entry['counts']
+
+    def set(self, source_md5, refactored, counts):
+        self._entries[source_md5] = {'refactored': refactored,
+                                     'counts': counts}
+
+    def save(self):
+        if not self._cache_fp:
+            return
+        cache_dir = dirname(self._cache_fp)
+        if cache_dir and not exists(cache_dir):
+            makedirs(cache_dir)
+        tmp_fp = '%s.tmp' % self._cache_fp
+        cache_f = open(tmp_fp,'w')
+        dump({'fixers_md5': self._fixers_md5, 'entries': self._entries},
+             cache_f)
+        cache_f.close()
+        rename(tmp_fp, self._cache_fp)
+
+def run_fixers(fps, fixer_names=all_fixer_names, jobs_to_start=1, cache=None):
+    """ Apply the fixers to each file, returning a list of results
+
+        Each result is (fp, original source, refactored source, counts,
+         status, seconds, error), where status is 'changed', 'unchanged',
+         'cached' (i.e., the result came from cache) or 'failed'. Files
+         are read but never written here. Results are in the order of fps.
+    """
+    results = {}
+    to_refactor = []
+    for fp in fps:
+        try:
+            source = open(fp,'U').read()
+        except IOError, e:
+            results[fp] = (fp, None, None, {}, 'failed', 0.0, str(e))
+            continue
+        cached = cache.get(md5(source).hexdigest()) if cache is not None \
+                 else None
+        if cached is not None:
+            refactored, counts = cached
+            results[fp] = (fp, source, refactored, counts, 'cached', 0.0, None)
+        else:
+            to_refactor.append((fp, source))
+
+    items = [(fp, source, list(fixer_names)) for fp, source in to_refactor]
+    if jobs_to_start > 1 and len(items) > 1:
+        pool = Pool(min(jobs_to_start, len(items)))
+        try:
+            refactored_files = pool.map(_refactor_file, items)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        refactored_files = map(_refactor_file, items)
+
+    for (fp, source), (refactored, counts, seconds, error) \
+     in zip(to_refactor, refactored_files):
+        if error:
+            results[fp] = (fp, source, None, {}, 'failed', seconds, error)
+            continue
+        if cache is not None:
+            cache.set(md5(source).hexdigest(), refactored, counts)
+        status = 'changed' if refactored != source else 'unchanged'
+        results[fp] = (fp, source, refactored, counts, status, seconds, None)
+    return [results[fp] for fp in fps]
+
+def format_fixer_summary(results, fixer_names=all_fixer_names):
+    lines = ['#file\tstatus\tseconds\ttransforms\terror']
+    fixer_totals = {}
+    status_counts = {}
+    for fp, source, refactored, counts, status, seconds, error in results:
+        lines.append('%s\t%s\t%1.3f\t%d\t%s' % (fp,
+                                              status,
+                                              seconds,
+                                              sum(counts.values()),
+                                              (error or '').replace('\n',' ')))
+        status_counts[status] = status_counts.get(status, 0) + 1
+        for name, count in counts.items():
+            fixer_totals[name] = fixer_totals.get(name, 0) + count
+    for fixer_name in fixer_names:
+        class_name = get_fixer_class_name(fixer_name)
+        lines.append('# %s: %d transforms' %
+                     (class_name, fixer_totals.get(class_name, 0)))
+    lines.append('# %d changed, %d unchanged, %d cached, %d failed' %
+                 tuple([status_counts.get(s, 0) for s in
+                        ['changed', 'unchanged', 'cached', 'failed']]))
+    return '\n'.join(lines)
+
+def get_fixer_class_name(fixer_name):
+    """ fixers.fix_option_error -> FixOptionError, as lib2to3 does
+    """
+    fix_name = fixer_name.rsplit('.', 1)[-1]
+    return ''.join([p.title() for p in fix_name.split('_')])
@@ -12,23 +12,30 @@ __email__ = "gregcaporaso@gmail.com"
 __status__ = "Development"
 
 from lib2to3.fixer_base import BaseFix
-from lib2to3.pgen2 import token
-from lib2to3.fixer_util import Leaf, Node, Subscript, syms, String
+from lib2to3.fixer_util import Name
+from lib2to3.pytree import Node
+from lib2to3.pygram import python_symbols as syms
 
 class FixOptionError(BaseFix):
+    """ option_parser.error(msg) -> raise QiimeCommandError(msg)
+    
+        Only calls which are statements of their own are rewritten, as a
+         raise can't appear inside an expression. cmd_main reports 
+         QiimeCommandErrors through the option parser, so the user sees the
+         same message.
+    """
     
-    #_accept_type = token.TRAILER
     PATTERN = """
-    power< 'option_parser' trailer< '.' 'error' > trailer< '(' term< '"Can\'t open parameters file (%s). Does it exist? Do you have read access?"' '%' power< 'opts' trailer< '.' 'parameter_fp' > > > ')' > >
+    simple_stmt< call=power< 'option_parser' trailer< '.' 'error' >
+                             arguments=trailer< '(' [any] ')' > > any* >
     """
 
-    def match(self, node):
-        print node
-        # if node.value == '.error':
-        #         return True
-        #     return False
-        # 
     def transform(self, node, results):
-        print node
-        node.value = 'QiimeCommandError'
-        node.changed()
+        call = results['call']
+        exception = Node(syms.power,
+                         [Name('QiimeCommandError', prefix=' '),
+                          results['arguments'].clone()])
+        raise_stmt = Node(syms.raise_stmt,
+                          [Name('raise'), exception],
+                          prefix=call.prefix)
+        call.replace(raise_stmt)
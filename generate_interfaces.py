@@ -12,31 +12,53 @@ __email__ = "gregcaporaso@gmail.com"
 __status__ = "Development"
 
 import inspect
-import re
-from os.path import join
-from site import addsitedir
+import ast
+import sys
+from json import dump, load
+from glob import glob
+from hashlib import md5
+from multiprocessing import Pool
+from os import rename
+from os.path import join, exists, basename, splitext, abspath, dirname
+from time import time
+from traceback import format_exception_only
 from qiime.util import parse_command_line_parameters, make_option, create_dir
+from cmd_abstraction import source_transform
+from cmd_abstraction.source_transform import transform_script
+from cmd_abstraction.command_index import index_filename, update_command_index
 
 script_info = {}
 script_info['brief_description'] = ""
 script_info['script_description'] = ""
-script_info['script_usage'] = [("","Autogenerate code for add_taxa.py and pick_otus_through_otu_table.py. After running this, add your top-level cmd-abstraction directory to $PYTHONPATH and call script_usage_tests.py on  ","%prog -i Qiime/scripts/ -s add_taxa,pick_otus_through_otu_table -o cmd-abstraction/autogenerated_scripts/ -f cmd-abstraction/cmd_abstraction/autogenerated_interfaces.py")]
-script_info['output_description']= ""
+script_info['script_usage'] = [("","Autogenerate code for add_taxa.py and pick_otus_through_otu_table.py. After running this, add your top-level cmd-abstraction directory to $PYTHONPATH and call script_usage_tests.py on  ","%prog -i Qiime/scripts/ -s add_taxa,pick_otus_through_otu_table -o cmd-abstraction/autogenerated_scripts/ -f cmd-abstraction/cmd_abstraction/autogenerated_interfaces/"),
+ ("","Autogenerate code for every script in Qiime/scripts/ using eight processes. Scripts which haven't changed since the last run are skipped.","%prog -i Qiime/scripts/ -o cmd-abstraction/autogenerated_scripts/ -f cmd-abstraction/cmd_abstraction/autogenerated_interfaces/ -O 8")]
+script_info['output_description']= "A wrapper script is written to -o and an interface module to -f for each script, along with the interfaces package's registry (__init__.py), the command index used to print help without importing the commands (%s), and the manifest used to skip unchanged scripts on the next run. A report of each script's status and generation time is written to stdout. Scripts whose interfaces were written but couldn't be imported to add them to the command index are reported as unindexed: they work as usual, but their help isn't served from the index." % index_filename
 script_info['required_options'] = [
  make_option('-i','--input_dir',type="existing_dirpath",help='the input script directory'),
- make_option('-s','--script_names',type="string",help='the script names'),
  make_option('-o','--output_dir',type="new_dirpath",help='the output script directory'),
- make_option('-f','--output_fp',type="new_filepath",help='the output interfaces file'),
+ make_option('-f','--output_package_dir',type="new_dirpath",help='the output interfaces package directory'),
 ]
 script_info['optional_options'] = [
+ make_option('-s','--script_names',type="string",
+             help='the script names [default: all scripts in input_dir]'),
+ make_option('-O','--jobs_to_start',type="int",default=1,
+             help='number of processes to generate interfaces with [default: %default]'),
+ make_option('-m','--manifest_fp',type="new_filepath",
+             help='the manifest of source hashes of generated scripts [default: '
+             'output_package_dir/%s]' % 'generation_manifest.json'),
+ make_option('--force',action='store_true',default=False,
+             help='regenerate all scripts, even if they are unchanged since '
+             'the last run [default: %default]'),
 ]
 script_info['version'] = __version__
 
-_interfaces_header_block = """
-#!/usr/bin/env python
+_interfaces_header_block = """#!/usr/bin/env python
 from __future__ import division
 
-from cmd_abstraction.util import (QiimeCommand)
+from cmd_abstraction.util import (QiimeCommand,
+                                  QiimeCommandError,
+                                  get_qiime_config,
+                                  get_qiime_options_lookup)
 
 __author__ = "Greg Caporaso"
 __copyright__ = "Copyright 2011, The QIIME project"
@@ -51,6 +73,31 @@ __status__ = "Development"
 # credit on the interfaces files. the credit/maintainer on the 
 # script file stays the same. 
 
+# Each interface gets its own module, and the package __init__ is a
+# registry which only imports an interface module when its class is
+# requested.
+_registry_block = """#!/usr/bin/env python
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = %s
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+from cmd_abstraction.registry import CommandRegistry
+
+registry = CommandRegistry({
+%s
+}, package=__name__)
+
+def get_command_class(class_name):
+    return registry.getCommandClass(class_name)
+"""
+
 _script_header_block = """#!/usr/bin/env python
 from __future__ import division
 
@@ -63,11 +110,18 @@ __maintainer__ = "%s"
 __email__ = "%s"
 __status__ = "%s"
 
-from cmd_abstraction.util import cmd_main
-from cmd_abstraction.autogenerated_interfaces import %s
 from sys import argv
+from cmd_abstraction.command_index import serve_help
+
+if __name__ == "__main__":
+    # help is printed from the command index, when it's up to date,
+    # without importing the command (or qiime)
+    serve_help('%s', argv)
+
+from cmd_abstraction.util import cmd_main
+from cmd_abstraction.autogenerated_interfaces import get_command_class
 
-cmd = %s()
+cmd = get_command_class('%s')()
 # script info is locally accessible for backward 
 # compatibility
 script_info = cmd.getScriptInfo()
@@ -77,6 +131,26 @@ if __name__ == "__main__":
     cmd_main(cmd,argv)
 """
 
+# Commands which do more than the QIIME script they replace are written by
+# hand in cmd_abstraction.interfaces, and their interface modules just
+# import them, so regenerating doesn't discard them.
+_hand_written_interface_block = """#!/usr/bin/env python
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = %s
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+# %s is hand-written in cmd_abstraction.interfaces,
+# rather than generated from %s.py
+from cmd_abstraction.interfaces import %s
+"""
+
 _class_definition = """
 
 class %s(QiimeCommand):
@@ -87,87 +161,264 @@ class %s(QiimeCommand):
 def get_class_name(script_name):
     return script_name.replace('_',' ').title().replace(' ','')
 
-def format_new_script(script_name):
-    module = __import__(script_name,globals(),locals())
+_script_metadata_names = ['__author__', '__copyright__', '__credits__',
+                          '__license__', '__version__', '__maintainer__',
+                          '__email__', '__status__']
+
+def get_script_metadata(input_script_fp):
+    """ Return the __author__, etc. values assigned in a script
+    
+        The values are read from the script's source rather than by 
+         importing it, which would import all of the script's dependencies.
+    """
+    tree = ast.parse(open(input_script_fp,'U').read(), input_script_fp)
+    result = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign):
+            for target in node.targets:
+                if isinstance(target, ast.Name) and \
+                   target.id in _script_metadata_names:
+                    result[target.id] = ast.literal_eval(node.value)
+    missing = [n for n in _script_metadata_names if n not in result]
+    if missing:
+        raise ValueError, "%s doesn't define %s" % (input_script_fp,
+                                                    ', '.join(missing))
+    return result
+
+def format_new_script(script_name, input_script_fp):
+    metadata = get_script_metadata(input_script_fp)
     class_name = get_class_name(script_name)
-    result = _script_header_block % (module.__author__,
-                                      module.__copyright__.replace('2011','2012'),
-                                      module.__credits__,
-                                      module.__license__,
-                                      module.__version__,
-                                      module.__maintainer__,
-                                      module.__email__,
-                                      module.__status__,
+    result = _script_header_block % (metadata['__author__'],
+                                      metadata['__copyright__'].replace('2011','2012'),
+                                      metadata['__credits__'],
+                                      metadata['__license__'],
+                                      metadata['__version__'],
+                                      metadata['__maintainer__'],
+                                      metadata['__email__'],
+                                      metadata['__status__'],
                                       class_name,
                                       class_name)
     return result
 
-def ignore_line(line):
-    bad_prefixes = ['__author__', '__copyright__', '__credits__',
-                    '__license__', '__version__', '__maintainer__',
-                    '__email__', '__status__','#!/usr/bin/env',
-                    '# File created on','option_parser, opts, args',
-                    'from __future__ import division','script_info={}']
-    stripped_line = line.strip()
-    if stripped_line:
-        for p in bad_prefixes:
-            if stripped_line.startswith(p):
-                return True
-    return False
-
-def transform_line(line):
-    if line.strip() == 'def main():':
-        return 'def run_command(self,opts,args):\n'
-        
-    # replace of script_info['x'] with _x
-    m = re.match(r".*script_info\[\'(?P<si_entry>\w+)\'\]", line)
-    if m:
-        si_entry = m.groupdict()['si_entry']
-        line = line.replace('script_info["%s"]' % si_entry, "_%s" % si_entry)
-        line = line.replace("script_info['%s']" % si_entry, "_%s" % si_entry)
-        return line
-    
-    m = re.match(r".*opts\.(?P<param_id>\w+)", line)
-    if m:
-        param_id = m.groupdict()['param_id']
-        line = line.replace('opts.%s' % param_id, "opts['%s']" % param_id)
-        return line
-        
-    return line
+interfaces_fp = join(dirname(abspath(source_transform.__file__)),
+                     'interfaces.py')
+
+_hand_written_commands = None
+
+def get_hand_written_commands():
+    """ Return the names of the command classes in cmd_abstraction.interfaces
+
+        The names are read from the module's source rather than by 
+         importing it.
+    """
+    global _hand_written_commands
+    if _hand_written_commands is None:
+        tree = ast.parse(open(interfaces_fp,'U').read(), interfaces_fp)
+        _hand_written_commands = frozenset([node.name for node in tree.body
+                                       if isinstance(node, ast.ClassDef)])
+    return _hand_written_commands
 
 def format_interface(script_name, input_script_fp):
     class_name = get_class_name(script_name)
-    code_lines = []
-    for line in open(input_script_fp,'U'):
-        if 'if __name__ ==' in line:
-            break
-        elif ignore_line(line):
-            continue
-        else:
-            line = transform_line(line)
-            code_lines.append('    %s' % line)
-    
-    result = _class_definition % (class_name,script_name,''.join(code_lines))
-    return result
-            
+    if class_name in get_hand_written_commands():
+        return _hand_written_interface_block % (str(__credits__),
+                                                class_name,
+                                                script_name,
+                                                class_name)
+    module_source, class_body_source = \
+     transform_script(open(input_script_fp,'U').read())
+    return ''.join([_interfaces_header_block,
+                    module_source,
+                    _class_definition % (class_name,
+                                         script_name,
+                                         class_body_source)])
+
+def format_registry(script_names):
+    command_modules = []
+    for script_name in script_names:
+        command_modules.append(" '%s': '%s'," % (get_class_name(script_name),
+                                                 script_name))
+    return _registry_block % (str(__credits__), '\n'.join(command_modules))
+
+default_manifest_filename = 'generation_manifest.json'
+
+def get_generator_md5():
+    """ Return the md5 of the generator's source (this module's, and the
+         transform engine's)
+
+        This is stored in the manifest, so that everything is regenerated
+         when the generator changes. The hand-written interfaces module is
+         included, as adding or removing a command there changes what is
+         generated.
+    """
+    result = md5()
+    for module_fp in [__file__, source_transform.__file__, interfaces_fp]:
+        result.update(open(splitext(abspath(module_fp))[0] + '.py','U').read())
+    return result.hexdigest()
+
+def get_script_names(input_dir):
+    return sorted([splitext(basename(fp))[0]
+                   for fp in glob(join(input_dir, '*.py'))
+                   if basename(fp) != '__init__.py'])
+
+def load_manifest(manifest_fp, generator_md5):
+    """ Return {script name: source md5} from the last run
+
+        The manifest is ignored (i.e., {} is returned) if it was written by
+         a different version of the generator.
+    """
+    if not exists(manifest_fp):
+        return {}
+    manifest = load(open(manifest_fp,'U'))
+    if manifest.get('generator_md5') != generator_md5:
+        return {}
+    return manifest['source_md5s']
+
+def load_manifest_script_names(manifest_fp):
+    """ Return the names of the scripts in the manifest from the last run,
+         whichever version of the generator wrote it
+    """
+    if not exists(manifest_fp):
+        return []
+    return sorted(load(open(manifest_fp,'U'))['source_md5s'])
+
+def write_manifest(manifest_fp, generator_md5, source_md5s):
+    tmp_fp = '%s.tmp' % manifest_fp
+    manifest_f = open(tmp_fp,'w')
+    dump({'generator_md5': generator_md5, 'source_md5s': source_md5s},
+         manifest_f, indent=1, sort_keys=True)
+    manifest_f.write('\n')
+    manifest_f.close()
+    rename(tmp_fp, manifest_fp)
+
+def generate_script(item):
+    """ Return (script_name, wrapper, interface, seconds, error)
+
+        wrapper and interface are the generated sources (None on failure),
+         and error is a short description of the failure (None on
+         success). Nothing is written here, so this can run in a worker
+         process and the caller writes the output in a fixed order.
+    """
+    script_name, input_script_fp = item
+    start = time()
+    try:
+        wrapper = format_new_script(script_name, input_script_fp)
+        interface = format_interface(script_name, input_script_fp)
+    except Exception, e:
+        return (script_name, None, None, time() - start,
+                ''.join(format_exception_only(type(e), e)).strip())
+    return script_name, wrapper, interface, time() - start, None
+
+def format_generation_report(results):
+    lines = ['#script\tstatus\tseconds\terror']
+    for script_name, status, seconds, error in results:
+        lines.append('%s\t%s\t%1.3f\t%s' % (script_name,
+                                             status,
+                                             seconds,
+                                             (error or '').replace('\n',' ')))
+    counts = {}
+    for r in results:
+        counts[r[1]] = counts.get(r[1], 0) + 1
+    lines.append('# %d generated, %d unchanged, %d unindexed, %d failed' %
+                 (counts.get('generated', 0),
+                  counts.get('unchanged', 0),
+                  counts.get('unindexed', 0),
+                  counts.get('failed', 0)))
+    return '\n'.join(lines)
+
 def main():
     option_parser, opts, args =\
        parse_command_line_parameters(**script_info)
-    script_names = opts.script_names.split(',')
-    addsitedir(opts.input_dir)
+    if opts.script_names:
+        script_names = opts.script_names.split(',')
+    else:
+        script_names = get_script_names(opts.input_dir)
+    manifest_fp = opts.manifest_fp or \
+                  join(opts.output_package_dir, default_manifest_filename)
     create_dir(opts.output_dir)
-    interfaces_f = open(opts.output_fp,'w')
-    interfaces_f.write(_interfaces_header_block)
+    create_dir(opts.output_package_dir)
+    
+    generator_md5 = get_generator_md5()
+    manifest_source_md5s = load_manifest(manifest_fp, generator_md5)
+    if opts.force:
+        last_source_md5s = {}
+    else:
+        last_source_md5s = manifest_source_md5s
+    
+    source_md5s = {}
+    if opts.script_names:
+        # the scripts generated by earlier runs stay in the registry and
+        # manifest. Those from a different version of the generator are
+        # recorded without a source md5, so the next run regenerates them.
+        for script_name in load_manifest_script_names(manifest_fp):
+            if script_name not in script_names:
+                source_md5s[script_name] = \
+                 manifest_source_md5s.get(script_name)
+    
+    to_generate = []
+    results = {}
     for script_name in script_names:
-        output_script_fp = join(opts.output_dir,'%s.py' % script_name)
-        output_script_f = open(output_script_fp,'w')
-        output_script_f.write(format_new_script(script_name))
+        input_script_fp = join(opts.input_dir,'%s.py' % script_name)
+        try:
+            source_md5s[script_name] = \
+             md5(open(input_script_fp,'U').read()).hexdigest()
+        except IOError, e:
+            results[script_name] = (script_name, 'failed', 0.0, str(e))
+            continue
+        if last_source_md5s.get(script_name) == source_md5s[script_name] and \
+           exists(join(opts.output_dir,'%s.py' % script_name)) and \
+           exists(join(opts.output_package_dir,'%s.py' % script_name)):
+            results[script_name] = (script_name, 'unchanged', 0.0, None)
+        else:
+            to_generate.append((script_name, input_script_fp))
+    
+    if opts.jobs_to_start > 1 and len(to_generate) > 1:
+        pool = Pool(min(opts.jobs_to_start, len(to_generate)))
+        try:
+            generated = pool.map(generate_script, to_generate)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        generated = map(generate_script, to_generate)
+    
+    # output is written here, in script name order, rather than by the 
+    # workers, so the output doesn't depend on which worker finishes first
+    for script_name, wrapper, interface, seconds, error in sorted(generated):
+        if error:
+            results[script_name] = (script_name, 'failed', seconds, error)
+            del source_md5s[script_name]
+            continue
+        output_script_f = open(join(opts.output_dir,'%s.py' % script_name),'w')
+        output_script_f.write(wrapper)
         output_script_f.close()
         
-        input_script_fp = join(opts.input_dir,'%s.py' % script_name)
-        interfaces_f.write(format_interface(script_name, input_script_fp))
-        interfaces_f.write('\n\n')
-    interfaces_f.close()
+        interface_f = open(join(opts.output_package_dir,'%s.py' % script_name),'w')
+        interface_f.write(interface)
+        interface_f.close()
+        results[script_name] = (script_name, 'generated', seconds, None)
+    
+    registry_f = open(join(opts.output_package_dir,'__init__.py'),'w')
+    registry_f.write(format_registry(sorted(source_md5s)))
+    registry_f.close()
+    write_manifest(manifest_fp, generator_md5, source_md5s)
+    command_modules = dict([(get_class_name(script_name), script_name)
+                            for script_name in source_md5s])
+    rebuilt, index_failures = update_command_index(
+     command_modules, opts.output_package_dir,
+     jobs_to_start=opts.jobs_to_start)
+    # interfaces which were written but couldn't be imported to index them
+    # (e.g., because an optional dependency isn't installed) still work, 
+    # but their help isn't served from the index
+    for class_name, error in index_failures:
+        script_name = command_modules[class_name]
+        seconds = results.get(script_name, (None, None, 0.0, None))[2]
+        results[script_name] = (script_name, 'unindexed', seconds, error)
+    
+    results = [results[script_name] for script_name in sorted(results)]
+    print format_generation_report(results)
+    if [r for r in results if r[1] == 'failed']:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
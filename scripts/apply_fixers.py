@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+import sys
+from glob import glob
+from os.path import join, isdir, basename
+from qiime.util import parse_command_line_parameters, make_option, create_dir
+from fixers.driver import (all_fixer_names,
+                           default_fixer_cache_fp,
+                           get_fixers_md5,
+                           FixerCache,
+                           run_fixers,
+                           format_fixer_summary)
+
+script_info = {}
+script_info['brief_description'] = "Apply the cmd_abstraction fixers to QIIME scripts"
+script_info['script_description'] = "Apply the lib2to3 fixers in the fixers package to many scripts at once. All fixers are applied in a single walk of each script's syntax tree, scripts are spread across a pool of processes, and results are cached on the md5 of each script's source, so unchanged scripts aren't reprocessed. Available fixers are: %s" % ', '.join(all_fixer_names)
+script_info['script_usage'] = [("","Apply all fixers to every script in Qiime/scripts/ using eight processes, writing the results to fixed_scripts/","%prog -i Qiime/scripts/ -o fixed_scripts/ -O 8"),
+ ("","Report what the FixOptionError fixer would change in add_taxa.py, without writing anything","%prog -i Qiime/scripts/add_taxa.py -f fixers.fix_option_error")]
+script_info['output_description']= "Refactored scripts are written to -o (or back to the input files, with -w). A summary of each script's status and of the number of transforms each fixer made is written to stdout."
+script_info['required_options'] = [
+ make_option('-i','--input_paths',type="string",
+             help='comma-separated scripts, or directories of scripts, to fix'),
+]
+script_info['optional_options'] = [
+ make_option('-o','--output_dir',type="new_dirpath",
+             help='directory to write the refactored scripts to [default: nothing is written]'),
+ make_option('-w','--write',action='store_true',default=False,
+             help='overwrite the input scripts with the refactored scripts [default: %default]'),
+ make_option('-f','--fixer_names',type="string",default=','.join(all_fixer_names),
+             help='comma-separated fixers to apply [default: %default]'),
+ make_option('-O','--jobs_to_start',type="int",default=1,
+             help='number of processes to apply fixers with [default: %default]'),
+ make_option('-c','--cache_fp',type="string",default=default_fixer_cache_fp,
+             help='path to the cache of refactored scripts [default: %default]'),
+ make_option('--disable_cache',action='store_true',default=False,
+             help='don\'t read or write the cache [default: %default]'),
+]
+script_info['version'] = __version__
+
+def main():
+    option_parser, opts, args =\
+       parse_command_line_parameters(**script_info)
+    if opts.write and opts.output_dir:
+        option_parser.error("-w and -o can't be used together.")
+    fixer_names = opts.fixer_names.split(',')
+    
+    fps = []
+    for input_path in opts.input_paths.split(','):
+        if isdir(input_path):
+            fps.extend(sorted(glob(join(input_path, '*.py'))))
+        else:
+            fps.append(input_path)
+    
+    if opts.disable_cache:
+        cache = None
+    else:
+        cache = FixerCache(opts.cache_fp, get_fixers_md5(fixer_names))
+    results = run_fixers(fps, fixer_names, opts.jobs_to_start, cache)
+    if cache:
+        cache.save()
+    
+    if opts.output_dir:
+        create_dir(opts.output_dir)
+    for fp, source, refactored, counts, status, seconds, error in results:
+        if refactored is None:
+            continue
+        if opts.output_dir:
+            output_fp = join(opts.output_dir, basename(fp))
+        elif opts.write and refactored != source:
+            output_fp = fp
+        else:
+            continue
+        output_f = open(output_fp,'w')
+        output_f.write(refactored)
+        output_f.close()
+    
+    print format_fixer_summary(results, fixer_names)
+    if [r for r in results if r[4] == 'failed']:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+from qiime.util import parse_command_line_parameters, make_option
+from qiime.workflow import WorkflowLogger, generate_log_fp
+from cmd_abstraction.util import get_qiime_config
+from cmd_abstraction.buffered_logger import BufferedWorkflowLogger
+from cmd_abstraction.registry import load_command_class
+from cmd_abstraction.batch import (parse_manifest,
+                                   run_batch,
+                                   format_batch_report)
+
+script_info = {}
+script_info['brief_description'] = "Run a QIIME command many times in one process"
+script_info['script_description'] = "Run a QIIME command once for each option set in a manifest file, sharing one interpreter (and optionally a pool of worker processes) and one master script log. All option sets are validated before any are run, and a failure of one item doesn't stop the batch."
+script_info['script_usage'] = [("","Run add_taxa.py for each option set in add_taxa.tsv, where the header line is -i, -o and -t option names (e.g., input_fp, output_fp and taxonomy_fp)","%prog -c add_taxa -m add_taxa.tsv -o batch_report.txt"),
+ ("","As above, but using four worker processes","%prog -c add_taxa -m add_taxa.tsv -o batch_report.txt -O 4")]
+script_info['output_description']= "A tab-separated report of each item's status, run time and error (if any) is written to -o, or to stdout if -o isn't provided. All items log to a single master script log."
+script_info['required_options'] = [
+ make_option('-c','--command_name',type="string",help='the command to run (e.g., add_taxa or AddTaxa)'),
+ make_option('-m','--manifest_fp',type="existing_filepath",help='the manifest: a JSON list of option sets or argument lists, or a tsv file with option names as the header'),
+]
+script_info['optional_options'] = [
+ make_option('-o','--output_fp',type="new_filepath",help='the report file [default: stdout]'),
+ make_option('-O','--jobs_to_start',type="int",default=1,
+             help='number of worker processes to run items on [default: %default]'),
+ make_option('--module_name',type="string",
+             default='cmd_abstraction.autogenerated_interfaces',
+             help='module to load the command from [default: %default]'),
+ make_option('--master_script_log_dir',type='existing_dirpath',default='./',
+             help='directory where the master script log will be stored [default: %default]'),
+ make_option('--buffer_master_script_log',action='store_true',default=False,
+             help='write the master script log on a background thread [default: %default]'),
+]
+script_info['version'] = __version__
+
+def main():
+    option_parser, opts, args =\
+       parse_command_line_parameters(**script_info)
+    try:
+        command_class = load_command_class(opts.command_name, opts.module_name)
+    except KeyError, e:
+        option_parser.error(str(e))
+    batch_argvs = parse_manifest(open(opts.manifest_fp,'U'))
+    
+    if opts.buffer_master_script_log:
+        logger_class = BufferedWorkflowLogger
+    else:
+        logger_class = WorkflowLogger
+    logger = logger_class(generate_log_fp(opts.master_script_log_dir),
+                          params={},
+                          qiime_config=get_qiime_config())
+    try:
+        results = run_batch(command_class(),
+                            batch_argvs,
+                            logger,
+                            script_name=opts.command_name,
+                            jobs_to_start=opts.jobs_to_start)
+    finally:
+        logger.close()
+    
+    report = format_batch_report(results)
+    if opts.output_fp:
+        output_f = open(opts.output_fp,'w')
+        output_f.write(report)
+        output_f.write('\n')
+        output_f.close()
+    else:
+        print report
+
+if __name__ == "__main__":
+    main()
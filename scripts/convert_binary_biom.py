@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+from qiime.util import parse_command_line_parameters, make_option
+from cmd_abstraction.binary_biom import convert_biom_table
+
+script_info = {}
+script_info['brief_description'] = "Convert biom tables to and from the binary biom format"
+script_info['script_description'] = "Convert a biom-format (JSON) table to the memory-mappable binary format of cmd_abstraction.binary_biom (as written by add_taxa.py --output_format binary), or a binary table to biom JSON. The input's format is detected from its contents, and by default the table is converted to the other format."
+script_info['script_usage'] = [
+ ("","Convert a binary table to biom JSON","%prog -i otu_table.bbiom -o otu_table.biom"),
+ ("","Convert a (possibly gzip compressed) biom table to the binary format","%prog -i otu_table.biom.gz -o otu_table.bbiom")]
+script_info['output_description']= "The converted table is written to -o."
+script_info['required_options'] = [
+ make_option('-i','--input_fp',type="existing_filepath",
+             help='the input table, in either format'),
+ make_option('-o','--output_fp',type="new_filepath",
+             help='the output table'),
+]
+script_info['optional_options'] = [
+ make_option('-t','--output_format',type="choice",choices=['json','binary'],
+             help='the format to write. Valid choices are: json, binary [default: the format the input isn\'t in]'),
+]
+script_info['version'] = __version__
+
+def main():
+    option_parser, opts, args =\
+       parse_command_line_parameters(**script_info)
+    output_f = open(opts.output_fp, 'wb')
+    try:
+        convert_biom_table(opts.input_fp, output_f, opts.output_format)
+    finally:
+        output_f.close()
+
+if __name__ == "__main__":
+    main()
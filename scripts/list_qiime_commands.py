@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+# This script is served from the command index, so (unlike the other
+# scripts) it uses optparse directly rather than qiime's
+# parse_command_line_parameters: qiime is only imported with --rebuild.
+
+import sys
+from optparse import OptionParser
+from os.path import dirname
+from cmd_abstraction.command_index import (default_index_fp,
+                                           load_command_index,
+                                           get_stale_commands,
+                                           update_command_index,
+                                           format_command_list,
+                                           format_help)
+from cmd_abstraction.autogenerated_interfaces import registry
+
+usage = """%prog [options]
+
+List the available commands (class name, script name and brief description)
+from the command index, without importing the commands or qiime.
+
+Example usage:
+ List the commands
+  %prog
+ Print the help for AddTaxa
+  %prog -c AddTaxa
+ Exit with status 1 if the index is missing or out of date
+  %prog --check
+ Rebuild the out of date entries in the index
+  %prog --rebuild"""
+
+def main():
+    option_parser = OptionParser(usage=usage, version='%prog ' + __version__)
+    option_parser.add_option('-c','--command',
+     help='print the help for this command (class name) [default: list all commands]')
+    option_parser.add_option('--check',action='store_true',default=False,
+     help='report commands which are missing from or out of date in the index [default: %default]')
+    option_parser.add_option('--rebuild',action='store_true',default=False,
+     help='rebuild the out of date entries in the index (this imports them) [default: %default]')
+    opts, args = option_parser.parse_args()
+
+    class_names = registry.getCommandNames()
+    if opts.rebuild:
+        rebuilt, failures = update_command_index(
+         dict([(c, registry.getModuleName(c).rsplit('.', 1)[-1])
+               for c in class_names]),
+         dirname(default_index_fp),
+         default_index_fp)
+        for class_name, error in failures:
+            print '%s\t%s' % (class_name, error.replace('\n', ' '))
+        print 'Rebuilt %d of %d commands in %s (%d failed)' % (
+         len(rebuilt) - len(failures), len(class_names), default_index_fp,
+         len(failures))
+        if failures:
+            sys.exit(1)
+        return
+
+    index = load_command_index(default_index_fp)
+    if index is None:
+        sys.stderr.write("No command index at %s. Build it with --rebuild.\n"
+                         % default_index_fp)
+        sys.exit(1)
+    if opts.check:
+        stale = get_stale_commands(index, class_names)
+        for class_name, reason in stale:
+            print '%s\t%s' % (class_name, reason)
+        print '# %d of %d commands are out of date' % (len(stale),
+                                                        len(class_names))
+        if stale:
+            sys.exit(1)
+    elif opts.command:
+        if opts.command not in index['commands']:
+            option_parser.error("Unknown command: %s" % opts.command)
+        sys.stdout.write(format_help(index['commands'][opts.command],
+          '%s.py' % index['commands'][opts.command]['module_filename'][:-3]))
+    else:
+        print format_command_list(index)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+from time import time
+from qiime.util import parse_command_line_parameters, make_option
+from cmd_abstraction.util import get_run_history_fp
+from cmd_abstraction.run_history import (connect_run_history,
+                                         get_run_trends,
+                                         format_run_trends,
+                                         period_lengths)
+
+script_info = {}
+script_info['brief_description'] = "Summarize the latency and throughput of recorded command runs"
+script_info['script_description'] = "Every command run is recorded in the run history database, along with its inputs and the time taken by each of its phases (and, for workflows, each of its steps). This script reports, for each command and period (e.g., day), the number of runs and failures, the median and maximum run time, and the throughput (MB of input per second) of the successful runs."
+script_info['script_usage'] = [
+ ("","Summarize all recorded runs by day","%prog"),
+ ("","Summarize the last 30 days of PickOtusThroughOtuTable runs by week","%prog -c PickOtusThroughOtuTable -s 30 -g week"),
+ ("","Summarize the time taken by the Pick OTUs step of workflow runs","%prog -c PickOtusThroughOtuTable -p 'step: Pick OTUs'")]
+script_info['output_description']= "A tab-separated table is written to stdout. Periods are in UTC."
+script_info['required_options'] = []
+script_info['optional_options'] = [
+ make_option('-d','--run_history_fp',type="existing_filepath",
+             help='the run history database [default: the qiime config\'s run_history_fp, or ~/.cmd_abstraction/run_history.sqlite]'),
+ make_option('-c','--command',type="string",
+             help='only summarize runs of this command (class name) [default: all commands]'),
+ make_option('-s','--since_days',type="float",
+             help='only summarize runs started in the last since_days days [default: all runs]'),
+ make_option('-g','--group_by',type="choice",choices=sorted(period_lengths),
+             default='day',
+             help='the period to summarize runs over. Valid choices are: %s [default: %%default]' % ', '.join(sorted(period_lengths))),
+ make_option('-p','--phase',type="string",
+             help='report the time taken by this phase of each run (e.g., run_command) rather than the whole run [default: %default]'),
+]
+script_info['version'] = __version__
+
+def main():
+    option_parser, opts, args =\
+       parse_command_line_parameters(**script_info)
+    if opts.since_days is None:
+        since = None
+    else:
+        since = time() - opts.since_days * 86400
+    conn = connect_run_history(opts.run_history_fp or get_run_history_fp())
+    try:
+        trends = get_run_trends(conn,
+                                command=opts.command,
+                                since=since,
+                                period=opts.group_by,
+                                phase=opts.phase)
+    finally:
+        conn.close()
+    print format_run_trends(trends, opts.group_by)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+# Thin client for start_qiime_command_server.py. This intentionally doesn't
+# use parse_command_line_parameters, as importing qiime is exactly the
+# startup cost we're trying to avoid.
+import sys
+from cmd_abstraction.command_client import send_command
+
+usage = "usage: %s socket_fp command_name [command options]\n" +\
+        "  e.g., %s $PWD/qiime.sock add_taxa.py -i otu_table.biom -o out.biom -t tax.txt\n"
+
+def main(argv):
+    if len(argv) < 3:
+        sys.stderr.write(usage % (argv[0], argv[0]))
+        return 2
+    socket_fp = argv[1]
+    command_name = argv[2]
+    exit_status, stdout, stderr = \
+     send_command(socket_fp, command_name, argv[2:])
+    sys.stdout.write(stdout)
+    sys.stderr.write(stderr)
+    return exit_status
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
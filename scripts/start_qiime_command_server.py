@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+from qiime.util import parse_command_line_parameters, make_option
+from cmd_abstraction.server import start_command_server
+
+script_info = {}
+script_info['brief_description'] = "Start a warm QIIME command server"
+script_info['script_description'] = "Preload QIIME command classes once and serve requests sent by send_qiime_command.py over a Unix socket, avoiding interpreter startup and import costs on every command. Each request is run in a forked child process, so requests can't affect one another."
+script_info['script_usage'] = [("","Serve the autogenerated commands on qiime.sock","%prog -s $PWD/qiime.sock")]
+script_info['output_description']= "The server runs until it is killed. Each command writes its usual master script log."
+script_info['required_options'] = [
+ make_option('-s','--socket_fp',type="string",
+             help='the unix socket to listen on. A socket left by a server '
+             'which crashed is replaced, but not one in use by a running '
+             'server'),
+]
+script_info['optional_options'] = [
+ make_option('-m','--module_names',type="string",
+             default='cmd_abstraction.autogenerated_interfaces',
+             help='comma-separated modules to load commands from [default: %default]'),
+]
+script_info['version'] = __version__
+
+def main():
+    option_parser, opts, args =\
+       parse_command_line_parameters(**script_info)
+    try:
+        start_command_server(opts.socket_fp, opts.module_names.split(','))
+    except ValueError, e:
+        option_parser.error(e)
+
+if __name__ == "__main__":
+    main()
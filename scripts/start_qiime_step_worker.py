@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+from multiprocessing import Process
+from qiime.util import parse_command_line_parameters, make_option
+from cmd_abstraction.util import (read_executor_authkey,
+                                  executor_authkey_env_var)
+from cmd_abstraction.executors import run_worker, parse_address
+
+script_info = {}
+script_info['brief_description'] = "Start workers which run workflow steps for a queue_workers executor"
+script_info['script_description'] = "Connect to a workflow run with --executor queue_workers and --executor_address, and run its steps as they're queued. Start this on each host that should run steps; the hosts must share the workflow's file system."
+script_info['script_usage'] = [("","Run steps from the workflow serving its queue on head-node:50000, four at a time, with the key in key.txt","%prog -s head-node:50000 -k key.txt -n 4")]
+script_info['output_description']= "The workers run until the workflow finishes. Step output is sent back to the workflow, and written to its master script log."
+script_info['required_options'] = [
+ make_option('-s','--executor_address',type="string",
+             help='the host:port the workflow serves its step queue on'),
+]
+script_info['optional_options'] = [
+ make_option('-k','--executor_authkey_fp',type="existing_filepath",
+             help='file containing the workflow\'s key [default: the key in the %s environment variable]' % executor_authkey_env_var),
+ make_option('-n','--num_workers',type="int",default=1,
+             help='number of steps to run at once on this host [default: %default]'),
+]
+script_info['version'] = __version__
+
+def main():
+    option_parser, opts, args =\
+       parse_command_line_parameters(**script_info)
+    try:
+        address = parse_address(opts.executor_address)
+    except ValueError:
+        option_parser.error("--executor_address must be host:port, not %s"
+                            % opts.executor_address)
+    try:
+        authkey = read_executor_authkey(opts.executor_authkey_fp)
+    except (IOError, ValueError), e:
+        option_parser.error("Couldn't read --executor_authkey_fp: %s" % e)
+    if not authkey:
+        option_parser.error("The workflow's key must be provided with "
+                            "--executor_authkey_fp or in %s"
+                            % executor_authkey_env_var)
+    workers = [Process(target=run_worker,
+                       args=(address, authkey))
+               for i in range(opts.num_workers)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+if __name__ == "__main__":
+    main()
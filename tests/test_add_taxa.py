@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+from shutil import rmtree
+from os.path import join
+from tempfile import mkdtemp
+from cogent.util.unit_test import TestCase, main
+from cmd_abstraction.util import QiimeCommandError
+from cmd_abstraction.interfaces import AddTaxa
+from cmd_abstraction.table_annotation import (get_table_fp_pairs,
+                                              check_new_metadata_labels,
+                                              format_unmatched_ids)
+
+class FakeTable(object):
+
+    def __init__(self, observation_metadata):
+        self.ObservationMetadata = observation_metadata
+
+class AddTaxaTests(TestCase):
+
+    def setUp(self):
+        self.input_dir = mkdtemp(prefix='add_taxa_tests_')
+        self.dir_tables = [join(self.input_dir, 'b.biom'),
+                           join(self.input_dir, 'a.biom'),
+                           join(self.input_dir, 'c.biom.gz')]
+        for fp in self.dir_tables + [join(self.input_dir, 'notes.txt')]:
+            open(fp, 'w').close()
+
+    def tearDown(self):
+        rmtree(self.input_dir)
+
+    def test_get_table_fp_pairs_from_options(self):
+        """ -i and -o values are paired in order """
+        self.assertEqual(get_table_fp_pairs(['x.biom', 'y.biom'],
+                                            ['x_tax.biom', 'y_tax.biom'],
+                                            None, None),
+                         [('x.biom', 'x_tax.biom'), ('y.biom', 'y_tax.biom')])
+
+    def test_get_table_fp_pairs_from_dirs(self):
+        """ input_dir tables are written under the same names in output_dir """
+        self.assertEqual(get_table_fp_pairs(['x.biom'], None,
+                                            self.input_dir, 'out'),
+                         [('x.biom', 'out/x.biom'),
+                          (join(self.input_dir, 'a.biom'), 'out/a.biom'),
+                          (join(self.input_dir, 'b.biom'), 'out/b.biom'),
+                          # compressed tables are written uncompressed
+                          (join(self.input_dir, 'c.biom.gz'), 'out/c.biom')])
+
+    def test_get_table_fp_pairs_invalid(self):
+        """ unpaired, duplicate or overwriting outputs are errors """
+        self.assertRaises(QiimeCommandError, get_table_fp_pairs,
+                          None, None, None, 'out')
+        self.assertRaises(QiimeCommandError, get_table_fp_pairs,
+                          ['x.biom', 'y.biom'], ['x_tax.biom'], None, None)
+        self.assertRaises(QiimeCommandError, get_table_fp_pairs,
+                          ['x.biom'], ['x_tax.biom'], None, 'out')
+        self.assertRaises(QiimeCommandError, get_table_fp_pairs,
+                          ['x.biom', 'y.biom'], ['t.biom', 't.biom'],
+                          None, None)
+        self.assertRaises(QiimeCommandError, get_table_fp_pairs,
+                          ['x.biom'], ['x.biom'], None, None)
+
+    def test_check_new_metadata_labels(self):
+        """ existing metadata fields can't be added again """
+        check_new_metadata_labels(FakeTable(None), ['taxonomy'], 'x.biom')
+        table = FakeTable([{'score': 0.5}])
+        check_new_metadata_labels(table, ['taxonomy'], 'x.biom')
+        self.assertRaises(QiimeCommandError, check_new_metadata_labels,
+                          table, ['taxonomy', 'score'], 'x.biom')
+        # every observation's fields are checked
+        table = FakeTable([None, {'taxonomy': ['k__Bacteria']},
+                           {'score': 0.5}])
+        self.assertRaises(QiimeCommandError, check_new_metadata_labels,
+                          table, ['score'], 'x.biom')
+
+    def test_format_unmatched_ids(self):
+        """ unmatched ids are counted, and the first few listed """
+        self.assertEqual(format_unmatched_ids('x.biom', 'tax.txt', [], []),
+                         [])
+        missing_ids = ['OTU%d' % i for i in range(12)]
+        self.assertEqual(format_unmatched_ids('x.biom', 'tax.txt',
+                                              missing_ids, ['OTU20']),
+                         ['12 observations in x.biom have no metadata in '
+                          'tax.txt: OTU0, OTU1, OTU2, OTU3, OTU4, OTU5, OTU6, '
+                          'OTU7, OTU8, OTU9, ...\n',
+                          "1 observations in tax.txt aren't in x.biom: "
+                          "OTU20\n"])
+
+    def test_get_input_fps(self):
+        """ every input table and the taxonomy are logged """
+        params = {'input_fp': ['x.biom', 'y.biom'],
+                  'taxonomy_fp': 'tax.txt',
+                  'input_dir': self.input_dir}
+        self.assertEqual(AddTaxa()._get_input_fps(params),
+                         ['x.biom', 'y.biom', 'tax.txt',
+                          join(self.input_dir, 'a.biom'),
+                          join(self.input_dir, 'b.biom'),
+                          join(self.input_dir, 'c.biom.gz')])
+        params = {'input_fp': None,
+                  'taxonomy_fp': 'tax.txt',
+                  'input_dir': None}
+        self.assertEqual(AddTaxa()._get_input_fps(params), ['tax.txt'])
+
+if __name__ == "__main__":
+    main()
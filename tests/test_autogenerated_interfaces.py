@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+import sys
+from os import environ, pathsep
+from os.path import join, dirname, abspath
+from subprocess import Popen, PIPE
+from cogent.util.unit_test import TestCase, main
+from qiime.test import initiate_timeout, disable_timeout
+from cmd_abstraction.autogenerated_interfaces import registry
+
+repo_dir = dirname(dirname(abspath(__file__)))
+wrapper_dir = join(repo_dir, 'autogenerated_scripts')
+
+# Seconds each wrapper script may take to import, over and above the cost
+# of importing cmd_abstraction.util (and therefore qiime.util), which every
+# command pays.
+import_time_budgets = {'add_taxa': 1.0,
+                       'pick_otus_through_otu_table': 2.0}
+
+_time_import_script = """
+import sys
+from time import time
+start = time()
+%s
+print time() - start
+print ','.join(sorted([m for m in sys.modules
+    if m.startswith('cmd_abstraction.autogenerated_interfaces.') and
+       sys.modules[m] is not None]))
+"""
+
+def time_import(import_code):
+    """ Import in a fresh interpreter, return (seconds, interface modules)
+    """
+    env = dict(environ)
+    env['PYTHONPATH'] = pathsep.join([repo_dir, env.get('PYTHONPATH','')])
+    proc = Popen([sys.executable, '-c', _time_import_script % import_code],
+                 stdout=PIPE, stderr=PIPE, env=env)
+    stdout, stderr = proc.communicate()
+    if proc.returncode != 0:
+        raise AssertionError, stderr
+    elapsed, modules = stdout.split('\n')[:2]
+    return float(elapsed), [m for m in modules.split(',') if m]
+
+class AutogeneratedInterfacesTests(TestCase):
+
+    def setUp(self):
+        initiate_timeout(60)
+
+    def tearDown(self):
+        disable_timeout()
+
+    def test_registry_contains_wrapped_commands(self):
+        """ every wrapper script has a command in the registry """
+        self.assertEqual(registry.getCommandNames(),
+                         ['AddTaxa', 'PickOtusThroughOtuTable'])
+        self.assertEqual(registry.getModuleName('AddTaxa'),
+                         'cmd_abstraction.autogenerated_interfaces.add_taxa')
+        self.assertRaises(KeyError, registry.getModuleName, 'NotACommand')
+
+    def test_wrapper_imports_only_its_interface(self):
+        """ importing a wrapper doesn't import other interface modules """
+        for script_name in import_time_budgets:
+            elapsed, modules = time_import(
+             "import imp; imp.load_source('wrapper', %r)" %
+             join(wrapper_dir, '%s.py' % script_name))
+            self.assertEqual(modules,
+             ['cmd_abstraction.autogenerated_interfaces.%s' % script_name])
+
+    def test_wrapper_import_time_budgets(self):
+        """ importing a wrapper script stays within its time budget """
+        baseline, modules = time_import('import cmd_abstraction.util')
+        for script_name, budget in import_time_budgets.items():
+            elapsed, modules = time_import(
+             "import imp; imp.load_source('wrapper', %r)" %
+             join(wrapper_dir, '%s.py' % script_name))
+            self.assertTrue(elapsed - baseline <= budget,
+             "Importing %s.py took %1.3fs over baseline (budget: %1.3fs)"
+             % (script_name, elapsed - baseline, budget))
+
+if __name__ == "__main__":
+    main()
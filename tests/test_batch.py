@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+from StringIO import StringIO
+from cogent.util.unit_test import TestCase, main
+from qiime.util import make_option
+from cmd_abstraction.util import QiimeCommand
+from cmd_abstraction.batch import (option_set_to_argv,
+                                   parse_manifest,
+                                   validate_batch,
+                                   run_batch,
+                                   BufferingLogger,
+                                   format_batch_report)
+
+class ExampleCommand(QiimeCommand):
+    _required_options = [make_option('-i','--input_fp',type='string')]
+    _optional_options = [make_option('-n','--num_seqs',type='int',default=1)]
+    _digest_cache_fp = None
+    _run_history_fp = None
+
+    def __init__(self):
+        self.runs = []
+
+    def run_command(self, params, args):
+        self.runs.append((params['input_fp'], params['num_seqs']))
+
+class BatchTests(TestCase):
+
+    def test_option_set_to_argv(self):
+        """ option sets are converted to sorted argument lists """
+        self.assertEqual(option_set_to_argv({'input_fp':'a.biom',
+                                             '-t':'tax.txt',
+                                             'all_strings':True,
+                                             'force':False,
+                                             'labels':''}),
+                         ['-t', 'tax.txt', '--all_strings',
+                          '--input_fp', 'a.biom'])
+
+    def test_parse_manifest_tsv(self):
+        """ tsv manifests are parsed into argument lists """
+        self.assertEqual(parse_manifest(StringIO(tsv_manifest)),
+                         [['--all_strings', '--input_fp', 'a.biom'],
+                          ['--input_fp', 'b.biom']])
+
+    def test_parse_manifest_json(self):
+        """ json manifests of option sets or argvs are parsed """
+        self.assertEqual(parse_manifest(StringIO(json_manifest)),
+                         [['--input_fp', 'a.biom'],
+                          ['-i', 'b.biom', '--all_strings']])
+
+    def test_validate_batch(self):
+        """ each item's own arguments are parsed """
+        batch_argvs = parse_manifest(StringIO(options_manifest))
+        validated = validate_batch(ExampleCommand(), batch_argvs)
+        self.assertEqual([(options['input_fp'], options['num_seqs'], error)
+                          for options, arguments, error in validated],
+                         [('a.fna', 5, None), ('b.fna', 1, None)])
+        validated = validate_batch(ExampleCommand(),
+                                   batch_argvs + [['-n', 'x']])
+        self.assertEqual(validated[2][:2], (None, None))
+        self.assertTrue(validated[2][2])
+        # asking for help or the version would print it mid-batch
+        for argv in [['-h'], ['-i', 'a.fna', '--help'], ['--version'],
+                     ['--vers']]:
+            options, arguments, error = \
+             validate_batch(ExampleCommand(), [argv])[0]
+            self.assertEqual(options, None)
+            self.assertTrue(error.startswith('Help and version options'))
+
+    def test_run_batch(self):
+        """ each item is run with its own options """
+        cmd = ExampleCommand()
+        results = run_batch(cmd,
+                            parse_manifest(StringIO(options_manifest)),
+                            BufferingLogger())
+        self.assertEqual(cmd.runs, [('a.fna', 5), ('b.fna', 1)])
+        self.assertEqual([(argv, succeeded)
+                          for argv, succeeded, seconds, error in results],
+                         [(['--input_fp', 'a.fna', '--num_seqs', '5'], True),
+                          (['--input_fp', 'b.fna'], True)])
+
+    def test_format_batch_report(self):
+        """ the report has one line per item and a summary """
+        results = [(['-i', 'a.biom'], True, 1.0, None),
+                   (['-i', 'b.biom'], False, 0.5, 'IOError: b.biom')]
+        self.assertEqual(format_batch_report(results).split('\n'),
+         ['#item\tstatus\tseconds\targuments\terror',
+          '0\tsuccess\t1.000\t-i a.biom\t',
+          '1\tfailed\t0.500\t-i b.biom\tIOError: b.biom',
+          '# 1 succeeded, 1 failed, 1.500 seconds in total'])
+
+tsv_manifest = """input_fp\tall_strings
+a.biom\tTrue
+# comments are ignored
+b.biom\tFalse
+"""
+
+options_manifest = """[{"input_fp": "a.fna", "num_seqs": 5},
+ {"input_fp": "b.fna"}]
+"""
+
+json_manifest = """[{"input_fp": "a.biom"},
+ ["-i", "b.biom", "--all_strings"]]
+"""
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+import gzip
+from copy import deepcopy
+from json import loads, dumps
+from os.path import join
+from shutil import rmtree
+from StringIO import StringIO
+from tempfile import mkdtemp
+from cogent.util.unit_test import TestCase, main
+from cmd_abstraction.util import QiimeCommandError
+from cmd_abstraction.binary_biom import (is_binary_biom_table,
+                                         get_sparse_data,
+                                         get_metadata,
+                                         add_observation_metadata,
+                                         write_binary_biom_table,
+                                         BinaryBiomTable,
+                                         load_biom_document,
+                                         write_biom_document,
+                                         convert_biom_table)
+from cmd_abstraction.observation_metadata import parse_taxonomy_columns
+from cmd_abstraction.table_annotation import add_taxa_to_table
+
+class BinaryBiomTests(TestCase):
+
+    def setUp(self):
+        self.test_dir = mkdtemp(prefix='binary_biom_tests_')
+        self.doc = loads(biom_table)
+        self.json_fp = join(self.test_dir, 'table.biom')
+        open(self.json_fp, 'w').write(biom_table)
+        self.binary_fp = join(self.test_dir, 'table.bbiom')
+        binary_f = open(self.binary_fp, 'wb')
+        write_binary_biom_table(self.doc, binary_f)
+        binary_f.close()
+
+    def tearDown(self):
+        rmtree(self.test_dir)
+
+    def test_is_binary_biom_table(self):
+        """ binary tables are detected from their contents """
+        self.assertTrue(is_binary_biom_table(self.binary_fp))
+        self.assertFalse(is_binary_biom_table(self.json_fp))
+
+    def test_get_sparse_data(self):
+        """ dense and unordered sparse data are returned in order """
+        self.assertEqual(get_sparse_data({'matrix_type': 'dense',
+                                          'data': [[0, 2], [1, 0]]}),
+                         [(0, 1, 2), (1, 0, 1)])
+        self.assertEqual(get_sparse_data({'matrix_type': 'sparse',
+                                          'data': [[1, 0, 1], [0, 1, 2],
+                                                   [0, 0, 0]]}),
+                         [(0, 1, 2), (1, 0, 1)])
+
+    def test_add_observation_metadata(self):
+        """ existing metadata is updated, and missing metadata replaced """
+        doc = deepcopy(self.doc)
+        add_observation_metadata(doc, {'OTU1': {'score': 0.5}})
+        self.assertEqual(get_metadata(doc, 'rows'),
+                         [{'taxonomy': ['k__Bacteria'], 'score': 0.5},
+                          {'taxonomy': ['k__Archaea']}, None])
+        for row in doc['rows']:
+            row['metadata'] = None
+        self.assertEqual(get_metadata(doc, 'rows'), None)
+        add_observation_metadata(doc, {'OTU3': {'score': 0.5}})
+        self.assertEqual(get_metadata(doc, 'rows'),
+                         [None, None, {'score': 0.5}])
+
+    def test_binary_biom_table(self):
+        """ the table's ids, metadata and counts are read """
+        table = BinaryBiomTable(self.binary_fp)
+        self.assertEqual(table.shape, (3, 4))
+        self.assertEqual(table.TableId, 'test')
+        self.assertEqual(table.Type, 'OTU table')
+        self.assertEqual(table.ObservationIds, ['OTU1', 'OTU2', 'OTU3'])
+        self.assertEqual(table.SampleIds, ['S1', 'S2', 'S3', u'S\xe94'])
+        self.assertEqual(table.getSampleIndex(u'S\xe94'), 3)
+        self.assertEqual(table.ObservationMetadata,
+                         [{'taxonomy': ['k__Bacteria'], 'score': 0.9},
+                          {'taxonomy': ['k__Archaea']}, None])
+        self.assertEqual(table.getObservationMetadataColumn('taxonomy'),
+                         [['k__Bacteria'], ['k__Archaea'], None])
+        self.assertRaises(KeyError, table.getObservationMetadataColumn, 'x')
+        self.assertEqual(table.SampleMetadata, None)
+        self.assertEqual(table.getNumNonzero(), 5)
+        indices, values = table.getObservationData(0)
+        self.assertEqual((list(indices), list(values)), ([0, 3], [1.0, 5.0]))
+        indices, values = table.getSampleData(3)
+        self.assertEqual((list(indices), list(values)), ([0, 2], [5.0, 2.5]))
+        self.assertEqual(table.getValue(2, 3), 2.5)
+        self.assertEqual(table.getValue(2, 0), 0)
+        self.assertEqual(list(table.iterNonzero()),
+                         [(0, 0, 1.0), (0, 3, 5.0), (1, 1, 2.0),
+                          (2, 1, 7.0), (2, 3, 2.5)])
+        table.close()
+        # non-binary files are rejected
+        self.assertRaises(ValueError, BinaryBiomTable, self.json_fp)
+
+    def test_int_tables(self):
+        """ int tables are written as ints, and other types rejected """
+        doc = deepcopy(self.doc)
+        doc['matrix_element_type'] = 'int'
+        doc['data'] = [[r, c, int(v)] for r, c, v in doc['data']]
+        binary_f = open(self.binary_fp, 'wb')
+        write_binary_biom_table(doc, binary_f)
+        binary_f.close()
+        self.assertEqual(BinaryBiomTable(self.binary_fp).toDocument(), doc)
+        doc['matrix_element_type'] = 'unicode'
+        self.assertRaises(ValueError, write_binary_biom_table, doc,
+                          StringIO())
+
+    def test_round_trip(self):
+        """ tables converted to binary and back are unchanged """
+        self.assertEqual(load_biom_document(self.binary_fp), self.doc)
+        self.assertEqual(load_biom_document(self.json_fp), self.doc)
+        # dense tables become sparse
+        dense_doc = deepcopy(self.doc)
+        dense_doc['matrix_type'] = 'dense'
+        dense_doc['data'] = [[1.0, 0, 0, 5.0], [0, 2.0, 0, 0],
+                             [0, 7.0, 0, 2.5]]
+        binary_f = open(self.binary_fp, 'wb')
+        write_binary_biom_table(dense_doc, binary_f)
+        binary_f.close()
+        self.assertEqual(load_biom_document(self.binary_fp), self.doc)
+
+    def test_write_biom_document(self):
+        """ documents are written as biom JSON """
+        output_f = StringIO()
+        write_biom_document(self.doc, output_f)
+        self.assertEqual(loads(output_f.getvalue()), self.doc)
+        self.assertTrue(output_f.getvalue().startswith(
+         '{"id": "test", "format": "Biological Observation Matrix 1.0.0"'))
+
+    def test_convert_biom_table(self):
+        """ tables are converted to the other format by default """
+        compressed_fp = join(self.test_dir, 'table.biom.gz')
+        compressed_f = gzip.open(compressed_fp, 'wb')
+        compressed_f.write(biom_table)
+        compressed_f.close()
+        converted_fp = join(self.test_dir, 'converted.bbiom')
+        output_f = open(converted_fp, 'wb')
+        convert_biom_table(compressed_fp, output_f)
+        output_f.close()
+        self.assertTrue(is_binary_biom_table(converted_fp))
+        output_f = StringIO()
+        convert_biom_table(converted_fp, output_f)
+        self.assertEqual(loads(output_f.getvalue()), self.doc)
+        output_f = StringIO()
+        convert_biom_table(converted_fp, output_f, 'binary')
+        self.assertTrue(output_f.getvalue().startswith('# cmd_abstraction'))
+
+    def test_add_taxa_to_table(self):
+        """ add_taxa writes and reads binary tables """
+        doc = deepcopy(self.doc)
+        for row in doc['rows']:
+            row['metadata'] = None
+        open(self.json_fp, 'w').write(dumps(doc))
+        output_fp = join(self.test_dir, 'with_taxa.bbiom')
+        taxonomy = parse_taxonomy_columns(['OTU1\tk__Bacteria',
+                                           'OTU2\tk__Archaea',
+                                           'OTU4\tk__Archaea'],
+                                          ['taxonomy'])
+        self.assertEqual(add_taxa_to_table(self.json_fp, output_fp,
+                                           taxonomy, ['taxonomy'], 'binary'),
+                         (['OTU3'], ['OTU4']))
+        table = BinaryBiomTable(output_fp)
+        self.assertEqual(table.getObservationMetadataColumn('taxonomy'),
+                         [['k__Bacteria'], ['k__Archaea'], None])
+        self.assertTrue(table.header['generated_by'].startswith('QIIME'))
+        table.close()
+        # binary input can be written as JSON
+        json_output_fp = join(self.test_dir, 'with_scores.biom')
+        scores = parse_taxonomy_columns(['OTU3\t0.5'], ['score'], [float])
+        add_taxa_to_table(output_fp, json_output_fp, scores, ['score'],
+                          'json')
+        self.assertEqual(get_metadata(loads(open(json_output_fp).read()),
+                                      'rows'),
+                         [{'taxonomy': ['k__Bacteria']},
+                          {'taxonomy': ['k__Archaea']},
+                          {'score': 0.5}])
+        # existing fields can't be added again
+        self.assertRaises(QiimeCommandError, add_taxa_to_table,
+                          output_fp, json_output_fp, taxonomy, ['taxonomy'],
+                          'binary')
+
+biom_table = """{"id": "test",
+ "format": "Biological Observation Matrix 1.0.0",
+ "format_url": "http://biom-format.org",
+ "type": "OTU table",
+ "generated_by": "QIIME 1.5.0",
+ "date": "2012-08-01T00:00:00.000000",
+ "rows": [{"id": "OTU1", "metadata": {"taxonomy": ["k__Bacteria"],
+                                      "score": 0.9}},
+          {"id": "OTU2", "metadata": {"taxonomy": ["k__Archaea"]}},
+          {"id": "OTU3", "metadata": null}],
+ "columns": [{"id": "S1", "metadata": null},
+             {"id": "S2", "metadata": null},
+             {"id": "S3", "metadata": null},
+             {"id": "S\\u00e94", "metadata": null}],
+ "matrix_type": "sparse",
+ "matrix_element_type": "float",
+ "shape": [3, 4],
+ "data": [[0, 0, 1.0], [0, 3, 5.0], [1, 1, 2.0], [2, 1, 7.0], [2, 3, 2.5]]}
+"""
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+from StringIO import StringIO
+from cogent.util.unit_test import TestCase, main
+from cmd_abstraction.biom_output import (supports_direct_io,
+                                         write_biom_table)
+
+class StringOnlyTable(object):
+
+    def getBiomFormatJsonString(self, generated_by):
+        return '{"generated_by": "%s"}' % generated_by
+
+class DirectIoTable(object):
+
+    def getBiomFormatJsonString(self, generated_by, direct_io=None):
+        pieces = ['{"generated_by": ', '"%s"' % generated_by, '}']
+        if direct_io is None:
+            return ''.join(pieces)
+        for piece in pieces:
+            direct_io.write(piece)
+
+class BiomOutputTests(TestCase):
+
+    def test_supports_direct_io(self):
+        """ tables are checked for a direct_io parameter """
+        self.assertTrue(supports_direct_io(DirectIoTable()))
+        self.assertFalse(supports_direct_io(StringOnlyTable()))
+
+    def test_write_biom_table(self):
+        """ both kinds of table produce the same document """
+        for table in [StringOnlyTable(), DirectIoTable()]:
+            output_f = StringIO()
+            write_biom_table(table, output_f, generated_by='QIIME test')
+            self.assertEqual(output_f.getvalue(),
+                             '{"generated_by": "QIIME test"}')
+
+if __name__ == "__main__":
+    main()
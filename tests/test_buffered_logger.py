@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+import re
+import sys
+from os import environ, pathsep
+from os.path import join, dirname, abspath
+from subprocess import Popen, PIPE
+from shutil import rmtree
+from tempfile import mkdtemp
+from cogent.util.unit_test import TestCase, main
+from qiime.workflow import WorkflowLogger
+from cmd_abstraction.buffered_logger import (BufferedWorkflowLogger,
+                                             flush_open_loggers,
+                                             _open_loggers)
+
+repo_dir = dirname(dirname(abspath(__file__)))
+
+_exception_exit_script = """
+from cmd_abstraction.buffered_logger import BufferedWorkflowLogger
+logger = BufferedWorkflowLogger(%r)
+for i in range(1000):
+    logger.write('line %%d\\n' %% i)
+raise ValueError
+"""
+
+# the start and stop times will differ between the loggers
+_time_re = re.compile(r'^(Logging st\w+ at).*$', re.MULTILINE)
+
+def read_log(fp):
+    return _time_re.sub(r'\1', open(fp).read())
+
+class BufferedWorkflowLoggerTests(TestCase):
+
+    def setUp(self):
+        self.test_dir = mkdtemp(prefix='buffered_logger_tests_')
+        self.writes = ['Command:\n', 'add_taxa.py -i a.biom', '\n\n'] + \
+                      ['line %d\n' % i for i in range(1000)]
+
+    def tearDown(self):
+        rmtree(self.test_dir)
+
+    def write_log(self, logger_class, fp, **kwargs):
+        logger = logger_class(fp, params={}, qiime_config={}, **kwargs)
+        for s in self.writes:
+            logger.write(s)
+        logger.close()
+
+    def test_same_log_as_workflow_logger(self):
+        """ the log file is identical to WorkflowLogger's """
+        expected_fp = join(self.test_dir, 'expected.txt')
+        self.write_log(WorkflowLogger, expected_fp)
+        for max_queued_writes in [1, 10, 10000]:
+            fp = join(self.test_dir, 'buffered_%d.txt' % max_queued_writes)
+            self.write_log(BufferedWorkflowLogger, fp,
+                           max_queued_writes=max_queued_writes)
+            self.assertEqual(read_log(fp), read_log(expected_fp))
+
+    def test_flush(self):
+        """ flush writes everything so far to the log file """
+        fp = join(self.test_dir, 'log.txt')
+        logger = BufferedWorkflowLogger(fp)
+        for s in self.writes:
+            logger.write(s)
+        logger.flush()
+        self.assertTrue(open(fp).read().endswith('line 999\n'))
+        logger.write('more\n')
+        flush_open_loggers()
+        self.assertTrue(open(fp).read().endswith('line 999\nmore\n'))
+        self.assertTrue(logger in _open_loggers)
+        logger.close()
+        self.assertFalse(logger in _open_loggers)
+        self.assertRaises(ValueError, logger.write, 'after close\n')
+
+    def test_flush_on_exception_exit(self):
+        """ the log is complete when the process exits with an exception """
+        fp = join(self.test_dir, 'log.txt')
+        env = dict(environ)
+        env['PYTHONPATH'] = pathsep.join([repo_dir, env.get('PYTHONPATH','')])
+        proc = Popen([sys.executable, '-c', _exception_exit_script % fp],
+                     stdout=PIPE, stderr=PIPE, env=env)
+        stdout, stderr = proc.communicate()
+        self.assertNotEqual(proc.returncode, 0)
+        self.assertTrue('ValueError' in stderr)
+        self.assertTrue(open(fp).read().endswith('line 998\nline 999\n'))
+
+    def test_no_log_fp(self):
+        """ without a log file, writes are discarded """
+        logger = BufferedWorkflowLogger()
+        logger.write('discarded\n')
+        logger.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+from shutil import rmtree
+from os import remove
+from os.path import exists, join
+from cogent.util.unit_test import TestCase, main
+from cogent.util.misc import create_dir
+from qiime.util import (get_qiime_temp_dir,
+                        get_tmp_filename)
+from qiime.test import initiate_timeout, disable_timeout
+from qiime.workflow import WorkflowLogger, WorkflowError, no_status_updates
+from cmd_abstraction.command_handlers import (get_step_outputs,
+                                              build_command_dependency_graph,
+                                              call_commands_serially_measured,
+                                              call_commands_as_dag)
+from cmd_abstraction.executors import QueueWorkerExecutor
+from cmd_abstraction.batch import BufferingLogger
+from cmd_abstraction.profiling import PhaseProfiler
+from cmd_abstraction.cost_model import StepHistory
+
+class CommandHandlerTests(TestCase):
+
+    def setUp(self):
+
+        self.dirs_to_remove = []
+
+        tmp_dir = get_qiime_temp_dir()
+        self.test_out = get_tmp_filename(tmp_dir=tmp_dir,
+                                         prefix='cmd_handler_tests_',
+                                         suffix='',
+                                         result_constructor=str)
+        self.dirs_to_remove.append(self.test_out)
+        create_dir(self.test_out)
+
+        initiate_timeout(60)
+
+    def tearDown(self):
+
+        disable_timeout()
+        for d in self.dirs_to_remove:
+            if exists(d):
+                rmtree(d)
+
+    def test_get_step_outputs(self):
+        """ output paths are found after output flags """
+        self.assertEqual(get_step_outputs('align_seqs.py -i a.fna -o out/'),
+                         ['out'])
+        self.assertEqual(get_step_outputs('cat a.txt > b.txt'), ['b.txt'])
+        self.assertEqual(get_step_outputs('x.py --output_fp=o.txt -i a'),
+                         ['o.txt'])
+        self.assertEqual(get_step_outputs('x.py -i a'), [])
+
+    def test_build_command_dependency_graph(self):
+        """ dependencies are inferred from the paths steps read and write """
+        actual = build_command_dependency_graph(workflow_steps)
+        expected = [set(),
+                    set([0]),
+                    set([1]),
+                    set([1]),
+                    set([3]),
+                    set([3,4]),
+                    set([0,2])]
+        self.assertEqual(actual, expected)
+
+    def test_call_commands_serially_measured(self):
+        """ steps are run in order, and each step's cost is recorded """
+        commands = [[(d, c % {'out':self.test_out})] for d, c in dag_steps]
+        profiler = PhaseProfiler()
+        history_fp = join(self.test_out, 'step_history.json')
+        logger = BufferingLogger()
+        call_commands_serially_measured(commands,
+                                        no_status_updates,
+                                        logger,
+                                        step_history=StepHistory(history_fp,
+                                                                 10),
+                                        profiler=profiler)
+        self.assertEqual(open(join(self.test_out,'d.txt')).read(),
+                         'a\na\n')
+        self.assertEqual([p['name'] for p in profiler.getPhases()],
+                         ['step: %s' % d for d, c in dag_steps])
+        self.assertTrue(logger.getvalue().index('# b command') <
+                        logger.getvalue().index('# c command'))
+        # a failed step stops the workflow, and is still profiled
+        steps = [('a', 'false'), ('b', 'true b.py')]
+        profiler = PhaseProfiler()
+        history = StepHistory(history_fp, 10)
+        self.assertRaises(WorkflowError,
+                          call_commands_serially_measured,
+                          [steps],
+                          no_status_updates,
+                          WorkflowLogger(),
+                          step_history=history,
+                          profiler=profiler)
+        self.assertEqual([p['name'] for p in profiler.getPhases()],
+                         ['step: a'])
+        call_commands_serially_measured([steps[1:]],
+                                        no_status_updates,
+                                        WorkflowLogger(),
+                                        step_history=history)
+        self.assertEqual(StepHistory(history_fp).getRecords('b.py')[0][0], 10)
+
+    def test_call_commands_as_dag(self):
+        """ all steps are run, and dependent steps see their inputs """
+        commands = [[(d, c % {'out':self.test_out})] for d, c in dag_steps]
+        profiler = PhaseProfiler()
+        call_commands_as_dag(commands,
+                             no_status_updates,
+                             WorkflowLogger(),
+                             jobs_to_start=2,
+                             profiler=profiler)
+        self.assertEqual(open(join(self.test_out,'d.txt')).read(),
+                         'a\na\n')
+        # each step's timing is recorded as a phase
+        self.assertEqual(sorted([p['name'] for p in profiler.getPhases()]),
+                         ['step: %s' % d for d, c in dag_steps])
+
+    def test_call_commands_as_dag_stops_on_failure(self):
+        """ steps depending on a failed step are never started """
+        steps = [('a', 'false > %(out)s/a.txt')] + dag_steps[1:]
+        commands = [[(d, c % {'out':self.test_out})] for d, c in steps]
+        self.assertRaises(WorkflowError,
+                          call_commands_as_dag,
+                          commands,
+                          no_status_updates,
+                          WorkflowLogger(),
+                          jobs_to_start=2)
+        for fn in ['b.txt','c.txt','d.txt']:
+            self.assertFalse(exists(join(self.test_out,fn)))
+
+    def test_call_commands_as_dag_retries(self):
+        """ failed steps are retried up to max_retries times """
+        # fails the first time it's run, and succeeds the second
+        flaky_step = ('flaky', 'test -e %(out)s/tried || '
+                      '(touch %(out)s/tried; exit 1) && '
+                      'echo ok > %(out)s/flaky.txt')
+        commands = [[(flaky_step[0], flaky_step[1] % {'out':self.test_out})]]
+        self.assertRaises(WorkflowError,
+                          call_commands_as_dag,
+                          commands,
+                          no_status_updates,
+                          WorkflowLogger(),
+                          jobs_to_start=2)
+        remove(join(self.test_out,'tried'))
+        logger = BufferingLogger()
+        call_commands_as_dag(commands,
+                             no_status_updates,
+                             logger,
+                             jobs_to_start=2,
+                             max_retries=1)
+        self.assertEqual(open(join(self.test_out,'flaky.txt')).read(), 'ok\n')
+        self.assertTrue('attempt 1 of 2), retrying' in logger.getvalue())
+
+    def test_call_commands_as_dag_log_order(self):
+        """ step output is logged in step order, however steps finish """
+        # b takes longer than c, so c finishes first
+        steps = [dag_steps[0],
+                 ('b', 'sleep 0.5; echo b_$((1+1)); ' + dag_steps[1][1]),
+                 ('c', 'echo c_$((1+1)); ' + dag_steps[2][1]),
+                 dag_steps[3]]
+        commands = [[(d, c % {'out':self.test_out})] for d, c in steps]
+        logger = BufferingLogger()
+        call_commands_as_dag(commands,
+                             no_status_updates,
+                             logger,
+                             jobs_to_start=2)
+        log = logger.getvalue()
+        self.assertTrue(log.index('b_2') < log.index('# c command') <
+                        log.index('c_2'))
+
+    def test_call_commands_as_dag_queue_workers(self):
+        """ steps can be run on queue workers """
+        commands = [[(d, c % {'out':self.test_out})] for d, c in dag_steps]
+        call_commands_as_dag(commands,
+                             no_status_updates,
+                             WorkflowLogger(),
+                             jobs_to_start=2,
+                             executor_factory=QueueWorkerExecutor)
+        self.assertEqual(open(join(self.test_out,'d.txt')).read(),
+                         'a\na\n')
+
+workflow_steps = [
+ ('Pick OTUs', 'pick_otus.py -i /data/seqs.fna -o /out/uclust_picked_otus'),
+ ('Pick representative set', 'pick_rep_set.py -i /out/uclust_picked_otus/seqs_otus.txt -f /data/seqs.fna -o /out/rep_set/seqs_rep_set.fasta'),
+ ('Assign taxonomy', 'assign_taxonomy.py -o /out/rdp_assigned_taxonomy -i /out/rep_set/seqs_rep_set.fasta'),
+ ('Align sequences', 'align_seqs.py -i /out/rep_set/seqs_rep_set.fasta -o /out/pynast_aligned_seqs'),
+ ('Filter alignment', 'filter_alignment.py -o /out/pynast_aligned_seqs -i /out/pynast_aligned_seqs/seqs_rep_set_aligned.fasta'),
+ ('Build phylogenetic tree', 'make_phylogeny.py -i /out/pynast_aligned_seqs/seqs_rep_set_aligned_pfiltered.fasta -o /out/rep_set.tre'),
+ ('Make OTU table', 'make_otu_table.py -i /out/uclust_picked_otus/seqs_otus.txt -t /out/rdp_assigned_taxonomy/seqs_rep_set_tax_assignments.txt -o /out/otu_table.biom'),
+]
+
+dag_steps = [
+ ('a', 'echo a > %(out)s/a.txt'),
+ ('b', 'cat %(out)s/a.txt > %(out)s/b.txt'),
+ ('c', 'cat %(out)s/a.txt > %(out)s/c.txt'),
+ ('d', 'cat %(out)s/b.txt %(out)s/c.txt > %(out)s/d.txt'),
+]
+
+if __name__ == "__main__":
+    main()
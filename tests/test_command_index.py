@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+import sys
+from os import environ
+from os.path import join
+from shutil import rmtree
+from StringIO import StringIO
+from tempfile import mkdtemp
+from cogent.util.unit_test import TestCase, main
+from cmd_abstraction.command_index import (index_filename,
+                                           load_command_index,
+                                           update_command_index,
+                                           get_stale_commands,
+                                           format_help,
+                                           format_command_list,
+                                           serve_help)
+
+class CommandIndexTests(TestCase):
+
+    def setUp(self):
+        self.package_dir = mkdtemp(prefix='command_index_tests_')
+        self.module_fp = join(self.package_dir, 'count_seqs.py')
+        open(self.module_fp, 'w').write(example_interface)
+        self.index_fp = join(self.package_dir, index_filename)
+        self.command_modules = {'CountSeqs': 'count_seqs'}
+        self.saved_qiime_config_fp = environ.get('QIIME_CONFIG_FP')
+
+    def tearDown(self):
+        rmtree(self.package_dir)
+        if self.saved_qiime_config_fp is None:
+            environ.pop('QIIME_CONFIG_FP', None)
+        else:
+            environ['QIIME_CONFIG_FP'] = self.saved_qiime_config_fp
+
+    def test_update_command_index(self):
+        """ index holds each command's script info, and is reused """
+        self.assertEqual(update_command_index(self.command_modules,
+                                              self.package_dir),
+                         (['CountSeqs'], []))
+        index = load_command_index(self.index_fp)
+        definition = index['commands']['CountSeqs']
+        self.assertEqual(definition['brief_description'], 'Count sequences')
+        self.assertEqual(definition['version'], '1.5.0-dev')
+        self.assertEqual(definition['module_filename'], 'count_seqs.py')
+        self.assertEqual(
+         [o['long_opts'] for o in definition['required_options']],
+         [['--input_fp']])
+        optional = dict([(o['dest'], o) for o in
+                         definition['optional_options']])
+        self.assertEqual(optional['min_length']['default'], 10)
+        self.assertEqual(optional['min_length']['type'], 'int')
+        self.assertEqual(optional['profile_mode']['choices'],
+                         ['none', 'phases', 'cprofile'])
+        # nothing has changed, so nothing is rebuilt
+        self.assertEqual(update_command_index(self.command_modules,
+                                              self.package_dir), ([], []))
+        self.assertEqual(load_command_index(self.index_fp), index)
+
+    def test_update_command_index_failures(self):
+        """ commands which can't be imported are reported, not raised """
+        open(join(self.package_dir, 'broken.py'), 'w').write(
+         'import not_a_real_module\n')
+        command_modules = {'CountSeqs': 'count_seqs', 'Broken': 'broken'}
+        for jobs_to_start in (1, 2):
+            rebuilt, failures = update_command_index(
+             command_modules, self.package_dir, jobs_to_start=jobs_to_start)
+            self.assertEqual(rebuilt, ['Broken', 'CountSeqs'])
+            self.assertEqual([f[0] for f in failures], ['Broken'])
+            self.assertTrue('not_a_real_module' in failures[0][1])
+            index = load_command_index(self.index_fp)
+            self.assertEqual(sorted(index['commands']), ['CountSeqs'])
+            # rebuild from scratch with the next number of jobs
+            open(self.module_fp, 'a').write('\n# changed\n')
+
+    def test_get_stale_commands(self):
+        """ changed, missing and unindexed commands are stale """
+        update_command_index(self.command_modules, self.package_dir)
+        index = load_command_index(self.index_fp)
+        self.assertEqual(get_stale_commands(index, ['CountSeqs'],
+                                            self.package_dir), [])
+        self.assertEqual(get_stale_commands(index, ['AddTaxa'],
+                                            self.package_dir),
+                         [('AddTaxa', 'not in index')])
+        open(self.module_fp, 'a').write('\n# changed\n')
+        self.assertEqual(get_stale_commands(index, ['CountSeqs'],
+                                            self.package_dir),
+                         [('CountSeqs', 'interface module has changed')])
+        self.assertEqual(update_command_index(self.command_modules,
+                                              self.package_dir),
+                         (['CountSeqs'], []))
+
+    def test_get_stale_commands_qiime_config(self):
+        """ changes to the qiime config make commands stale """
+        qiime_config_fp = join(self.package_dir, 'qiime_config')
+        open(qiime_config_fp, 'w').write('jobs_to_start\t1\n')
+        environ['QIIME_CONFIG_FP'] = qiime_config_fp
+        update_command_index(self.command_modules, self.package_dir)
+        index = load_command_index(self.index_fp)
+        self.assertEqual(get_stale_commands(index, ['CountSeqs'],
+                                            self.package_dir), [])
+        open(qiime_config_fp, 'w').write('jobs_to_start\t4\n')
+        self.assertEqual(get_stale_commands(index, ['CountSeqs'],
+                                            self.package_dir),
+                         [('CountSeqs', 'the qiime config has changed')])
+        # as is a different version of qiime
+        open(qiime_config_fp, 'w').write('jobs_to_start\t1\n')
+        index['qiime_md5'] = 'abc'
+        self.assertEqual(get_stale_commands(index, ['CountSeqs'],
+                                            self.package_dir),
+                         [('CountSeqs', 'qiime has changed')])
+
+    def test_load_command_index_missing(self):
+        """ missing or old-format indices aren't loaded """
+        self.assertEqual(load_command_index(self.index_fp), None)
+        open(self.index_fp, 'w').write('{"format_version": 0}')
+        self.assertEqual(load_command_index(self.index_fp), None)
+
+    def test_format_help(self):
+        """ help is formatted from the index """
+        update_command_index(self.command_modules, self.package_dir)
+        definition = load_command_index(self.index_fp)['commands']['CountSeqs']
+        help_text = format_help(definition, 'count_seqs.py')
+        self.assertTrue(help_text.startswith(
+         'Usage: count_seqs.py [options] {-i/--input_fp INPUT_FP}'))
+        self.assertTrue('Count the sequences in a fasta file' in help_text)
+        self.assertTrue('count_seqs.py -i seqs.fna' in help_text)
+        self.assertTrue('REQUIRED options:' in help_text)
+        self.assertTrue('the input fasta file [REQUIRED]' in help_text)
+        self.assertTrue('minimum length [default: 10]' in help_text)
+        self.assertTrue('--master_script_log_dir' in help_text)
+
+    def test_format_command_list(self):
+        """ commands are listed with their script names """
+        update_command_index(self.command_modules, self.package_dir)
+        self.assertEqual(
+         format_command_list(load_command_index(self.index_fp)),
+         'CountSeqs\tcount_seqs\tCount sequences')
+
+    def test_serve_help(self):
+        """ help is served from an up to date index, and exits """
+        update_command_index(self.command_modules, self.package_dir)
+        saved_stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            self.assertRaises(SystemExit, serve_help, 'CountSeqs',
+                              ['count_seqs.py', '-h'], self.index_fp)
+            help_text = sys.stdout.getvalue()
+        finally:
+            sys.stdout = saved_stdout
+        self.assertTrue('the input fasta file [REQUIRED]' in help_text)
+        # not a request for help
+        self.assertEqual(serve_help('CountSeqs',
+                                    ['count_seqs.py', '-i', 'seqs.fna'],
+                                    self.index_fp), None)
+        # stale, so the caller falls back to the command
+        open(self.module_fp, 'a').write('\n# changed\n')
+        self.assertEqual(serve_help('CountSeqs',
+                                    ['count_seqs.py', '-h'],
+                                    self.index_fp), None)
+
+example_interface = """#!/usr/bin/env python
+from __future__ import division
+
+from qiime.util import make_option
+from cmd_abstraction.util import QiimeCommand
+
+class CountSeqs(QiimeCommand):
+    \"\"\"class defining count_seqs script interface\"\"\"
+    _brief_description = "Count sequences"
+    _script_description = "Count the sequences in a fasta file"
+    _script_usage = [("", "Count the sequences", "%prog -i seqs.fna")]
+    _output_description = "The count is written to stdout"
+    _required_options = [
+     make_option('-i','--input_fp',type='existing_filepath',
+                 help='the input fasta file')]
+    _optional_options = [
+     make_option('-m','--min_length',type='int',default=10,
+                 help='minimum length [default: %default]')]
+    _version = "1.5.0-dev"
+
+    def run_command(self,opts,args):
+        pass
+"""
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+import bz2
+from os.path import join, getsize
+from shutil import rmtree
+from tempfile import mkdtemp
+from cogent.util.unit_test import TestCase, main
+from qiime.test import initiate_timeout, disable_timeout
+from qiime.workflow import WorkflowLogger, no_status_updates
+from cmd_abstraction.command_handlers import call_commands_as_dag
+from cmd_abstraction.cost_model import (default_cost_model,
+                                        get_fasta_size,
+                                        get_step_num_seqs,
+                                        StepHistory,
+                                        fit_linear,
+                                        calibrate_cost_model,
+                                        estimate_step_costs,
+                                        simulate_schedule,
+                                        get_critical_path,
+                                        get_peak_memory,
+                                        format_seconds,
+                                        format_cost_estimate)
+
+class CostModelTests(TestCase):
+
+    def setUp(self):
+        self.test_dir = mkdtemp(prefix='cost_model_tests_')
+        self.history_fp = join(self.test_dir, 'step_history.json')
+        initiate_timeout(60)
+
+    def tearDown(self):
+        disable_timeout()
+        rmtree(self.test_dir)
+
+    def test_get_fasta_size(self):
+        """ sequences are counted, including across chunk boundaries """
+        fasta_fp = join(self.test_dir, 'seqs.fna')
+        open(fasta_fp, 'w').write('>s1\nACGT\n>s2\nAC\n>s3\nA\n')
+        for chunk_size in [1, 2, 3, 5, 1024]:
+            self.assertEqual(get_fasta_size(fasta_fp, chunk_size), (3, 22))
+        # compressed files' sequences are counted as they're decompressed
+        compressed_fp = join(self.test_dir, 'seqs.fna.bz2')
+        open(compressed_fp, 'wb').write(
+         bz2.compress('>s1\nACGT\n>s2\nAC\n>s3\nA\n'))
+        self.assertEqual(get_fasta_size(compressed_fp, 5),
+                         (3, getsize(compressed_fp)))
+
+    def test_step_history(self):
+        """ steps are recorded by script, with the input size """
+        history = StepHistory(self.history_fp, 1000, max_records=2)
+        history.recordStep('python /scripts/pick_otus.py -i s.fna', 10.0,
+                           2048)
+        history.recordStep('pick_otus.py -i s.fna', 12.0, 4096)
+        history.recordStep('pick_otus.py -i s.fna', 14.0, 4096)
+        # commands which don't run a script aren't recorded
+        history.recordStep('cat a.txt > b.txt', 1.0, 1024)
+        history.save()
+        history = StepHistory(self.history_fp)
+        self.assertEqual(history.getRecords('pick_otus.py'),
+                         [(1000, 12.0, 4.0), (1000, 14.0, 4.0)])
+        self.assertEqual(history.getRecords('make_phylogeny.py'), [])
+
+    def test_step_history_input_size(self):
+        """ the input is only counted once a step is recorded """
+        fasta_fp = join(self.test_dir, 'seqs.fna')
+        open(fasta_fp, 'w').write('>s1\nACGT\n>s2\nAC\n')
+        history = StepHistory(None, input_fp=fasta_fp)
+        history.recordStep('cat a.txt > b.txt', 1.0, 1024)
+        self.assertEqual(history.num_seqs, None)
+        history.recordStep('pick_otus.py -i seqs.fna', 10.0, 1024)
+        self.assertEqual(history.getRecords('pick_otus.py'),
+                         [(2, 10.0, 1.0)])
+        self.assertEqual(history.getInputSize(), (2, 16))
+        # provided sizes are used rather than counting the input
+        history = StepHistory(None, 100, num_bytes=1000, input_fp=fasta_fp)
+        self.assertEqual(history.getInputSize(), (100, 1000))
+
+    def test_step_history_concurrent_saves(self):
+        """ histories saved by other workflows since loading are kept """
+        first = StepHistory(self.history_fp, 100, max_records=3)
+        second = StepHistory(self.history_fp, 200, max_records=3)
+        first.recordStep('pick_otus.py', 10.0, 1024)
+        second.recordStep('pick_otus.py', 20.0, 1024)
+        second.recordStep('align_seqs.py', 5.0, 1024)
+        second.save()
+        first.save()
+        history = StepHistory(self.history_fp)
+        self.assertEqual(history.getRecords('pick_otus.py'),
+                         [(200, 20.0, 1.0), (100, 10.0, 1.0)])
+        self.assertEqual(history.getRecords('align_seqs.py'),
+                         [(200, 5.0, 1.0)])
+        # saving again doesn't add the same records twice
+        first.recordStep('pick_otus.py', 30.0, 1024)
+        first.save()
+        self.assertEqual(StepHistory(self.history_fp).getRecords(
+                         'pick_otus.py'),
+                         [(200, 20.0, 1.0), (100, 10.0, 1.0),
+                          (100, 30.0, 1.0)])
+
+    def test_get_step_num_seqs(self):
+        """ shard steps read their shard's share of the sequences """
+        shard_command = 'python -m cmd_abstraction.sharding run ' +\
+         '/data/seqs.fna 250 750 -- pick_otus.py -i /dev/stdin -o /out/s0'
+        self.assertEqual(get_step_num_seqs(shard_command, 100, 1000), 50)
+        self.assertEqual(get_step_num_seqs('pick_otus.py -i seqs.fna',
+                                           100, 1000), 100)
+        # and are recorded with it
+        history = StepHistory(None, 100, num_bytes=1000)
+        history.recordStep(shard_command, 10.0, 1024)
+        self.assertEqual(history.getRecords('pick_otus.py'),
+                         [(50, 10.0, 1.0)])
+        self.assertFloatEqual(
+         estimate_step_costs([('Pick OTUs (shard 1 of 2)', shard_command)],
+                             200, history, 1000)[0][:2],
+         (20.0, 2.0))
+
+    def test_fit_linear(self):
+        """ lines are fit, through the origin for a single size """
+        self.assertFloatEqual(fit_linear([1, 2, 3], [3, 5, 7]), (1.0, 2.0))
+        self.assertFloatEqual(fit_linear([10, 10], [4, 6]), (0.0, 0.5))
+        # costs don't fall with size
+        self.assertFloatEqual(fit_linear([1, 2], [5, 3]), (4.0, 0.0))
+
+    def test_calibrate_cost_model(self):
+        """ models are fit to records, or the default is used """
+        self.assertEqual(calibrate_cost_model([]),
+                         (default_cost_model, False))
+        model, calibrated = calibrate_cost_model([(100, 20.0, 150.0),
+                                                  (200, 30.0, 250.0)])
+        self.assertTrue(calibrated)
+        self.assertFloatEqual(model, (10.0, 0.1, 50.0, 1.0))
+
+    def test_estimate_step_costs(self):
+        """ costs are estimated from the input size """
+        history = StepHistory(None, 100)
+        history.recordStep('pick_otus.py', 20.0, 150 * 1024)
+        history.recordStep('pick_otus.py', 20.0, 150 * 1024)
+        actual = estimate_step_costs(workflow_steps[:2], 200, history)
+        self.assertFloatEqual(actual[0][:2], (40.0, 300.0))
+        self.assertTrue(actual[0][2])
+        self.assertFalse(actual[1][2])
+
+    def test_simulate_schedule(self):
+        """ steps are scheduled on the available slots """
+        durations = [10, 5, 1, 3, 2, 4, 1]
+        starts, finishes = simulate_schedule(durations, dependencies, 1)
+        self.assertEqual(finishes[-1], 26)
+        self.assertEqual(get_critical_path(dependencies, starts, finishes),
+                         [0, 1, 2, 3, 4, 5, 6])
+        starts, finishes = simulate_schedule(durations, dependencies, 2)
+        # taxonomy assignment runs alongside alignment, and the OTU table
+        # is built alongside the alignment filtering
+        self.assertEqual(starts, [0, 10, 15, 15, 18, 20, 16])
+        self.assertEqual(max(finishes), 24)
+        self.assertEqual(get_critical_path(dependencies, starts, finishes),
+                         [0, 1, 3, 4, 5])
+        # no step could ever start
+        self.assertRaises(ValueError, simulate_schedule, durations,
+                          dependencies, 0)
+
+    def test_get_peak_memory(self):
+        """ memory of steps running at the same time is summed """
+        self.assertEqual(get_peak_memory([0, 0, 5], [5, 3, 6],
+                                         [100, 50, 200]), 200)
+        self.assertEqual(get_peak_memory([0, 0, 4], [5, 3, 6],
+                                         [100, 50, 200]), 300)
+
+    def test_format_cost_estimate(self):
+        """ the estimate includes each step, the total and critical path """
+        history = StepHistory(None, 100)
+        actual = format_cost_estimate(workflow_steps, 1000, 50000, history, 2)
+        self.assertTrue(actual.startswith(
+         'Input: 1000 sequences, 50000 bytes'))
+        self.assertTrue('Pick OTUs\t0:00:06\t102\tno' in actual)
+        self.assertTrue('Critical path with jobs_to_start=2:' in actual)
+        self.assertTrue('Estimated total time: 0:00:30' in actual)
+        self.assertEqual(format_seconds(3725.4), '1:02:05')
+
+    def test_call_commands_as_dag_records_history(self):
+        """ completed steps are recorded in the step history """
+        history = StepHistory(self.history_fp, 500)
+        steps = [('a', 'true a.py'), ('b', 'true b.py')]
+        call_commands_as_dag([steps],
+                             no_status_updates,
+                             WorkflowLogger(),
+                             jobs_to_start=2,
+                             step_history=history)
+        history = StepHistory(self.history_fp)
+        self.assertEqual(len(history.getRecords('a.py')), 1)
+        self.assertEqual(history.getRecords('b.py')[0][0], 500)
+
+workflow_steps = [
+ ('Pick OTUs', 'pick_otus.py -i /data/seqs.fna -o /out/uclust_picked_otus'),
+ ('Pick representative set', 'pick_rep_set.py -i /out/uclust_picked_otus/seqs_otus.txt -f /data/seqs.fna -o /out/rep_set/seqs_rep_set.fasta'),
+ ('Assign taxonomy', 'assign_taxonomy.py -o /out/rdp_assigned_taxonomy -i /out/rep_set/seqs_rep_set.fasta'),
+ ('Align sequences', 'align_seqs.py -i /out/rep_set/seqs_rep_set.fasta -o /out/pynast_aligned_seqs'),
+ ('Filter alignment', 'filter_alignment.py -o /out/pynast_aligned_seqs -i /out/pynast_aligned_seqs/seqs_rep_set_aligned.fasta'),
+ ('Build phylogenetic tree', 'make_phylogeny.py -i /out/pynast_aligned_seqs/seqs_rep_set_aligned_pfiltered.fasta -o /out/rep_set.tre'),
+ ('Make OTU table', 'make_otu_table.py -i /out/uclust_picked_otus/seqs_otus.txt -t /out/rdp_assigned_taxonomy/seqs_rep_set_tax_assignments.txt -o /out/otu_table.biom'),
+]
+
+# the dependencies of workflow_steps
+dependencies = [set(), set([0]), set([1]), set([1]), set([3]), set([3,4]),
+                set([0,2])]
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+import sys
+from os import environ, pathsep, kill
+from shutil import rmtree
+from tempfile import mkdtemp
+from signal import SIGKILL, SIGSTOP, SIGCONT
+from time import sleep
+from os.path import join, dirname, abspath, exists
+from subprocess import Popen
+from cogent.util.unit_test import TestCase, main
+from qiime.test import initiate_timeout, disable_timeout
+from cmd_abstraction.util import (WorkflowCommand,
+                                  QiimeCommandError,
+                                  executor_authkey_env_var)
+from cmd_abstraction.executors import (LocalPoolExecutor,
+                                       QueueWorkerExecutor,
+                                       StepTracker,
+                                       get_executor,
+                                       parse_address,
+                                       run_measured_command)
+
+repo_dir = dirname(dirname(abspath(__file__)))
+
+class ExecutorTests(TestCase):
+
+    def setUp(self):
+        self.test_dir = mkdtemp(prefix='executor_tests_')
+        self.authkey_fp = join(self.test_dir, 'key.txt')
+        open(self.authkey_fp, 'w').write('test key\n')
+        self.env_authkey = environ.pop(executor_authkey_env_var, None)
+        initiate_timeout(60)
+
+    def tearDown(self):
+        disable_timeout()
+        environ.pop(executor_authkey_env_var, None)
+        if self.env_authkey is not None:
+            environ[executor_authkey_env_var] = self.env_authkey
+        rmtree(self.test_dir)
+
+    def run_steps(self, executor, commands):
+        try:
+            for i, command in enumerate(commands):
+                executor.submit(i, command)
+            results = [executor.getResult() for command in commands]
+        finally:
+            executor.close()
+        # the run time and memory use vary, so aren't compared
+        return sorted([r[:4] for r in results])
+
+    def test_local_pool_executor(self):
+        """ steps run on a local pool """
+        actual = self.run_steps(LocalPoolExecutor(2),
+                                ['echo a', 'echo b', 'exit 3'])
+        self.assertEqual(actual, [(0, 'a\n', '', 0),
+                                  (1, 'b\n', '', 0),
+                                  (2, '', '', 3)])
+
+    def test_local_pool_executor_lost_process(self):
+        """ steps whose pool process dies fail, and can be run again """
+        pid_fp = join(self.test_dir, 'pid.txt')
+        executor = LocalPoolExecutor(1, poll_interval=0.1)
+        try:
+            # the shell's parent is the pool process running the step
+            executor.submit(0, 'echo $PPID > %s; sleep 30' % pid_fp)
+            while not open(pid_fp, 'a+').read().strip():
+                sleep(0.1)
+            kill(int(open(pid_fp).read()), SIGKILL)
+            step_index, stdout, stderr, return_value, seconds, peak_rss_kb =\
+             executor.getResult()
+            self.assertEqual((step_index, return_value), (0, 1))
+            self.assertTrue('died while running this step' in stderr)
+            executor.submit(0, 'echo a')
+            self.assertEqual(executor.getResult()[:4], (0, 'a\n', '', 0))
+        finally:
+            executor.close()
+
+    def test_queue_worker_executor(self):
+        """ steps run on local workers taking them from the queue """
+        actual = self.run_steps(QueueWorkerExecutor(2),
+                                ['echo a', 'echo b', 'exit 3'])
+        self.assertEqual(actual, [(0, 'a\n', '', 0),
+                                  (1, 'b\n', '', 0),
+                                  (2, '', '', 3)])
+
+    def test_queue_worker_executor_remote_workers(self):
+        """ steps run on workers which connect to the executor """
+        executor = QueueWorkerExecutor(2, authkey='test key',
+                                       start_local_workers=False)
+        # this stands in for workers on other hosts
+        env = dict(environ)
+        env['PYTHONPATH'] = pathsep.join([repo_dir, env.get('PYTHONPATH','')])
+        worker = Popen([sys.executable,
+                        join(repo_dir, 'scripts', 'start_qiime_step_worker.py'),
+                        '-s', '%s:%d' % executor.address,
+                        '-k', self.authkey_fp,
+                        '-n', '2'], env=env)
+        actual = self.run_steps(executor, ['echo a', 'echo b'])
+        self.assertEqual(actual, [(0, 'a\n', '', 0), (1, 'b\n', '', 0)])
+        # the workers stop when the executor shuts down
+        self.assertEqual(worker.wait(), 0)
+
+    def test_queue_worker_executor_lost_worker(self):
+        """ steps running on workers which stop responding fail """
+        executor = QueueWorkerExecutor(1, heartbeat_interval=0.1,
+                                       lost_worker_timeout=1.0)
+        try:
+            executor.submit(0, 'sleep 2')
+            # give the worker time to take the step
+            sleep(0.5)
+            kill(executor._workers[0].pid, SIGKILL)
+            step_index, stdout, stderr, return_value, seconds, peak_rss_kb =\
+             executor.getResult()
+        finally:
+            executor.close()
+        self.assertEqual((step_index, return_value), (0, 1))
+        self.assertTrue('stopped responding' in stderr)
+
+    def test_queue_worker_executor_lost_worker_step_killed(self):
+        """ workers kill their step once they've been given up on """
+        output_fp = join(self.test_dir, 'out.txt')
+        executor = QueueWorkerExecutor(1, heartbeat_interval=0.1,
+                                       lost_worker_timeout=1.0)
+        try:
+            executor.submit(0, 'sleep 3; touch %s' % output_fp)
+            sleep(0.5)
+            # the worker stops responding, but its step keeps running
+            worker_pid = executor._workers[0].pid
+            kill(worker_pid, SIGSTOP)
+            self.assertEqual(executor.getResult()[3], 1)
+            # and when the worker responds again, the step is killed
+            # before it can write its output
+            kill(worker_pid, SIGCONT)
+            sleep(3)
+        finally:
+            executor.close()
+        self.assertFalse(exists(output_fp))
+
+    def test_step_tracker_attempts(self):
+        """ only the result of a step's latest attempt is accepted """
+        tracker = StepTracker()
+        tracker.setTimeouts(0.1, 0.2)
+        first_worker = tracker.register()[0]
+        tracker.submit((0, 'true'))
+        self.assertEqual(tracker.take(first_worker), (0, 'true', 1))
+        sleep(0.3)
+        self.assertEqual(tracker.collectLost(), 1)
+        self.assertEqual(tracker.getResult(0.1)[3], 1)
+        second_worker = tracker.register()[0]
+        tracker.submit((0, 'true'))
+        self.assertEqual(tracker.take(second_worker), (0, 'true', 2))
+        tracker.complete(first_worker, (0, 'first', '', 0, 1.0, 0))
+        tracker.complete(second_worker, (0, 'second', '', 0, 1.0, 0))
+        self.assertEqual(tracker.getResult(0.1), (0, 'second', '', 0, 1.0, 0))
+        self.assertEqual(tracker.getResult(0.1), None)
+
+    def test_run_measured_command(self):
+        """ commands are run in a shell, and their usage is measured """
+        stdout, stderr, return_value, seconds, peak_rss_kb = \
+         run_measured_command('echo a; echo b >&2; exit 2')
+        self.assertEqual((stdout, stderr, return_value), ('a\n', 'b\n', 2))
+        self.assertTrue(seconds >= 0)
+        # the usage of processes run by the shell is included
+        stdout, stderr, return_value, seconds, peak_rss_kb = \
+         run_measured_command('%s -c "x = \' \' * 50000000"' %
+                              sys.executable)
+        self.assertEqual(return_value, 0)
+        self.assertTrue(peak_rss_kb > 50000)
+
+    def test_get_executor(self):
+        """ executors are created by name """
+        executor = get_executor('local_pool', 1)
+        self.assertTrue(isinstance(executor, LocalPoolExecutor))
+        executor.close()
+        self.assertRaises(ValueError, get_executor, 'grid_engine', 1)
+
+    def test_parse_address(self):
+        """ host:port is parsed """
+        self.assertEqual(parse_address('head-node:50000'),
+                         ('head-node', 50000))
+        self.assertRaises(ValueError, parse_address, 'head-node')
+
+    def test_get_executor_factory(self):
+        """ executor options are validated """
+        cmd = WorkflowCommand()
+        executor = cmd._get_executor_factory({'executor': 'queue_workers'})(1)
+        self.assertTrue(isinstance(executor, QueueWorkerExecutor))
+        executor.close()
+        self.assertRaises(QiimeCommandError, cmd._get_executor_factory,
+                          {'executor': 'local_pool',
+                           'executor_address': 'localhost:50000'})
+        self.assertRaises(QiimeCommandError, cmd._get_executor_factory,
+                          {'executor': 'queue_workers',
+                           'executor_address': 'localhost:50000'})
+        self.assertRaises(QiimeCommandError, cmd._get_executor_factory,
+                          {'executor': 'queue_workers',
+                           'executor_address': 'localhost',
+                           'executor_authkey_fp': self.authkey_fp})
+        self.assertRaises(QiimeCommandError, cmd._get_executor_factory,
+                          {'executor': 'queue_workers',
+                           'executor_address': 'localhost:50000',
+                           'executor_authkey_fp': self.authkey_fp,
+                           'executor_authkey': 'key'})
+        # the key is read from the file, or from the environment
+        for options in [{'executor_authkey_fp': self.authkey_fp}, {}]:
+            if not options:
+                environ[executor_authkey_env_var] = 'test key'
+            options.update({'executor': 'queue_workers',
+                            'executor_address': 'localhost:0',
+                            'remote_workers_only': True})
+            executor = cmd._get_executor_factory(options)(1)
+            self.assertEqual(executor.authkey, 'test key')
+            executor.close()
+        self.assertRaises(QiimeCommandError, cmd._get_executor_factory,
+                          {'executor': 'queue_workers',
+                           'remote_workers_only': True})
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+import gzip
+from os.path import join, exists
+from shutil import rmtree
+from tempfile import mkdtemp
+from cogent.util.unit_test import TestCase, main
+from qiime.test import initiate_timeout, disable_timeout
+import cmd_abstraction.fasta_index
+from cmd_abstraction.fasta_index import (find_chunk_starts,
+                                         scan_fasta_chunk,
+                                         scan_fasta,
+                                         write_fasta_index,
+                                         load_fasta_index,
+                                         get_fasta_index,
+                                         format_fasta_errors)
+
+class FastaIndexTests(TestCase):
+
+    def setUp(self):
+        self.test_dir = mkdtemp(prefix='fasta_index_tests_')
+        self.fasta_fp = join(self.test_dir, 'seqs.fna')
+        open(self.fasta_fp, 'w').write(valid_fasta)
+        self.index_fp = join(self.test_dir, 'seqs.fna.idx')
+        self.min_chunk_size = cmd_abstraction.fasta_index._min_chunk_size
+        self.block_size = cmd_abstraction.fasta_index._block_size
+        initiate_timeout(60)
+
+    def tearDown(self):
+        disable_timeout()
+        cmd_abstraction.fasta_index._min_chunk_size = self.min_chunk_size
+        cmd_abstraction.fasta_index._block_size = self.block_size
+        rmtree(self.test_dir)
+
+    def test_find_chunk_starts(self):
+        """ chunks start at record headers """
+        self.assertEqual(find_chunk_starts(valid_fasta, 1), [0])
+        self.assertEqual(find_chunk_starts(valid_fasta, 2), [0, 28])
+        self.assertEqual(find_chunk_starts(valid_fasta, 3), [0, 28, 44])
+        # no more chunks than records
+        self.assertEqual(find_chunk_starts(valid_fasta, 100),
+                         [0, 15, 28, 44])
+
+    def test_scan_fasta_chunk(self):
+        """ records are indexed, and samples and lengths counted """
+        offsets, sample_counts, min_length, max_length, total_length, \
+         errors, num_errors = scan_fasta_chunk(valid_fasta, 0,
+                                               len(valid_fasta))
+        self.assertEqual(list(offsets), [0, 15, 28, 44])
+        self.assertEqual(sample_counts, {'S1': 2, 'S.2': 2})
+        self.assertEqual((min_length, max_length, total_length), (2, 8, 20))
+        self.assertEqual((errors, num_errors), ([], 0))
+        # a chunk starting part-way through the data
+        offsets, sample_counts, min_length, max_length, total_length, \
+         errors, num_errors = scan_fasta_chunk(valid_fasta, 28,
+                                               len(valid_fasta))
+        self.assertEqual(list(offsets), [28, 44])
+        self.assertEqual(sample_counts, {'S.2': 2})
+        # records are found however the chunk is split into blocks
+        expected = scan_fasta_chunk(invalid_fasta, 0, len(invalid_fasta))
+        for block_size in [1, 3, 7]:
+            cmd_abstraction.fasta_index._block_size = block_size
+            self.assertEqual(scan_fasta_chunk(invalid_fasta, 0,
+                                              len(invalid_fasta)), expected)
+
+    def test_scan_fasta_chunk_errors(self):
+        """ malformed records and identifiers are reported """
+        errors, num_errors = scan_fasta_chunk(invalid_fasta, 0,
+                                              len(invalid_fasta))[5:]
+        self.assertEqual(num_errors, 6)
+        self.assertEqual(errors, [
+         (0, 'file does not start with a header (a line starting with ">")'),
+         (4, 'identifier S1 is not of the form <sample_id>_<seq_id>'),
+         (13, 'sample id S-1 in identifier S-1_2 may only contain '
+              'alphanumeric characters and periods'),
+         (25, 'sequence S1_3 contains invalid characters: 1X'),
+         (36, 'sequence S1_4 is empty'),
+         (42, 'empty header')])
+
+    def test_scan_fasta(self):
+        """ chunks scanned in parallel give the same index as one chunk """
+        index, errors, num_errors = scan_fasta(self.fasta_fp)
+        self.assertEqual(list(index.offsets), [0, 15, 28, 44])
+        self.assertEqual(index.getNumSeqs(), 4)
+        self.assertEqual(index.getNumBytes(), len(valid_fasta))
+        self.assertFloatEqual(index.getMeanLength(), 5.0)
+        cmd_abstraction.fasta_index._min_chunk_size = 10
+        parallel_index, errors, num_errors = scan_fasta(self.fasta_fp, 3)
+        self.assertEqual((errors, num_errors), ([], 0))
+        self.assertEqual(parallel_index.offsets, index.offsets)
+        self.assertEqual(parallel_index.sample_counts, index.sample_counts)
+        self.assertEqual((parallel_index.min_length,
+                          parallel_index.max_length,
+                          parallel_index.total_length), (2, 8, 20))
+
+        open(self.fasta_fp, 'w').write(invalid_fasta)
+        index, errors, num_errors = scan_fasta(self.fasta_fp, 3)
+        self.assertEqual(num_errors, 6)
+        self.assertEqual([e[0] for e in errors], [0, 4, 13, 25, 36, 42])
+
+        open(self.fasta_fp, 'w').write('')
+        index, errors, num_errors = scan_fasta(self.fasta_fp)
+        self.assertEqual(errors, [(0, 'file contains no sequences')])
+
+    def test_scan_compressed_fasta(self):
+        """ compressed files are scanned as they're decompressed """
+        for data in [valid_fasta, invalid_fasta]:
+            open(self.fasta_fp, 'w').write(data)
+            expected_index, expected_errors, expected_num_errors = \
+             scan_fasta(self.fasta_fp)
+            compressed_fp = join(self.test_dir, 'seqs.fna.gz')
+            compressed_f = gzip.open(compressed_fp, 'wb')
+            compressed_f.write(data)
+            compressed_f.close()
+            # records are found however the data is split into blocks
+            for block_size in [1, 3, 7, 1024]:
+                cmd_abstraction.fasta_index._block_size = block_size
+                index, errors, num_errors = scan_fasta(compressed_fp)
+                self.assertEqual(index.offsets, expected_index.offsets)
+                self.assertEqual(index.sample_counts,
+                                 expected_index.sample_counts)
+                self.assertEqual((index.min_length, index.max_length,
+                                  index.total_length),
+                                 (expected_index.min_length,
+                                  expected_index.max_length,
+                                  expected_index.total_length))
+                self.assertEqual((errors, num_errors),
+                                 (expected_errors, expected_num_errors))
+
+    def test_write_load_fasta_index(self):
+        """ indexes are written and loaded """
+        self.assertEqual(load_fasta_index(self.index_fp), None)
+        index = scan_fasta(self.fasta_fp)[0]
+        write_fasta_index(index, self.index_fp)
+        loaded = load_fasta_index(self.index_fp)
+        self.assertEqual(loaded.offsets, index.offsets)
+        self.assertEqual(loaded.sample_counts, index.sample_counts)
+        self.assertEqual(loaded.total_length, 20)
+        self.assertTrue(loaded.isCurrent())
+        # truncated indexes are ignored
+        data = open(self.index_fp, 'rb').read()
+        open(self.index_fp, 'wb').write(data[:-4])
+        self.assertEqual(load_fasta_index(self.index_fp), None)
+
+    def test_get_fasta_index(self):
+        """ indexes are reused until the input changes """
+        index, errors, num_errors = get_fasta_index(self.fasta_fp,
+                                                    self.index_fp)
+        self.assertEqual(index.getNumSeqs(), 4)
+        self.assertTrue(exists(self.index_fp))
+        open(self.index_fp, 'r+b').write('# not an index\n')
+        self.assertEqual(get_fasta_index(self.fasta_fp,
+                                         self.index_fp)[0].getNumSeqs(), 4)
+        index = get_fasta_index(self.fasta_fp, self.index_fp)[0]
+        index.offsets.append(100)
+        write_fasta_index(index, self.index_fp)
+        # the (modified) index is reused while the input is unchanged
+        self.assertEqual(get_fasta_index(self.fasta_fp,
+                                         self.index_fp)[0].getNumSeqs(), 5)
+        # and the input is rescanned once it changes
+        open(self.fasta_fp, 'a').write('>S1_9\nACGT\n>S1_10\nAC\n')
+        self.assertEqual(get_fasta_index(self.fasta_fp,
+                                         self.index_fp)[0].getNumSeqs(), 6)
+        self.assertEqual(load_fasta_index(self.index_fp).sample_counts,
+                         {'S1': 4, 'S.2': 2})
+        # invalid input isn't indexed
+        open(self.fasta_fp, 'w').write(invalid_fasta)
+        self.assertEqual(get_fasta_index(self.fasta_fp,
+                                         self.index_fp)[2], 6)
+        self.assertEqual(load_fasta_index(self.index_fp).sample_counts,
+                         {'S1': 4, 'S.2': 2})
+
+    def test_format_fasta_errors(self):
+        """ errors are listed, with a count of those not listed """
+        self.assertEqual(format_fasta_errors('seqs.fna',
+                                             [(0, 'empty header')], 3),
+                         'Found 3 error(s) in seqs.fna:\n'
+                         ' at byte 0: empty header\n'
+                         ' (and 2 more)')
+
+valid_fasta = """>S1_1 x=1
+ACGT
+>S1_2
+ACGTNN
+>S.2_1
+ACGTACGT
+>S.2_2
+AC
+"""
+
+invalid_fasta = """ACG
+>S1
+ACGT
+>S-1_2
+ACGT
+>S1_3
+AC1X
+>S1_4
+>
+ACGT
+"""
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+from shutil import rmtree
+from os.path import join
+from tempfile import mkdtemp
+from cogent.util.unit_test import TestCase, main
+from fixers.driver import (refactor_source,
+                           run_fixers,
+                           get_fixers_md5,
+                           get_fixer_class_name,
+                           FixerCache,
+                           all_fixer_names)
+
+class FixersTests(TestCase):
+
+    def setUp(self):
+        self.test_dir = mkdtemp(prefix='fixers_tests_')
+        self.script_fp = join(self.test_dir, 'script.py')
+        open(self.script_fp, 'w').write(example_script)
+        self.unchanged_fp = join(self.test_dir, 'unchanged.py')
+        open(self.unchanged_fp, 'w').write('x = 42\n')
+        self.broken_fp = join(self.test_dir, 'broken.py')
+        open(self.broken_fp, 'w').write('def (\n')
+
+    def tearDown(self):
+        rmtree(self.test_dir)
+
+    def test_refactor_source(self):
+        """ all fixers are applied, and their transforms counted """
+        refactored, counts = refactor_source(example_script, 'script.py')
+        self.assertEqual(refactored, expected_script)
+        self.assertEqual(counts, {'FixOptionsObject': 3,
+                                  'FixReplaceOpts': 4,
+                                  'FixReplaceArgs': 2,
+                                  'FixOptionError': 2})
+
+    def test_fix_option_error_only(self):
+        """ option_parser.error statements become raises """
+        refactored, counts = refactor_source(example_script, 'script.py',
+                                             ['fixers.fix_option_error'])
+        self.assertTrue('raise QiimeCommandError("a is bad")' in refactored)
+        self.assertTrue('f(option_parser.error)' in refactored)
+        self.assertEqual(counts, {'FixOptionError': 2})
+
+    def test_run_fixers(self):
+        """ results are cached, and failures don't stop the run """
+        fps = [self.script_fp, self.unchanged_fp, self.broken_fp]
+        cache_fp = join(self.test_dir, 'cache.json')
+        cache = FixerCache(cache_fp, get_fixers_md5(all_fixer_names))
+        results = run_fixers(fps, jobs_to_start=2, cache=cache)
+        self.assertEqual([r[4] for r in results],
+                         ['changed', 'unchanged', 'failed'])
+        self.assertEqual(results[0][2], expected_script)
+        self.assertTrue(results[2][6].startswith('ParseError'))
+        cache.save()
+
+        cache = FixerCache(cache_fp, get_fixers_md5(all_fixer_names))
+        results = run_fixers(fps, cache=cache)
+        self.assertEqual([r[4] for r in results],
+                         ['cached', 'cached', 'failed'])
+        self.assertEqual(results[0][2], expected_script)
+
+        # changing the fixers invalidates the cache
+        fixer_names = ['fixers.fix_option_error']
+        cache = FixerCache(cache_fp, get_fixers_md5(fixer_names))
+        results = run_fixers(fps, fixer_names, cache=cache)
+        self.assertEqual([r[4] for r in results],
+                         ['changed', 'unchanged', 'failed'])
+
+    def test_get_fixer_class_name(self):
+        """ fixer class names are derived as lib2to3 does """
+        self.assertEqual(get_fixer_class_name('fixers.fix_option_error'),
+                         'FixOptionError')
+
+example_script = """def main():
+    option_parser, opts, args = parse_command_line_parameters(**script_info)
+    if opts.a: option_parser.error("a is bad")
+    if opts.n > 1:
+        option_parser.error(
+         "n (%d) too big" % opts.n)
+    x = f(option_parser.error)
+    print args
+"""
+
+expected_script = """def main():
+    option_parser, options, arguments = parse_command_line_parameters(**script_info)
+    if options['a']: raise QiimeCommandError("a is bad")
+    if options['n'] > 1:
+        raise QiimeCommandError(
+         "n (%d) too big" % options['n'])
+    x = f(option_parser.error)
+    print arguments
+"""
+
+if __name__ == "__main__":
+    main()
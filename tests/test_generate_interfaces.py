@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+import sys
+from os import environ, pathsep, mkdir
+from os.path import join, dirname, abspath
+from subprocess import Popen, PIPE
+from shutil import rmtree
+from tempfile import mkdtemp
+from cogent.util.unit_test import TestCase, main
+from generate_interfaces import (get_script_metadata,
+                                 generate_script,
+                                 get_generator_md5,
+                                 load_manifest,
+                                 write_manifest)
+
+repo_dir = dirname(dirname(abspath(__file__)))
+
+class GenerateInterfacesTests(TestCase):
+
+    def setUp(self):
+        self.test_dir = mkdtemp(prefix='generate_interfaces_tests_')
+        self.input_dir = join(self.test_dir, 'scripts')
+        self.output_dir = join(self.test_dir, 'autogenerated_scripts')
+        self.package_dir = join(self.test_dir, 'autogenerated_interfaces')
+        mkdir(self.input_dir)
+        self.script_fp = join(self.input_dir, 'count_seqs.py')
+        open(self.script_fp, 'w').write(example_script)
+        open(join(self.input_dir, 'broken.py'), 'w').write(broken_script)
+
+    def tearDown(self):
+        rmtree(self.test_dir)
+
+    def run_generate_interfaces(self, *args):
+        env = dict(environ)
+        env['PYTHONPATH'] = pathsep.join([repo_dir, env.get('PYTHONPATH','')])
+        proc = Popen([sys.executable,
+                      join(repo_dir, 'generate_interfaces.py'),
+                      '-i', self.input_dir,
+                      '-o', self.output_dir,
+                      '-f', self.package_dir] + list(args),
+                     stdout=PIPE, stderr=PIPE, env=env)
+        stdout, stderr = proc.communicate()
+        return proc.returncode, stdout.strip().split('\n')
+
+    def test_get_script_metadata(self):
+        """ script metadata is read without importing the script """
+        metadata = get_script_metadata(self.script_fp)
+        self.assertEqual(metadata['__author__'], 'Greg Caporaso')
+        self.assertEqual(metadata['__credits__'],
+                         ['Greg Caporaso', 'Rob Knight'])
+        self.assertRaises(ValueError, get_script_metadata,
+                          join(self.input_dir, 'broken.py'))
+
+    def test_generate_script(self):
+        """ generated sources are returned, and failures are reported """
+        script_name, wrapper, interface, seconds, error = \
+         generate_script(('count_seqs', self.script_fp))
+        self.assertEqual(error, None)
+        self.assertTrue("get_command_class('CountSeqs')" in wrapper)
+        self.assertTrue('class CountSeqs(QiimeCommand):' in interface)
+        self.assertTrue("opts['input_fp']" in interface)
+        script_name, wrapper, interface, seconds, error = \
+         generate_script(('broken', join(self.input_dir, 'broken.py')))
+        self.assertEqual(wrapper, None)
+        self.assertTrue(error.startswith('ValueError'))
+
+    def test_generate_hand_written_script(self):
+        """ hand-written commands are imported, not generated """
+        script_name, wrapper, interface, seconds, error = \
+         generate_script(('add_taxa', self.script_fp))
+        self.assertEqual(error, None)
+        self.assertTrue("get_command_class('AddTaxa')" in wrapper)
+        self.assertTrue('from cmd_abstraction.interfaces import AddTaxa'
+                        in interface)
+        self.assertFalse('class AddTaxa' in interface)
+
+    def test_manifest(self):
+        """ manifests from other generator versions are ignored """
+        manifest_fp = join(self.test_dir, 'manifest.json')
+        self.assertEqual(load_manifest(manifest_fp, 'abc'), {})
+        write_manifest(manifest_fp, 'abc', {'count_seqs': '123'})
+        self.assertEqual(load_manifest(manifest_fp, 'abc'),
+                         {'count_seqs': '123'})
+        self.assertEqual(load_manifest(manifest_fp, 'def'), {})
+
+    def test_incremental_generation(self):
+        """ unchanged scripts are skipped, and failures don't stop the run """
+        returncode, report = self.run_generate_interfaces('-O', '2')
+        self.assertEqual(returncode, 1)
+        self.assertEqual([l.split('\t')[:2] for l in report[1:-1]],
+                         [['broken', 'failed'], ['count_seqs', 'generated']])
+        registry = open(join(self.package_dir, '__init__.py')).read()
+        self.assertTrue("'CountSeqs': 'count_seqs'," in registry)
+        self.assertFalse('Broken' in registry)
+
+        returncode, report = self.run_generate_interfaces('-s', 'count_seqs')
+        self.assertEqual(returncode, 0)
+        self.assertEqual(report[1].split('\t')[:2],
+                         ['count_seqs', 'unchanged'])
+
+        open(self.script_fp, 'a').write('\n')
+        returncode, report = self.run_generate_interfaces('-s', 'count_seqs')
+        self.assertEqual(report[1].split('\t')[:2],
+                         ['count_seqs', 'generated'])
+
+        returncode, report = self.run_generate_interfaces('-s', 'count_seqs',
+                                                          '--force')
+        self.assertEqual(report[1].split('\t')[:2],
+                         ['count_seqs', 'generated'])
+
+    def test_subset_generation(self):
+        """ generating a subset keeps the other commands in the registry """
+        open(join(self.input_dir, 'broken.py'), 'w').write(
+         example_script.replace('Count sequences', 'Count reads'))
+        returncode, report = self.run_generate_interfaces()
+        self.assertEqual(returncode, 0)
+        returncode, report = self.run_generate_interfaces('-s', 'count_seqs',
+                                                          '--force')
+        self.assertEqual(returncode, 0)
+        self.assertEqual([l.split('\t')[:2] for l in report[1:-1]],
+                         [['count_seqs', 'generated']])
+        registry = open(join(self.package_dir, '__init__.py')).read()
+        self.assertTrue("'CountSeqs': 'count_seqs'," in registry)
+        self.assertTrue("'Broken': 'broken'," in registry)
+        self.assertEqual(
+         sorted(load_manifest(join(self.package_dir,
+                                   'generation_manifest.json'),
+                              get_generator_md5())),
+         ['broken', 'count_seqs'])
+        # the other scripts are still skipped while unchanged
+        returncode, report = self.run_generate_interfaces()
+        self.assertEqual([l.split('\t')[:2] for l in report[1:-1]],
+                         [['broken', 'unchanged'], ['count_seqs', 'unchanged']])
+
+example_script = """#!/usr/bin/env python
+# File created on 01 Aug 2012
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso", "Rob Knight"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+from qiime.util import parse_command_line_parameters, make_option
+
+script_info = {}
+script_info['brief_description'] = "Count sequences"
+script_info['script_description'] = "Count the sequences in a fasta file."
+script_info['script_usage'] = []
+script_info['output_description']= "The count is printed."
+script_info['required_options'] = [
+ make_option('-i','--input_fp',type="existing_filepath",help='the input'),
+]
+script_info['optional_options'] = []
+script_info['version'] = __version__
+
+def main():
+    option_parser, opts, args =\\
+       parse_command_line_parameters(**script_info)
+    print len([l for l in open(opts.input_fp) if l.startswith('>')])
+
+if __name__ == "__main__":
+    main()
+"""
+
+broken_script = """#!/usr/bin/env python
+__author__ = "Greg Caporaso"
+
+def main():
+    pass
+"""
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+from os import remove
+from shutil import rmtree
+from os.path import exists, join
+from hashlib import md5
+from cogent.util.unit_test import TestCase, main
+from cogent.util.misc import create_dir
+from qiime.util import (get_qiime_temp_dir,
+                        get_tmp_filename)
+from qiime.test import initiate_timeout, disable_timeout
+from cmd_abstraction.hashing import (compute_file_md5,
+                                     get_file_md5s,
+                                     DigestCache,
+                                     BackgroundInputMd5s,
+                                     HeldInputMd5sLogger,
+                                     log_input_md5s)
+
+class FakeLogger(object):
+
+    def __init__(self):
+        self.lines = []
+
+    def write(self, s):
+        self.lines.append(s)
+
+class HashingTests(TestCase):
+
+    def setUp(self):
+
+        self.dirs_to_remove = []
+
+        tmp_dir = get_qiime_temp_dir()
+        self.test_out = get_tmp_filename(tmp_dir=tmp_dir,
+                                         prefix='hashing_tests_',
+                                         suffix='',
+                                         result_constructor=str)
+        self.dirs_to_remove.append(self.test_out)
+        create_dir(self.test_out)
+
+        self.small_fp = join(self.test_out, 'small.txt')
+        open(self.small_fp, 'w').write(small_data)
+        # large enough to be memory-mapped
+        self.large_fp = join(self.test_out, 'large.txt')
+        open(self.large_fp, 'w').write(large_data)
+        self.empty_fp = join(self.test_out, 'empty.txt')
+        open(self.empty_fp, 'w').close()
+        self.cache_fp = join(self.test_out, 'cache', 'md5_cache.json')
+
+        initiate_timeout(60)
+
+    def tearDown(self):
+
+        disable_timeout()
+        for d in self.dirs_to_remove:
+            if exists(d):
+                rmtree(d)
+
+    def test_compute_file_md5(self):
+        """ md5s are correct for small, large and empty files """
+        self.assertEqual(compute_file_md5(self.small_fp),
+                         md5(small_data).hexdigest())
+        self.assertEqual(compute_file_md5(self.large_fp),
+                         md5(large_data).hexdigest())
+        self.assertEqual(compute_file_md5(self.empty_fp),
+                         md5('').hexdigest())
+
+    def test_get_file_md5s(self):
+        """ md5s are returned in input order when hashed concurrently """
+        fps = [self.large_fp, self.small_fp, self.empty_fp]
+        expected = map(compute_file_md5, fps)
+        self.assertEqual(get_file_md5s(fps, jobs=3), expected)
+        self.assertEqual(get_file_md5s(fps, jobs=1), expected)
+
+    def test_digest_cache(self):
+        """ cached md5s are reused until the file changes """
+        digest_cache = DigestCache(self.cache_fp)
+        self.assertEqual(digest_cache.getMd5(self.small_fp),
+                         md5(small_data).hexdigest())
+        digest_cache.save()
+        self.assertTrue(exists(self.cache_fp))
+
+        # a new cache reads the saved md5s
+        digest_cache = DigestCache(self.cache_fp)
+        self.assertEqual(len(digest_cache._entries), 1)
+
+        # hits don't rewrite the cache
+        remove(self.cache_fp)
+        self.assertEqual(digest_cache.getMd5(self.small_fp),
+                         md5(small_data).hexdigest())
+        digest_cache.save()
+        self.assertFalse(exists(self.cache_fp))
+
+        # changing the file changes its size, so it is re-hashed
+        open(self.small_fp, 'a').write('more')
+        self.assertEqual(digest_cache.getMd5(self.small_fp),
+                         md5(small_data + 'more').hexdigest())
+
+    def test_background_md5s_match_foreground(self):
+        """ background hashing logs exactly what foreground hashing does """
+        fps = [self.small_fp, None, self.large_fp]
+        foreground_logger = FakeLogger()
+        log_input_md5s(foreground_logger, fps)
+        background_logger = FakeLogger()
+        background_md5s = BackgroundInputMd5s(fps)
+        background_md5s.start()
+        background_md5s.write(background_logger)
+        self.assertEqual(background_logger.lines, foreground_logger.lines)
+        self.assertEqual(foreground_logger.lines[0], 'Input file md5 sums:\n')
+        self.assertEqual(foreground_logger.lines[1],
+                         '%s: %s\n' % (self.small_fp,
+                                       md5(small_data).hexdigest()))
+
+    def test_held_logger_writes_md5s_first(self):
+        """ writes made while hashing are logged after the md5s """
+        fps = [self.small_fp, self.large_fp]
+        expected = FakeLogger()
+        expected.write('Command:\n')
+        log_input_md5s(expected, fps)
+        expected.write('step 1\n')
+        expected.write('step 2\n')
+        logger = FakeLogger()
+        logger.write('Command:\n')
+        background_md5s = BackgroundInputMd5s(fps)
+        background_md5s.start()
+        held_logger = HeldInputMd5sLogger(logger, background_md5s)
+        held_logger.write('step 1\n')
+        held_logger.write('step 2\n')
+        held_logger.release()
+        self.assertEqual(logger.lines, expected.lines)
+        # once released, writes pass straight through
+        held_logger.write('step 3\n')
+        held_logger.release()
+        self.assertEqual(logger.lines, expected.lines + ['step 3\n'])
+
+small_data = "ACGT\n"
+large_data = "ACGT" * 2**19
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+import sys
+import bz2
+import gzip
+from os.path import join
+from shutil import rmtree
+from StringIO import StringIO
+from tempfile import mkdtemp
+from cogent.util.unit_test import TestCase, main
+from qiime.test import initiate_timeout, disable_timeout
+from qiime.workflow import WorkflowLogger, no_status_updates
+from cmd_abstraction.command_handlers import make_dag_command_handler
+from cmd_abstraction.input_files import (get_compression,
+                                         get_uncompressed_basename,
+                                         iter_decompressed_blocks,
+                                         translate_newlines,
+                                         open_input,
+                                         decompressing_step,
+                                         decompress_commands,
+                                         make_decompressing_command_handler)
+
+def write_gzip(fp, data, num_streams=1):
+    """ Write data to fp as num_streams concatenated gzip streams
+    """
+    f = open(fp, 'wb')
+    size = len(data) // num_streams + 1
+    for i in range(num_streams):
+        gzip_f = gzip.GzipFile(fileobj=f, mode='wb')
+        gzip_f.write(data[i * size:(i + 1) * size])
+        gzip_f.close()
+    f.close()
+
+def write_bz2(fp, data, num_streams=1):
+    """ Write data to fp as num_streams concatenated bz2 streams
+    """
+    f = open(fp, 'wb')
+    size = len(data) // num_streams + 1
+    for i in range(num_streams):
+        f.write(bz2.compress(data[i * size:(i + 1) * size]))
+    f.close()
+
+class InputFilesTests(TestCase):
+
+    def setUp(self):
+        self.test_dir = mkdtemp(prefix='input_files_tests_')
+        self.plain_fp = join(self.test_dir, 'seqs.fna')
+        open(self.plain_fp, 'wb').write(fasta)
+        self.gzip_fp = join(self.test_dir, 'seqs.fna.gz')
+        write_gzip(self.gzip_fp, fasta)
+        self.bz2_fp = join(self.test_dir, 'seqs.fna.bz2')
+        write_bz2(self.bz2_fp, fasta)
+        initiate_timeout(60)
+
+    def tearDown(self):
+        disable_timeout()
+        rmtree(self.test_dir)
+
+    def test_get_compression(self):
+        """ compression is detected from the file's contents """
+        self.assertEqual(get_compression(self.plain_fp), None)
+        self.assertEqual(get_compression(self.gzip_fp), 'gzip')
+        self.assertEqual(get_compression(self.bz2_fp), 'bz2')
+        # not from its name
+        misnamed_fp = join(self.test_dir, 'seqs.txt')
+        write_gzip(misnamed_fp, fasta)
+        self.assertEqual(get_compression(misnamed_fp), 'gzip')
+        empty_fp = join(self.test_dir, 'empty.gz')
+        open(empty_fp, 'w').close()
+        self.assertEqual(get_compression(empty_fp), None)
+
+    def test_get_uncompressed_basename(self):
+        """ compression extensions are removed """
+        self.assertEqual(get_uncompressed_basename('/a/t.biom.gz'), 't.biom')
+        self.assertEqual(get_uncompressed_basename('t.biom.BZ2'), 't.biom')
+        self.assertEqual(get_uncompressed_basename('/a/t.biom'), 't.biom')
+
+    def test_iter_decompressed_blocks(self):
+        """ every stream of multi-stream files is decompressed """
+        for write, compression in [(write_gzip, 'gzip'), (write_bz2, 'bz2')]:
+            fp = join(self.test_dir, 'multi')
+            write(fp, fasta, 3)
+            for block_size in [1, 7, 1024]:
+                blocks = iter_decompressed_blocks(open(fp, 'rb'),
+                                                  compression, block_size)
+                self.assertEqual(''.join(blocks), fasta)
+
+    def test_translate_newlines(self):
+        """ line endings are translated, including across blocks """
+        self.assertEqual(list(translate_newlines(['a\r', '\nb\r', 'c\r\n',
+                                                  'd\r'])),
+                         ['a', '\nb', '\nc\n', 'd', '\n'])
+
+    def test_open_input(self):
+        """ compressed files are read as their decompressed data """
+        plain_f = open_input(self.plain_fp)
+        self.assertTrue(isinstance(plain_f, file))
+        plain_f.close()
+        for fp in [self.gzip_fp, self.bz2_fp]:
+            f = open_input(fp, 'rb')
+            self.assertEqual(f.readline(), '>S1_1\r\n')
+            self.assertEqual(f.read(4), 'ACGT')
+            self.assertEqual(f.read(), fasta[11:])
+            self.assertEqual(f.read(), '')
+            f.close()
+            self.assertEqual(list(open_input(fp)),
+                             list(StringIO(fasta.replace('\r\n', '\n'))))
+
+    def test_open_input_closed_early(self):
+        """ closing a file stops its decompression """
+        fp = join(self.test_dir, 'big.gz')
+        write_gzip(fp, fasta * 100000)
+        f = open_input(fp)
+        f.readline()
+        thread = f.raw._thread
+        f.close()
+        thread.join(10)
+        self.assertFalse(thread.is_alive())
+
+    def test_open_input_invalid(self):
+        """ truncated compressed files raise errors when they're read """
+        for compressed_fp in [self.gzip_fp, self.bz2_fp]:
+            fp = join(self.test_dir, 'truncated')
+            open(fp, 'wb').write(open(compressed_fp, 'rb').read()[:-6])
+            f = open_input(fp)
+            self.assertRaises(IOError, f.read)
+            f.close()
+
+    def test_decompressing_step(self):
+        """ steps reading the input read it through a named pipe """
+        step = ('Pick OTUs', 'pick_otus.py -i %s -o out' % self.gzip_fp)
+        self.assertEqual(decompressing_step(step, self.gzip_fp, 'py'),
+                         ('Pick OTUs', 'py -m cmd_abstraction.input_files '
+                          'stream %s -- pick_otus.py -i %s -o out' %
+                          (self.gzip_fp, self.gzip_fp)))
+        other_step = ('Pick rep set', 'pick_rep_set.py -i out/otus.txt')
+        self.assertEqual(decompressing_step(other_step, self.gzip_fp),
+                         other_step)
+        self.assertRaises(ValueError, decompressing_step,
+                          ('Count', 'echo x | grep -c x %s' % self.gzip_fp),
+                          self.gzip_fp)
+        self.assertEqual(decompress_commands([[other_step]], self.gzip_fp),
+                         [[other_step]])
+
+    def test_decompressing_command_handler(self):
+        """ steps read the decompressed input through a named pipe """
+        output_fp = join(self.test_dir, 'out.txt')
+        names_fp = join(self.test_dir, 'names.txt')
+        commands = [[('Copy', 'cat %s > %s' % (self.bz2_fp, output_fp)),
+                     ('Name', '%s -c "import sys; print sys.argv[1]" '
+                              '--input=%s > %s' % (sys.executable,
+                                                   self.bz2_fp, names_fp))]]
+        command_handler = make_decompressing_command_handler(
+                            make_dag_command_handler(2),
+                            self.bz2_fp)
+        command_handler(commands, no_status_updates, WorkflowLogger())
+        self.assertEqual(open(output_fp, 'rb').read(), fasta)
+        # the named pipe has the input's name
+        name = open(names_fp).read().strip()
+        self.assertTrue(name.startswith('--input='))
+        self.assertTrue(name.endswith('/seqs.fna.bz2'))
+        self.assertNotEqual(name, '--input=%s' % self.bz2_fp)
+
+fasta = """>S1_1\r
+ACGTACGT\r
+>S1_2\r
+ACGTAAAA\r
+>S2_3\r
+CCCCGGGG\r
+"""
+
+if __name__ == "__main__":
+    main()
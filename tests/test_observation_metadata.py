@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+from StringIO import StringIO
+from cogent.util.unit_test import TestCase, main
+from cmd_abstraction.observation_metadata import (split_taxonomy,
+                                                  InternedColumn,
+                                                  parse_taxonomy_columns)
+
+class ObservationMetadataTests(TestCase):
+
+    def setUp(self):
+        self.columns = parse_taxonomy_columns(StringIO(taxonomy))
+
+    def test_split_taxonomy(self):
+        """ levels are stripped, and shared between assignments """
+        levels1 = split_taxonomy('k__Bacteria; p__' + 'Firmicutes')
+        levels2 = split_taxonomy('k__Bacteria;p__Firmicutes ')
+        self.assertEqual(levels1, ['k__Bacteria', 'p__Firmicutes'])
+        self.assertEqual(levels1, levels2)
+        self.assertTrue(levels1[1] is levels2[1])
+
+    def test_interned_column(self):
+        """ each distinct field is processed once """
+        processed = []
+        def process_f(field):
+            processed.append(field)
+            return field.upper()
+        column = InternedColumn(process_f)
+        column.extend(['a', 'b', 'a', 'a'])
+        self.assertEqual(column.take([3, 1, 0]), ['A', 'B', 'A'])
+        self.assertEqual(processed, ['a', 'b'])
+        self.assertEqual(column.getNumValues(), 2)
+
+    def test_parse_taxonomy_columns(self):
+        """ taxonomy files are parsed as parse_taxonomy_to_otu_metadata """
+        self.assertEqual(len(self.columns), 4)
+        self.assertEqual(self.columns.Labels, ['taxonomy', 'score'])
+        self.assertTrue('OTU1' in self.columns)
+        self.assertFalse('OTU5' in self.columns)
+        self.assertEqual(self.columns.getMetadata('OTU1'),
+                         {'taxonomy': ['k__Bacteria', 'p__Firmicutes'],
+                          'score': 0.9})
+        # only the first word of the id is used, and later lines replace
+        # earlier ones
+        self.assertEqual(self.columns.getMetadata('OTU2'),
+                         {'taxonomy': ['k__Archaea'], 'score': 0.25})
+        # fields beyond the labels are ignored, and missing fields are
+        # left out
+        self.assertEqual(self.columns.getMetadata('OTU3'),
+                         {'taxonomy': ['k__Bacteria', 'p__Firmicutes'],
+                          'score': 1.0})
+        self.assertEqual(self.columns.getMetadata('OTU4'),
+                         {'taxonomy': ['Unassigned']})
+        # invalid scores are errors, as with parse_taxonomy_to_otu_metadata
+        self.assertRaises(ValueError, parse_taxonomy_columns,
+                          ['OTU1\tk__Bacteria\thigh'])
+
+    def test_parse_taxonomy_columns_process_fs(self):
+        """ fields are processed with process_fs, if provided """
+        columns = parse_taxonomy_columns(StringIO(taxonomy),
+                                         ['taxonomy', 'score'], [str, str])
+        self.assertEqual(columns.getMetadata('OTU1'),
+                         {'taxonomy': 'k__Bacteria; p__Firmicutes',
+                          'score': '0.9'})
+        columns = parse_taxonomy_columns(StringIO(taxonomy), ['taxonomy'],
+                                         [str])
+        self.assertEqual(columns.getMetadata('OTU3'),
+                         {'taxonomy': 'k__Bacteria;p__Firmicutes'})
+        # fields need processing functions
+        self.assertRaises(ValueError, parse_taxonomy_columns,
+                          StringIO(taxonomy), ['taxonomy', 'score'], [str])
+        # labels can be empty
+        columns = parse_taxonomy_columns(StringIO(taxonomy), [], [])
+        self.assertEqual(columns.getMetadata('OTU1'), {})
+
+    def test_get_table_metadata(self):
+        """ metadata is returned for the table's ids, with unmatched ids """
+        metadata, missing_ids, extra_ids = \
+         self.columns.getTableMetadata(['OTU3', 'OTU5', 'OTU1', 'OTU6'])
+        self.assertEqual(metadata,
+                         {'OTU3': {'taxonomy': ['k__Bacteria',
+                                                'p__Firmicutes'],
+                                   'score': 1.0},
+                          'OTU1': {'taxonomy': ['k__Bacteria',
+                                                'p__Firmicutes'],
+                                   'score': 0.9}})
+        self.assertEqual(missing_ids, ['OTU5', 'OTU6'])
+        self.assertEqual(extra_ids, ['OTU4', 'OTU2'])
+        # equal levels are shared, and equal assignments share a list
+        self.assertTrue(metadata['OTU1']['taxonomy'][1] is
+                        metadata['OTU3']['taxonomy'][1])
+        self.assertTrue(metadata['OTU1']['taxonomy'] is
+                        self.columns.getMetadata('OTU1')['taxonomy'])
+        self.assertEqual(list(self.columns.getRows(['OTU2', 'OTU5'])),
+                         [4, -1])
+
+taxonomy = """OTU1\tk__Bacteria; p__Firmicutes\t0.9
+OTU2 description\tk__Bacteria\t0.5
+
+OTU4\tUnassigned
+OTU3\tk__Bacteria;p__Firmicutes\t1.0\tcomment
+OTU2\tk__Archaea\t0.25
+"""
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+from json import load
+from shutil import rmtree
+from os.path import join
+from tempfile import mkdtemp
+from cogent.util.unit_test import TestCase, main
+from cmd_abstraction.profiling import PhaseProfiler
+
+class PhaseProfilerTests(TestCase):
+
+    def test_phase(self):
+        """ nested phases are recorded in the order they finish """
+        profiler = PhaseProfiler()
+        with profiler.phase('outer'):
+            with profiler.phase('inner'):
+                pass
+            try:
+                with profiler.phase('failed'):
+                    raise ValueError
+            except ValueError:
+                pass
+        with profiler.phase('next'):
+            sum(range(100000))
+        phases = profiler.getPhases()
+        self.assertEqual([p['name'] for p in phases],
+                         ['outer/inner', 'outer/failed', 'outer', 'next'])
+        for p in phases:
+            self.assertTrue(p['wall_seconds'] >= 0)
+            self.assertTrue(p['cpu_seconds'] >= 0)
+            self.assertTrue(p['peak_rss_kb'] > 0)
+
+    def test_writeJson(self):
+        """ phases and metadata are written as JSON """
+        test_dir = mkdtemp(prefix='profiling_tests_')
+        try:
+            profiler = PhaseProfiler()
+            profiler.addPhase('parse_options', 1.5, 1.0, 2048)
+            fp = join(test_dir, 'profile.json')
+            profiler.writeJson(fp, command='AddTaxa')
+            self.assertEqual(load(open(fp)),
+                             {'command': 'AddTaxa',
+                              'phases': [{'name': 'parse_options',
+                                          'wall_seconds': 1.5,
+                                          'cpu_seconds': 1.0,
+                                          'peak_rss_kb': 2048}]})
+        finally:
+            rmtree(test_dir)
+
+if __name__ == "__main__":
+    main()
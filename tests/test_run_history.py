@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+import sys
+from multiprocessing import Process
+from os.path import join
+from shutil import rmtree
+from tempfile import mkdtemp
+from cogent.util.unit_test import TestCase, main
+from qiime.test import initiate_timeout, disable_timeout
+from qiime.util import make_option, parse_command_line_parameters
+from cmd_abstraction.hashing import compute_file_md5
+from cmd_abstraction.util import QiimeCommand, get_options_dict
+from cmd_abstraction.run_history import (get_options_md5,
+                                         get_filesystem_type,
+                                         get_journal_mode,
+                                         connect_run_history,
+                                         record_run,
+                                         median,
+                                         get_run_trends,
+                                         format_run_trends)
+
+class CountSeqsCommand(QiimeCommand):
+    _required_options = [make_option('-i','--input_fp',
+                                     type='existing_filepath')]
+    _optional_options = [make_option('-n','--num_seqs',type='int',default=1)]
+    _input_file_parameter_ids = ['input_fp']
+    _digest_cache_fp = None
+
+    def run_command(self, params, args):
+        with self.phase('count_seqs'):
+            if params['num_seqs'] < 0:
+                raise ValueError, "num_seqs must be positive"
+            elif params['num_seqs'] == 0:
+                sys.exit()
+            elif params['num_seqs'] > 1000:
+                sys.exit('too many sequences')
+
+def record_runs(history_fp, command, num_runs):
+    for i in range(num_runs):
+        record_run(history_fp, command, '1.0', {'i': i}, [command],
+                   1000.0 + i, 1001.0 + i, 0,
+                   phases=[{'name': 'run_command', 'wall_seconds': 1.0,
+                            'cpu_seconds': 0.5, 'peak_rss_kb': 1024}])
+
+class RunHistoryTests(TestCase):
+
+    def setUp(self):
+        self.test_dir = mkdtemp(prefix='run_history_tests_')
+        self.history_fp = join(self.test_dir, 'history', 'runs.sqlite')
+        initiate_timeout(60)
+
+    def tearDown(self):
+        disable_timeout()
+        rmtree(self.test_dir)
+
+    def test_get_filesystem_type(self):
+        """ file systems are found in the mount table """
+        mounts_fp = join(self.test_dir, 'mounts')
+        open(mounts_fp, 'w').write(
+         'rootfs / ext4 rw 0 0\n'
+         'server:/home /home nfs4 rw 0 0\n'
+         'tmpfs /home/scratch\\040space tmpfs rw 0 0\n')
+        self.assertEqual(get_filesystem_type('/var/tmp', mounts_fp), 'ext4')
+        self.assertEqual(get_filesystem_type('/home/greg', mounts_fp), 'nfs4')
+        self.assertEqual(get_filesystem_type('/homes', mounts_fp), 'ext4')
+        self.assertEqual(
+         get_filesystem_type('/home/scratch space/x', mounts_fp), 'tmpfs')
+        self.assertEqual(get_filesystem_type('/var/tmp',
+                                             join(self.test_dir, 'none')),
+                         None)
+        # write-ahead logging is only used on local file systems
+        self.assertEqual(get_journal_mode('/var/tmp/runs.sqlite', mounts_fp),
+                         'wal')
+        self.assertEqual(get_journal_mode('/home/greg/runs.sqlite',
+                                          mounts_fp),
+                         'delete')
+        self.assertEqual(get_journal_mode('/var/tmp/runs.sqlite',
+                                          join(self.test_dir, 'none')),
+                         'delete')
+
+    def test_get_options_md5(self):
+        """ equal options have the same md5, whatever their order """
+        self.assertEqual(get_options_md5({'a': 1, 'b': 'x'}),
+                         get_options_md5({'b': 'x', 'a': 1}))
+        self.assertNotEqual(get_options_md5({'a': 1}),
+                            get_options_md5({'a': 2}))
+
+    def test_record_run(self):
+        """ a run is recorded with its inputs and phases """
+        input_fp = join(self.test_dir, 'seqs.fna')
+        open(input_fp, 'w').write('>s1\nACGT\n')
+        run_id = record_run(self.history_fp, 'AddTaxa', '1.5.0-dev',
+                            {'input_fp': input_fp}, ['add_taxa.py', '-i', 'x'],
+                            100.0, 102.5, 1, error='ValueError: oops',
+                            input_md5s=[(input_fp, 'abc')],
+                            phases=[{'name': 'run_command',
+                                     'wall_seconds': 2.0,
+                                     'cpu_seconds': 1.5,
+                                     'peak_rss_kb': 2048}])
+        conn = connect_run_history(self.history_fp)
+        self.assertEqual(conn.execute(
+         'SELECT run_id, command, command_line, start_time, end_time, '
+         'exit_status, error FROM runs').fetchall(),
+         [(run_id, u'AddTaxa', u'add_taxa.py -i x', 100.0, 102.5, 1,
+           u'ValueError: oops')])
+        self.assertEqual(conn.execute('SELECT * FROM run_inputs').fetchall(),
+                         [(run_id, input_fp, u'abc', 9)])
+        self.assertEqual(conn.execute('SELECT * FROM run_phases').fetchall(),
+                         [(run_id, u'run_command', 2.0, 1.5, 2048)])
+        conn.close()
+
+    def test_concurrent_writes(self):
+        """ runs recorded by concurrent processes are all kept """
+        workers = [Process(target=record_runs,
+                           args=(self.history_fp, 'Command%d' % i, 20))
+                   for i in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+            self.assertEqual(worker.exitcode, 0)
+        conn = connect_run_history(self.history_fp)
+        self.assertEqual(conn.execute(
+         'SELECT command, COUNT(*) FROM runs GROUP BY command').fetchall(),
+         [('Command%d' % i, 20) for i in range(4)])
+        self.assertEqual(conn.execute(
+         'SELECT COUNT(*) FROM run_phases').fetchone(), (80,))
+        conn.close()
+
+    def test_command_records_run(self):
+        """ QiimeCommand records each run, whether or not it succeeds """
+        input_fp = join(self.test_dir, 'seqs.fna')
+        open(input_fp, 'w').write('>s1\nACGT\n')
+        CountSeqsCommand._run_history_fp = self.history_fp
+        for num_seqs in ['1', '-1']:
+            argv = ['-i', input_fp, '-n', num_seqs,
+                    '--master_script_log_dir', self.test_dir]
+            script_info = CountSeqsCommand().getScriptInfo()
+            script_info['command_line_args'] = argv
+            option_parser, options, arguments = \
+             parse_command_line_parameters(**script_info)
+            try:
+                CountSeqsCommand()(get_options_dict(options), arguments, argv)
+            except ValueError:
+                pass
+        conn = connect_run_history(self.history_fp)
+        self.assertEqual(conn.execute(
+         'SELECT command, exit_status, error FROM runs').fetchall(),
+         [(u'CountSeqsCommand', 0, None),
+          (u'CountSeqsCommand', 1, u'ValueError: num_seqs must be positive')])
+        self.assertEqual(conn.execute(
+         'SELECT DISTINCT fp, md5, size_bytes FROM run_inputs').fetchall(),
+         [(input_fp, compute_file_md5(input_fp), 9)])
+        self.assertEqual(conn.execute(
+         'SELECT name FROM run_phases WHERE run_id = 1').fetchall(),
+         [(u'start_logging/setup_logger',), (u'start_logging/log_input_md5s',),
+          (u'start_logging',), (u'run_command/count_seqs',),
+          (u'run_command',), (u'stop_logging',)])
+        conn.close()
+
+    def test_command_records_exit_status(self):
+        """ exit codes are recorded as the interpreter would exit with them """
+        input_fp = join(self.test_dir, 'seqs.fna')
+        open(input_fp, 'w').write('>s1\nACGT\n')
+        CountSeqsCommand._run_history_fp = self.history_fp
+        for num_seqs in ['0', '1001']:
+            argv = ['-i', input_fp, '-n', num_seqs,
+                    '--master_script_log_dir', self.test_dir]
+            script_info = CountSeqsCommand().getScriptInfo()
+            script_info['command_line_args'] = argv
+            option_parser, options, arguments = \
+             parse_command_line_parameters(**script_info)
+            self.assertRaises(SystemExit, CountSeqsCommand(),
+                              get_options_dict(options), arguments, argv)
+        conn = connect_run_history(self.history_fp)
+        self.assertEqual(conn.execute(
+         'SELECT exit_status, error FROM runs').fetchall(),
+         [(0, None), (1, u'SystemExit: too many sequences')])
+        conn.close()
+
+    def test_median(self):
+        """ median handles odd and even numbers of values """
+        self.assertEqual(median([3, 1, 2]), 2)
+        self.assertEqual(median([4, 1, 2, 3]), 2.5)
+
+    def test_get_run_trends(self):
+        """ runs are summarized per command and period """
+        input_fp = join(self.test_dir, 'seqs.fna')
+        open(input_fp, 'w').write('A' * 1024 * 1024)
+        day = 86400
+        for command, start, seconds, status in [('A', 0, 2.0, 0),
+                                                ('A', 10, 4.0, 0),
+                                                ('A', 20, 9.0, 1),
+                                                ('A', day + 5, 1.0, 0),
+                                                ('B', 30, 5.0, 0)]:
+            record_run(self.history_fp, command, '1.0', {}, [], start,
+                       start + seconds, status,
+                       input_md5s=[(input_fp, None)],
+                       phases=[{'name': 'p', 'wall_seconds': seconds / 2,
+                                'cpu_seconds': None, 'peak_rss_kb': None}])
+        conn = connect_run_history(self.history_fp)
+        self.assertEqual(get_run_trends(conn),
+                         [('A', 0, 3, 1, 4.0, 9.0, 2 / 6),
+                          ('A', day, 1, 0, 1.0, 1.0, 1.0),
+                          ('B', 0, 1, 0, 5.0, 5.0, 1 / 5)])
+        self.assertEqual(get_run_trends(conn, command='A', since=5),
+                         [('A', 0, 2, 1, 6.5, 9.0, 1 / 4),
+                          ('A', day, 1, 0, 1.0, 1.0, 1.0)])
+        self.assertEqual(get_run_trends(conn, command='A', period='week',
+                                        phase='p'),
+                         [('A', 0, 4, 1, 1.5, 4.5, 3 / 3.5)])
+        self.assertEqual(format_run_trends(get_run_trends(conn, command='B')),
+                         '#command\tday\truns\tfailures\tmedian seconds\t'
+                         'max seconds\tMB/second\n'
+                         'B\t1970-01-01\t1\t0\t5.00\t5.00\t0.200')
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+from cogent.util.unit_test import TestCase, main
+from qiime.test import initiate_timeout, disable_timeout
+from qiime.workflow import WorkflowLogger, no_status_updates
+from cmd_abstraction.util import WorkflowCommand, QiimeCommandError
+from cmd_abstraction.command_handlers import call_commands_as_dag
+from cmd_abstraction.executors import LocalPoolExecutor
+from cmd_abstraction.scheduler import (StepRequirements,
+                                       default_requirements,
+                                       get_step_script_name,
+                                       get_step_requirements,
+                                       parse_step_requirements,
+                                       get_host_resources,
+                                       ResourceScheduler)
+
+class StepRequirementsTests(TestCase):
+
+    def test_get_step_script_name(self):
+        """ the script a step runs is found """
+        self.assertEqual(get_step_script_name(
+         'python /qiime/scripts/pick_otus.py -i seqs.fna -o out'),
+         'pick_otus.py')
+        self.assertEqual(get_step_script_name('cat a.txt > b.txt'), None)
+
+    def test_get_step_requirements(self):
+        """ requirements are looked up by script name """
+        self.assertEqual(get_step_requirements('pick_otus.py -i s.fna'),
+                         StepRequirements(1, 2048))
+        self.assertEqual(get_step_requirements('cat a.txt > b.txt'),
+                         default_requirements)
+        # parallel scripts need their requirements once per job
+        self.assertEqual(get_step_requirements(
+         'parallel_align_seqs_pynast.py -i rep_set.fna -O 4'),
+         StepRequirements(4, 2048))
+        self.assertEqual(get_step_requirements('big.py',
+                                               {'big.py': (2, 100)}),
+                         (2, 100))
+
+    def test_parse_step_requirements(self):
+        """ requirements are parsed, and override the defaults """
+        actual = parse_step_requirements(['# script\tcores\tmemory',
+                                          'pick_otus.py\t1\t8000',
+                                          'big.py\t2\t100'])
+        self.assertEqual(actual['pick_otus.py'], (1, 8000))
+        self.assertEqual(actual['big.py'], (2, 100))
+        self.assertEqual(actual['make_phylogeny.py'], (1, 2048))
+        self.assertRaises(ValueError, parse_step_requirements,
+                          ['big.py 2 100'])
+
+    def test_get_host_resources(self):
+        """ host cores and memory are found """
+        cores, memory_mb = get_host_resources()
+        self.assertTrue(cores >= 1)
+        self.assertTrue(memory_mb > 0)
+
+class ResourceSchedulerTests(TestCase):
+
+    def setUp(self):
+        self.scheduler = ResourceScheduler(4, 1000, synthetic_requirements)
+        initiate_timeout(60)
+
+    def tearDown(self):
+        disable_timeout()
+
+    def test_select_steps(self):
+        """ steps are packed into the budget, first-fit """
+        ready = [(0, 'big.py'), (1, 'big.py'), (2, 'small.py'),
+                 (3, 'wide.py'), (4, 'small.py')]
+        # one big step fills most of the memory, and two small steps use 
+        # what's left; the wide step needs cores which aren't left
+        self.assertEqual(self.scheduler.selectSteps(ready), [0, 2, 4])
+        self.assertEqual(self.scheduler.getAvailable(), (1, 200))
+        self.assertEqual(self.scheduler.selectSteps([(1, 'big.py'),
+                                                     (3, 'wide.py')]), [])
+        self.scheduler.finish(0)
+        self.assertEqual(self.scheduler.selectSteps([(1, 'big.py'),
+                                                     (3, 'wide.py')]), [1])
+        self.scheduler.finish(1)
+        self.scheduler.finish(2)
+        self.scheduler.finish(4)
+        self.assertEqual(self.scheduler.getAvailable(), (4, 1000))
+
+    def test_oversized_steps(self):
+        """ steps needing more than the budget run alone """
+        self.assertEqual(self.scheduler.getRequirements('huge.py'),
+                         (4, 1000))
+        self.assertEqual(self.scheduler.selectSteps([(0, 'small.py'),
+                                                     (1, 'huge.py')]), [0])
+        self.scheduler.finish(0)
+        self.assertEqual(self.scheduler.selectSteps([(1, 'huge.py'),
+                                                     (2, 'small.py')]), [1])
+
+    def test_call_commands_as_dag(self):
+        """ concurrent steps never exceed the budget """
+        steps = [('step %d' % i, 'true %s && sleep 0.1' % script_name)
+                 for i, script_name in
+                 enumerate(['big.py', 'small.py', 'big.py', 'wide.py',
+                            'small.py', 'small.py', 'huge.py', 'big.py'])]
+        executor = RecordingExecutor(4)
+        call_commands_as_dag([steps],
+                             no_status_updates,
+                             WorkflowLogger(),
+                             jobs_to_start=4,
+                             executor_factory=lambda jobs: executor,
+                             scheduler=self.scheduler)
+        self.assertEqual(sorted(executor.submitted), range(len(steps)))
+        self.assertTrue(executor.peak_cores <= 4)
+        self.assertTrue(executor.peak_memory_mb <= 1000)
+        # steps were run at the same time, where they fit
+        self.assertTrue(executor.peak_cores > 1)
+
+    def test_get_scheduler(self):
+        """ the budget is taken from the options """
+        cmd = WorkflowCommand()
+        scheduler = cmd._get_scheduler({'max_cores': 2,
+                                        'max_memory_mb': 512})
+        self.assertEqual((scheduler.cores, scheduler.memory_mb), (2, 512))
+        self.assertRaises(QiimeCommandError, cmd._get_scheduler,
+                          {'max_cores': 0})
+
+class RecordingExecutor(LocalPoolExecutor):
+    """ Record the peak requirements of the steps running at once """
+
+    def __init__(self, jobs_to_start):
+        LocalPoolExecutor.__init__(self, jobs_to_start)
+        self.submitted = []
+        self.running = {}
+        self.peak_cores = 0
+        self.peak_memory_mb = 0
+
+    def submit(self, step_index, command):
+        self.submitted.append(step_index)
+        # steps needing more than the budget are run as if they needed 
+        # the whole budget
+        cores, memory_mb = \
+         get_step_requirements(command, synthetic_requirements)
+        self.running[step_index] = StepRequirements(min(cores, 4),
+                                                    min(memory_mb, 1000))
+        self.peak_cores = max(self.peak_cores,
+                              sum([r.cores for r in self.running.values()]))
+        self.peak_memory_mb = max(self.peak_memory_mb,
+         sum([r.memory_mb for r in self.running.values()]))
+        LocalPoolExecutor.submit(self, step_index, command)
+
+    def getResult(self):
+        result = LocalPoolExecutor.getResult(self)
+        del self.running[result[0]]
+        return result
+
+synthetic_requirements = {'big.py': StepRequirements(1, 600),
+                          'small.py': StepRequirements(1, 100),
+                          'wide.py': StepRequirements(3, 100),
+                          'huge.py': StepRequirements(8, 4000)}
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+import sys
+from os.path import exists, join
+from shutil import rmtree
+from socket import socket, AF_UNIX, SOCK_STREAM
+from tempfile import mkdtemp
+from threading import Thread
+from cogent.util.unit_test import TestCase, main
+from qiime.util import make_option
+from cmd_abstraction.util import QiimeCommand
+from cmd_abstraction.command_client import send_command
+from cmd_abstraction.server import (remove_stale_socket,
+                                    QiimeCommandServer)
+
+class EchoCommand(QiimeCommand):
+    _required_options = [make_option('-s','--string',type='string')]
+    _optional_options = [make_option('-e','--exit_status',type='int',
+                                     default=0)]
+    _digest_cache_fp = None
+    _run_history_fp = None
+
+    def run_command(self, params, args):
+        print params['string']
+        sys.stderr.write('to stderr\n')
+        if params['exit_status']:
+            sys.exit(params['exit_status'])
+
+class ServerTests(TestCase):
+
+    def setUp(self):
+        self.test_dir = mkdtemp(prefix='server_tests_')
+        self.socket_fp = join(self.test_dir, 'qiime.sock')
+
+    def tearDown(self):
+        rmtree(self.test_dir)
+
+    def test_remove_stale_socket(self):
+        """ sockets left by servers that aren't running are removed """
+        # nothing to remove
+        remove_stale_socket(self.socket_fp)
+        # a bound socket that nothing listens on, as left by a crash
+        s = socket(AF_UNIX, SOCK_STREAM)
+        s.bind(self.socket_fp)
+        s.close()
+        self.assertTrue(exists(self.socket_fp))
+        remove_stale_socket(self.socket_fp)
+        self.assertFalse(exists(self.socket_fp))
+
+    def test_remove_stale_socket_in_use(self):
+        """ sockets of running servers, and other files, are left alone """
+        s = socket(AF_UNIX, SOCK_STREAM)
+        s.bind(self.socket_fp)
+        s.listen(1)
+        try:
+            self.assertRaises(ValueError, remove_stale_socket,
+                              self.socket_fp)
+            self.assertTrue(exists(self.socket_fp))
+        finally:
+            s.close()
+        fp = join(self.test_dir, 'not_a_socket')
+        open(fp, 'w').write('x')
+        self.assertRaises(ValueError, remove_stale_socket, fp)
+        self.assertTrue(exists(fp))
+
+    def test_server_runs_requests(self):
+        """ requests are dispatched to commands, and their output returned """
+        server = QiimeCommandServer(self.socket_fp,
+                                    {'EchoCommand': EchoCommand})
+        thread = Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        try:
+            exit_status, stdout, stderr = send_command(
+             self.socket_fp, 'echo_command.py',
+             ['echo_command.py', '-s', 'hello',
+              '--master_script_log_dir', self.test_dir])
+            self.assertEqual((exit_status, stdout, stderr),
+                             (0, 'hello\n', 'to stderr\n'))
+            exit_status, stdout, stderr = send_command(
+             self.socket_fp, 'EchoCommand',
+             ['echo_command.py', '-s', 'bye', '-e', '3',
+              '--master_script_log_dir', self.test_dir])
+            self.assertEqual((exit_status, stdout), (3, 'bye\n'))
+            exit_status, stdout, stderr = send_command(
+             self.socket_fp, 'missing.py', ['missing.py'])
+            self.assertEqual(exit_status, 1)
+            self.assertEqual(stderr, 'Unknown command: missing.py\n')
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertFalse(exists(self.socket_fp))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+import sys
+from os.path import join, exists
+from shutil import rmtree
+from tempfile import mkdtemp
+from cogent.util.unit_test import TestCase, main
+from qiime.test import initiate_timeout, disable_timeout
+from qiime.workflow import WorkflowLogger, no_status_updates
+from cmd_abstraction.command_handlers import (make_dag_command_handler,
+                                              build_command_dependency_graph,
+                                              flatten_commands)
+from cmd_abstraction.fasta_index import scan_fasta
+from cmd_abstraction.sharding import (compute_shards,
+                                      FastaRangeReader,
+                                      merge_otu_maps,
+                                      run_on_range,
+                                      get_shard_range,
+                                      shard_pick_otus_step,
+                                      shard_commands,
+                                      make_sharded_command_handler)
+
+class ShardingTests(TestCase):
+
+    def setUp(self):
+        self.test_dir = mkdtemp(prefix='sharding_tests_')
+        self.fasta_fp = join(self.test_dir, 'seqs.fna')
+        open(self.fasta_fp, 'w').write(fasta)
+        self.index = scan_fasta(self.fasta_fp)[0]
+        self.picker_fp = join(self.test_dir, 'pick_otus.py')
+        open(self.picker_fp, 'w').write(exact_match_otu_picker)
+        initiate_timeout(60)
+
+    def tearDown(self):
+        disable_timeout()
+        rmtree(self.test_dir)
+
+    def test_compute_shards(self):
+        """ shards are contiguous, record-aligned and cover the file """
+        self.assertEqual(compute_shards(self.index, 1), [(0, len(fasta))])
+        for num_shards in [2, 3, 5]:
+            shards = compute_shards(self.index, num_shards)
+            self.assertEqual(len(shards), num_shards)
+            self.assertEqual(shards[0][0], 0)
+            self.assertEqual(shards[-1][1], len(fasta))
+            for (start, end), (next_start, next_end) in zip(shards,
+                                                            shards[1:]):
+                self.assertEqual(end, next_start)
+                self.assertEqual(fasta[next_start], '>')
+        # no more shards than records
+        self.assertEqual(len(compute_shards(self.index, 100)), 10)
+
+    def test_fasta_range_reader(self):
+        """ only the range is read """
+        reader = FastaRangeReader(self.fasta_fp, 10, 30)
+        self.assertEqual(reader.readline(), fasta[10:15])
+        self.assertEqual(reader.read(3), fasta[15:18])
+        self.assertEqual(reader.read(), fasta[18:30])
+        self.assertEqual(reader.read(), '')
+        reader.close()
+        reader = FastaRangeReader(self.fasta_fp, 0, 20)
+        self.assertEqual(''.join(reader), fasta[:20])
+        reader.close()
+
+    def test_merge_otu_maps(self):
+        """ OTUs are merged in shard order """
+        fps = [join(self.test_dir, 'a_otus.txt'),
+               join(self.test_dir, 'b_otus.txt')]
+        open(fps[0], 'w').write('r1\ts1\ts2\nr2\ts3\n')
+        open(fps[1], 'w').write('r3\ts4\nr1\ts5\n')
+        open(join(self.test_dir, 'b_failures.txt'), 'w').write('s6\n')
+        output_fp = join(self.test_dir, 'merged_otus.txt')
+        merge_otu_maps(fps, output_fp)
+        self.assertEqual(open(output_fp).read(),
+                         'r1\ts1\ts2\ts5\nr2\ts3\nr3\ts4\n')
+        self.assertEqual(open(join(self.test_dir,
+                                   'merged_failures.txt')).read(), 's6\n')
+        # sequences are missing (or duplicated)
+        for num_seqs in [5, 7]:
+            missing_fp = join(self.test_dir, 'missing_otus.txt')
+            self.assertRaises(ValueError, merge_otu_maps, fps, missing_fp,
+                              num_seqs)
+            self.assertFalse(exists(missing_fp))
+        merge_otu_maps(fps, output_fp, 6)
+
+    def test_run_on_range(self):
+        """ commands fail if they, or the reading of their range, fail """
+        output_fp = join(self.test_dir, 'range.txt')
+        self.assertEqual(run_on_range(self.fasta_fp, 10, 30,
+                                      ['sh', '-c', 'cat > %s' % output_fp]),
+                         0)
+        self.assertEqual(open(output_fp).read(), fasta[10:30])
+        self.assertEqual(run_on_range(self.fasta_fp, 10, 30,
+                                      ['sh', '-c', 'cat > /dev/null; exit 2']),
+                         2)
+        # the file ends before the range does (e.g., it was truncated)
+        self.assertEqual(run_on_range(self.fasta_fp, 10, len(fasta) + 10,
+                                      ['sh', '-c', 'cat > /dev/null']),
+                         1)
+        self.assertEqual(get_shard_range(
+         'py -m cmd_abstraction.sharding run seqs.fna 0 40 -- pick_otus.py'),
+         (0, 40))
+        self.assertEqual(get_shard_range('pick_otus.py -i seqs.fna'), None)
+
+    def test_shard_pick_otus_step(self):
+        """ pick_otus.py steps are replaced by shard steps and a merge """
+        step = ('Pick OTUs', 'pick_otus.py -i %s -o out/picked '
+                '-m uclust_ref -r ref.fna' % self.fasta_fp)
+        steps = shard_pick_otus_step(step, self.fasta_fp,
+                                     [(0, 40), (40, 80)], python_exe='py',
+                                     num_seqs=10)
+        self.assertEqual(steps, [
+         ('Pick OTUs (shard 1 of 2)',
+          'py -m cmd_abstraction.sharding run %s 0 40 -- pick_otus.py -i '
+          '/dev/stdin -o out/picked/shards/shard_0 -m uclust_ref -r ref.fna '
+          '--suppress_new_clusters' % self.fasta_fp),
+         ('Pick OTUs (shard 2 of 2)',
+          'py -m cmd_abstraction.sharding run %s 40 80 -- pick_otus.py -i '
+          '/dev/stdin -o out/picked/shards/shard_1 -m uclust_ref -r ref.fna '
+          '--suppress_new_clusters' % self.fasta_fp),
+         ('Pick OTUs (merge shards)',
+          'py -m cmd_abstraction.sharding merge -o out/picked/seqs_otus.txt '
+          '-n 10 out/picked/shards/shard_0 out/picked/shards/shard_1')])
+        # de novo OTUs can't be merged
+        self.assertRaises(ValueError, shard_pick_otus_step,
+                          ('Pick OTUs', 'pick_otus.py -i %s -o out/picked'
+                           % self.fasta_fp), self.fasta_fp, [(0, 40)])
+
+    def test_shard_commands(self):
+        """ the shards run independently, and later steps wait for the merge
+        """
+        commands = [[('Pick OTUs', 'pick_otus.py -i %s -o out/picked '
+                      '-m blast' % self.fasta_fp)],
+                    [('Pick rep set', 'pick_rep_set.py -i '
+                      'out/picked/seqs_otus.txt -o out/rep_set.fna')]]
+        steps = flatten_commands(shard_commands(commands, self.fasta_fp,
+                                                [(0, 40), (40, 80)]))
+        self.assertEqual([s[0] for s in steps],
+                         ['Pick OTUs (shard 1 of 2)',
+                          'Pick OTUs (shard 2 of 2)',
+                          'Pick OTUs (merge shards)',
+                          'Pick rep set'])
+        self.assertEqual(build_command_dependency_graph(steps),
+                         [set(), set(), set([0, 1]), set([2])])
+
+    def test_sharded_run_matches_unsharded_run(self):
+        """ the merged OTU map is the same as that of the unsharded input
+        """
+        def get_commands(output_dir):
+            return [[('Pick OTUs', '%s %s -i %s -o %s -m uclust_ref' %
+                      (sys.executable, self.picker_fp, self.fasta_fp,
+                       output_dir))]]
+        unsharded_dir = join(self.test_dir, 'unsharded')
+        make_dag_command_handler(1)(get_commands(unsharded_dir),
+                                    no_status_updates,
+                                    WorkflowLogger())
+        for num_shards in [2, 3, 10]:
+            sharded_dir = join(self.test_dir, 'sharded_%d' % num_shards)
+            command_handler = make_sharded_command_handler(
+                                make_dag_command_handler(3),
+                                self.fasta_fp,
+                                compute_shards(self.index, num_shards),
+                                self.index.getNumSeqs())
+            command_handler(get_commands(sharded_dir),
+                            no_status_updates,
+                            WorkflowLogger())
+            # each shard's OTU map was written by its own picker
+            self.assertTrue(exists(join(sharded_dir, 'shards', 'shard_1',
+                                        'stdin_otus.txt')))
+            for fn in ['seqs_otus.txt', 'seqs_failures.txt']:
+                self.assertEqual(open(join(sharded_dir, fn)).read(),
+                                 open(join(unsharded_dir, fn)).read())
+
+fasta = """>S1_1
+ACGTACGT
+>S1_2
+ACGTAAAA
+>S2_3
+ACGTACGT
+>S2_4
+ACGTNNNN
+>S3_5
+ACGTAAAA
+>S3_6
+CCCCGGGG
+>S1_7
+ACGTACGT
+>S2_8
+CCCCGGGG
+>S3_9
+ACGTNNNN
+>S1_10
+TTTTACGT
+"""
+
+# assigns each sequence to an OTU named for its sequence (i.e., exact
+# matching against a reference of every sequence), except that sequences
+# containing Ns fail. OTUs are listed in the order they first appear, and
+# their sequences in input order.
+exact_match_otu_picker = """
+import sys
+from optparse import OptionParser
+from os import makedirs
+from os.path import join, splitext, basename, exists
+parser = OptionParser()
+parser.add_option('-i')
+parser.add_option('-o')
+parser.add_option('-m')
+parser.add_option('-C', '--suppress_new_clusters', action='store_true')
+opts, args = parser.parse_args()
+if not exists(opts.o):
+    makedirs(opts.o)
+otus = []
+members = {}
+failures = []
+lines = [l.strip() for l in open(opts.i)]
+for seq_id, seq in zip(lines[::2], lines[1::2]):
+    if 'N' in seq:
+        failures.append(seq_id[1:])
+        continue
+    if seq not in members:
+        otus.append(seq)
+        members[seq] = []
+    members[seq].append(seq_id[1:])
+base = join(opts.o, splitext(basename(opts.i))[0])
+f = open(base + '_otus.txt', 'w')
+for otu in otus:
+    f.write('%s\\n' % '\\t'.join([otu] + members[otu]))
+f.close()
+open(base + '_failures.txt', 'w').write(''.join([s + '\\n' for s in failures]))
+"""
+
+if __name__ == "__main__":
+    main()
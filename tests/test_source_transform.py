@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+from cogent.util.unit_test import TestCase, main
+from cmd_abstraction.source_transform import (get_statements,
+                                              transform_script)
+
+class SourceTransformTests(TestCase):
+
+    def test_get_statements(self):
+        """ multi-line statements are grouped, comments stand alone """
+        statements = list(get_statements(
+         "# a comment\nx = f(1,\n      2)\n\ny = 3\n"))
+        self.assertEqual([[t[1] for t in code] for tokens, code in statements],
+                         [[], ['x', '=', 'f', '(', '1', ',', '2', ')'],
+                          [], ['y', '=', '3']])
+
+    def test_transform_script(self):
+        """ scripts are split into module and class code and rewritten """
+        module_source, class_source = transform_script(example_script)
+        self.assertEqual(module_source, expected_module_source)
+        self.assertEqual(class_source, expected_class_source)
+
+    def test_transform_script_rewrites_every_opts(self):
+        """ every opts.x is rewritten, but not other objects' opts """
+        module_source, class_source = transform_script(
+         "script_info = {}\nx = opts.a + opts.b + self.opts.c\n")
+        self.assertEqual(class_source,
+                         "    x = opts['a'] + opts['b'] + self.opts.c\n")
+
+example_script = '''#!/usr/bin/env python
+# File created on 01 Aug 2012
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__credits__ = ["Greg Caporaso",
+               "Rob Knight"]
+
+from qiime.util import (parse_command_line_parameters,
+                        make_option, load_qiime_config)
+
+# a module-level comment
+qiime_config = load_qiime_config()
+
+script_info = {}
+script_info['brief_description'] = "Demo"
+script_info["script_description"] = """A multi-line
+description with opts.fake in it."""
+script_info['required_options'] = [
+ make_option('-i','--input_fp',type="existing_filepath",help='the input'),
+]
+
+def main():
+    option_parser, opts, args =\\
+       parse_command_line_parameters(**script_info)
+    # check things
+    if opts.a and opts.b: option_parser.error("both a and b")
+    if opts.n > 1:
+        option_parser.error(
+         "n (%d) must be at most 1" % opts.n)
+    x = foo(opts.a,
+            opts.b)
+
+if __name__ == "__main__":
+    main()
+'''
+
+expected_module_source = '''
+
+from qiime.util import (parse_command_line_parameters,
+                        make_option, load_qiime_config)
+
+# a module-level comment
+qiime_config = get_qiime_config()
+
+'''
+
+expected_class_source = '''    _brief_description = "Demo"
+    _script_description = """A multi-line
+description with opts.fake in it."""
+    _required_options = [
+     make_option('-i','--input_fp',type="existing_filepath",help='the input'),
+    ]
+    
+    def run_command(self,opts,args):
+        # check things
+        if opts['a'] and opts['b']: raise QiimeCommandError("both a and b")
+        if opts['n'] > 1:
+            raise QiimeCommandError(
+             "n (%d) must be at most 1" % opts['n'])
+        x = foo(opts['a'],
+                opts['b'])
+    
+'''
+
+if __name__ == "__main__":
+    main()
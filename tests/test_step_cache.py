@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# File created on 17 Oct 2026
+from __future__ import division
+
+__author__ = "Greg Caporaso"
+__copyright__ = "Copyright 2011, The QIIME project"
+__credits__ = ["Greg Caporaso"]
+__license__ = "GPL"
+__version__ = "1.5.0-dev"
+__maintainer__ = "Greg Caporaso"
+__email__ = "gregcaporaso@gmail.com"
+__status__ = "Development"
+
+from shutil import rmtree
+from os.path import exists, join
+from cogent.util.unit_test import TestCase, main
+from cogent.util.misc import create_dir
+from qiime.util import (get_qiime_temp_dir,
+                        get_tmp_filename)
+from qiime.test import initiate_timeout, disable_timeout
+from qiime.workflow import WorkflowLogger, no_status_updates
+from cmd_abstraction.command_handlers import call_commands_as_dag
+from cmd_abstraction.step_cache import StepCache
+
+class StepCacheTests(TestCase):
+
+    def setUp(self):
+
+        self.dirs_to_remove = []
+
+        tmp_dir = get_qiime_temp_dir()
+        self.test_out = get_tmp_filename(tmp_dir=tmp_dir,
+                                         prefix='step_cache_tests_',
+                                         suffix='',
+                                         result_constructor=str)
+        self.dirs_to_remove.append(self.test_out)
+        create_dir(self.test_out)
+
+        self.input_fp = join(self.test_out,'in.txt')
+        open(self.input_fp,'w').write('a\n')
+        self.cache_fp = join(self.test_out,'step_cache.json')
+        self.commands = [[(d, c % {'out':self.test_out})]
+                         for d, c in cached_steps]
+
+        initiate_timeout(60)
+
+    def tearDown(self):
+
+        disable_timeout()
+        for d in self.dirs_to_remove:
+            if exists(d):
+                rmtree(d)
+
+    def run_steps(self, version='1.0'):
+        step_cache = StepCache(self.cache_fp, version)
+        call_commands_as_dag(self.commands,
+                             no_status_updates,
+                             WorkflowLogger(),
+                             jobs_to_start=1,
+                             step_cache=step_cache)
+        return step_cache.hits
+
+    def test_unchanged_steps_are_hits(self):
+        """ re-running an unchanged workflow skips every step """
+        self.assertEqual(self.run_steps(), [])
+        self.assertEqual(sorted(self.run_steps()), ['a', 'b', 'c'])
+
+    def test_changed_inputs_are_misses(self):
+        """ steps are re-run when their inputs change """
+        self.run_steps()
+        # c doesn't read in.txt, so is the only step which isn't re-run
+        open(self.input_fp,'w').write('a\n\n')
+        self.assertEqual(self.run_steps(), ['c'])
+        self.assertEqual(open(join(self.test_out,'b.txt')).read(), 'a\n\na\n\n')
+
+    def test_changed_outputs_are_misses(self):
+        """ steps are re-run when their recorded outputs have changed """
+        self.run_steps()
+        open(join(self.test_out,'c.txt'),'w').write('x\n')
+        self.assertEqual(sorted(self.run_steps()), ['a', 'b'])
+        self.assertEqual(open(join(self.test_out,'c.txt')).read(), 'c\n')
+
+    def test_version_change_invalidates(self):
+        """ steps are re-run when the version changes """
+        self.run_steps()
+        self.assertEqual(self.run_steps('2.0'), [])
+
+    def test_steps_without_outputs_are_not_cached(self):
+        """ steps whose outputs can't be detected are always run """
+        self.commands.append([('d', 'touch %s' %
+                                    join(self.test_out,'d.txt'))])
+        self.assertEqual(self.run_steps(), [])
+        self.assertEqual(sorted(self.run_steps()), ['a', 'b', 'c'])
+        self.assertEqual(
+         [r['description'] for r in
+          StepCache(self.cache_fp, '1.0')._records.values()
+          if r['description'] == 'd'], [])
+
+    def test_purge(self):
+        """ purging the cache forgets completed steps """
+        self.run_steps()
+        StepCache(self.cache_fp, '1.0').purge()
+        self.assertFalse(exists(self.cache_fp))
+        self.assertEqual(self.run_steps(), [])
+        # a damaged cache is rebuilt, and can be purged
+        open(self.cache_fp, 'w').write('{"truncated')
+        StepCache(self.cache_fp, '1.0').purge()
+        self.assertFalse(exists(self.cache_fp))
+
+cached_steps = [
+ ('a', 'cat %(out)s/in.txt > %(out)s/a.txt'),
+ ('b', 'cat %(out)s/a.txt %(out)s/a.txt > %(out)s/b.txt'),
+ ('c', 'echo c > %(out)s/c.txt'),
+]
+
+if __name__ == "__main__":
+    main()
@@ -14,13 +14,39 @@ __status__ = "Development"
 
 from cogent.util.unit_test import TestCase, main
 
+from json import load
+from glob import glob
 from shutil import rmtree
+from tempfile import mkdtemp
+from os import environ
 from os.path import exists, join
 from cogent.util.unit_test import TestCase, main
 from cogent.util.misc import remove_files, create_dir
 from qiime.util import (get_qiime_temp_dir, 
                         get_tmp_filename)
 from qiime.test import initiate_timeout, disable_timeout
+from qiime.util import make_option, parse_command_line_parameters
+from cmd_abstraction.util import (QiimeCommand,
+                                  get_options_dict,
+                                  redact_argv,
+                                  read_executor_authkey,
+                                  executor_authkey_env_var)
+
+class ExampleCommand(QiimeCommand):
+    _required_options = [make_option('-i','--input_fp',type='string')]
+    _optional_options = [make_option('-n','--num_seqs',type='int',default=1)]
+    _digest_cache_fp = None
+    _run_history_fp = None
+    
+    def run_command(self, params, args):
+        with self.phase('count_seqs'):
+            if params['num_seqs'] < 0:
+                raise ValueError, "num_seqs must be positive"
+
+class SecretExampleCommand(ExampleCommand):
+    _optional_options = ExampleCommand._optional_options + \
+     [make_option('--password',type='string')]
+    _secret_options = ['--password']
 
 class NAMETests(TestCase):
     
@@ -62,6 +88,144 @@ class NAMETests(TestCase):
             if exists(d):
                 rmtree(d)
 
+class QiimeCommandTests(TestCase):
+    
+    def test_option_schema_built_once(self):
+        """ instantiating commands doesn't change the option lists """
+        for i in range(3):
+            cmd = ExampleCommand()
+            script_info = cmd.getScriptInfo()
+            self.assertEqual(
+             [o.dest for o in script_info['required_options']],
+             ['input_fp'])
+            self.assertEqual(
+             [o.dest for o in script_info['optional_options']],
+             ['num_seqs', 'master_script_log_dir',
+              'hash_inputs_in_background', 'buffer_master_script_log',
+              'profile_mode'])
+        self.assertEqual(len(ExampleCommand._optional_options), 1)
+        self.assertTrue(ExampleCommand.getOptionSchema() is
+                        cmd.getOptionSchema())
+        self.assertEqual(ExampleCommand.getOptionSchema().dests,
+                         frozenset(['input_fp', 'num_seqs',
+                                    'master_script_log_dir',
+                                    'hash_inputs_in_background',
+                                    'buffer_master_script_log',
+                                    'profile_mode']))
+    
+    def test_get_options_dict(self):
+        """ parsed options are converted to a dict """
+        script_info = ExampleCommand().getScriptInfo()
+        script_info['command_line_args'] = ['-i', "it's.fna", '-n', '5']
+        option_parser, options, arguments = \
+         parse_command_line_parameters(**script_info)
+        params = get_options_dict(options)
+        self.assertEqual(params['input_fp'], "it's.fna")
+        self.assertEqual(params['num_seqs'], 5)
+        self.assertEqual(params['hash_inputs_in_background'], False)
+        # the dict is a copy
+        params['num_seqs'] = 6
+        self.assertEqual(options.num_seqs, 5)
+    
+    def run_example_command(self, argv):
+        script_info = ExampleCommand().getScriptInfo()
+        script_info['command_line_args'] = argv
+        option_parser, options, arguments = \
+         parse_command_line_parameters(**script_info)
+        ExampleCommand()(get_options_dict(options), arguments, argv)
+    
+    def test_profile_mode(self):
+        """ phase timings are written next to the log when requested """
+        log_dir = mkdtemp(prefix='cmd_abstraction_tests_')
+        try:
+            self.run_example_command(['-i', 'seqs.fna',
+                                      '--master_script_log_dir', log_dir])
+            self.assertEqual(len(glob(join(log_dir, '*.json'))), 0)
+            
+            self.run_example_command(['-i', 'seqs.fna',
+                                      '--master_script_log_dir', log_dir,
+                                      '--profile_mode', 'phases'])
+            profile_fps = glob(join(log_dir, '*_profile.json'))
+            self.assertEqual(len(profile_fps), 1)
+            self.assertTrue(exists(profile_fps[0].replace('_profile.json',
+                                                          '.txt')))
+            profile = load(open(profile_fps[0]))
+            self.assertEqual(profile['command'], 'ExampleCommand')
+            self.assertTrue(profile['succeeded'])
+            self.assertEqual(profile['cprofile_fp'], None)
+            self.assertEqual([p['name'] for p in profile['phases']],
+                             ['start_logging/setup_logger',
+                              'start_logging/log_input_md5s',
+                              'start_logging',
+                              'run_command/count_seqs',
+                              'run_command',
+                              'stop_logging'])
+            rmtree(log_dir)
+            
+            log_dir = mkdtemp(prefix='cmd_abstraction_tests_')
+            self.assertRaises(ValueError, self.run_example_command,
+                              ['-i', 'seqs.fna', '-n', '-1',
+                               '--master_script_log_dir', log_dir,
+                               '--profile_mode', 'cprofile'])
+            profile = load(open(glob(join(log_dir, '*_profile.json'))[0]))
+            self.assertFalse(profile['succeeded'])
+            self.assertTrue(exists(profile['cprofile_fp']))
+            self.assertEqual(profile['phases'][-1]['name'], 'run_command')
+        finally:
+            rmtree(log_dir)
+
+    def test_redact_argv(self):
+        """ the values of secret options are redacted """
+        self.assertEqual(redact_argv(['-i', 'a', '--password', 'x', '-n',
+                                      '2'], ['--password']),
+                         ['-i', 'a', '--password', '<redacted>', '-n', '2'])
+        self.assertEqual(redact_argv(['--password=x', '--pass', 'y'],
+                                     ['--password']),
+                         ['--password=<redacted>', '--pass', '<redacted>'])
+        self.assertEqual(redact_argv(['--passwords', 'x', '-p', 'y'],
+                                     ['--password']),
+                         ['--passwords', 'x', '-p', 'y'])
+    
+    def test_secret_options_not_logged(self):
+        """ secret options are redacted from the log and profile """
+        log_dir = mkdtemp(prefix='cmd_abstraction_tests_')
+        try:
+            argv = ['-i', 'seqs.fna', '--password', 'open sesame',
+                    '--master_script_log_dir', log_dir,
+                    '--profile_mode', 'phases']
+            script_info = SecretExampleCommand().getScriptInfo()
+            script_info['command_line_args'] = argv
+            option_parser, options, arguments = \
+             parse_command_line_parameters(**script_info)
+            SecretExampleCommand()(get_options_dict(options), arguments, argv)
+            profile_fp = glob(join(log_dir, '*_profile.json'))[0]
+            log = open(profile_fp.replace('_profile.json', '.txt')).read()
+            self.assertTrue('--password <redacted>' in log)
+            self.assertFalse('open sesame' in log)
+            self.assertFalse('open sesame' in open(profile_fp).read())
+        finally:
+            rmtree(log_dir)
+    
+    def test_read_executor_authkey(self):
+        """ the key is read from a file, or from the environment """
+        test_dir = mkdtemp(prefix='cmd_abstraction_tests_')
+        env_authkey = environ.pop(executor_authkey_env_var, None)
+        try:
+            authkey_fp = join(test_dir, 'key.txt')
+            open(authkey_fp, 'w').write('file key\n')
+            self.assertEqual(read_executor_authkey(authkey_fp), 'file key')
+            self.assertEqual(read_executor_authkey(), None)
+            environ[executor_authkey_env_var] = 'env key'
+            self.assertEqual(read_executor_authkey(), 'env key')
+            self.assertEqual(read_executor_authkey(authkey_fp), 'file key')
+            open(authkey_fp, 'w').write('\n')
+            self.assertRaises(ValueError, read_executor_authkey, authkey_fp)
+        finally:
+            environ.pop(executor_authkey_env_var, None)
+            if env_authkey is not None:
+                environ[executor_authkey_env_var] = env_authkey
+            rmtree(test_dir)
+
 inseqs1 = """>example input here
 ACGT
 """